@@ -0,0 +1,351 @@
+# audit_store.py — Indexed Audit Log (SQLite)
+#
+# Audit entries live in their own SQLite database so they can be kept by
+# the million and searched without loading them. Every query is answered
+# from an index:
+#   - refs: each ID an entry mentions (user, role, channel, bot, ...),
+#     flagged as target and/or actor (whoever did it: adder, inviter,
+#     executor), and the guild it happened in, in (ref, id) order;
+#   - type: (type, id);
+#   - time: entry IDs grow with time, so since/until are looked up once in
+#     the ts index and become ID bounds the other indexes can use.
+# Results are read newest first in small batches keyed by entry ID, so a
+# query only reads as far as the owner pages. Details are encrypted like
+# db.json (ENCRYPT_DB); the IDs, types and times in the indexes are not.
+# Shard processes share the file (WAL mode). Appends run in a thread
+# (db_manager.add_to_audit_log) so a busy file never stalls the event loop.
+import datetime
+import heapq
+import itertools
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+from logger import logger
+import db_manager
+from config import AUDIT_DB_PATH, AUDIT_LOG_MAX_ENTRIES, AUDIT_QUERY_BATCH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    details TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_type ON entries (type, id);
+CREATE INDEX IF NOT EXISTS entries_ts ON entries (ts);
+CREATE TABLE IF NOT EXISTS refs (
+    ref INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    roles INTEGER NOT NULL,
+    PRIMARY KEY (ref, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS refs_id ON refs (id);
+"""
+
+# Roles an ID plays in an entry (refs.roles is a bitmask of them)
+TARGET = 1
+ACTOR = 2
+GUILD = 4
+
+# Detail keys naming whoever did it; other *_id keys are targets
+ACTOR_KEYS = ('executor_id', 'adder_id', 'inviter_id', 'moderator_id')
+# Detail key naming the guild an entry belongs to (.logs searches one guild)
+GUILD_KEY = 'guild_id'
+# *_id keys that aren't Discord objects an owner would look up
+IGNORED_KEYS = ('snapshot_id',)
+
+_PRUNE_EVERY = 1000  # appends between checks of AUDIT_LOG_MAX_ENTRIES
+
+_conn = None
+_lock = threading.Lock()
+_appends = 0
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(AUDIT_DB_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+        _conn.execute('PRAGMA journal_mode=WAL')
+        _conn.execute('PRAGMA synchronous=NORMAL')
+        _conn.executescript(SCHEMA)
+        _import_legacy(_conn)
+    return _conn
+
+def _refs(details: dict) -> dict:
+    """Get {id: roles} for the IDs an entry's details mention"""
+    refs = {}
+    for key, value in details.items():
+        if not key.endswith('_id') or key in IGNORED_KEYS:
+            continue
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if isinstance(value, int) and not isinstance(value, bool):
+            role = GUILD if key == GUILD_KEY else ACTOR if key in ACTOR_KEYS else TARGET
+            refs[value] = refs.get(value, 0) | role
+    return refs
+
+def _insert(conn: sqlite3.Connection, ts: float, event_type: str, details: dict):
+    text = db_manager.encrypt_text(json.dumps(details, ensure_ascii=False, default=str))
+    entry_id = conn.execute(
+        'INSERT INTO entries (ts, type, details) VALUES (?, ?, ?)', (ts, event_type, text)
+    ).lastrowid
+    refs = _refs(details)
+    if refs:
+        conn.executemany('INSERT INTO refs (ref, id, roles) VALUES (?, ?, ?)',
+                         [(ref, entry_id, roles) for ref, roles in refs.items()])
+
+def _import_legacy(conn: sqlite3.Connection):
+    """Move the audit log db.json used to keep (its last 1000 entries) into the store"""
+    legacy = db_manager.load_db().get('audit_log')
+    if legacy is None:
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Another shard process may have imported it already
+        if not legacy or conn.execute('SELECT 1 FROM entries LIMIT 1').fetchone():
+            legacy = []
+        for entry in legacy:
+            try:
+                stamp = datetime.datetime.fromisoformat(entry['timestamp']).replace(tzinfo=datetime.timezone.utc)
+                ts = stamp.timestamp()
+            except (KeyError, TypeError, ValueError):
+                ts = time.time()
+            _insert(conn, ts, entry.get('type', 'unknown'), entry.get('details') or {})
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    db_manager.update_json(db_manager.DB_PATH, lambda db: db.pop('audit_log', None), db_manager._get_default_db())
+    if legacy:
+        logger.info(f'Moved {len(legacy)} audit log entries from {db_manager.DB_PATH} into {AUDIT_DB_PATH}')
+
+# ============= WRITING =============
+def append(event_type: str, details: dict):
+    """Store an audit entry (the oldest are dropped past AUDIT_LOG_MAX_ENTRIES)"""
+    global _appends
+    with _lock:
+        conn = _connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            _insert(conn, time.time(), event_type, details)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        _appends += 1
+        if _appends % _PRUNE_EVERY == 0:
+            _prune(conn)
+
+def _prune(conn: sqlite3.Connection):
+    """Drop entries (and their refs) older than the newest AUDIT_LOG_MAX_ENTRIES"""
+    newest = conn.execute('SELECT MAX(id) FROM entries').fetchone()[0]
+    if newest is None or newest <= AUDIT_LOG_MAX_ENTRIES:
+        return
+    cutoff = newest - AUDIT_LOG_MAX_ENTRIES
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM refs WHERE id <= ?', (cutoff,))
+        conn.execute('DELETE FROM entries WHERE id <= ?', (cutoff,))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+def count() -> int:
+    """Number of stored entries"""
+    with _lock:
+        return _connect().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+# ============= QUERIES =============
+class Query(NamedTuple):
+    refs: tuple = ()      # (id, roles mask or 0 for any role); every one must match
+    types: tuple = ()     # entry types; any may match
+    since: float = None   # unix time bounds
+    until: float = None
+    limit: int = None
+    guild: int = None     # only entries from this guild (None = every guild)
+
+FILTERS = ('type', 'actor', 'target', 'since', 'until', 'limit', 'guild')
+
+_DURATION = re.compile(r'^(\d+)([smhdw])$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+def _parse_time(text: str, now: float):
+    """Parse `2h` / `7d` (ago) or an ISO date/time in UTC; None if neither"""
+    match = _DURATION.match(text.lower())
+    if match:
+        return now - int(match.group(1)) * _UNITS[match.group(2)]
+    try:
+        stamp = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=datetime.timezone.utc)
+    return stamp.timestamp()
+
+def _parse_id(text: str):
+    """Parse an ID or a user, role or channel mention"""
+    text = text.strip('<>@!&#')
+    return int(text) if text.isdigit() else None
+
+def parse_query(text: str, guild_id: int = None):
+    """
+    Parse a .logs query: IDs (any role) and type:, actor:, target:,
+    since:, until:, limit: filters, e.g. `123 type:ban_by_owner since:7d`
+
+    The query covers `guild_id`'s entries unless it has `guild:all`.
+
+    Returns:
+        tuple: (Query, None), or (None, error message)
+    """
+    refs, types, since, until, limit, guild = [], [], None, None, None, guild_id
+    now = time.time()
+    for word in text.split():
+        name, _, value = word.partition(':')
+        if not value:
+            ref = _parse_id(word)
+            if ref is None:
+                return None, f'❌ Not an ID or filter: `{word}`'
+            refs.append((ref, 0))
+            continue
+
+        name = name.lower()
+        if name == 'type':
+            types.extend(part.lower() for part in value.split(',') if part)
+        elif name in ('actor', 'target'):
+            ref = _parse_id(value)
+            if ref is None:
+                return None, f'❌ `{name}:` needs an ID or mention'
+            refs.append((ref, ACTOR if name == 'actor' else TARGET))
+        elif name in ('since', 'until'):
+            stamp = _parse_time(value, now)
+            if stamp is None:
+                return None, f'❌ `{name}:` takes a duration like `2h` / `7d` or a date like `2024-05-01`'
+            if name == 'since':
+                since = stamp
+            else:
+                until = stamp
+        elif name == 'limit':
+            if not value.isdigit() or int(value) < 1:
+                return None, '❌ `limit:` takes a positive number'
+            limit = int(value)
+        elif name == 'guild':
+            if value.lower() != 'all':
+                return None, '❌ `guild:` only takes `all` (searches every guild)'
+            guild = None
+        else:
+            return None, f"❌ Unknown filter `{name}:` (use {', '.join(f'`{f}:`' for f in FILTERS)})"
+
+    return Query(tuple(refs), tuple(dict.fromkeys(types)), since, until, limit, guild), None
+
+def _id_bounds(conn: sqlite3.Connection, query: Query):
+    """Turn the time bounds into entry ID bounds: (lowest, highest), or None if nothing is in range"""
+    low = 0
+    if query.since is not None:
+        row = conn.execute('SELECT id FROM entries WHERE ts >= ? ORDER BY ts LIMIT 1', (query.since,)).fetchone()
+        if row is None:
+            return None
+        low = row[0]
+    if query.until is not None:
+        row = conn.execute('SELECT id FROM entries WHERE ts < ? ORDER BY ts DESC LIMIT 1', (query.until,)).fetchone()
+    else:
+        row = conn.execute('SELECT MAX(id) FROM entries').fetchone()
+    if row is None or row[0] is None or row[0] < low:
+        return None
+    return low, row[0]
+
+def _batch_sql(query: Query) -> tuple:
+    """
+    Build the query for one batch (newest first below an ID)
+
+    The first ref, if any, drives the scan through the refs index; the
+    type, if any, otherwise through the type index; the guild only when
+    there is nothing narrower. The rest are checked per row. Parameters:
+    filters..., lowest ID, below ID, batch size.
+
+    Returns:
+        tuple: (sql, filter params)
+    """
+    refs = list(query.refs)
+    if query.guild is not None:
+        refs.append((query.guild, GUILD))
+    lead = refs[:1] if query.refs or not query.types else []
+    checked = refs[len(lead):]
+
+    params = []
+    checks = []
+    for ref, roles in checked:
+        checks.append('EXISTS (SELECT 1 FROM refs x WHERE x.ref = ? AND x.id = e.id' +
+                      (' AND x.roles & ?)' if roles else ')'))
+        params += [ref, roles] if roles else [ref]
+
+    if lead:
+        ref, roles = lead[0]
+        where = ['r.ref = ?'] + (['r.roles & ?'] if roles else [])
+        head = [ref] + ([roles] if roles else [])
+        if query.types:
+            where.append('e.type = ?')
+            head.append(query.types[0])
+        sql = ('SELECT e.id, e.ts, e.type, e.details FROM refs r CROSS JOIN entries e ON e.id = r.id '
+               f"WHERE {' AND '.join(where + checks)} AND r.id >= ? AND r.id < ? ORDER BY r.id DESC LIMIT ?")
+        return sql, head + params
+
+    where = checks
+    if query.types:
+        where = ['type = ?'] + checks
+        params = [query.types[0]] + params
+    sql = ('SELECT id, ts, type, details FROM entries e '
+           f"WHERE {' AND '.join(where + ['id >= ?', 'id < ?'])} ORDER BY id DESC LIMIT ?")
+    return sql, params
+
+def _search_one(query: Query):
+    """Stream entries matching a query with at most one type, newest first"""
+    with _lock:
+        conn = _connect()
+        bounds = _id_bounds(conn, query)
+    if bounds is None:
+        return
+    low, high = bounds
+    sql, params = _batch_sql(query)
+
+    below = high + 1
+    while True:
+        with _lock:
+            rows = _connect().execute(sql, (*params, low, below, AUDIT_QUERY_BATCH)).fetchall()
+        for entry_id, ts, event_type, details in rows:
+            yield {'id': entry_id, 'ts': ts, 'type': event_type, 'details': details}
+        if len(rows) < AUDIT_QUERY_BATCH:
+            return
+        below = rows[-1][0]
+
+def search(query: Query):
+    """
+    Stream the entries matching a query, newest first
+
+    Nothing is read until the generator is, and then AUDIT_QUERY_BATCH
+    entries at a time. Details stay encrypted until details() is called.
+
+    Yields:
+        dict: id, ts (unix time), type, details (stored text)
+    """
+    if len(query.types) > 1:
+        # One index scan per type, merged by entry ID
+        streams = [_search_one(query._replace(types=(event_type,))) for event_type in query.types]
+        results = heapq.merge(*streams, key=lambda entry: -entry['id'])
+    else:
+        results = _search_one(query)
+    return itertools.islice(results, query.limit)
+
+def details(entry: dict) -> dict:
+    """Decrypt and parse a streamed entry's details"""
+    try:
+        return json.loads(db_manager.decrypt_text(entry['details']))
+    except Exception as e:
+        logger.warning(f"Unreadable audit entry {entry['id']}: {e}")
+        return {}
+
+def timestamp(entry: dict) -> str:
+    """An entry's time as `YYYY-MM-DD HH:MM:SS` (UTC)"""
+    return datetime.datetime.fromtimestamp(entry['ts'], datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
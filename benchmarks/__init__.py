@@ -0,0 +1 @@
+# benchmarks — Offline Microbenchmarks for Q Bot Hot Paths
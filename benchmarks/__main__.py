@@ -0,0 +1,67 @@
+# benchmarks/__main__.py — Run All Benchmarks
+#
+#   python -m benchmarks                          # run and print
+#   python -m benchmarks --json base.json         # also save results
+#   python -m benchmarks --compare base.json      # run and compare with a saved run
+#   python -m benchmarks --compare base.json new.json
+#   python -m benchmarks --only db. filters.      # names starting with these prefixes
+import argparse
+import importlib
+import logging
+import sys
+from benchmarks.harness import print_results, write_results, read_results, compare_results, print_comparison
+
+MODULES = (
+    'benchmarks.bench_permissions',
+    'benchmarks.bench_db',
+    'benchmarks.bench_filters',
+    'benchmarks.bench_alerts',
+    'benchmarks.bench_messages',
+    'benchmarks.bench_pipeline',
+)
+
+def run_all(prefixes: list = None) -> list:
+    """Run every benchmark module, keeping results whose name matches a prefix"""
+    results = []
+    for name in MODULES:
+        module = importlib.import_module(name)
+        for result in module.run():
+            if not prefixes or result['name'].startswith(tuple(prefixes)):
+                results.append(result)
+    return results
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Offline microbenchmarks')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', nargs='+', metavar='FILE',
+                        help='baseline results file (and optionally a second file instead of running)')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='slowdown that counts as a regression (default: 0.10)')
+    parser.add_argument('--only', nargs='+', metavar='PREFIX', help='only keep results with these name prefixes')
+    args = parser.parse_args(argv)
+
+    # Keep log handlers out of the timings
+    from logger import logger
+    logger.setLevel(logging.WARNING)
+
+    if args.compare and len(args.compare) > 1:
+        results = read_results(args.compare[1])['results']
+    else:
+        results = run_all(args.only)
+        print_results(results)
+
+    if args.json:
+        write_results(results, args.json)
+        print(f'\nResults written to {args.json}')
+
+    if args.compare:
+        base = read_results(args.compare[0])
+        print(f"\nCompared with {args.compare[0]} (commit {base.get('commit') or 'unknown'}):")
+        rows = compare_results(base['results'], results, args.threshold)
+        print_comparison(rows)
+        if any(row['regressed'] for row in rows):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# benchmarks/bench_alerts.py — Alert Path with a Stubbed DM Sender
+#
+# Run from the repo root: python -m benchmarks.bench_alerts
+import asyncio
+import contextlib
+from collections import deque
+import dm_notify
+import fakes
+from benchmarks.harness import bench, print_results, scratch_db
+
+@contextlib.contextmanager
+def stubbed_alerts():
+    """Disable rate limiting and count DMs instead of sending them"""
+    saved = {
+        name: getattr(dm_notify, name)
+        for name in ('_send_dm_alert', 'DM_ALERTS', 'OWNER_ID', 'ALERT_COOLDOWN',
+                     'MAX_ALERTS_PER_MINUTE', 'alert_timestamps')
+    }
+    sent = [0]
+
+    async def _send_dm_alert(bot, title, details, priority, embed_fields=None, quick_action_text=None, guild=None):
+        sent[0] += 1
+
+    dm_notify._send_dm_alert = _send_dm_alert
+    dm_notify.DM_ALERTS = True
+    dm_notify.OWNER_ID = dm_notify.OWNER_ID or 1
+    dm_notify.ALERT_COOLDOWN = 0
+    dm_notify.MAX_ALERTS_PER_MINUTE = 10 ** 9
+    dm_notify.alert_timestamps = deque()
+    try:
+        yield sent
+    finally:
+        for name, value in saved.items():
+            setattr(dm_notify, name, value)
+
+def run() -> list:
+    """Run the benchmarks and return result dicts (plain database)"""
+    state = fakes.make_state()
+    guild = fakes.make_guild(state, fakes.guild_payload(1, 'Bench'))
+    bot = fakes.FakeBot(guild)
+    loop = asyncio.new_event_loop()
+
+    def send(priority):
+        # alert() increments the guild's total_alerts stat, so this includes one settings write
+        loop.run_until_complete(dm_notify.alert(bot, 'Role Updated', '**Role:** @mod', priority=priority, guild=guild))
+
+    try:
+        with scratch_db(), stubbed_alerts() as sent:
+            results = [
+                bench('alerts.alert.warning', lambda: send('🟡 WARNING'), number=50),
+                bench('alerts.alert.critical', lambda: send('🔴 CRITICAL'), number=50),
+            ]
+            assert sent[0] == 2 * 50 * 5, sent[0]
+    finally:
+        loop.close()
+
+    return results
+
+if __name__ == '__main__':
+    print_results(run())
@@ -0,0 +1,134 @@
+# benchmarks/bench_audit.py — Audit Log Queries on a Full-Size Log
+#
+# Fills a scratch audit store with AUDIT_LOG_MAX_ENTRIES entries (a year
+# of synthetic member, role, channel and owner activity across a large
+# and a small guild) and times what .logs does: the first page of results
+# (20 lines) for each kind of filter, across every guild (`guild:all`) and
+# within the small guild, and reading a whole result set. Also times appends on the full
+# store. Not part of `python -m benchmarks`: filling the store takes a
+# while.
+#
+# Run from the repo root: python -m benchmarks.bench_audit [--entries N]
+import argparse
+import itertools
+import logging
+import random
+import time
+import audit_store
+from benchmarks.harness import bench, print_results, scratch_db
+from config import AUDIT_LOG_MAX_ENTRIES
+
+PAGE = 20  # lines on the first .logs page
+USERS = 50000
+ROLES = 200
+CHANNELS = 500
+EXECUTORS = 20  # admins and bots that show up as actors
+SPAN = 365 * 86400  # seconds the entries are spread over
+BIG_GUILD, SMALL_GUILD = 1, 2
+SMALL_GUILD_SHARE = 0.05  # of the entries
+
+def _entry(rng: random.Random, user_ids: list, executor_ids: list) -> tuple:
+    """A (type, details) pair shaped like the ones the monitors and commands write"""
+    user_id = rng.choice(user_ids)
+    kind = rng.random()
+    if kind < 0.35:
+        return 'member_join', {'user_id': user_id, 'user_name': 'user', 'inviter_id': rng.choice(executor_ids)}
+    if kind < 0.6:
+        return 'member_leave', {'user_id': user_id, 'user_name': 'user'}
+    if kind < 0.75:
+        return 'member_update', {'user_id': user_id, 'user_name': 'user', 'changes': ['Nickname: a → b']}
+    if kind < 0.85:
+        return 'message_delete', {'user_id': user_id, 'channel_id': rng.randrange(CHANNELS), 'content': 'hello'}
+    if kind < 0.93:
+        return 'role_update', {'role_id': rng.randrange(ROLES), 'role_name': 'role', 'changes': ['Color']}
+    if kind < 0.98:
+        return 'channel_update', {'channel_id': rng.randrange(CHANNELS), 'channel_name': 'general', 'changes': ['Name']}
+    if kind < 0.999:
+        return 'member_ban', {'user_id': user_id, 'reason': None}
+    return 'bot_add', {'bot_id': user_id, 'bot_name': 'bot', 'adder_id': rng.choice(executor_ids)}
+
+def populate(count: int, seed: int = 1):
+    """Fill the audit store with `count` entries, oldest first"""
+    rng = random.Random(seed)
+    # A few very active users and a long tail, as in a real guild
+    user_ids = [100000000000000000 + int(rng.paretovariate(1.2) * 10) % USERS for _ in range(USERS)]
+    executor_ids = [900000000000000000 + i for i in range(EXECUTORS)]
+    start = time.time() - SPAN
+    conn = audit_store._connect()
+    conn.execute('BEGIN')
+    for i in range(count):
+        event_type, details = _entry(rng, user_ids, executor_ids)
+        details['guild_id'] = SMALL_GUILD if rng.random() < SMALL_GUILD_SHARE else BIG_GUILD
+        audit_store._insert(conn, start + SPAN * i / count, event_type, details)
+    conn.execute('COMMIT')
+
+def _busiest(kind: str) -> int:
+    """The ID referenced by the most entries in a role (target/actor)"""
+    conn = audit_store._connect()
+    role = audit_store.ACTOR if kind == 'actor' else audit_store.TARGET
+    return conn.execute('SELECT ref FROM refs WHERE roles & ? GROUP BY ref ORDER BY COUNT(*) DESC LIMIT 1',
+                        (role,)).fetchone()[0]
+
+def _typical() -> int:
+    """An ID referenced by a few dozen to a few hundred entries"""
+    return audit_store._connect().execute(
+        'SELECT ref FROM refs GROUP BY ref HAVING COUNT(*) BETWEEN 50 AND 500 LIMIT 1'
+    ).fetchone()[0]
+
+def first_page(text: str, guild_id: int = None):
+    query, error = audit_store.parse_query(text, guild_id)
+    assert error is None, error
+    for entry in itertools.islice(audit_store.search(query), PAGE):
+        audit_store.details(entry)
+
+def read_all(text: str) -> int:
+    query, _ = audit_store.parse_query(text)
+    return sum(1 for _ in audit_store.search(query))
+
+def run(entries: int = AUDIT_LOG_MAX_ENTRIES) -> list:
+    """Run the benchmarks and return result dicts"""
+    with scratch_db():
+        started = time.perf_counter()
+        populate(entries)
+        print(f'Populated {entries:,} entries in {time.perf_counter() - started:.1f}s')
+
+        user = _typical()
+        busiest = _busiest('target')
+        actor = _busiest('actor')
+        queries = {
+            'all': '',
+            'id': f'{user}',
+            'id.busiest': f'{busiest}',
+            'actor': f'actor:{actor}',
+            'type': 'type:member_ban',
+            'type.multi': 'type:member_ban,bot_add',
+            'since': 'since:1h',
+            'until': 'until:180d',
+            'combined': f'{busiest} type:member_leave since:30d',
+        }
+        results = [bench(f'audit.first_page.{name}', lambda text=text: first_page(text), number=20, repeat=3)
+                   for name, text in queries.items()]
+        for name in ('all', 'id', 'type', 'combined'):
+            results.append(bench(f'audit.first_page.guild.{name}',
+                                 lambda text=queries[name]: first_page(text, SMALL_GUILD), number=20, repeat=3))
+        for name in ('id', 'id.busiest', 'type'):
+            found = read_all(queries[name])
+            results.append(bench(f'audit.read_all.{name} ({found:,} entries)', lambda name=name: read_all(queries[name]),
+                                 number=1, repeat=3))
+
+        results.append(bench('audit.append', lambda: audit_store.append(
+            'role_update', {'role_id': 1, 'role_name': 'role', 'executor_id': 900000000000000000}
+        ), number=200, repeat=3))
+    return results
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_audit')
+    parser.add_argument('--entries', type=int, default=AUDIT_LOG_MAX_ENTRIES, help='entries in the store')
+    args = parser.parse_args(argv)
+
+    from logger import logger
+    logger.setLevel(logging.WARNING)
+    print_results(run(args.entries))
+
+if __name__ == '__main__':
+    main()
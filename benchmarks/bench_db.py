@@ -0,0 +1,44 @@
+# benchmarks/bench_db.py — Database Load/Save and Audit Log Writes
+#
+# Audit entries go to the audit store (audit_store.py), whose queries
+# bench_audit.py times on a full-size log. add_to_audit_log hands the
+# append to a thread, so the append itself is timed here.
+#
+# Run from the repo root: python -m benchmarks.bench_db
+import audit_store
+import db_manager
+from benchmarks.harness import bench, print_results, scratch_db, SCRATCH_GUILD_ID
+
+def make_contents() -> dict:
+    return {
+        'watched_users': [str(200000000000000000 + i) for i in range(100)],
+        'whitelist': [str(300000000000000000 + i) for i in range(100)]
+    }
+
+def run() -> list:
+    """Run the benchmarks and return result dicts"""
+    results = []
+    contents = make_contents()
+
+    # shared = encrypted stores in the state service used by shard processes
+    for mode, encrypted, shared in (('plain', False, False), ('encrypted', True, False), ('shared', True, True)):
+        number = 50
+
+        with scratch_db(encrypted, shared, **contents):
+            db = db_manager.load_db()
+            results.append(bench(f'db.load.{mode}', db_manager.load_db, number=number, repeat=3))
+            results.append(bench(f'db.save.{mode}', lambda: db_manager.save_db(db), number=number, repeat=3))
+            results.append(bench(
+                f'db.audit_append.{mode}',
+                lambda: audit_store.append('role_update', {'role_id': 1, 'guild_id': 1}),
+                number=number, repeat=3
+            ))
+            results.append(bench(
+                f'db.save_partition.{mode}', lambda: db_manager.save_partition(SCRATCH_GUILD_ID),
+                number=number, repeat=3
+            ))
+
+    return results
+
+if __name__ == '__main__':
+    print_results(run())
@@ -0,0 +1,37 @@
+# benchmarks/bench_filters.py — Alert Filters and Watch/Whitelist Lookups
+#
+# Run from the repo root: python -m benchmarks.bench_filters
+import db_manager
+from filters import should_alert
+from benchmarks.harness import bench, print_results, scratch_db, SCRATCH_GUILD_ID as GUILD
+
+LIST_SIZES = (10, 1000, 10000)
+BASE_ID = 400000000000000000
+
+def run() -> list:
+    """Run the benchmarks and return result dicts (plain database)"""
+    results = []
+
+    for size in LIST_SIZES:
+        ids = [str(BASE_ID + i) for i in range(size)]
+        last_id = BASE_ID + size - 1  # worst case for a list scan
+        missing_id = BASE_ID - 1
+
+        with scratch_db(watched_users=ids, whitelist=ids):
+            results.extend([
+                bench(f'filters.is_watched.{size}.hit', lambda: db_manager.is_watched(GUILD, last_id), number=50),
+                bench(f'filters.is_watched.{size}.miss', lambda: db_manager.is_watched(GUILD, missing_id), number=50),
+                bench(f'filters.is_whitelisted.{size}.hit', lambda: db_manager.is_whitelisted(GUILD, last_id), number=50),
+                bench(f'filters.is_whitelisted.{size}.miss', lambda: db_manager.is_whitelisted(GUILD, missing_id), number=50),
+                # Warning category: whitelist lookup, then the filter lookup
+                bench(f'filters.should_alert.{size}', lambda: should_alert(GUILD, 'channels', missing_id), number=50),
+            ])
+
+    with scratch_db():
+        # Critical categories return before touching the database
+        results.append(bench('filters.should_alert.critical', lambda: should_alert(GUILD, 'bots', BASE_ID), number=10000))
+
+    return results
+
+if __name__ == '__main__':
+    print_results(run())
@@ -0,0 +1,70 @@
+# benchmarks/bench_messages.py — Guild Message Hot Path
+#
+# Every guild message goes through bot.on_message. Messages outside mask
+# channels should cost a dict lookup; mask channel messages within the
+# reply cooldown shouldn't get much further.
+#
+# Run from the repo root: python -m benchmarks.bench_messages
+import fakes
+import mask
+from benchmarks.harness import bench, print_results, scratch_db, SCRATCH_GUILD_ID
+
+MASK_CHANNEL_ID = 500
+OTHER_CHANNEL_ID = 501
+AUTHOR_ID = 600
+
+def make_message(guild, channel_id: int):
+    return fakes.make_message(guild, {
+        'id': str(fakes.snowflake()),
+        'channel_id': str(channel_id),
+        'guild_id': str(guild.id),
+        'author': fakes.user_payload(AUTHOR_ID),
+        'content': 'hello',
+        'timestamp': '2024-01-01T00:00:00+00:00',
+        'edited_timestamp': None,
+        'tts': False,
+        'mention_everyone': False,
+        'mentions': [],
+        'mention_roles': [],
+        'attachments': [],
+        'embeds': [],
+        'pinned': False,
+        'type': 0
+    })
+
+def handle(on_message, message):
+    """Run on_message to completion (neither path awaits anything that suspends)"""
+    try:
+        on_message(message).send(None)
+    except StopIteration:
+        pass
+
+def run() -> list:
+    """Run the benchmarks and return result dicts"""
+    import bot
+
+    state = fakes.make_state()
+    guild = fakes.make_guild(state, fakes.guild_payload(SCRATCH_GUILD_ID, 'Bench', channels=[
+        fakes.channel_payload(MASK_CHANNEL_ID, 'mask'),
+        fakes.channel_payload(OTHER_CHANNEL_ID, 'general'),
+    ]))
+    other = make_message(guild, OTHER_CHANNEL_ID)
+    masked = make_message(guild, MASK_CHANNEL_ID)
+
+    with scratch_db():
+        mask.set_channel(SCRATCH_GUILD_ID, MASK_CHANNEL_ID)
+        mask.set_cooldown(SCRATCH_GUILD_ID, MASK_CHANNEL_ID, 10 ** 9)
+        mask._last_reply[MASK_CHANNEL_ID] = 0  # as if it just replied: every message is within the cooldown
+        try:
+            results = [
+                bench('messages.on_message.other_channel', lambda: handle(bot.on_message, other), number=20000),
+                bench('messages.on_message.mask_cooldown', lambda: handle(bot.on_message, masked), number=20000),
+            ]
+        finally:
+            mask.clear(SCRATCH_GUILD_ID)
+            mask._last_reply.clear()
+
+    return results
+
+if __name__ == '__main__':
+    print_results(run())
@@ -0,0 +1,141 @@
+# benchmarks/bench_permissions.py — Permission Analysis on a 250-Role Guild
+#
+# Run from the repo root: python -m benchmarks.bench_permissions
+import random
+import discord
+import permissions
+from permissions import CRITICAL_PERMS, DANGEROUS_PERMS, MODERATE_PERMS
+from utils import format_permissions
+from benchmarks.harness import bench, print_results
+
+ROLE_COUNT = 250
+
+# ============= REFERENCE (pre-bitmask) IMPLEMENTATION =============
+def legacy_analyze_permissions(perms: discord.Permissions) -> dict:
+    """getattr-based analysis, kept to check results stay identical"""
+    critical_found = [p.replace('_', ' ').title() for p in CRITICAL_PERMS if getattr(perms, p, False)]
+    dangerous_found = [p.replace('_', ' ').title() for p in DANGEROUS_PERMS if getattr(perms, p, False)]
+    moderate_found = [p.replace('_', ' ').title() for p in MODERATE_PERMS if getattr(perms, p, False)]
+
+    if critical_found:
+        risk_level = '🔴 CRITICAL'
+    elif dangerous_found:
+        risk_level = '🟡 HIGH'
+    elif moderate_found:
+        risk_level = '🟠 MODERATE'
+    else:
+        risk_level = '🟢 LOW'
+
+    return {
+        'has_critical': bool(critical_found),
+        'has_dangerous': bool(dangerous_found),
+        'critical_list': critical_found,
+        'dangerous_list': dangerous_found,
+        'moderate_list': moderate_found,
+        'risk_level': risk_level,
+        'summary': format_permissions(perms)
+    }
+
+def legacy_get_permission_changes(before: discord.Permissions, after: discord.Permissions) -> dict:
+    """dir()-reflection diff, kept to check results stay identical"""
+    added = []
+    removed = []
+    all_perms = [attr for attr in dir(before) if not attr.startswith('_') and isinstance(getattr(before, attr), bool)]
+    for perm in all_perms:
+        before_val = getattr(before, perm, False)
+        after_val = getattr(after, perm, False)
+        if before_val != after_val:
+            perm_name = perm.replace('_', ' ').title()
+            if after_val:
+                added.append(perm_name)
+            else:
+                removed.append(perm_name)
+    has_critical = any(perm.replace(' ', '_').lower() in CRITICAL_PERMS for perm in added + removed)
+    return {'added': added, 'removed': removed, 'has_critical_changes': has_critical}
+
+# ============= SYNTHETIC GUILD =============
+class _Role:
+    def __init__(self, role_id: int, name: str, position: int, perms: discord.Permissions):
+        self.id = role_id
+        self.name = name
+        self.position = position
+        self.permissions = perms
+
+class _Guild:
+    def __init__(self, roles: list):
+        self.roles = roles
+
+def _random_perms(rng: random.Random) -> discord.Permissions:
+    """Mostly harmless roles with a sprinkling of moderator/admin roles"""
+    value = discord.Permissions.general().value & rng.getrandbits(64)
+    if rng.random() < 0.1:
+        value |= discord.Permissions.VALID_FLAGS[rng.choice(DANGEROUS_PERMS)]
+    if rng.random() < 0.03:
+        value |= discord.Permissions.VALID_FLAGS[rng.choice(CRITICAL_PERMS)]
+    return discord.Permissions(value)
+
+def make_guild(role_count: int = ROLE_COUNT, seed: int = 250) -> _Guild:
+    """Build a guild with `role_count` roles plus @everyone"""
+    rng = random.Random(seed)
+    roles = [_Role(0, '@everyone', 0, discord.Permissions.general())]
+    for i in range(1, role_count + 1):
+        roles.append(_Role(i, f'role-{i}', i, _random_perms(rng)))
+    return _Guild(roles)
+
+def check_identical(guild: _Guild):
+    """Assert the bitmask implementation matches the reference exactly"""
+    roles = guild.roles
+    for role in roles:
+        assert permissions.analyze_permissions(role.permissions) == legacy_analyze_permissions(role.permissions), role.name
+    for before, after in zip(roles, roles[1:]):
+        new = permissions.get_permission_changes(before.permissions, after.permissions)
+        old = legacy_get_permission_changes(before.permissions, after.permissions)
+        assert new == old, (before.name, after.name)
+
+def run() -> list:
+    """Run the benchmarks and return result dicts"""
+    guild = make_guild()
+    check_identical(guild)
+
+    roles = guild.roles
+    pairs = list(zip(roles, roles[1:]))
+
+    def legacy_analyze_all():
+        for role in roles:
+            legacy_analyze_permissions(role.permissions)
+
+    def analyze_all():
+        for role in roles:
+            permissions.analyze_permissions(role.permissions)
+
+    def analyze_all_cold():
+        permissions._analyze_value.cache_clear()
+        analyze_all()
+
+    def legacy_changes_all():
+        for before, after in pairs:
+            legacy_get_permission_changes(before.permissions, after.permissions)
+
+    def changes_all():
+        for before, after in pairs:
+            permissions.get_permission_changes(before.permissions, after.permissions)
+
+    def changes_all_cold():
+        permissions._changes_for.cache_clear()
+        changes_all()
+
+    def dangerous_roles():
+        permissions.get_dangerous_roles(guild, 'moderate')
+
+    return [
+        bench('permissions.analyze_250_roles.legacy', legacy_analyze_all, number=20),
+        bench('permissions.analyze_250_roles.cold', analyze_all_cold, number=20),
+        bench('permissions.analyze_250_roles.warm', analyze_all, number=200),
+        bench('permissions.changes_250_roles.legacy', legacy_changes_all, number=5),
+        bench('permissions.changes_250_roles.cold', changes_all_cold, number=20),
+        bench('permissions.changes_250_roles.warm', changes_all, number=200),
+        bench('permissions.dangerous_roles_250', dangerous_roles, number=200),
+    ]
+
+if __name__ == '__main__':
+    print_results(run())
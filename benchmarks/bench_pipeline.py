@@ -0,0 +1,159 @@
+# benchmarks/bench_pipeline.py — Critical Alert Latency Under Load
+#
+# Drives the real event pipeline and monitor handlers (fakes.py guild,
+# scratch database, DMs captured instead of sent) and times how long a
+# bot addition takes to reach the owner: on an idle pipeline, behind
+# 10,000 voice events from a watched member that are still queued or
+# running, and behind a raid of 300 suspicious joins already in the
+# enrich stage, waiting for their invite attribution.
+#
+# This is also the regression test for priority handling: the run fails
+# (AssertionError) if a loaded time is over LATENCY_FACTOR times the idle
+# one, with a LATENCY_FLOOR minimum. It runs with `python -m benchmarks`.
+#
+# Run from the repo root: python -m benchmarks.bench_pipeline
+import asyncio
+import time
+import dm_notify
+import fakes
+from benchmarks.bench_alerts import stubbed_alerts
+from benchmarks.harness import print_results, scratch_db, SCRATCH_GUILD_ID
+
+VOICE_EVENTS = 10000
+VOICE_CHANNEL_ID = 500
+WATCHED_ID = 600
+BOT_ID = 700
+JOIN_BURST = 300
+RAIDER_BASE_ID = 10_000
+# Loaded bot-add latency allowed: this many times the idle one, and at least the floor
+LATENCY_FACTOR = 10
+LATENCY_FLOOR = 0.1  # seconds
+
+def result(name: str, seconds: float) -> dict:
+    """A one-shot measurement in the harness's result format"""
+    return {
+        'name': name,
+        'number': 1,
+        'repeat': 1,
+        'best_us': seconds * 1e6,
+        'mean_us': seconds * 1e6,
+        'ops_per_sec': 1 / seconds if seconds else float('inf')
+    }
+
+def make_guild():
+    state = fakes.make_state()
+    guild = fakes.make_guild(state, fakes.guild_payload(SCRATCH_GUILD_ID, 'Bench', channels=[
+        fakes.channel_payload(VOICE_CHANNEL_ID, 'voice', channel_type=2),
+    ], members=[fakes.member_payload(fakes.user_payload(WATCHED_ID))]))
+    return fakes.FakeBot(guild), guild
+
+def voice_state(guild, channel_id: int = None):
+    return fakes.make_voice_state(guild, {
+        'channel_id': str(channel_id) if channel_id else None,
+        'user_id': str(WATCHED_ID),
+        'session_id': 'bench',
+        'deaf': False, 'mute': False, 'self_deaf': False, 'self_mute': False,
+        'self_video': False, 'suppress': False, 'requested_to_speak_at': None
+    })
+
+def bot_member(guild, bot_id: int = BOT_ID):
+    member = fakes.make_member(guild, fakes.member_payload(fakes.user_payload(bot_id, bot=True)))
+    guild._add_member(member)
+    return member
+
+def raider(guild, user_id: int):
+    """A new member with no avatar (suspicious, so their join alerts and waits for attribution)"""
+    member = fakes.make_member(guild, fakes.member_payload(fakes.user_payload(user_id)))
+    guild._add_member(member)
+    return member
+
+class AlertClock:
+    """Capture alerts instead of sending them, noting when each title first arrived"""
+
+    def __init__(self):
+        self.arrived = {}  # {title: perf_counter time}
+        self.count = 0
+
+    async def send(self, bot, title, details, priority, embed_fields=None, quick_action_text=None, guild=None):
+        self.count += 1
+        self.arrived.setdefault(title, time.perf_counter())
+
+    async def wait_for(self, title: str, timeout: float = 60) -> float:
+        deadline = time.perf_counter() + timeout
+        while title not in self.arrived:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f'No {title!r} alert within {timeout}s')
+            await asyncio.sleep(0.001)
+        return self.arrived.pop(title)
+
+async def reached_enrich():
+    """Wait until every submitted event has left the stages before enrich"""
+    import pipeline
+
+    stats = pipeline.get_stats()
+    while stats['normalize']['depth'] or stats['filter']['depth']:
+        await asyncio.sleep(0.001)
+        stats = pipeline.get_stats()
+
+async def bot_add_latency(bot, guild, clock: AlertClock, background: list, settle: bool = False) -> float:
+    """
+    Submit `background` events, then a bot addition, and time the bot alert
+
+    With `settle`, the background reaches the enrich stage first (so it is
+    already holding workers rather than queued behind the bot addition).
+
+    Returns:
+        float: Seconds from submitting the bot addition to its alert
+    """
+    import monitors
+    import pipeline
+
+    await pipeline.start(bot, monitors.EVENT_SPECS)
+    try:
+        for kind, args in background:
+            await pipeline.submit(kind, *args)
+        if settle:
+            await reached_enrich()
+        started = time.perf_counter()
+        await pipeline.submit('member_join', bot_member(guild))
+        return await clock.wait_for('BOT ADDED TO SERVER') - started
+    finally:
+        await pipeline.stop()
+
+def run() -> list:
+    """Run the benchmarks and return result dicts (fails if a loaded latency is over the bound)"""
+    import monitors
+    import pipeline
+
+    bot, guild = make_guild()
+    member = guild.get_member(WATCHED_ID)
+    joined, left = voice_state(guild, VOICE_CHANNEL_ID), voice_state(guild)
+    voice = [('voice_state_update', (member, left, joined) if i % 2 else (member, joined, left))
+             for i in range(VOICE_EVENTS)]
+    raid = [('member_join', (raider(guild, RAIDER_BASE_ID + i),)) for i in range(JOIN_BURST)]
+
+    # Every guild counts as protected, as in replay.py
+    saved_guild_ids = (monitors.GUILD_IDS, pipeline.GUILD_IDS)
+    monitors.GUILD_IDS = pipeline.GUILD_IDS = ()
+    clock = AlertClock()
+    try:
+        with scratch_db(watched_users=[str(WATCHED_ID)]), stubbed_alerts():
+            dm_notify._send_dm_alert = clock.send
+            idle = asyncio.run(bot_add_latency(bot, guild, clock, []))
+            loaded = asyncio.run(bot_add_latency(bot, guild, clock, voice))
+            raided = asyncio.run(bot_add_latency(bot, guild, clock, raid, settle=True))
+    finally:
+        monitors.GUILD_IDS, pipeline.GUILD_IDS = saved_guild_ids
+
+    bound = max(idle * LATENCY_FACTOR, LATENCY_FLOOR)
+    for seconds, behind in ((loaded, f'{VOICE_EVENTS} voice events'), (raided, f'{JOIN_BURST} joins')):
+        assert seconds <= bound, (f'bot addition took {seconds * 1000:.1f}ms behind {behind} '
+                                  f'(idle {idle * 1000:.1f}ms, bound {bound * 1000:.0f}ms)')
+    return [
+        result('pipeline.bot_add.idle', idle),
+        result(f'pipeline.bot_add.behind_{VOICE_EVENTS}_voice', loaded),
+        result(f'pipeline.bot_add.behind_{JOIN_BURST}_joins', raided),
+    ]
+
+if __name__ == '__main__':
+    print_results(run())
@@ -0,0 +1,184 @@
+# benchmarks/bench_startup.py — Startup Time & Memory on a Large Guild
+#
+# Loads a synthetic guild the way the gateway delivers it (GUILD_CREATE
+# without the member list, then GUILD_MEMBERS_CHUNK events of 1000 when
+# the member list is requested, or just the watched members otherwise)
+# under each gateway profile, then builds the risk and channel permission
+# indexes and the member counters as on_ready does. Each profile runs in
+# its own process so the RSS figures don't share a heap.
+#
+# Run from the repo root: python -m benchmarks.bench_startup [--members N]
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROLE_COUNT = 50
+CHANNEL_COUNT = 100
+WATCHED = 5
+CHUNK_SIZE = 1000  # members per GUILD_MEMBERS_CHUNK, as Discord sends them
+GUILD_ID = 1  # benchmarks.harness.SCRATCH_GUILD_ID, so the settings below apply to it
+BOT_ID = 10
+
+# name: guild settings (None = the fixed options bot.py used before cache_policy.py)
+PROFILES = {
+    'before': None,
+    'default filters': {},
+    'watch list only': {'filters': {'members': False, 'roles': False}},
+}
+
+def _rss_mb() -> float:
+    """Current resident set size (peak where /proc isn't available)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+def _legacy_options() -> dict:
+    import discord
+    intents = discord.Intents.default()
+    intents.members = intents.message_content = intents.moderation = True
+    intents.voice_states = intents.invites = True
+    return {
+        'intents': intents,
+        'member_cache_flags': discord.MemberCacheFlags.from_intents(intents),
+        'chunk_guilds_at_startup': True,
+        'max_messages': 1000
+    }
+
+def _member_ids(count: int) -> range:
+    return range(100000000000000000, 100000000000000000 + count)
+
+def _chunks(guild, member_ids, joined_at: str, role_ids: list):
+    """GUILD_MEMBERS_CHUNK payloads for these members"""
+    import fakes
+    member_ids = list(member_ids)
+    count = (len(member_ids) + CHUNK_SIZE - 1) // CHUNK_SIZE
+    for index in range(count):
+        members = []
+        for member_id in member_ids[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]:
+            roles = [role_ids[member_id % ROLE_COUNT]]
+            if member_id % 7 == 0:
+                roles.append(role_ids[(member_id // 7) % ROLE_COUNT])
+            members.append(fakes.member_payload(fakes.user_payload(member_id), roles, joined_at))
+        yield {'guild_id': str(guild.id), 'members': members, 'chunk_index': index, 'chunk_count': count,
+               'nonce': 'bench'}
+
+def _load(options: dict, member_count: int) -> dict:
+    """Load the guild and build the indexes under one set of bot options"""
+    from discord.state import ConnectionState, ChunkRequest
+    import fakes
+    import risk_index
+    import channel_perms
+    import member_counters
+
+    loop = asyncio.new_event_loop()
+    state = ConnectionState(dispatch=lambda *args, **kwargs: None, handlers={}, hooks={},
+                            http=fakes.OfflineHTTP(), **options)
+
+    started = time.perf_counter()
+
+    role_ids = [GUILD_ID + 1 + index for index in range(ROLE_COUNT)]
+    roles = [fakes.role_payload(role_id, f'role{role_id}', permissions=8 if role_id % 10 == 0 else 0,
+                                position=index + 1) for index, role_id in enumerate(role_ids)]
+    channels = [
+        fakes.channel_payload(5000 + index, f'channel{index}', overwrites=[
+            {'id': str(role_ids[index % ROLE_COUNT]), 'type': 0, 'allow': '1024', 'deny': '0'}
+        ])
+        for index in range(CHANNEL_COUNT)
+    ]
+    joined_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    data = fakes.guild_payload(GUILD_ID, 'Large', roles=roles, channels=channels,
+                               members=[fakes.member_payload(fakes.user_payload(BOT_ID, bot=True), (), joined_at)])
+    data['member_count'] = member_count  # large guilds arrive without their member list
+    guild = fakes.make_guild(state, data)
+
+    if options['chunk_guilds_at_startup']:
+        member_ids = _member_ids(member_count)  # chunk_guilds_at_startup: the whole list
+    else:
+        member_ids = _member_ids(WATCHED)  # cache_policy.cache_watched: a query for the watched ids
+    request = ChunkRequest(guild.id, None, loop, state._get_guild, cache=True)
+    request.nonce = 'bench'
+    state._chunk_requests[request.nonce] = request
+    for chunk in _chunks(guild, member_ids, joined_at, role_ids):
+        state.parse_guild_members_chunk(chunk)
+
+    risk_index.build(guild)
+    channel_perms.build(guild)
+    member_counters.build(guild)
+    elapsed = time.perf_counter() - started
+    request.buffer.clear()  # the library drops it once the request completes
+
+    gc.collect()
+    loop.close()
+    return {'seconds': elapsed, 'cached_members': len(guild._members), 'guild': guild}
+
+def _child(profile: str, member_count: int):
+    from logger import logger
+    logger.setLevel(logging.WARNING)
+    import cache_policy
+    from benchmarks.harness import scratch_db
+
+    gc.collect()
+    baseline = _rss_mb()
+    settings = PROFILES[profile]
+    contents = {'watched_users': [str(member_id) for member_id in _member_ids(WATCHED)]}
+    if settings is not None:
+        from config import DEFAULT_FILTERS
+        contents['filters'] = {**DEFAULT_FILTERS, **settings.get('filters', {})}
+
+    with scratch_db(**contents):
+        options = _legacy_options() if settings is None else cache_policy.bot_options()
+        result = _load(options, member_count)
+
+    print(json.dumps({
+        'profile': profile,
+        'seconds': result['seconds'],
+        'rss_mb': _rss_mb(),
+        'rss_delta_mb': _rss_mb() - baseline,
+        'cached_members': result['cached_members'],
+        'intents': options['intents'].value,
+        'chunk': options['chunk_guilds_at_startup'],
+        'max_messages': options['max_messages'],
+    }))
+
+def run(member_count: int) -> list:
+    """Run every profile in a fresh interpreter and return their results"""
+    results = []
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_startup', '--members', str(member_count), '--child', profile],
+            capture_output=True, text=True, check=True, env=dict(os.environ, LOG_TO_CONSOLE='0')
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+def print_table(results: list, member_count: int):
+    print(f'Startup on a {member_count:,}-member guild ({ROLE_COUNT} roles, {CHANNEL_COUNT} channels, {WATCHED} watched)')
+    print(f"{'profile':<16} {'load+index':>11} {'RSS':>9} {'Δ RSS':>9} {'cached':>9}  chunk  max_messages  intents")
+    for r in results:
+        print(f"{r['profile']:<16} {r['seconds']:>10.2f}s {r['rss_mb']:>7.1f}MB {r['rss_delta_mb']:>7.1f}MB "
+              f"{r['cached_members']:>9,}  {str(r['chunk']):<5}  {str(r['max_messages']):<12}  {r['intents']}")
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_startup')
+    parser.add_argument('--members', type=int, default=100_000, help='guild size (default: 100000)')
+    parser.add_argument('--child', choices=list(PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args.child, args.members)
+    else:
+        print_table(run(args.members), args.members)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# benchmarks/harness.py — Minimal Timing Harness
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+def bench(name: str, fn, number: int = 1000, repeat: int = 5) -> dict:
+    """
+    Time `fn()` called `number` times, best of `repeat` runs
+
+    Returns:
+        dict: {'name', 'number', 'repeat', 'best_us', 'mean_us', 'ops_per_sec'}
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+
+    best = min(runs)
+    return {
+        'name': name,
+        'number': number,
+        'repeat': repeat,
+        'best_us': best * 1e6,
+        'mean_us': sum(runs) / len(runs) * 1e6,
+        'ops_per_sec': 1 / best if best else float('inf')
+    }
+
+def print_results(results: list):
+    """Print results as an aligned table"""
+    width = max(len(r['name']) for r in results)
+    for r in results:
+        print(f"{r['name']:<{width}}  {r['best_us']:>12.2f} µs  {r['ops_per_sec']:>14,.0f} ops/s")
+
+# ============= SCRATCH DATABASE =============
+SCRATCH_GUILD_ID = 1  # guild that per-guild scratch contents belong to
+
+@contextlib.contextmanager
+def scratch_db(encrypted: bool = False, shared: bool = False, **contents):
+    """
+    Point db_manager at a throwaway database for the duration of a block
+
+    With shared=True the stores live in a scratch state service database,
+    as they do when the bot runs as several shard processes.
+
+    Keyword arguments replace top-level keys of the default database, or
+    of SCRATCH_GUILD_ID's settings for per-guild keys (e.g. watched_users=[...]).
+    """
+    import db_manager
+    import state_store
+    import audit_store
+
+    saved = (db_manager.DB_PATH, db_manager.GUILD_DATA_DIR, db_manager.ENCRYPT_DB)
+    saved_state = (state_store.enabled, state_store.STATE_DB_PATH, state_store._conn, state_store._data_version)
+    saved_audit = (audit_store.AUDIT_DB_PATH, audit_store._conn)
+    saved_partitions = dict(db_manager._partitions)
+    with tempfile.TemporaryDirectory(prefix='qbot-bench-') as scratch_dir:
+        db_manager.DB_PATH = os.path.join(scratch_dir, 'db.json')
+        db_manager.GUILD_DATA_DIR = os.path.join(scratch_dir, 'guilds')
+        db_manager.ENCRYPT_DB = encrypted
+        db_manager._partitions.clear()
+        state_store.enabled = shared
+        state_store.STATE_DB_PATH = os.path.join(scratch_dir, 'state.db')
+        state_store._conn = None
+        audit_store.AUDIT_DB_PATH = os.path.join(scratch_dir, 'audit.db')
+        audit_store._conn = None
+        try:
+            db = db_manager._get_default_db()
+            db.update({key: value for key, value in contents.items() if key not in db_manager.PARTITION_KEYS})
+            db_manager.save_db(db)
+            partition = db_manager.get_partition(SCRATCH_GUILD_ID)
+            partition.update({key: value for key, value in contents.items() if key in db_manager.PARTITION_KEYS})
+            db_manager.save_partition(SCRATCH_GUILD_ID)
+            yield db_manager.DB_PATH
+        finally:
+            if state_store._conn is not None and state_store._conn is not saved_state[2]:
+                state_store._conn.close()
+            state_store.enabled, state_store.STATE_DB_PATH, state_store._conn, state_store._data_version = saved_state
+            if audit_store._conn is not None and audit_store._conn is not saved_audit[1]:
+                audit_store._conn.close()
+            audit_store.AUDIT_DB_PATH, audit_store._conn = saved_audit
+            db_manager.DB_PATH, db_manager.GUILD_DATA_DIR, db_manager.ENCRYPT_DB = saved
+            db_manager._partitions.clear()
+            db_manager._partitions.update(saved_partitions)
+
+# ============= RESULT FILES =============
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, timeout=5, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def write_results(results: list, path: str):
+    """Write results with enough context to compare runs across commits"""
+    import discord
+    data = {
+        'commit': _git_commit(),
+        'time': datetime.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'discord.py': discord.__version__,
+        'machine': platform.machine(),
+        'results': results
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+def read_results(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def compare_results(base: list, new: list, threshold: float = 0.10) -> list:
+    """
+    Compare two result lists by benchmark name
+
+    Returns:
+        list: {'name', 'base_us', 'new_us', 'change', 'regressed'} for names in both
+    """
+    base_by_name = {r['name']: r for r in base}
+    rows = []
+    for r in new:
+        old = base_by_name.get(r['name'])
+        if old is None or not old['best_us']:
+            continue
+        change = r['best_us'] / old['best_us'] - 1
+        rows.append({
+            'name': r['name'],
+            'base_us': old['best_us'],
+            'new_us': r['best_us'],
+            'change': change,
+            'regressed': change > threshold
+        })
+    return rows
+
+def print_comparison(rows: list):
+    """Print a comparison table, regressions marked"""
+    if not rows:
+        print('No benchmarks in common')
+        return
+    width = max(len(r['name']) for r in rows)
+    for r in rows:
+        mark = '  ⚠️ slower' if r['regressed'] else ''
+        print(f"{r['name']:<{width}}  {r['base_us']:>12.2f} → {r['new_us']:>12.2f} µs  {r['change']:>+8.1%}{mark}")
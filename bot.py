@@ -3,78 +3,219 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import asyncio
+import hashlib
+import json
 import os
+import signal
 
+import startup
 from config import *
 from logger import logger
 import commands as dm_commands
 import monitors
+import pipeline
+import risk_index
+import channel_perms
+import member_counters
+import snapshots
+import catchup
+import metrics_server
+import loop_watchdog
 import mask
+import db_manager
+import sharding
+import cache_policy
 from dm_notify import alert_simple
+from perf import timed
 
 # ============= BOT SETUP =============
-intents = discord.Intents.default()
-intents.guilds = True
-intents.members = True
-intents.message_content = True
-intents.moderation = True
-intents.voice_states = True
-intents.invites = True
+# Intents, member list and message cache follow the enabled filters, watch
+# list and mask channel (cache_policy.py)
+gateway_options = cache_policy.bot_options()
+logger.info(cache_policy.describe())
 
-bot = commands.Bot(command_prefix=None, intents=intents, help_command=None)
+def _presence():
+    """Activity shown on the bot (sent with every identify, so reconnects keep it)"""
+    if BOT_ACTIVITY_TYPE == 'watching':
+        return discord.Activity(type=discord.ActivityType.watching, name=BOT_STATUS)
+    elif BOT_ACTIVITY_TYPE == 'playing':
+        return discord.Activity(type=discord.ActivityType.playing, name=BOT_STATUS)
+    elif BOT_ACTIVITY_TYPE == 'listening':
+        return discord.Activity(type=discord.ActivityType.listening, name=BOT_STATUS)
+    return None
+
+# With SHARD_COUNT set this process runs SHARD_IDS (all shards when empty)
+# of a sharded session; launcher.py splits the shards across processes
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        command_prefix=None, help_command=None,
+        activity=_presence(), status=discord.Status.online,
+        shard_count=SHARD_COUNT, shard_ids=list(SHARD_IDS) or None,
+        **gateway_options
+    )
+else:
+    bot = commands.Bot(
+        command_prefix=None, help_command=None,
+        activity=_presence(), status=discord.Status.online,
+        **gateway_options
+    )
 
 # ============= STARTUP EVENT =============
+_ready_lock = asyncio.Lock()
+_close_task = None  # bot.close() started by SIGTERM
+
+def _on_sigterm():
+    """Close the connection (launcher.py stops shard processes with SIGTERM)"""
+    global _close_task
+    if _close_task is None:
+        _close_task = asyncio.create_task(bot.close())
+
+@bot.event
+async def setup_hook():
+    """Start background systems before connecting to the gateway"""
+    startup.mark('logged in')
+    # Stop like Ctrl+C does, so the shutdown below still runs
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, _on_sigterm)
+    except NotImplementedError:  # Windows
+        pass
+    await pipeline.start(bot, monitors.EVENT_SPECS)
+    loop_watchdog.start(bot)
+    sharding.start(bot)
+    
+    # Commands are added once per process; on_ready only syncs them when they change
+    if GUILD_IDS:
+        _add_slash_commands()
+    
+    if METRICS_ENABLED:
+        try:
+            await metrics_server.start(bot)
+        except OSError as e:
+            logger.error(f'Could not start metrics endpoint on port {METRICS_PORT}: {e}')
+    
+    startup.mark('connecting to gateway')
+
 @bot.event
+@timed(kind='event')
 async def on_ready():
-    """Bot ready event"""
-    logger.info(f'Q Bot logged in as {bot.user} (ID: {bot.user.id})')
-    logger.info(f'Connected to {len(bot.guilds)} guild(s)')
+    """
+    Bot ready event
     
-    # Set bot presence (stealth mode)
-    try:
-        if BOT_ACTIVITY_TYPE == 'watching':
-            activity = discord.Activity(type=discord.ActivityType.watching, name=BOT_STATUS)
-        elif BOT_ACTIVITY_TYPE == 'playing':
-            activity = discord.Activity(type=discord.ActivityType.playing, name=BOT_STATUS)
-        elif BOT_ACTIVITY_TYPE == 'listening':
-            activity = discord.Activity(type=discord.ActivityType.listening, name=BOT_STATUS)
-        else:
-            activity = None
+    Fires again whenever a dropped session had to re-identify. The cache is
+    rebuilt from scratch then, so indexes are rebuilt and catch-up reports
+    what was missed; one-time steps (slash sync, startup DM) are skipped.
+    """
+    # A ready arriving while the last one is still initializing waits for it
+    async with _ready_lock:
+        first = startup.readies == 0
+        startup.begin('gateway ready')
+        logger.info(f'Q Bot logged in as {bot.user} (ID: {bot.user.id})')
+        logger.info(f'Connected to {len(bot.guilds)} guild(s)')
         
-        await bot.change_presence(activity=activity, status=discord.Status.online)
-        logger.info(f'Bot presence set: {BOT_STATUS}')
-    except Exception as e:
-        logger.exception(f'Failed to set presence: {e}')
+        guilds = [guild for guild in bot.guilds if not GUILD_IDS or guild.id in GUILD_IDS]
+        
+        # Independent steps run concurrently
+        await asyncio.gather(
+            startup.step('shard_registry', sharding.publish, bot),
+            startup.step('slash_sync', _sync_slash_commands, once=True),
+            startup.step('guild_settings', _load_guild_settings, guilds),
+            startup.step('indexes', _build_indexes, guilds),
+            startup.step('invites', _cache_invites, guilds),
+            startup.step('catchup', _catch_up)
+        )
+        
+        # Send startup notification to owner
+        await startup.step('startup_dm', _send_startup_dm, once=True)
+        
+        startup.log_timeline('Startup' if first else 'Reconnect')
+        if first:
+            logger.info('='*60)
+            logger.info('Q Bot is fully operational!')
+            logger.info('='*60)
+
+# ============= INITIALIZATION STEPS =============
+def _load_guild_settings(guilds: list):
+    """Load each protected guild's settings into memory and index their mask channels"""
+    for guild in guilds:
+        db_manager.get_partition(guild.id)
+        mask.load_guild(guild.id)
+
+async def _build_indexes(guilds: list):
+    """Build the risk and channel permission indexes (kept current incrementally from here on)"""
+    # Without the full member list, fetch watched members first so they are indexed too
+    await cache_policy.cache_watched(guilds)
+    for guild in guilds:
+        risk_index.build(guild)
+        channel_perms.build(guild)
+        member_counters.build(guild)
+
+async def _cache_invites(guilds: list):
+    """Cache invites for join tracking, once per guild (join refreshes keep them current)"""
+    if not bot.intents.invites:
+        return
+    await asyncio.gather(*(
+        monitors.cache_invites(guild) for guild in guilds if not monitors.invites_cached(guild.id)
+    ))
+
+async def _catch_up():
+    """Report what changed while we were disconnected, then resume periodic snapshots"""
+    # Catch-up diffs against the last snapshot, so it must run first
+    await catchup.run(bot)
+    snapshots.start(bot)
+
+async def _send_startup_dm():
+    """Tell the owner the bot is up"""
+    if OWNER_ID and DM_ALERTS:
+        shards = f'\n**Shards:** {list(SHARD_IDS) or "all"} of {SHARD_COUNT}' if SHARD_COUNT else ''
+        await alert_simple(bot, f'✅ **Q Bot Started**\n**Name:** {BOT_NAME}\n**Guilds:** {len(bot.guilds)}{shards}\n**Status:** Online')
+
+# ============= SLASH COMMANDS =============
+def _command_tree_hash(guild: discord.abc.Snowflake) -> str:
+    """Hash the slash commands registered for a guild, as they would be sent to Discord"""
+    payload = sorted((command.to_dict(bot.tree) for command in bot.tree.get_commands(guild=guild)),
+                     key=lambda command: command['name'])
+    blob = json.dumps({'application_id': bot.application_id, 'commands': payload}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+async def _sync_slash_commands():
+    """Sync slash commands to every protected guild whose command tree changed since its last sync"""
+    if not GUILD_IDS:
+        logger.info('GUILD_IDS not set - skipping slash command registration')
+        return
     
-    # Register slash commands
-    try:
-        if GUILD_ID is not None:
-            await _register_slash_commands()
-        else:
-            logger.info('GUILD_ID not set - skipping slash command registration')
-    except Exception as e:
-        logger.exception(f'Failed to register slash commands: {e}')
+    # Every shard process registers the same commands; one sync is enough
+    if not sharding.owns_dm:
+        logger.info('Slash commands registered (synced by the DM process)')
+        return
     
-    # Cache invites for tracking
-    if GUILD_ID:
-        guild = bot.get_guild(GUILD_ID)
-        if guild:
-            await monitors.cache_invites(guild)
+    changed = {}
+    for guild_id in GUILD_IDS:
+        digest = _command_tree_hash(discord.Object(id=guild_id))
+        if db_manager.get_command_sync_hash(guild_id) != digest:
+            changed[guild_id] = digest
     
-    # Send startup notification to owner
-    if OWNER_ID and DM_ALERTS:
-        try:
-            await alert_simple(bot, f'✅ **Q Bot Started**\n**Name:** {BOT_NAME}\n**Guilds:** {len(bot.guilds)}\n**Status:** Online')
-        except:
-            pass
+    async def sync(guild_id: int, digest: str):
+        await bot.tree.sync(guild=discord.Object(id=guild_id))
+        db_manager.set_command_sync_hash(guild_id, digest)
     
-    logger.info('='*60)
-    logger.info('Q Bot is fully operational!')
-    logger.info('='*60)
+    results = await asyncio.gather(*(sync(guild_id, digest) for guild_id, digest in changed.items()),
+                                   return_exceptions=True)
+    failed = 0
+    for guild_id, result in zip(changed, results):
+        if isinstance(result, Exception):
+            failed += 1
+            logger.error(f'Slash command sync failed for guild {guild_id}: {result}')
+    
+    logger.info(
+        f'Slash commands synced to {len(changed) - failed} guild(s), '
+        f'{len(GUILD_IDS) - len(changed)} unchanged'
+    )
+    if failed:
+        raise RuntimeError(f'sync failed for {failed} guild(s)')  # retried on the next ready
 
-async def _register_slash_commands():
-    """Register slash commands (real and fake)"""
-    guild = discord.Object(id=GUILD_ID)
+def _add_slash_commands():
+    """Add slash commands (real and fake) to the tree for every protected guild"""
+    guilds = [discord.Object(id=guild_id) for guild_id in GUILD_IDS]
     
     # Real command: set mask channel (owner only)
     @app_commands.command(name='set-auto-reply', description='⚙️ Configure auto-reply channel')
@@ -85,16 +226,15 @@ async def _register_slash_commands():
             await interaction.response.send_message('❌ Owner only command', ephemeral=True)
             return
         
-        from mask import set_mask_channel_by_id
-        set_mask_channel_by_id(channel.id)
+        mask.set_mask_channel_by_id(channel.guild.id, channel.id)
         
         await interaction.response.send_message(
-            f'✅ Auto-reply enabled in {channel.mention}',
+            f'✅ Auto-reply enabled in {channel.mention}{cache_policy.restart_notice()}',
             ephemeral=True
         )
         logger.info(f'Auto-reply channel set to {channel.id} by {interaction.user}')
     
-    bot.tree.add_command(set_auto_reply, guild=guild)
+    bot.tree.add_command(set_auto_reply, guilds=guilds)
     
     # Fake commands (for cover)
     if ENABLE_FAKE_COMMANDS:
@@ -129,7 +269,7 @@ async def _register_slash_commands():
             
             await interaction.response.send_message(embed=help_embed, ephemeral=True)
         
-        bot.tree.add_command(fake_help, guild=guild)
+        bot.tree.add_command(fake_help, guilds=guilds)
         
         # Fake ping command
         @app_commands.command(name='ping', description='🏓 Check bot latency')
@@ -145,7 +285,7 @@ async def _register_slash_commands():
             
             await interaction.response.send_message(embed=embed, ephemeral=True)
         
-        bot.tree.add_command(fake_ping, guild=guild)
+        bot.tree.add_command(fake_ping, guilds=guilds)
         
         # Fake serverinfo command
         @app_commands.command(name='serverinfo', description='ℹ️ Display server information')
@@ -169,7 +309,7 @@ async def _register_slash_commands():
             
             await interaction.response.send_message(embed=embed, ephemeral=True)
         
-        bot.tree.add_command(fake_serverinfo, guild=guild)
+        bot.tree.add_command(fake_serverinfo, guilds=guilds)
         
         # Fake avatar command
         @app_commands.command(name='avatar', description='🖼️ Display a user\'s avatar')
@@ -187,19 +327,18 @@ async def _register_slash_commands():
             
             await interaction.response.send_message(embed=embed, ephemeral=True)
         
-        bot.tree.add_command(fake_avatar, guild=guild)
+        bot.tree.add_command(fake_avatar, guilds=guilds)
     
-    # Sync commands
-    await bot.tree.sync(guild=guild)
-    logger.info(f'Slash commands registered and synced to guild {GUILD_ID}')
+    logger.info(f'Slash commands added for {len(guilds)} guild(s)')
 
 # ============= GUILD JOIN/LEAVE =============
 @bot.event
+@timed(kind='event')
 async def on_guild_join(guild: discord.Guild):
     """Handle bot joining a guild"""
     try:
-        # If GUILD_ID is set and this is not our guild, leave immediately
-        if GUILD_ID is not None and guild.id != GUILD_ID:
+        # If protected guilds are set and this is not one of them, leave immediately
+        if GUILD_IDS and guild.id not in GUILD_IDS:
             await guild.leave()
             logger.warning(f'Auto-left unauthorized guild: {guild.name} ({guild.id})')
             
@@ -208,8 +347,15 @@ async def on_guild_join(guild: discord.Guild):
         else:
             logger.info(f'Joined guild: {guild.name} ({guild.id})')
             
-            # Cache invites
-            await monitors.cache_invites(guild)
+            # Load settings and cache invites
+            await sharding.publish(bot)
+            db_manager.get_partition(guild.id)
+            mask.load_guild(guild.id)
+            if bot.intents.invites:
+                await monitors.cache_invites(guild)
+            risk_index.build(guild)
+            channel_perms.build(guild)
+            member_counters.build(guild)
             
             if OWNER_ID and DM_ALERTS:
                 await alert_simple(bot, f'✅ Bot joined guild\n**Guild:** {guild.name} ({guild.id})\n**Members:** {guild.member_count}')
@@ -219,172 +365,263 @@ async def on_guild_join(guild: discord.Guild):
 # ============= MESSAGE HANDLING =============
 @bot.event
 async def on_message(message: discord.Message):
-    """Handle messages"""
-    # Ignore bot messages
-    if message.author.bot:
+    """
+    Handle messages
+    
+    Guild messages only matter in mask channels; the rest leave after one
+    dict lookup, before any timing or logging.
+    """
+    if message.guild is not None:
+        if message.channel.id in mask.channels:
+            await on_mask_message(message)
         return
     
-    # Mask behavior (auto-reply)
+    # DM commands (owner only)
+    if not message.author.bot:
+        await on_dm_message(message)
+
+@timed(kind='event')
+async def on_mask_message(message: discord.Message):
+    """Mask behavior (auto-reply)"""
     try:
         await mask.on_message_mask(bot, message)
     except Exception as e:
         logger.exception(f'Mask handler failed: {e}')
-    
-    # DM commands (owner only)
-    if message.guild is None:
-        try:
-            await dm_commands.handle_dm(bot, message)
-        except Exception as e:
-            logger.exception(f'DM command handler failed: {e}')
-        return
-    
-    # No processing for regular server messages
-    return
+
+@timed(kind='event')
+async def on_dm_message(message: discord.Message):
+    """DM commands (owner only)"""
+    try:
+        await dm_commands.handle_dm(bot, message)
+    except Exception as e:
+        logger.exception(f'DM command handler failed: {e}')
 
 # ============= MEMBER EVENTS =============
 @bot.event
+@timed(kind='event')
 async def on_member_join(member: discord.Member):
     """Handle member join"""
     try:
-        await monitors.handle_member_join(bot, member)
+        risk_index.on_member_join(member)
+        channel_perms.on_member_join(member)
+        member_counters.on_member_join(member)
+        await pipeline.submit('member_join', member)
     except Exception as e:
         logger.exception(f'handle_member_join failed: {e}')
 
 @bot.event
+@timed(kind='event')
 async def on_member_remove(member: discord.Member):
     """Handle member leave"""
     try:
-        await monitors.handle_member_remove(bot, member)
+        risk_index.on_member_remove(member)
+        channel_perms.on_member_remove(member)
+        member_counters.on_member_remove(member)
+        await pipeline.submit('member_remove', member)
     except Exception as e:
         logger.exception(f'handle_member_remove failed: {e}')
 
 @bot.event
+@timed(kind='event')
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent):
+    """Handle any member leave (on_member_remove only fires for cached members)"""
+    try:
+        guild = bot.get_guild(payload.guild_id)
+        if guild is not None:
+            member_counters.on_raw_member_remove(guild)
+    except Exception as e:
+        logger.exception(f'handle_raw_member_remove failed: {e}')
+
+@bot.event
+@timed(kind='event')
 async def on_member_update(before: discord.Member, after: discord.Member):
     """Handle member updates"""
     try:
-        await monitors.handle_member_update(bot, before, after)
+        risk_index.on_member_update(before, after)
+        channel_perms.on_member_update(before, after)
+        member_counters.on_member_update(before, after)
+        await pipeline.submit('member_update', before, after)
     except Exception as e:
         logger.exception(f'handle_member_update failed: {e}')
 
+@bot.event
+async def on_presence_update(before: discord.Member, after: discord.Member):
+    """
+    Keep the online count (only subscribed to with TRACK_PRESENCE)
+    
+    The busiest gateway event on large guilds, so it's one counter update
+    without timing or logging.
+    """
+    if before.status is not after.status:
+        member_counters.on_presence_update(before, after)
+
 # ============= MODERATION EVENTS =============
 @bot.event
+@timed(kind='event')
 async def on_member_ban(guild: discord.Guild, user: discord.User):
     """Handle member ban"""
     try:
-        await monitors.handle_member_ban(bot, guild, user)
+        await pipeline.submit('member_ban', guild, user)
     except Exception as e:
         logger.exception(f'handle_member_ban failed: {e}')
 
 @bot.event
+@timed(kind='event')
 async def on_member_unban(guild: discord.Guild, user: discord.User):
     """Handle member unban"""
     try:
-        await monitors.handle_member_unban(bot, guild, user)
+        await pipeline.submit('member_unban', guild, user)
     except Exception as e:
         logger.exception(f'handle_member_unban failed: {e}')
 
 # ============= CHANNEL EVENTS =============
 @bot.event
+@timed(kind='event')
 async def on_guild_channel_create(channel: discord.abc.GuildChannel):
     """Handle channel creation"""
     try:
-        await monitors.handle_channel_create(bot, channel)
+        await pipeline.submit('channel_create', channel)
     except Exception as e:
         logger.exception(f'handle_channel_create failed: {e}')
 
 @bot.event
+@timed(kind='event')
 async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
     """Handle channel deletion"""
     try:
-        await monitors.handle_channel_delete(bot, channel)
+        channel_perms.on_channel_delete(channel)
+        await pipeline.submit('channel_delete', channel)
     except Exception as e:
         logger.exception(f'handle_channel_delete failed: {e}')
 
 @bot.event
+@timed(kind='event')
 async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
     """Handle channel update"""
     try:
-        await monitors.handle_channel_update(bot, before, after)
+        channel_perms.on_channel_update(before, after)
+        await pipeline.submit('channel_update', before, after)
     except Exception as e:
         logger.exception(f'handle_channel_update failed: {e}')
 
 # ============= ROLE EVENTS =============
 @bot.event
+@timed(kind='event')
 async def on_guild_role_create(role: discord.Role):
     """Handle role creation"""
     try:
-        await monitors.handle_guild_role_create(bot, role)
+        risk_index.on_role_create(role)
+        await pipeline.submit('role_create', role)
     except Exception as e:
         logger.exception(f'handle_guild_role_create failed: {e}')
 
 @bot.event
+@timed(kind='event')
 async def on_guild_role_delete(role: discord.Role):
     """Handle role deletion"""
     try:
-        await monitors.handle_guild_role_delete(bot, role)
+        risk_index.on_role_delete(role)
+        channel_perms.on_role_delete(role)
+        await pipeline.submit('role_delete', role)
     except Exception as e:
         logger.exception(f'handle_guild_role_delete failed: {e}')
 
 @bot.event
+@timed(kind='event')
 async def on_guild_role_update(before: discord.Role, after: discord.Role):
     """Handle role update"""
     try:
-        await monitors.handle_guild_role_update(bot, before, after)
+        risk_index.on_role_update(before, after)
+        channel_perms.on_role_update(before, after)
+        await pipeline.submit('role_update', before, after)
     except Exception as e:
         logger.exception(f'handle_guild_role_update failed: {e}')
 
 # ============= MESSAGE TRACKING (Watched users only) =============
 @bot.event
+@timed(kind='event')
 async def on_message_delete(message: discord.Message):
     """Handle message deletion"""
     try:
-        await monitors.handle_message_delete(bot, message)
+        await pipeline.submit('message_delete', message)
     except Exception as e:
         logger.exception(f'handle_message_delete failed: {e}')
 
 @bot.event
+@timed(kind='event')
 async def on_message_edit(before: discord.Message, after: discord.Message):
     """Handle message edit"""
     try:
-        await monitors.handle_message_edit(bot, before, after)
+        await pipeline.submit('message_edit', before, after)
     except Exception as e:
         logger.exception(f'handle_message_edit failed: {e}')
 
 # ============= GUILD EVENTS =============
 @bot.event
+@timed(kind='event')
 async def on_guild_update(before: discord.Guild, after: discord.Guild):
     """Handle guild settings update"""
     try:
-        await monitors.handle_guild_update(bot, before, after)
+        risk_index.on_guild_update(before, after)
+        await pipeline.submit('guild_update', before, after)
     except Exception as e:
         logger.exception(f'handle_guild_update failed: {e}')
 
 # ============= VOICE EVENTS =============
 @bot.event
+@timed(kind='event')
 async def on_voice_state_update(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
     """Handle voice state changes"""
     try:
-        await monitors.handle_voice_state_update(bot, member, before, after)
+        await pipeline.submit('voice_state_update', member, before, after)
     except Exception as e:
         logger.exception(f'handle_voice_state_update failed: {e}')
 
 # ============= INVITE EVENTS =============
 @bot.event
+@timed(kind='event')
 async def on_invite_create(invite: discord.Invite):
     """Handle invite creation"""
     try:
-        await monitors.handle_invite_create(bot, invite)
+        await pipeline.submit('invite_create', invite)
     except Exception as e:
         logger.exception(f'handle_invite_create failed: {e}')
 
 @bot.event
+@timed(kind='event')
 async def on_invite_delete(invite: discord.Invite):
     """Handle invite deletion"""
     try:
-        await monitors.handle_invite_delete(bot, invite)
+        await pipeline.submit('invite_delete', invite)
     except Exception as e:
         logger.exception(f'handle_invite_delete failed: {e}')
 
+# ============= SESSION EVENTS =============
+@bot.event
+@timed(kind='event')
+async def on_disconnect():
+    """Handle gateway disconnect"""
+    try:
+        catchup.on_disconnect(bot)
+    except Exception as e:
+        logger.exception(f'on_disconnect failed: {e}')
+
+@bot.event
+@timed(kind='event')
+async def on_resumed():
+    """Handle gateway session resume"""
+    catchup.on_resumed()
+
+# ============= AUDIT LOG EVENTS =============
+@bot.event
+@timed(kind='event')
+async def on_audit_log_entry_create(entry: discord.AuditLogEntry):
+    """Track the newest audit log entry for offline catch-up"""
+    try:
+        catchup.on_audit_log_entry(entry)
+    except Exception as e:
+        logger.exception(f'on_audit_log_entry_create failed: {e}')
+
 # ============= ERROR HANDLING =============
 @bot.event
 async def on_error(event, *args, **kwargs):
@@ -404,3 +641,6 @@ if __name__ == '__main__':
     except Exception as e:
         logger.exception(f'Fatal error: {e}')
         raise
+    finally:
+        # Rollups still waiting for their batched write
+        member_counters.flush()
@@ -0,0 +1,152 @@
+# cache_policy.py — Gateway Intents & Cache Policy
+#
+# What the bot subscribes to and caches follows what the guild settings
+# switch on. Across every guild's filters, watch list and mask channel:
+#   - the members / roles filters need the whole member list (member
+#     updates need the cached "before", role alerts and .risky count
+#     members), so it is requested at startup;
+#   - otherwise only watched members are cached, fetched on demand, and
+#     the rest of a large guild is never loaded;
+#   - messages, voice and invite events are only subscribed to while
+#     something uses them, and messages are only cached while tracked;
+#   - presences (privileged, and the busiest event) only with TRACK_PRESENCE.
+# Settings are read before connecting: switching on something the running
+# session doesn't receive takes a restart, and the commands say so.
+import discord
+from logger import logger
+import db_manager
+import risk_index
+import channel_perms
+from config import GUILD_IDS, DEFAULT_FILTERS, INTENTS_AUTO, MESSAGE_CACHE_SIZE, TRACK_PRESENCE
+
+# What the settings can need from the gateway, with the name shown to the owner
+NEEDS = {
+    'member_list': 'full member list',
+    'messages': 'message tracking',
+    'mask': 'mask replies',
+    'voice': 'voice tracking',
+    'invites': 'invite tracking',
+}
+
+active = None  # needs the running session was started with
+
+def requirements() -> dict:
+    """
+    Work out what the current settings need, across every guild
+
+    Returns:
+        dict: {need: bool} for each key of NEEDS
+    """
+    if not INTENTS_AUTO:
+        return dict.fromkeys(NEEDS, True)
+
+    needs = dict.fromkeys(NEEDS, False)
+    stored = set(db_manager.get_partition_ids())
+    if GUILD_IDS:
+        stored &= set(GUILD_IDS)
+    partitions = [db_manager.get_partition(guild_id) for guild_id in sorted(stored)]
+    # Protected guilds without settings yet start with the defaults
+    if any(guild_id not in stored for guild_id in GUILD_IDS) or not partitions:
+        partitions.append({'filters': DEFAULT_FILTERS, 'watched_users': [], 'mask': {}})
+
+    for partition in partitions:
+        filters = partition['filters']
+        enabled = lambda name: filters.get(name, True)
+        watched = bool(partition['watched_users'])
+
+        needs['member_list'] |= enabled('members') or enabled('roles')
+        needs['messages'] |= enabled('messages') and watched
+        needs['mask'] |= bool(partition['mask'].get('channels')) or partition['mask'].get('channel_id') is not None
+        needs['voice'] |= enabled('voice') and watched
+        needs['invites'] |= enabled('invites') or enabled('members')
+    return needs
+
+def bot_options(needs: dict = None) -> dict:
+    """
+    Get the intent and cache options for the bot (and remember them as active)
+
+    Returns:
+        dict: intents, member_cache_flags, chunk_guilds_at_startup, max_messages
+    """
+    global active
+    needs = needs or requirements()
+    active = needs
+
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.members = True          # bot additions are critical and arrive as member joins
+    intents.moderation = True       # bans, and the audit log feed behind offline catch-up
+    intents.dm_messages = True      # owner commands (DM content needs no message_content)
+    intents.guild_messages = needs['messages'] or needs['mask']
+    intents.message_content = needs['messages']
+    intents.voice_states = needs['voice']
+    intents.invites = needs['invites']
+    intents.presences = TRACK_PRESENCE  # privileged: only when asked for (online counts)
+
+    if needs['member_list']:
+        member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+    else:
+        # Only the members put there on purpose (watched, fetched): joins,
+        # updates and voice activity of everyone else don't build up a cache
+        member_cache_flags = discord.MemberCacheFlags.none()
+
+    return {
+        'intents': intents,
+        'member_cache_flags': member_cache_flags,
+        'chunk_guilds_at_startup': needs['member_list'],
+        'max_messages': MESSAGE_CACHE_SIZE if needs['messages'] else None
+    }
+
+def describe(needs: dict = None) -> str:
+    """One line summary of a set of needs (the active ones by default)"""
+    needs = needs or active or {}
+    enabled = [label for name, label in NEEDS.items() if needs.get(name)]
+    if TRACK_PRESENCE:
+        enabled.append('presences')
+    return f"Gateway: {', '.join(enabled) or 'watched members only'}"
+
+def restart_notice() -> str:
+    """
+    Say what the current settings need that the running session doesn't receive
+
+    Returns:
+        str: A line to add to the command's reply, or '' if nothing is missing
+    """
+    if active is None:
+        return ''
+    needs = requirements()
+    missing = [label for name, label in NEEDS.items() if needs[name] and not active[name]]
+    return f"\nℹ️ Restart the bot to turn on: {', '.join(missing)}" if missing else ''
+
+# ============= LAZY MEMBERS =============
+def has_member_list(guild: discord.Guild) -> bool:
+    """Whether every member of a guild is cached"""
+    return guild.chunked
+
+async def cache_members(guild: discord.Guild, user_ids: list):
+    """
+    Put members in the cache (e.g. newly watched ones) when the guild isn't
+    fully cached; ones that arrive after the indexes were built are indexed
+    as if they had just joined
+    """
+    if has_member_list(guild):
+        return
+    user_ids = [user_id for user_id in user_ids if guild.get_member(user_id) is None]
+    indexed = risk_index.is_built(guild)
+    # The gateway answers up to 100 ids per request
+    for start in range(0, len(user_ids), 100):
+        try:
+            members = await guild.query_members(user_ids=user_ids[start:start + 100], cache=True)
+        except Exception as e:
+            logger.exception(f'Failed to fetch members in guild {guild.id}: {e}')
+            continue
+        if indexed:
+            for member in members:
+                risk_index.on_member_join(member)
+                channel_perms.on_member_join(member)
+
+async def cache_watched(guilds: list):
+    """Cache every guild's watched members (their events need a cached member)"""
+    for guild in guilds:
+        watched = db_manager.get_watched_users(guild.id)
+        await cache_members(guild, [int(user_id) for user_id in watched])
@@ -0,0 +1,265 @@
+# catchup.py — Offline Catch-Up After Restarts & Reconnects
+import asyncio
+import discord
+from logger import logger
+from dm_notify import alert
+from db_manager import add_to_audit_log, get_audit_cursor, set_audit_cursor
+from filters import should_alert
+from utils import truncate_text
+import snapshots
+from config import (
+    GUILD_IDS, PRIORITY_CRITICAL, PRIORITY_WARNING,
+    CATCHUP_MAX_ENTRIES, CATCHUP_CURSOR_FLUSH_DELAY, CATCHUP_MASS_THRESHOLD
+)
+
+Action = discord.AuditLogAction
+
+# Audit log actions worth reporting: (filter category, summary heading)
+_ACTIONS = {
+    Action.bot_add: ('bots', '🤖 Bots Added'),
+    Action.ban: ('moderation', '🔨 Bans'),
+    Action.unban: ('moderation', '🔓 Unbans'),
+    Action.kick: ('moderation', '👢 Kicks'),
+    Action.member_prune: ('moderation', '🧹 Prunes'),
+    Action.member_update: ('moderation', '✏️ Member Updates'),
+    Action.member_role_update: ('roles', '🎭 Member Role Changes'),
+    Action.role_create: ('roles', '➕ Roles Created'),
+    Action.role_delete: ('roles', '🗑️ Roles Deleted'),
+    Action.role_update: ('roles', '✏️ Roles Updated'),
+    Action.channel_create: ('channels', '➕ Channels Created'),
+    Action.channel_delete: ('channels', '🗑️ Channels Deleted'),
+    Action.channel_update: ('channels', '✏️ Channels Updated'),
+    Action.overwrite_create: ('channels', '🔐 Overwrites Changed'),
+    Action.overwrite_update: ('channels', '🔐 Overwrites Changed'),
+    Action.overwrite_delete: ('channels', '🔐 Overwrites Changed'),
+    Action.guild_update: ('server', '⚙️ Server Settings'),
+    Action.webhook_create: ('server', '🪝 Webhooks Created'),
+    Action.webhook_delete: ('server', '🪝 Webhooks Deleted'),
+    Action.invite_create: ('invites', '📨 Invites Created'),
+}
+
+# Destructive actions: enough of them while we were away is a critical summary
+_DESTRUCTIVE = {Action.ban, Action.kick, Action.member_prune, Action.role_delete, Action.channel_delete}
+
+_baselines = {}  # {guild_id: state} cached guild state at the last disconnect
+_cursors = {}  # {guild_id: newest audit log entry id seen}
+_dirty = set()  # guild ids whose cursor is not persisted yet
+_flush_task = None
+_catchup_lock = asyncio.Lock()
+
+# ============= CURSOR =============
+def _advance(guild_id: int, entry_id: int) -> bool:
+    """Move a guild's cursor forward (never back)"""
+    if entry_id <= _cursors.get(guild_id, 0):
+        return False
+    _cursors[guild_id] = entry_id
+    return True
+
+def _flush():
+    """Persist every cursor that moved"""
+    for guild_id in list(_dirty):
+        set_audit_cursor(guild_id, _cursors[guild_id])
+    _dirty.clear()
+
+async def _delayed_flush():
+    await asyncio.sleep(CATCHUP_CURSOR_FLUSH_DELAY)
+    _flush()
+
+def on_audit_log_entry(entry: discord.AuditLogEntry):
+    """Keep the cursor current while connected (writes are batched)"""
+    global _flush_task
+    if GUILD_IDS and entry.guild.id not in GUILD_IDS:
+        return
+
+    if _advance(entry.guild.id, entry.id):
+        _dirty.add(entry.guild.id)
+        if _flush_task is None or _flush_task.done():
+            _flush_task = asyncio.create_task(_delayed_flush())
+
+def _load_cursor(guild_id: int) -> int:
+    """Get a guild's cursor, from memory or the store"""
+    if guild_id not in _cursors:
+        cursor = get_audit_cursor(guild_id)
+        if cursor:
+            _cursors[guild_id] = cursor
+    return _cursors.get(guild_id)
+
+# ============= SESSION EVENTS =============
+def on_disconnect(bot):
+    """Remember what the cache held when the gateway session dropped"""
+    for guild in bot.guilds:
+        if not GUILD_IDS or guild.id in GUILD_IDS:
+            _, previous = snapshots.get_latest_snapshot(guild)
+            _baselines[guild.id] = snapshots.capture_cached(guild, previous)
+
+def on_resumed():
+    """A resumed session replays missed events itself: nothing to catch up"""
+    _baselines.clear()
+
+# ============= AUDIT LOG REPLAY =============
+def _name_of(obj) -> str:
+    """Get a display name for an audit log user/target"""
+    if obj is None:
+        return 'Unknown'
+    name = getattr(obj, 'name', None)
+    return f'{name}' if name else f'`{obj.id}`'
+
+async def fetch_missed_entries(guild: discord.Guild) -> list:
+    """
+    Page through audit log entries newer than the stored cursor
+
+    On the very first run there is no cursor: nothing is replayed and the
+    cursor starts at the newest entry.
+
+    Returns:
+        list: Entries oldest first (at most CATCHUP_MAX_ENTRIES)
+    """
+    cursor = _load_cursor(guild.id)
+    entries = []
+
+    try:
+        if cursor is None:
+            async for entry in guild.audit_logs(limit=1):
+                _advance(guild.id, entry.id)
+                set_audit_cursor(guild.id, entry.id)
+            return []
+
+        after = discord.Object(id=cursor)
+        async for entry in guild.audit_logs(limit=CATCHUP_MAX_ENTRIES, after=after, oldest_first=True):
+            entries.append(entry)
+    except discord.Forbidden:
+        logger.warning(f'No permission to read audit log in guild {guild.id}, skipping catch-up replay')
+        return []
+
+    if entries:
+        _advance(guild.id, entries[-1].id)
+        set_audit_cursor(guild.id, _cursors[guild.id])
+    return entries
+
+def group_entries(guild_id: int, entries: list, bot_id: int = None) -> dict:
+    """
+    Group reportable entries under their summary heading
+
+    Entries by the bot itself, by whitelisted users, or in a category whose
+    filter is off are left out.
+
+    Returns:
+        dict: {heading: {'category': str, 'lines': [...], 'destructive': int}}
+    """
+    groups = {}
+    for entry in entries:
+        spec = _ACTIONS.get(entry.action)
+        if spec is None:
+            continue
+
+        category, heading = spec
+        actor_id = entry.user.id if entry.user else None
+        if actor_id is not None and actor_id == bot_id:
+            continue
+        if not should_alert(guild_id, category, actor_id):
+            continue
+
+        group = groups.setdefault(heading, {'category': category, 'lines': [], 'destructive': 0})
+        line = f"{_name_of(entry.target)} by {_name_of(entry.user)}"
+        if entry.reason:
+            line += f" — {entry.reason[:60]}"
+        group['lines'].append(line)
+        if entry.action in _DESTRUCTIVE:
+            group['destructive'] += 1
+    return groups
+
+# ============= CATCH-UP =============
+def _priority_of(groups: dict, drift_changes: int) -> str:
+    """Pick the summary priority from what was missed"""
+    categories = {group['category'] for group in groups.values()}
+    destructive = sum(group['destructive'] for group in groups.values())
+
+    if categories & set(PRIORITY_CRITICAL) or destructive >= CATCHUP_MASS_THRESHOLD:
+        return '🔴 CRITICAL'
+    if categories & set(PRIORITY_WARNING) or drift_changes:
+        return '🟡 WARNING'
+    return '🟢 INFO'
+
+async def catch_up_guild(bot, guild: discord.Guild) -> dict:
+    """
+    Find what changed in a guild while the bot was away and send one summary
+
+    Returns:
+        dict: {'entries': int, 'drift_changes': int, 'alerted': bool}
+    """
+    # After a reconnect, compare with what the cache held when the session
+    # dropped; after a restart, with the last snapshot (the snapshot taken
+    # below becomes the baseline for the next restart)
+    summary, state = snapshots.get_latest_snapshot(guild)
+    baseline = _baselines.pop(guild.id, None)
+    if baseline is not None:
+        state = baseline
+        summary = None
+
+    drift_lines = []
+    drift_changes = 0
+    if state is not None:
+        live = await snapshots.capture(guild, state)
+        drift = snapshots.compute_drift(state, live)
+        drift_lines = snapshots.format_drift(drift, max_items=10)
+        drift_changes = sum(
+            len(entry['deleted']) + len(entry['created']) + len(entry['changed'])
+            for entry in drift.values()
+        )
+    await snapshots.take_snapshot(guild, 'catchup')
+
+    entries = await fetch_missed_entries(guild)
+    groups = group_entries(guild.id, entries, bot.user.id if bot.user else None)
+
+    result = {'entries': len(entries), 'drift_changes': drift_changes, 'alerted': False}
+    if not groups and not drift_changes:
+        logger.info(f'Catch-up for guild {guild.id}: nothing missed ({len(entries)} audit entries)')
+        return result
+
+    details_lines = [f"**Server:** {guild.name}"]
+    if summary is not None:
+        details_lines.append(f"**Since:** snapshot #{summary['id']} ({summary['time'][:16].replace('T', ' ')} UTC)")
+    else:
+        details_lines.append("**Since:** gateway reconnect")
+
+    for heading, group in groups.items():
+        details_lines.append(f"\n**{heading} ({len(group['lines'])}):**")
+        details_lines.extend(f"• {line}" for line in group['lines'][:8])
+        if len(group['lines']) > 8:
+            details_lines.append(f"... and {len(group['lines']) - 8} more")
+
+    if drift_lines:
+        details_lines.append("\n**📸 Server Structure Drift:**")
+        details_lines.extend(drift_lines)
+
+    await add_to_audit_log('offline_catchup', {
+        'guild_id': guild.id,
+        'entries': len(entries),
+        'drift_changes': drift_changes,
+        'counts': {heading: len(group['lines']) for heading, group in groups.items()}
+    })
+
+    await alert(
+        bot,
+        "Missed While Offline",
+        truncate_text('\n'.join(details_lines), 4000),
+        priority=_priority_of(groups, drift_changes),
+        guild=guild
+    )
+    result['alerted'] = True
+    return result
+
+async def run(bot):
+    """Catch up every monitored guild (one run at a time)"""
+    if _catchup_lock.locked():
+        logger.info('Catch-up already running, skipping')
+        return
+
+    async with _catchup_lock:
+        for guild in bot.guilds:
+            if not GUILD_IDS or guild.id in GUILD_IDS:
+                try:
+                    result = await catch_up_guild(bot, guild)
+                    logger.info(f'Catch-up for guild {guild.id}: {result}')
+                except Exception as e:
+                    logger.exception(f'Catch-up failed for guild {guild.id}: {e}')
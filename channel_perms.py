@@ -0,0 +1,310 @@
+# channel_perms.py — Effective Channel Permission Resolver
+import discord
+from logger import logger
+from permissions import get_permission_changes
+from config import CHANNEL_PERMS_CACHE_SIZE
+
+# Parsed overwrites per channel:
+# {channel_id: (everyone_allow, everyone_deny, {role_id: (allow, deny)}, {member_id: (allow, deny)})}
+_layouts = {}
+
+# Resolved bitfields: {guild_id: {channel_id: {key: value}}}
+# Members are keyed by (role signature, timed out, member id or 0), so members
+# sharing the same roles share one entry and role changes need no invalidation.
+# Roles are keyed by (role_id,).
+_values = {}
+
+# Inverted index for who_can: {guild_id: {role signature: {member_id}}}
+_groups = {}
+_timed_out = {}  # {guild_id: {member_id}} members with a timeout set (maybe expired)
+
+# ============= OVERWRITES =============
+def _parse_overwrites(channel) -> tuple:
+    """Split a channel's raw overwrites into @everyone, role and member entries"""
+    everyone_allow = everyone_deny = 0
+    roles = {}
+    members = {}
+    guild_id = channel.guild.id
+
+    # The raw list avoids building Overwrite objects for every target
+    for overwrite in channel._overwrites:
+        if overwrite.id == guild_id:
+            everyone_allow, everyone_deny = overwrite.allow, overwrite.deny
+        elif overwrite.is_role():
+            roles[overwrite.id] = (overwrite.allow, overwrite.deny)
+        else:
+            members[overwrite.id] = (overwrite.allow, overwrite.deny)
+
+    return everyone_allow, everyone_deny, roles, members
+
+def _layout(channel) -> tuple:
+    """Get a channel's parsed overwrites (cached)"""
+    layout = _layouts.get(channel.id)
+    if layout is None:
+        layout = _layouts[channel.id] = _parse_overwrites(channel)
+    return layout
+
+def _base_channel(channel):
+    """Threads inherit their parent's permissions"""
+    if isinstance(channel, discord.Thread):
+        return channel.parent
+    return channel
+
+# ============= RESOLUTION =============
+def _signature(member: discord.Member) -> tuple:
+    """Get the sorted role ids that decide a member's base permissions"""
+    return tuple(sorted(role.id for role in member.roles))
+
+def _member_key(layout: tuple, member: discord.Member, signature: tuple) -> tuple:
+    """Members with the same roles, timeout state and no overwrite of their own share a key"""
+    member_id = member.id if member.id in layout[3] else 0
+    return (signature, member.is_timed_out(), member_id)
+
+def _channel_values(channel) -> dict:
+    """Get the value cache for a channel"""
+    guild_values = _values.setdefault(channel.guild.id, {})
+    values = guild_values.get(channel.id)
+    if values is None or len(values) >= CHANNEL_PERMS_CACHE_SIZE:
+        values = guild_values[channel.id] = {}
+    return values
+
+def _cached_value(channel, values: dict, key: tuple, target) -> int:
+    """Get a cached value, resolving it through discord.py on a miss"""
+    value = values.get(key)
+    if value is None:
+        # discord.py applies the owner, admin, @everyone/role/member overwrite,
+        # timeout and per-channel-type implicit rules
+        value = values[key] = channel.permissions_for(target).value
+    return value
+
+def resolve_value(channel, target) -> int:
+    """Get the effective permission bitfield of a member or role in a channel"""
+    channel = _base_channel(channel)
+
+    if isinstance(target, discord.Role):
+        return _cached_value(channel, _channel_values(channel), (target.id,), target)
+
+    # The owner is never cached: ownership can move without a member event
+    if target.id == channel.guild.owner_id:
+        return channel.permissions_for(target).value
+
+    key = _member_key(_layout(channel), target, _signature(target))
+    return _cached_value(channel, _channel_values(channel), key, target)
+
+def resolve(channel, target) -> discord.Permissions:
+    """
+    Get the effective permissions of a member or role in a channel
+
+    Roles resolve to what the role alone (with @everyone) grants there.
+    Threads resolve through their parent channel.
+
+    Returns:
+        discord.Permissions: Effective permissions
+    """
+    return discord.Permissions(resolve_value(channel, target))
+
+# ============= WHO CAN =============
+def _ensure_groups(guild: discord.Guild) -> dict:
+    """Get (building if needed) the role-signature groups for a guild"""
+    groups = _groups.get(guild.id)
+    if groups is None:
+        build(guild)
+        groups = _groups[guild.id]
+    return groups
+
+def who_can(channel, perm_name: str) -> tuple:
+    """
+    Find every role and member holding a permission in a channel
+
+    Each distinct role signature is resolved once through one of its
+    members, then the whole group is taken or skipped together. Only the owner, members with their
+    own overwrite and members with a timeout are resolved one by one.
+
+    Returns:
+        tuple: (list of roles, list of member ids)
+    """
+    bit = discord.Permissions.VALID_FLAGS[perm_name]
+    channel = _base_channel(channel)
+    guild = channel.guild
+    layout = _layout(channel)
+    values = _channel_values(channel)
+    groups = _ensure_groups(guild)
+
+    roles = [role for role in guild.roles if resolve_value(channel, role) & bit]
+
+    special = set(layout[3]) | _timed_out.get(guild.id, set())
+    if guild.owner_id:
+        special.add(guild.owner_id)
+
+    member_ids = []
+    for signature, ids in groups.items():
+        plain = ids.difference(special) if special else ids
+        if not plain:
+            continue
+
+        # Any plain member of the group stands in for all of them
+        member = guild.get_member(next(iter(plain)))
+        if member is None:
+            continue
+        if _cached_value(channel, values, (signature, False, 0), member) & bit:
+            member_ids.extend(plain)
+
+    for member_id in special:
+        member = guild.get_member(member_id)
+        if member is not None and resolve_value(channel, member) & bit:
+            member_ids.append(member_id)
+
+    return roles, member_ids
+
+# ============= OVERWRITE DELTAS =============
+def _target_label(guild: discord.Guild, target_id: int, is_role: bool) -> str:
+    """Get a display label for an overwrite target"""
+    if target_id == guild.id:
+        return '@everyone'
+    if is_role:
+        role = guild.get_role(target_id)
+        return f'@{role.name}' if role else f'Role {target_id}'
+    member = guild.get_member(target_id)
+    return f'{member}' if member else f'Member {target_id}'
+
+def get_overwrite_deltas(before, after) -> list:
+    """
+    Get the effective permission changes caused by an overwrite edit
+
+    Each changed overwrite target is resolved against the old and the new
+    overwrites. Members no longer in the cache fall back to the raw
+    allow/deny bits of their overwrite.
+
+    Returns:
+        list: List of dicts with target, added, removed and has_critical_changes
+    """
+    guild = after.guild
+    before_layout = _parse_overwrites(before)
+    after_layout = _parse_overwrites(after)
+    deltas = []
+
+    def _entries(layout):
+        everyone_allow, everyone_deny, roles, members = layout
+        entries = {(guild.id, True): (everyone_allow, everyone_deny)}
+        entries.update({(role_id, True): ow for role_id, ow in roles.items()})
+        entries.update({(member_id, False): ow for member_id, ow in members.items()})
+        return entries
+
+    before_entries = _entries(before_layout)
+    after_entries = _entries(after_layout)
+
+    for target_id, is_role in before_entries.keys() | after_entries.keys():
+        if before_entries.get((target_id, is_role), (0, 0)) == after_entries.get((target_id, is_role), (0, 0)):
+            continue
+
+        target = guild.get_role(target_id) if is_role else guild.get_member(target_id)
+        if target is not None:
+            before_value = before.permissions_for(target).value
+            after_value = after.permissions_for(target).value
+        elif not is_role:
+            before_value = before_layout[3].get(target_id, (0, 0))[0]
+            after_value = after_layout[3].get(target_id, (0, 0))[0]
+        else:
+            continue
+
+        changes = get_permission_changes(discord.Permissions(before_value), discord.Permissions(after_value))
+        if changes['added'] or changes['removed']:
+            deltas.append({
+                'target': _target_label(guild, target_id, is_role),
+                **changes
+            })
+
+    deltas.sort(key=lambda delta: (not delta['has_critical_changes'], delta['target']))
+    return deltas
+
+# ============= INDEX MAINTENANCE =============
+def build(guild: discord.Guild):
+    """Group a guild's members by role signature"""
+    groups = {}
+    timed_out = set()
+
+    for member in guild.members:
+        groups.setdefault(_signature(member), set()).add(member.id)
+        if member.timed_out_until is not None:
+            timed_out.add(member.id)
+
+    _groups[guild.id] = groups
+    _timed_out[guild.id] = timed_out
+    logger.info(f'Channel permission index built for guild {guild.id}: {len(groups)} role signatures')
+
+def discard(guild: discord.Guild):
+    """Forget a guild"""
+    _groups.pop(guild.id, None)
+    _timed_out.pop(guild.id, None)
+    for channel_id in _values.pop(guild.id, {}):
+        _layouts.pop(channel_id, None)
+
+def _invalidate_channel(channel):
+    """Drop a channel's parsed overwrites and resolved values"""
+    _layouts.pop(channel.id, None)
+    _values.get(channel.guild.id, {}).pop(channel.id, None)
+
+def _invalidate_guild_values(guild: discord.Guild):
+    """Drop every resolved value in a guild (role permissions changed)"""
+    _values.pop(guild.id, None)
+
+def _add_member(member: discord.Member):
+    groups = _groups.get(member.guild.id)
+    if groups is None:
+        return
+    groups.setdefault(_signature(member), set()).add(member.id)
+    if member.timed_out_until is not None:
+        _timed_out[member.guild.id].add(member.id)
+
+def _remove_member(member: discord.Member):
+    groups = _groups.get(member.guild.id)
+    if groups is None:
+        return
+    signature = _signature(member)
+    ids = groups.get(signature)
+    if ids is not None:
+        ids.discard(member.id)
+        if not ids:
+            del groups[signature]
+    _timed_out[member.guild.id].discard(member.id)
+
+def on_channel_update(before, after):
+    """Invalidate a channel whose overwrites changed"""
+    if _parse_overwrites(before) != _parse_overwrites(after):
+        _invalidate_channel(after)
+
+def on_channel_delete(channel):
+    """Forget a deleted channel"""
+    _invalidate_channel(channel)
+
+def on_role_update(before: discord.Role, after: discord.Role):
+    """Role permissions feed every channel's base permissions"""
+    if before.permissions != after.permissions:
+        _invalidate_guild_values(after.guild)
+
+def on_role_delete(role: discord.Role):
+    """Members may still carry the deleted id until their own update"""
+    _invalidate_guild_values(role.guild)
+
+def on_member_join(member: discord.Member):
+    """Index a new member"""
+    _add_member(member)
+
+def on_member_remove(member: discord.Member):
+    """Drop a member"""
+    _remove_member(member)
+
+def on_member_update(before: discord.Member, after: discord.Member):
+    """Move a member whose roles or timeout changed"""
+    if before.roles == after.roles and before.timed_out_until == after.timed_out_until:
+        return
+    _remove_member(before)
+    _add_member(after)
+
+def get_stats(guild: discord.Guild) -> dict:
+    """Get index and cache sizes for a guild"""
+    return {
+        'signatures': len(_groups.get(guild.id, {})),
+        'cached_channels': len(_values.get(guild.id, {})),
+        'cached_values': sum(len(values) for values in _values.get(guild.id, {}).values())
+    }
@@ -1,9 +1,9 @@
 # commands.py — ULTIMATE DM Command System (Owner Only)
 import discord
-from db_manager import load_db, save_db, add_to_audit_log, increment_stat
+from db_manager import add_to_audit_log, increment_stat, get_partition, save_partition
 from logger import logger
 from dm_notify import alert_simple, get_alert_stats
-from config import OWNER_ID, GUILD_ID, PREFIX
+from config import OWNER_ID, GUILD_ID, GUILD_IDS, PREFIX, MEMBER_RECENT_DAYS, MEMBER_TREND_DAYS
 from filters import (
     should_alert, get_priority, toggle_filter, set_filter,
     get_filters_status, enable_all_filters, disable_all_filters, reset_filters
@@ -12,9 +12,25 @@ from whitelist import (
     add_to_whitelist, remove_from_whitelist, get_whitelist_users, get_whitelist_display
 )
 from quick_actions import handle_quick_action_response, get_pending_actions_count, pending_actions
-from utils import parse_user_id, format_user, format_timestamp, format_channel, format_role, format_duration, get_account_age, get_member_age
+from utils import parse_user_id, parse_channel_id, format_user, format_timestamp, format_channel, format_role, format_duration, get_account_age, get_member_age, get_or_fetch_member, get_audit_action_emoji
 from permissions import format_role_info, analyze_permissions
+import risk_index
+import channel_perms
+import snapshots
+import recorder
+import sharding
+import cache_policy
+import mask
+import paginator
+import audit_store
+import member_counters
+import perf
+import asyncio
+import contextlib
+import contextvars
 import datetime
+import time
+from typing import Callable, NamedTuple
 
 async def handle_dm(bot, message: discord.Message):
     """Handle DM commands from owner"""
@@ -30,6 +46,13 @@ async def handle_dm(bot, message: discord.Message):
         return
     
     # Check if it's a quick action response (just a number)
+    if content.isdigit() and sharding.enabled and _forwarded_guild.get() is None:
+        latest = sharding.latest_action()
+        if latest and latest[1] != sharding.process:
+            # The newest action was raised by another shard process
+            await sharding.forward_command(latest[1], f'{latest[0]} {content}')
+            return
+    
     if content.isdigit() and get_pending_actions_count() > 0:
         await _handle_quick_action_number(bot, message, int(content))
         return
@@ -39,6 +62,11 @@ async def handle_dm(bot, message: discord.Message):
     if len(parts) == 2 and parts[0].isalnum() and len(parts[0]) == 6 and parts[1].isdigit():
         action_id = parts[0].upper()
         choice = int(parts[1])
+        if sharding.enabled and action_id not in pending_actions and _forwarded_guild.get() is None:
+            holder = sharding.action_process(action_id)
+            if holder is not None and holder != sharding.process:
+                await sharding.forward_command(holder, f'{action_id} {choice}')
+                return
         result = await handle_quick_action_response(bot, message, action_id, choice)
         await message.author.send(result)
         return
@@ -54,102 +82,250 @@ async def handle_dm(bot, message: discord.Message):
         return
     
     keyword = parts[0].lower()
-    
-    # ============= HELP COMMAND =============
-    if keyword in ('help', 'مساعدة', 'مساعده'):
-        await _cmd_help(message)
-        return
-    
-    # ============= WATCH COMMANDS =============
-    if keyword in ('watch', 'راقب'):
-        await _cmd_watch(message, parts)
-        return
-    
-    if keyword in ('unwatch', 'الغاء', 'إلغاء'):
-        await _cmd_unwatch(message, parts)
-        return
-    
-    if keyword in ('list', 'قائمة', 'قايمة'):
-        await _cmd_list_watched(message)
-        return
-    
-    # ============= WHITELIST COMMANDS =============
-    if keyword in ('whitelist', 'موثوق'):
-        await _cmd_whitelist(message, parts)
-        return
-    
-    if keyword in ('unwhitelist', 'حذف_موثوق'):
-        await _cmd_unwhitelist(message, parts)
-        return
-    
-    if keyword in ('listwhite', 'قايمة_موثوق'):
-        await _cmd_list_whitelist(message)
+    spec = COMMANDS.get(keyword)
+    if spec is None:
+        await message.author.send(f'❌ Unknown command: `{keyword}`\nSend `{PREFIX}help` for list.')
         return
     
-    # ============= FILTER COMMANDS =============
-    if keyword in ('filter', 'فلتر'):
-        await _cmd_filter(message, parts)
-        return
-    
-    if keyword in ('filters', 'الفلاتر'):
-        await _cmd_filters_status(message)
-        return
-    
-    # ============= INFO COMMANDS =============
-    if keyword in ('info', 'معلومات'):
-        await _cmd_info(message, parts, bot)
-        return
-    
-    if keyword in ('logs', 'سجل'):
-        await _cmd_logs(message, parts)
-        return
-    
-    if keyword in ('stats', 'احصائيات'):
-        await _cmd_stats(message)
-        return
+    await _run_command(bot, message, spec, parts, content)
+
+# =====================================================
+# GUILD SELECTION
+# =====================================================
+
+_selected_guild_id = None  # guild chosen with .guild (None = GUILD_ID / the only guild)
+
+# Guild a command forwarded from the DM process acts on (set in the shard process running it)
+_forwarded_guild = contextvars.ContextVar('forwarded_guild', default=None)
+
+def _protected_guilds(bot) -> list:
+    """Get the guilds the bot protects, in configured order (including other shard processes')"""
+    guilds = list(bot.guilds)
+    if sharding.enabled:
+        local = {guild.id for guild in guilds}
+        guilds += [guild for guild in sharding.remote_guilds() if guild.id not in local]
+    if not GUILD_IDS:
+        return guilds
+    by_id = {guild.id: guild for guild in guilds}
+    return [by_id[guild_id] for guild_id in GUILD_IDS if guild_id in by_id]
+
+def _selected_guild_id_for(bot):
+    """Get the ID of the guild DM commands act on (None if unset)"""
+    guild_id = _forwarded_guild.get() or _selected_guild_id or GUILD_ID
+    if guild_id is not None:
+        return guild_id
+    guilds = _protected_guilds(bot)
+    return guilds[0].id if len(guilds) == 1 else None
+
+def _get_selected_guild(bot):
+    """Get the guild DM commands act on (None if unset or not run by this process)"""
+    guild_id = _selected_guild_id_for(bot)
+    return bot.get_guild(guild_id) if guild_id is not None else None
+
+async def _require_guild(bot, message: discord.Message):
+    """
+    Get the selected guild, telling the owner when there is none
     
-    # ============= MODERATION COMMANDS =============
-    if keyword in ('strip', 'سحب'):
-        await _cmd_strip(message, parts, bot)
-        return
+    When another shard process runs the guild, the whole command is
+    forwarded there (its replies still reach the owner) and None is returned.
+    """
+    guild = _get_selected_guild(bot)
+    if guild is None and sharding.enabled and _forwarded_guild.get() is None:
+        guild_id = _selected_guild_id_for(bot)
+        holder = sharding.process_for_guild(guild_id) if guild_id is not None else None
+        if holder is not None and holder != sharding.process:
+            await sharding.forward_command(holder, message.content, guild_id)
+            return None
+    if guild is None:
+        if _selected_guild_id is None and GUILD_ID is None:
+            await message.author.send(f'❌ No guild selected. Use `{PREFIX}guild` to pick one')
+        else:
+            await message.author.send('❌ Guild not accessible')
+    return guild
+
+def _member_cache_note(guild: discord.Guild) -> str:
+    """Caveat for replies built from the member cache when it doesn't hold the whole guild"""
+    if cache_policy.has_member_list(guild):
+        return ''
+    return (f'\n*Only {len(guild.members)} of {guild.member_count} members are cached '
+            f'(the members and roles filters load the full list)*')
+
+async def handle_forwarded(bot, message, guild_id: int = None):
+    """Run a DM command the DM process forwarded to this shard process"""
+    _forwarded_guild.set(guild_id)
+    try:
+        await handle_dm(bot, message)
+    except Exception as e:
+        logger.exception(f'Forwarded DM command failed: {e}')
+
+# =====================================================
+# COMMAND REGISTRY
+# =====================================================
+
+class Arg(NamedTuple):
+    """A positional command argument"""
+    name: str
+    kind: str = 'word'   # a key of _ARG_KINDS
+    required: bool = True
+    default: object = None
+    error: str = None    # reply when the value doesn't parse (default: the kind's)
+
+class Command(NamedTuple):
+    """A DM command: handler(ctx, **args) plus what the dispatcher does before calling it"""
+    name: str
+    aliases: tuple
+    handler: Callable
+    args: tuple
+    usage: str
+    guild: bool          # resolve the selected guild first (ctx.guild)
+    concurrency: int     # runs allowed at once (0 = unlimited)
+
+def _parse_int(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+def _parse_float(text: str):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def _parse_snapshot_id(text: str):
+    """Parse a snapshot id like `12` or `#12`"""
+    text = text.lstrip('#')
+    return int(text) if text.isdigit() else None
+
+# kind: (parser returning None when invalid, default error reply)
+# `member` is parsed as a user ID and resolved to a guild member once the
+# guild is known; `text` takes the rest of the line with its spacing kept
+_ARG_KINDS = {
+    'word': (str, None),
+    'text': (str, None),
+    'int': (_parse_int, None),
+    'float': (_parse_float, None),
+    'user': (parse_user_id, '❌ Invalid user ID'),
+    'member': (parse_user_id, '❌ Invalid user ID'),
+    'channel': (parse_channel_id, '❌ Invalid channel ID'),
+    'snapshot': (_parse_snapshot_id, '❌ Invalid snapshot ID'),
+}
+
+COMMANDS = {}  # {name or alias: Command}
+_slots = {}  # {command name: asyncio.Semaphore} for commands with a concurrency limit
+
+# Runs turned away because the command was already running (exported by metrics_server): {name: count}
+busy_counters = {}
+
+def command(name: str, *aliases: str, args: tuple = (), usage: str = None, guild: bool = False, concurrency: int = 0):
+    """
+    Register a DM command under its name and aliases
     
-    if keyword in ('ban', 'حظر'):
-        await _cmd_ban(message, parts, bot)
-        return
+    The handler gets a _Context and the parsed args as keyword arguments.
+    Usage defaults to one built from the args.
+    """
+    def decorator(fn):
+        if usage is None:
+            shown = ' '.join(f'<{arg.name}>' if arg.required else f'[{arg.name}]' for arg in args)
+            text = f'❌ Usage: `{PREFIX}{name}{" " + shown if shown else ""}`'
+        else:
+            text = usage
+        spec = Command(name, aliases, fn, tuple(args), text, guild, concurrency)
+        for alias in (name, *aliases):
+            if alias in COMMANDS:
+                raise ValueError(f'Command alias {alias!r} is already taken by {COMMANDS[alias].name}')
+            COMMANDS[alias] = spec
+        if concurrency:
+            _slots[name] = asyncio.Semaphore(concurrency)
+        return fn
+    return decorator
+
+class _Context:
+    """What a command handler works with"""
     
-    if keyword in ('kick', 'طرد'):
-        await _cmd_kick(message, parts, bot)
-        return
+    __slots__ = ('bot', 'message', 'parts', 'content', 'guild')
     
-    if keyword in ('timeout', 'كتم'):
-        await _cmd_timeout(message, parts, bot)
-        return
+    def __init__(self, bot, message: discord.Message, parts: list, content: str):
+        self.bot = bot
+        self.message = message
+        self.parts = parts        # the command line split on whitespace (parts[0] is the keyword)
+        self.content = content    # the command line without the prefix
+        self.guild = None         # the selected guild, for commands registered with guild=True
     
-    # ============= GUILD INFO COMMANDS =============
-    if keyword in ('channels', 'قنوات'):
-        await _cmd_channels(message, bot)
-        return
+    async def send(self, text: str = None, **kwargs):
+        """Reply to the owner"""
+        return await self.message.author.send(text, **kwargs)
     
-    if keyword in ('roles', 'رتب', 'الرتب'):
-        await _cmd_roles(message, bot)
-        return
+    async def paginate(self, title: str, lines, empty: str = None):
+        """Reply with a listing the owner pages through (lines are read as pages are shown)"""
+        await paginator.send(self.message.author, title, lines, empty)
+
+async def _parse_args(ctx: _Context, spec: Command):
+    """
+    Parse a command's args from its line, replying with the problem if one doesn't parse
     
-    if keyword in ('members', 'اعضاء'):
-        await _cmd_members(message, bot)
+    Returns:
+        dict: {arg name: value}, or None if the owner was told what's wrong
+    """
+    values = {}
+    for index, arg in enumerate(spec.args, 1):
+        if arg.kind == 'text':
+            words = ctx.content.split(None, index)
+            text = words[index] if len(words) > index else ''
+        else:
+            text = ctx.parts[index] if len(ctx.parts) > index else ''
+        
+        if not text:
+            if arg.required:
+                await ctx.send(spec.usage)
+                return None
+            values[arg.name] = arg.default
+            continue
+        
+        parser, error = _ARG_KINDS[arg.kind]
+        value = parser(text)
+        if value is None:
+            await ctx.send(arg.error or error or f'❌ Invalid {arg.name}')
+            return None
+        values[arg.name] = value
+    return values
+
+async def _invoke(ctx: _Context, spec: Command):
+    """Parse args, resolve the guild and members, then run the handler"""
+    values = await _parse_args(ctx, spec)
+    if values is None:
         return
     
-    # ============= SETTINGS COMMANDS =============
-    if keyword in ('settings', 'اعدادات'):
-        await _cmd_settings(message)
-        return
+    if spec.guild:
+        ctx.guild = await _require_guild(ctx.bot, ctx.message)
+        if ctx.guild is None:
+            return
+        
+        for arg in spec.args:
+            if arg.kind == 'member' and values[arg.name] is not None:
+                member = await get_or_fetch_member(ctx.guild, values[arg.name])
+                if member is None:
+                    await ctx.send('❌ Member not found in server')
+                    return
+                values[arg.name] = member
     
-    # ============= MASK COMMANDS =============
-    if keyword == 'mask':
-        await _cmd_mask(message, parts, content)
+    try:
+        await spec.handler(ctx, **values)
+    except Exception as e:
+        logger.exception(f'Command {spec.name} failed: {e}')
+        await ctx.send(f'❌ `{PREFIX}{spec.name}` failed: {e}')
+
+async def _run_command(bot, message: discord.Message, spec: Command, parts: list, content: str):
+    """Run a command within its concurrency limit, timing it under perf's `command` kind"""
+    slot = _slots.get(spec.name)
+    if slot is not None and slot.locked():
+        busy_counters[spec.name] = busy_counters.get(spec.name, 0) + 1
+        await message.author.send(f'⏳ `{PREFIX}{spec.name}` is already running, try again when it finishes')
         return
     
-    # Unknown command
-    await message.author.send(f'❌ Unknown command: `{keyword}`\nSend `.help` for list.')
+    with perf.timer('command', spec.name):
+        async with slot or contextlib.nullcontext():
+            await _invoke(_Context(bot, message, parts, content), spec)
 
 # =====================================================
 # COMMAND IMPLEMENTATIONS
@@ -168,18 +344,23 @@ async def _handle_quick_action_number(bot, message: discord.Message, choice: int
     result = await handle_quick_action_response(bot, message, action_id, choice)
     await message.author.send(result)
 
-async def _cmd_help(message: discord.Message):
+@command('help', 'مساعدة', 'مساعده')
+async def _cmd_help(ctx):
     """Help command"""
     help_text = f"""
 **Q Bot - DM Commands** 🛡️
 *All commands start with `{PREFIX}`*
 
+**🏠 Guilds:**
+`{PREFIX}guild` / `{PREFIX}سيرفر` - List protected guilds
+`{PREFIX}guild <number|id>` - Choose the guild commands act on
+
 **📋 Monitoring:**
 `{PREFIX}watch <user_id>` / `{PREFIX}راقب <id>` - Watch a user
 `{PREFIX}unwatch <user_id>` / `{PREFIX}الغاء <id>` - Stop watching
 `{PREFIX}list` / `{PREFIX}قائمة` - List watched users
 `{PREFIX}info <user_id>` / `{PREFIX}معلومات` - Get user info
-`{PREFIX}logs <user_id>` - View user activity logs
+`{PREFIX}logs [id] [type:] [actor:] [target:] [since:] [until:] [limit:] [guild:all]` - Search the audit log
 
 **✅ Whitelist:**
 `{PREFIX}whitelist <user_id>` - Add to whitelist
@@ -201,13 +382,28 @@ async def _cmd_help(message: discord.Message):
 **📊 Server Info:**
 `{PREFIX}channels` / `{PREFIX}قنوات` - List channels
 `{PREFIX}roles` / `{PREFIX}رتب` - List roles
+`{PREFIX}risky` / `{PREFIX}خطر` - Members with dangerous permissions
+`{PREFIX}whocan <perm> <channel>` / `{PREFIX}من` - Who holds a permission in a channel
 `{PREFIX}members` - List members (summary)
 `{PREFIX}stats` / `{PREFIX}احصائيات` - Bot statistics
+`{PREFIX}pipeline` - Event pipeline queue depth and latency
+`{PREFIX}perf [reset]` / `{PREFIX}اداء` - Handler latency p50/p95/p99 and event loop stalls
+`{PREFIX}profile cpu <sec> [exact]` / `{PREFIX}profile mem <sec>` - Profile the bot, report sent as a file
+
+**📸 Snapshots:**
+`{PREFIX}snapshot` / `{PREFIX}لقطة` - Snapshot roles, channels & webhooks now
+`{PREFIX}snapshots` / `{PREFIX}لقطات` - List stored snapshots
+`{PREFIX}diff <id>` / `{PREFIX}فرق` - Drift between a snapshot and now
+`{PREFIX}restore <id> [confirm]` / `{PREFIX}استعادة` - Recreate deleted roles & channels
+`{PREFIX}record start [name]` / `{PREFIX}record stop` / `{PREFIX}تسجيل` - Record events for offline replay
 
 **⚙️ Settings:**
 `{PREFIX}settings` - View current settings
-`{PREFIX}mask set_channel <id>` - Set mask channel
-`{PREFIX}mask set_reply <text>` - Set mask reply
+`{PREFIX}mask list` - List mask channels
+`{PREFIX}mask set_channel <channel> [reply]` - Add a mask channel (with its own reply)
+`{PREFIX}mask remove <channel>` - Remove a mask channel
+`{PREFIX}mask set_reply <text>` - Set the default mask reply
+`{PREFIX}mask cooldown <channel> <seconds>` - Seconds between replies
 `{PREFIX}mask clear` - Clear mask
 
 **⚡ Quick Actions:**
@@ -216,185 +412,177 @@ When you get an alert with quick actions, reply with:
 • Or `ACTION_ID NUMBER` (e.g., `ABC123 1`)
 
 **💡 Tip:** Watched users get detailed monitoring (messages, etc.)
+Watch list, whitelist, filters, mask and stats are kept per guild
     """
-    await message.author.send(help_text)
+    await ctx.send(help_text)
 
-async def _cmd_watch(message: discord.Message, parts: list):
-    """Watch a user"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.watch <user_id>`')
-        return
+@command('guild', 'سيرفر', args=[Arg('choice', required=False)])
+async def _cmd_guild(ctx, choice):
+    """Show or change the guild DM commands act on"""
+    global _selected_guild_id
+    guilds = _protected_guilds(ctx.bot)
+    
+    if choice is None:
+        current_id = _selected_guild_id_for(ctx.bot)
+        lines = ['🏠 **Guilds** (▶️ = commands act on this one)\n']
+        for i, guild in enumerate(guilds, 1):
+            marker = '▶️' if guild.id == current_id else '▫️'
+            lines.append(f'{marker} {i}. **{guild.name}** (`{guild.id}`) - {guild.member_count} members')
+        if not guilds:
+            lines.append('None')
+        lines.append(f'\nUse `{PREFIX}guild <number|id>` to switch')
+        await ctx.send('\n'.join(lines))
+        return
+    
+    guild = None
+    if choice.isdigit():
+        number = int(choice)
+        if 1 <= number <= len(guilds):
+            guild = guilds[number - 1]
+        else:
+            guild = next((g for g in guilds if g.id == number), None)
     
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
+    if guild is None:
+        await ctx.send(f'❌ Guild not found. Send `{PREFIX}guild` for the list')
         return
     
+    _selected_guild_id = guild.id
+    await ctx.send(f'✅ Commands now act on **{guild.name}** (`{guild.id}`)')
+    logger.info(f'Owner selected guild {guild.id}')
+
+@command('watch', 'راقب', args=[Arg('user_id', 'user')], guild=True)
+async def _cmd_watch(ctx, user_id):
+    """Watch a user in the selected guild"""
+    guild = ctx.guild
     user_id_str = str(user_id)
-    db = load_db()
+    watched = get_partition(guild.id)['watched_users']
     
-    if user_id_str in db.get('watched_users', []):
-        await message.author.send(f'⚠️ Already watching user `{user_id}`')
+    if user_id_str in watched:
+        await ctx.send(f'⚠️ Already watching user `{user_id}` in **{guild.name}**')
         return
     
-    db.setdefault('watched_users', []).append(user_id_str)
-    save_db(db)
+    watched.append(user_id_str)
+    save_partition(guild.id)
+    await cache_policy.cache_members(guild, [user_id])
     
-    add_to_audit_log('watch_added', {'user_id': user_id})
+    await add_to_audit_log('watch_added', {'user_id': user_id, 'guild_id': guild.id})
     
-    await message.author.send(f'✅ Now watching user `{user_id}`')
-    logger.info(f'Owner added watch for user {user_id}')
+    await ctx.send(f'✅ Now watching user `{user_id}` in **{guild.name}**{cache_policy.restart_notice()}')
+    logger.info(f'Owner added watch for user {user_id} in guild {guild.id}')
 
-async def _cmd_unwatch(message: discord.Message, parts: list):
-    """Stop watching a user"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.unwatch <user_id>`')
-        return
-    
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
-        return
-    
+@command('unwatch', 'الغاء', 'إلغاء', args=[Arg('user_id', 'user')], guild=True)
+async def _cmd_unwatch(ctx, user_id):
+    """Stop watching a user in the selected guild"""
+    guild = ctx.guild
     user_id_str = str(user_id)
-    db = load_db()
+    watched = get_partition(guild.id)['watched_users']
     
-    if user_id_str not in db.get('watched_users', []):
-        await message.author.send(f'⚠️ User `{user_id}` not in watch list')
+    if user_id_str not in watched:
+        await ctx.send(f'⚠️ User `{user_id}` not in watch list of **{guild.name}**')
         return
     
-    db['watched_users'].remove(user_id_str)
-    save_db(db)
+    watched.remove(user_id_str)
+    save_partition(guild.id)
     
-    add_to_audit_log('watch_removed', {'user_id': user_id})
+    await add_to_audit_log('watch_removed', {'user_id': user_id, 'guild_id': guild.id})
     
-    await message.author.send(f'✅ Stopped watching user `{user_id}`')
-    logger.info(f'Owner removed watch for user {user_id}')
+    await ctx.send(f'✅ Stopped watching user `{user_id}` in **{guild.name}**')
+    logger.info(f'Owner removed watch for user {user_id} in guild {guild.id}')
 
-async def _cmd_list_watched(message: discord.Message):
-    """List watched users"""
-    db = load_db()
-    watched = db.get('watched_users', [])
+@command('list', 'قائمة', 'قايمة', guild=True)
+async def _cmd_list_watched(ctx):
+    """List watched users in the selected guild"""
+    guild = ctx.guild
+    watched = get_partition(guild.id)['watched_users']
     
     if not watched:
-        await message.author.send('📋 **Watched Users:** None')
+        await ctx.send(f'📋 **Watched Users in {guild.name}:** None')
         return
     
-    lines = ['📋 **Watched Users:**\n']
+    lines = [f'📋 **Watched Users in {guild.name}:**\n']
     for i, uid in enumerate(watched, 1):
         lines.append(f'{i}. `{uid}`')
     
-    await message.author.send('\n'.join(lines))
+    await ctx.send('\n'.join(lines))
 
-async def _cmd_whitelist(message: discord.Message, parts: list):
-    """Add user to whitelist"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.whitelist <user_id>`')
-        return
-    
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
-        return
-    
-    success, msg = add_to_whitelist(user_id)
-    await message.author.send(msg)
+@command('whitelist', 'موثوق', args=[Arg('user_id', 'user')], guild=True)
+async def _cmd_whitelist(ctx, user_id):
+    """Add user to the selected guild's whitelist"""
+    success, msg = add_to_whitelist(ctx.guild.id, user_id)
+    await ctx.send(f'{msg} (**{ctx.guild.name}**)')
 
-async def _cmd_unwhitelist(message: discord.Message, parts: list):
-    """Remove user from whitelist"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.unwhitelist <user_id>`')
-        return
-    
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
-        return
-    
-    success, msg = remove_from_whitelist(user_id)
-    await message.author.send(msg)
+@command('unwhitelist', 'حذف_موثوق', args=[Arg('user_id', 'user')], guild=True)
+async def _cmd_unwhitelist(ctx, user_id):
+    """Remove user from the selected guild's whitelist"""
+    success, msg = remove_from_whitelist(ctx.guild.id, user_id)
+    await ctx.send(f'{msg} (**{ctx.guild.name}**)')
 
-async def _cmd_list_whitelist(message: discord.Message):
-    """List whitelisted users"""
-    msg = get_whitelist_display()
-    await message.author.send(msg)
+@command('listwhite', 'قايمة_موثوق', guild=True)
+async def _cmd_list_whitelist(ctx):
+    """List whitelisted users in the selected guild"""
+    msg = get_whitelist_display(ctx.guild.id)
+    await ctx.send(f'🏠 **{ctx.guild.name}**\n{msg}')
 
-async def _cmd_filter(message: discord.Message, parts: list):
-    """Manage filters"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.filter <name> on/off` or `.filter all on/off` or `.filter reset`')
-        return
-    
-    sub = parts[1].lower()
+@command('filter', 'فلتر', args=[Arg('name'), Arg('state', required=False)], guild=True,
+         usage=f'❌ Usage: `{PREFIX}filter <name> on/off` or `{PREFIX}filter all on/off` or `{PREFIX}filter reset`')
+async def _cmd_filter(ctx, name, state):
+    """Manage the selected guild's filters"""
+    guild = ctx.guild
+    sub = name.lower()
     
     # Reset filters
     if sub == 'reset':
-        msg = reset_filters()
-        await message.author.send(msg)
+        msg = reset_filters(guild.id)
+        await ctx.send(f'{msg} (**{guild.name}**){cache_policy.restart_notice()}')
         return
     
     # Toggle all
     if sub == 'all':
-        if len(parts) < 3:
-            await message.author.send('❌ Usage: `.filter all on/off`')
+        if state is None:
+            await ctx.send(f'❌ Usage: `{PREFIX}filter all on/off`')
             return
         
-        action = parts[2].lower()
+        action = state.lower()
         if action in ('on', 'تشغيل'):
-            msg = enable_all_filters()
+            msg = enable_all_filters(guild.id)
         elif action in ('off', 'ايقاف', 'إيقاف'):
-            msg = disable_all_filters()
+            msg = disable_all_filters(guild.id)
         else:
-            await message.author.send('❌ Use `on` or `off`')
+            await ctx.send('❌ Use `on` or `off`')
             return
         
-        await message.author.send(msg)
+        await ctx.send(f'{msg} (**{guild.name}**){cache_policy.restart_notice()}')
         return
     
     # Toggle specific filter
-    if len(parts) < 3:
-        await message.author.send('❌ Usage: `.filter <name> on/off`')
+    if state is None:
+        await ctx.send(f'❌ Usage: `{PREFIX}filter <name> on/off`')
         return
     
     filter_name = sub
-    action = parts[2].lower()
+    action = state.lower()
     
     if action in ('on', 'تشغيل'):
-        success, msg = set_filter(filter_name, True)
+        success, msg = set_filter(guild.id, filter_name, True)
     elif action in ('off', 'ايقاف', 'إيقاف'):
-        success, msg = set_filter(filter_name, False)
+        success, msg = set_filter(guild.id, filter_name, False)
     else:
-        await message.author.send('❌ Use `on` or `off`')
+        await ctx.send('❌ Use `on` or `off`')
         return
     
-    await message.author.send(msg)
+    await ctx.send(f'{msg} (**{guild.name}**){cache_policy.restart_notice()}')
 
-async def _cmd_filters_status(message: discord.Message):
-    """Show all filters status"""
-    msg = get_filters_status()
-    await message.author.send(msg)
+@command('filters', 'الفلاتر', guild=True)
+async def _cmd_filters_status(ctx):
+    """Show the selected guild's filters"""
+    msg = get_filters_status(ctx.guild.id)
+    await ctx.send(f'🏠 **{ctx.guild.name}**\n{msg}')
 
-async def _cmd_info(message: discord.Message, parts: list, bot):
+@command('info', 'معلومات', args=[Arg('user_id', 'user')], guild=True)
+async def _cmd_info(ctx, user_id):
     """Get user info"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.info <user_id>`')
-        return
-    
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
-        return
-    
-    if GUILD_ID is None:
-        await message.author.send('❌ GUILD_ID not configured')
-        return
-    
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        await message.author.send('❌ Guild not accessible')
-        return
-    
-    member = guild.get_member(user_id)
+    guild = ctx.guild
+    member = await get_or_fetch_member(guild, user_id)
     
     if member:
         # Full member info
@@ -421,447 +609,641 @@ async def _cmd_info(message: discord.Message, parts: list, bot):
         
         # Watched/Whitelisted status
         from db_manager import is_watched, is_whitelisted
-        if is_watched(user_id):
+        if is_watched(guild.id, user_id):
             lines.append("**Status:** 👁️ WATCHED")
-        if is_whitelisted(user_id):
+        if is_whitelisted(guild.id, user_id):
             lines.append("**Status:** ✅ WHITELISTED")
         
-        await message.author.send('\n'.join(lines))
+        await ctx.send('\n'.join(lines))
     else:
         # Try to fetch user (not in guild)
         try:
-            user = await bot.fetch_user(user_id)
+            user = await ctx.bot.fetch_user(user_id)
             lines = [
                 f"**👤 User Info** (Not in server)",
                 f"**User:** {format_user(user)}",
                 f"**Bot:** {'Yes 🤖' if user.bot else 'No'}",
                 f"**Account Age:** {get_account_age(user)}",
             ]
-            await message.author.send('\n'.join(lines))
+            await ctx.send('\n'.join(lines))
         except:
-            await message.author.send(f'❌ User `{user_id}` not found')
+            await ctx.send(f'❌ User `{user_id}` not found')
 
-async def _cmd_logs(message: discord.Message, parts: list):
-    """View user activity logs"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.logs <user_id>`')
-        return
-    
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
-        return
-    
-    db = load_db()
-    audit_log = db.get('audit_log', [])
-    
-    # Filter logs for this user
-    user_logs = [
-        entry for entry in audit_log
-        if entry.get('details', {}).get('user_id') == user_id
-    ]
-    
-    if not user_logs:
-        await message.author.send(f'📋 No logs found for user `{user_id}`')
-        return
-    
-    # Show last 20 entries
-    recent_logs = user_logs[-20:]
-    
-    lines = [f'📋 **Recent Activity for `{user_id}`** (Last {len(recent_logs)})\n']
-    
-    for entry in recent_logs:
-        timestamp = entry.get('timestamp', 'Unknown')
-        event_type = entry.get('type', 'unknown')
-        from utils import get_audit_action_emoji
-        emoji = get_audit_action_emoji(event_type)
-        
-        lines.append(f"{emoji} `{timestamp[:19]}` - {event_type}")
-    
-    # Split if too long
-    msg = '\n'.join(lines)
-    if len(msg) > 1900:
-        # Send in chunks
-        chunks = [msg[i:i+1900] for i in range(0, len(msg), 1900)]
-        for chunk in chunks:
-            await message.author.send(chunk)
-    else:
-        await message.author.send(msg)
+_LOGS_USAGE = f'Usage: `{PREFIX}logs [id] [type:a,b] [actor:id] [target:id] [since:7d] [until:2024-05-01] [limit:n] [guild:all]`'
+
+def _log_line(entry: dict) -> str:
+    """One .logs result: emoji, time, type, who/what it names and who did it"""
+    details = audit_store.details(entry)
+    event_type = entry['type']
+    names = [details[key] for key in ('user_name', 'bot_name', 'role_name', 'channel_name') if details.get(key)]
+    targets = [f"`{value}`" for key, value in details.items()
+               if key.endswith('_id') and key not in audit_store.ACTOR_KEYS + audit_store.IGNORED_KEYS + (audit_store.GUILD_KEY,)]
+    line = f"{get_audit_action_emoji(event_type)} `{audit_store.timestamp(entry)}` {event_type}"
+    if names or targets:
+        line += f" — {' '.join(map(str, names + targets))}"
+    actors = [f"`{details[key]}`" for key in audit_store.ACTOR_KEYS if details.get(key)]
+    if actors:
+        line += f" (by {', '.join(actors)})"
+    return line
 
-async def _cmd_stats(message: discord.Message):
-    """Show bot statistics"""
-    stats = get_alert_stats()
-    db = load_db()
+@command('logs', 'سجل', args=[Arg('query', 'text', required=False, default='')], guild=True, concurrency=2)
+async def _cmd_logs(ctx, query):
+    """Search the selected guild's audit log (any referenced ID, type, actor, target, time range)"""
+    parsed, error = audit_store.parse_query(query, ctx.guild.id)
+    if error:
+        await ctx.send(f'{error}\n{_LOGS_USAGE}')
+        return
+    
+    # Streamed from the indexes, newest first, only as far as the owner pages
+    lines = (_log_line(entry) for entry in audit_store.search(parsed))
+    label = f' for `{query}`' if query else ''
+    if parsed.guild is not None:
+        label = f' of {ctx.guild.name}{label}'
+    await ctx.paginate(f'📋 **Audit log{label}** (newest first)', lines,
+                       empty=f'📋 No audit log entries{label}')
+
+@command('stats', 'احصائيات', guild=True)
+async def _cmd_stats(ctx):
+    """Show the selected guild's statistics"""
+    guild = ctx.guild
+    stats = get_alert_stats(guild.id)
+    partition = get_partition(guild.id)
     
     lines = [
-        "📊 **Q Bot Statistics**\n",
+        f"📊 **Q Bot Statistics — {guild.name}**\n",
         f"**Total Alerts:** {stats.get('total_alerts', 0)}",
         f"**Bot Additions:** {stats.get('bot_additions', 0)}",
         f"**Role Changes:** {stats.get('role_changes', 0)}",
         f"**Channel Changes:** {stats.get('channel_changes', 0)}",
         f"**Bans:** {stats.get('bans', 0)}",
         f"**Kicks:** {stats.get('kicks', 0)}",
-        f"\n**Watched Users:** {len(db.get('watched_users', []))}",
-        f"**Whitelisted Users:** {len(db.get('whitelist', []))}",
-        f"**Audit Log Entries:** {len(db.get('audit_log', []))}",
+        f"\n**Members:** {guild.member_count} ({member_counters.get_trend(guild, 7)['net']:+d} in 7 days)",
+        f"**Watched Users:** {len(partition['watched_users'])}",
+        f"**Whitelisted Users:** {len(partition['whitelist'])}",
+        f"**Audit Log Entries:** {audit_store.count()}",
         f"**Pending Quick Actions:** {get_pending_actions_count()}"
     ]
     
-    await message.author.send('\n'.join(lines))
+    await ctx.send('\n'.join(lines))
 
-async def _cmd_strip(message: discord.Message, parts: list, bot):
-    """Strip all roles from user"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.strip <user_id>`')
-        return
+@command('pipeline', 'المعالجة')
+async def _cmd_pipeline(ctx):
+    """Show event pipeline statistics"""
+    import pipeline
+    await ctx.send(pipeline.format_stats())
+
+@command('perf', 'اداء', 'أداء', args=[Arg('action', required=False)])
+async def _cmd_perf(ctx, action):
+    """Show handler latency percentiles (or reset them)"""
+    import loop_watchdog
+    if action is not None and action.lower() in ('reset', 'مسح'):
+        perf.reset()
+        loop_watchdog.reset()
+        await ctx.send('✅ Latency histograms and loop stall offenders cleared')
+        return
+    
+    for chunk in perf.format_report():
+        await ctx.send(chunk)
+    await ctx.send(loop_watchdog.format_offenders())
+
+_PROFILE_USAGE = f'❌ Usage: `{PREFIX}profile cpu <seconds> [exact]` or `{PREFIX}profile mem <seconds>`'
+
+@command('profile', 'تحليل', args=[Arg('kind'), Arg('seconds', 'float', error='❌ Seconds must be a number'),
+                                   Arg('mode', required=False)], usage=_PROFILE_USAGE, concurrency=1)
+async def _cmd_profile(ctx, kind, seconds, mode):
+    """Profile CPU or memory for a few seconds and send the report as a file"""
+    import io
+    import profiler
+    from config import PROFILE_MAX_SECONDS
     
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
+    kind = kind.lower()
+    if kind not in ('cpu', 'mem'):
+        await ctx.send(_PROFILE_USAGE)
         return
     
-    if GUILD_ID is None:
-        await message.author.send('❌ GUILD_ID not configured')
-        return
+    exact = kind == 'cpu' and mode is not None and mode.lower() == 'exact'
+    seconds = profiler.clamp_seconds(seconds)
     
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        await message.author.send('❌ Guild not accessible')
-        return
+    note = ' (cProfile: the bot will be slower meanwhile)' if exact else ''
+    await ctx.send(f'⏳ Profiling {kind} for {seconds:.0f}s (max {PROFILE_MAX_SECONDS}s){note}...')
     
-    member = guild.get_member(user_id)
-    if not member:
-        await message.author.send('❌ Member not found in server')
+    try:
+        if kind == 'cpu':
+            summary, report = await profiler.profile_cpu(seconds, exact)
+        else:
+            summary, report = await profiler.profile_mem(seconds)
+    except Exception as e:
+        logger.exception(f'Profile failed: {e}')
+        await ctx.send(f'❌ Profile failed: {e}')
         return
     
+    filename = f"profile-{kind}-{datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.txt"
+    await ctx.send(
+        f'✅ **{kind.upper()} profile:** {summary}',
+        file=discord.File(io.BytesIO(report.encode('utf-8')), filename=filename)
+    )
+
+@command('strip', 'سحب', args=[Arg('member', 'member')], guild=True)
+async def _cmd_strip(ctx, member):
+    """Strip all roles from user"""
+    guild = ctx.guild
+    user_id = member.id
+    
     # Get removable roles
     bot_member = guild.me
     to_remove = [r for r in member.roles if r != guild.default_role and r.position < bot_member.top_role.position]
     
     if not to_remove:
-        await message.author.send('⚠️ No removable roles (either user has no roles or bot lacks permission)')
+        await ctx.send('⚠️ No removable roles (either user has no roles or bot lacks permission)')
         return
     
     try:
         await member.remove_roles(*to_remove, reason='Roles stripped by owner via DM')
         
-        add_to_audit_log('strip_roles', {
+        await add_to_audit_log('strip_roles', {
+            'guild_id': guild.id,
             'user_id': user_id,
+            'executor_id': OWNER_ID,
             'roles_removed': [r.name for r in to_remove]
         })
         
-        await message.author.send(f'✅ Stripped {len(to_remove)} roles from {member}\n**Roles:** {", ".join([r.name for r in to_remove[:10]])}')
+        await ctx.send(f'✅ Stripped {len(to_remove)} roles from {member}\n**Roles:** {", ".join([r.name for r in to_remove[:10]])}')
         logger.info(f'Stripped roles from {user_id} by owner')
     except Exception as e:
         logger.exception(f'Strip failed: {e}')
-        await message.author.send(f'❌ Failed to strip roles: {str(e)}')
+        await ctx.send(f'❌ Failed to strip roles: {str(e)}')
 
-async def _cmd_ban(message: discord.Message, parts: list, bot):
+@command('ban', 'حظر', args=[Arg('user_id', 'user'), Arg('reason', 'text', required=False, default='Banned by owner via DM')],
+         guild=True)
+async def _cmd_ban(ctx, user_id, reason):
     """Ban a user"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.ban <user_id> [reason]`')
-        return
-    
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
-        return
-    
-    reason = ' '.join(parts[2:]) if len(parts) > 2 else 'Banned by owner via DM'
-    
-    if GUILD_ID is None:
-        await message.author.send('❌ GUILD_ID not configured')
-        return
-    
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        await message.author.send('❌ Guild not accessible')
-        return
-    
+    guild = ctx.guild
     try:
         await guild.ban(discord.Object(id=user_id), reason=reason, delete_message_days=0)
         
-        add_to_audit_log('ban_by_owner', {
+        await add_to_audit_log('ban_by_owner', {
+            'guild_id': guild.id,
             'user_id': user_id,
+            'executor_id': OWNER_ID,
             'reason': reason
         })
         
-        increment_stat('bans')
+        increment_stat(guild.id, 'bans')
         
-        await message.author.send(f'✅ Banned user `{user_id}`\n**Reason:** {reason}')
+        await ctx.send(f'✅ Banned user `{user_id}`\n**Reason:** {reason}')
         logger.info(f'Banned {user_id} by owner')
     except Exception as e:
         logger.exception(f'Ban failed: {e}')
-        await message.author.send(f'❌ Ban failed: {str(e)}')
+        await ctx.send(f'❌ Ban failed: {str(e)}')
 
-async def _cmd_kick(message: discord.Message, parts: list, bot):
+@command('kick', 'طرد', args=[Arg('member', 'member'), Arg('reason', 'text', required=False, default='Kicked by owner via DM')],
+         guild=True)
+async def _cmd_kick(ctx, member, reason):
     """Kick a user"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.kick <user_id> [reason]`')
-        return
-    
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
-        return
-    
-    reason = ' '.join(parts[2:]) if len(parts) > 2 else 'Kicked by owner via DM'
-    
-    if GUILD_ID is None:
-        await message.author.send('❌ GUILD_ID not configured')
-        return
-    
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        await message.author.send('❌ Guild not accessible')
-        return
-    
-    member = guild.get_member(user_id)
-    if not member:
-        await message.author.send('❌ Member not found in server')
-        return
-    
+    guild = ctx.guild
+    user_id = member.id
     try:
         await member.kick(reason=reason)
         
-        add_to_audit_log('kick_by_owner', {
+        await add_to_audit_log('kick_by_owner', {
+            'guild_id': guild.id,
             'user_id': user_id,
+            'executor_id': OWNER_ID,
             'reason': reason
         })
         
-        increment_stat('kicks')
+        increment_stat(guild.id, 'kicks')
         
-        await message.author.send(f'✅ Kicked {member}\n**Reason:** {reason}')
+        await ctx.send(f'✅ Kicked {member}\n**Reason:** {reason}')
         logger.info(f'Kicked {user_id} by owner')
     except Exception as e:
         logger.exception(f'Kick failed: {e}')
-        await message.author.send(f'❌ Kick failed: {str(e)}')
+        await ctx.send(f'❌ Kick failed: {str(e)}')
 
-async def _cmd_timeout(message: discord.Message, parts: list, bot):
+@command('timeout', 'كتم', args=[Arg('member', 'member'), Arg('minutes', 'int', required=False, default=60,
+                                                                  error='❌ Invalid duration')], guild=True)
+async def _cmd_timeout(ctx, member, minutes):
     """Timeout a user"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage: `.timeout <user_id> [minutes]`')
-        return
-    
-    user_id = parse_user_id(parts[1])
-    if user_id is None:
-        await message.author.send('❌ Invalid user ID')
-        return
-    
-    # Get duration
-    try:
-        duration_minutes = int(parts[2]) if len(parts) > 2 else 60
-        if duration_minutes < 1 or duration_minutes > 40320:  # Max 28 days
-            await message.author.send('❌ Duration must be 1-40320 minutes (28 days)')
-            return
-    except ValueError:
-        await message.author.send('❌ Invalid duration')
-        return
-    
-    if GUILD_ID is None:
-        await message.author.send('❌ GUILD_ID not configured')
-        return
-    
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        await message.author.send('❌ Guild not accessible')
-        return
-    
-    member = guild.get_member(user_id)
-    if not member:
-        await message.author.send('❌ Member not found in server')
+    user_id = member.id
+    duration_minutes = minutes
+    if duration_minutes < 1 or duration_minutes > 40320:  # Max 28 days
+        await ctx.send('❌ Duration must be 1-40320 minutes (28 days)')
         return
     
     try:
         duration = datetime.timedelta(minutes=duration_minutes)
         await member.timeout(duration, reason='Timeout by owner via DM')
         
-        add_to_audit_log('timeout_by_owner', {
+        await add_to_audit_log('timeout_by_owner', {
+            'guild_id': ctx.guild.id,
             'user_id': user_id,
+            'executor_id': OWNER_ID,
             'duration_minutes': duration_minutes
         })
         
-        await message.author.send(f'✅ Timeout applied to {member}\n**Duration:** {format_duration(duration_minutes * 60)}')
+        await ctx.send(f'✅ Timeout applied to {member}\n**Duration:** {format_duration(duration_minutes * 60)}')
         logger.info(f'Timeout {user_id} for {duration_minutes}m by owner')
     except Exception as e:
         logger.exception(f'Timeout failed: {e}')
-        await message.author.send(f'❌ Timeout failed: {str(e)}')
+        await ctx.send(f'❌ Timeout failed: {str(e)}')
 
-async def _cmd_channels(message: discord.Message, bot):
+@command('channels', 'قنوات', guild=True)
+async def _cmd_channels(ctx):
     """List all channels"""
-    if GUILD_ID is None:
-        await message.author.send('❌ GUILD_ID not configured')
-        return
-    
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        await message.author.send('❌ Guild not accessible')
-        return
-    
-    lines = [f'📁 **Channels in {guild.name}**\n']
-    
-    # Text channels
+    guild = ctx.guild
     text_channels = [c for c in guild.channels if isinstance(c, discord.TextChannel)]
-    if text_channels:
-        lines.append('**Text Channels:**')
-        for c in text_channels[:20]:
-            lines.append(f'  • #{c.name} (`{c.id}`)')
-        if len(text_channels) > 20:
-            lines.append(f'  ... and {len(text_channels) - 20} more')
-    
-    # Voice channels
     voice_channels = [c for c in guild.channels if isinstance(c, discord.VoiceChannel)]
-    if voice_channels:
-        lines.append('\n**Voice Channels:**')
-        for c in voice_channels[:20]:
-            lines.append(f'  • 🔊 {c.name} (`{c.id}`)')
-        if len(voice_channels) > 20:
-            lines.append(f'  ... and {len(voice_channels) - 20} more')
-    
-    msg = '\n'.join(lines)
-    
-    # Split if too long
-    if len(msg) > 1900:
-        chunks = [msg[i:i+1900] for i in range(0, len(msg), 1900)]
-        for chunk in chunks:
-            await message.author.send(chunk)
-    else:
-        await message.author.send(msg)
+    
+    def channel_lines():
+        if text_channels:
+            yield '**Text Channels:**'
+            for c in text_channels:
+                yield f'  • #{c.name} (`{c.id}`)'
+        if voice_channels:
+            if text_channels:
+                yield ''
+            yield '**Voice Channels:**'
+            for c in voice_channels:
+                yield f'  • 🔊 {c.name} (`{c.id}`)'
+    
+    await ctx.paginate(
+        f'📁 **Channels in {guild.name}** ({len(text_channels)} text, {len(voice_channels)} voice)',
+        channel_lines()
+    )
 
-async def _cmd_roles(message: discord.Message, bot):
+@command('roles', 'رتب', 'الرتب', guild=True)
+async def _cmd_roles(ctx):
     """List all roles"""
-    if GUILD_ID is None:
-        await message.author.send('❌ GUILD_ID not configured')
-        return
+    guild = ctx.guild
+    # Sort by position (highest first)
+    roles = sorted(guild.roles, key=lambda r: r.position, reverse=True)
     
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        await message.author.send('❌ Guild not accessible')
-        return
+    def role_lines():
+        for role in roles:
+            if role.is_default():
+                continue
+            # Indexed risk level and member count (no member scan)
+            risk, member_count = risk_index.get_role_risk(role)
+            yield f"{risk} **{role.name}** (`{role.id}`) - {member_count} members"
     
-    lines = [f'👥 **Roles in {guild.name}**\n']
+    await ctx.paginate(f'👥 **Roles in {guild.name}** ({len(roles) - 1})', role_lines())
+
+@command('risky', 'خطر', guild=True)
+async def _cmd_risky(ctx):
+    """List members with high/critical effective permissions"""
+    guild = ctx.guild
+    risky = risk_index.get_risky_members(guild)
     
-    # Sort by position (highest first)
-    roles = sorted(guild.roles, key=lambda r: r.position, reverse=True)
+    if not risky:
+        await ctx.send(f'✅ No members with dangerous permissions in {guild.name}{_member_cache_note(guild)}')
+        return
     
-    for role in roles[:30]:
-        if role.name == '@everyone':
-            continue
-        
-        # Analyze permissions
-        perm_analysis = analyze_permissions(role.permissions)
-        risk = perm_analysis['risk_level']
+    def risky_lines():
+        for member_id, risk in risky:
+            member = guild.get_member(member_id)
+            name = f'{member}' if member else 'Unknown'
+            bot_tag = ' 🤖' if member and member.bot else ''
+            yield f"{risk} **{name}**{bot_tag} (`{member_id}`)"
+        yield from _member_cache_note(guild).splitlines()
+    
+    await ctx.paginate(f'⚠️ **Risky Members in {guild.name}** ({len(risky)})', risky_lines())
+
+@command('whocan', 'من', args=[Arg('permission'), Arg('channel')], guild=True,
+         usage=f'❌ Usage: `{PREFIX}whocan <permission> <channel>`\nExample: `{PREFIX}whocan manage_messages #general`')
+async def _cmd_whocan(ctx, permission, channel):
+    """List roles and members holding a permission in a channel"""
+    guild = ctx.guild
+    
+    # Accept `manage_messages` as well as `Manage Messages` (the channel is always last)
+    perm_name = '_'.join(ctx.parts[1:-1]).lower()
+    if perm_name not in discord.Permissions.VALID_FLAGS:
+        await ctx.send(f'❌ Unknown permission: `{perm_name}`')
+        return
+    
+    channel_id = parse_channel_id(ctx.parts[-1])
+    channel = guild.get_channel_or_thread(channel_id) if channel_id else None
+    if channel is None:
+        await ctx.send('❌ Channel not found')
+        return
+    
+    started = time.perf_counter()
+    roles, member_ids = channel_perms.who_can(channel, perm_name)
+    elapsed = (time.perf_counter() - started) * 1000
+    
+    def holder_lines():
+        yield '**Roles:**'
+        if not roles:
+            yield 'None'
+        for role in sorted(roles, key=lambda r: r.position, reverse=True):
+            yield f'• {format_role(role)}'
         
-        lines.append(f"{risk} **{role.name}** (`{role.id}`) - {len(role.members)} members")
+        yield ''
+        yield '**Members:**'
+        if not member_ids:
+            yield 'None'
+        for member_id in member_ids:
+            member = guild.get_member(member_id)
+            name = f'{member}' if member else 'Unknown'
+            bot_tag = ' 🤖' if member and member.bot else ''
+            yield f'• **{name}**{bot_tag} (`{member_id}`)'
+        yield from _member_cache_note(guild).splitlines()
+    
+    title = perm_name.replace('_', ' ').title()
+    await ctx.paginate(
+        f'🔎 **Who can {title} in {format_channel(channel)}**\n'
+        f'*{len(roles)} roles, {len(member_ids)} members ({elapsed:.1f}ms)*',
+        holder_lines()
+    )
+
+def _trend_line(days: int, trend: dict) -> str:
+    return f"**Last {days} days:** +{trend['joins']} / -{trend['leaves']} (net {trend['net']:+d})"
+
+@command('members', 'اعضاء', guild=True)
+async def _cmd_members(ctx):
+    """Show member summary"""
+    guild = ctx.guild
+    counts = member_counters.get_counts(guild)
+    week = member_counters.get_trend(guild, 7)
+    month = member_counters.get_trend(guild, MEMBER_TREND_DAYS)
+    online = counts['online'] if counts['online'] is not None else 'unknown (needs TRACK_PRESENCE)'
+    
+    lines = [
+        f"**👥 {guild.name} Members**\n",
+        f"**Total:** {counts['total']}",
+        f"**Humans:** {counts['humans']}",
+        f"**Bots:** {counts['bots']}",
+        f"**Online:** {online}",
+        f"**Joined (last {MEMBER_RECENT_DAYS} days):** {counts['recent']}",
+        f"**Suspicious accounts:** {counts['suspicious']}",
+        f"\n**📈 Trend**",
+        _trend_line(7, week),
+        _trend_line(MEMBER_TREND_DAYS, month)
+    ]
+    totals = month['totals']
+    if len(totals) > 1:
+        lines.append(f"**Members per day:** {member_counters.sparkline(totals)} ({min(totals)}–{max(totals)})")
     
-    if len(roles) > 30:
-        lines.append(f'\n... and {len(roles) - 30} more roles')
+    await ctx.send('\n'.join(lines) + _member_cache_note(guild))
+
+@command('snapshot', 'لقطة', guild=True, concurrency=1)
+async def _cmd_snapshot(ctx):
+    """Take a guild snapshot now"""
+    guild = ctx.guild
+    summary = await snapshots.take_snapshot(guild, 'manual')
+    counts = summary['counts']
+    kind = 'full' if summary['full'] else f"{summary['changes']} changes"
+    
+    await ctx.send(
+        f"📸 **Snapshot #{summary['id']}** taken ({kind})\n"
+        f"**Roles:** {counts['roles']} | **Channels:** {counts['channels']} | **Webhooks:** {counts['webhooks']}"
+    )
+
+@command('snapshots', 'لقطات', guild=True)
+async def _cmd_snapshots(ctx):
+    """List stored snapshots"""
+    guild = ctx.guild
+    summaries = snapshots.list_snapshots(guild)
+    if not summaries:
+        await ctx.send(f'📭 No snapshots yet. Take one with `{PREFIX}snapshot`')
+        return
+    
+    def summary_lines():
+        for summary in summaries:
+            counts = summary['counts']
+            kind = 'full' if summary['full'] else f"+{summary['changes']}"
+            yield (f"`#{summary['id']}` {summary['time'][:16].replace('T', ' ')} · {summary['reason']} · {kind} · "
+                   f"{counts['roles']}R/{counts['channels']}C/{counts['webhooks']}W")
+    
+    await ctx.paginate(f'📸 **Snapshots of {guild.name}** ({len(summaries)})', summary_lines())
+
+@command('diff', 'فرق', args=[Arg('snapshot_id', 'snapshot')], guild=True, concurrency=2)
+async def _cmd_diff(ctx, snapshot_id):
+    """Show drift between a snapshot and the live guild"""
+    drift = await snapshots.diff_live(ctx.guild, snapshot_id)
+    if drift is None:
+        await ctx.send(f'❌ Snapshot #{snapshot_id} not found')
+        return
     
-    msg = '\n'.join(lines)
+    lines = snapshots.format_drift(drift)
+    if not lines:
+        await ctx.send(f'✅ No drift since snapshot #{snapshot_id}')
+        return
     
-    if len(msg) > 1900:
-        chunks = [msg[i:i+1900] for i in range(0, len(msg), 1900)]
-        for chunk in chunks:
-            await message.author.send(chunk)
-    else:
-        await message.author.send(msg)
+    await ctx.paginate(f'🔍 **Drift since snapshot #{snapshot_id}**', lines)
 
-async def _cmd_members(message: discord.Message, bot):
-    """Show member summary"""
-    if GUILD_ID is None:
-        await message.author.send('❌ GUILD_ID not configured')
+@command('restore', 'استعادة', args=[Arg('snapshot_id', 'snapshot'), Arg('confirm', required=False)], guild=True,
+         concurrency=1)
+async def _cmd_restore(ctx, snapshot_id, confirm):
+    """Recreate roles and channels deleted since a snapshot"""
+    guild = ctx.guild
+    if snapshots.is_restoring():
+        await ctx.send('⏳ A restore is already running')
         return
     
-    guild = bot.get_guild(GUILD_ID)
-    if not guild:
-        await message.author.send('❌ Guild not accessible')
+    plan = snapshots.plan_restore(guild, snapshot_id)
+    if plan is None:
+        await ctx.send(f'❌ Snapshot #{snapshot_id} not found')
         return
     
-    total_members = guild.member_count
-    bots = len([m for m in guild.members if m.bot])
-    humans = total_members - bots
+    if not plan['roles'] and not plan['channels']:
+        await ctx.send(f'✅ Nothing to restore: every role and channel in #{snapshot_id} still exists')
+        return
     
-    # Count online
-    online = len([m for m in guild.members if m.status != discord.Status.offline])
+    # Without confirm, only show what would be recreated
+    if confirm is None or confirm.lower() not in ('confirm', 'تأكيد'):
+        lines = [f"**Roles to recreate ({len(plan['roles'])}):**"]
+        lines.extend(f"• `{data['name']}`" for _, data in plan['roles'])
+        lines.append(f"\n**Channels to recreate ({len(plan['channels'])}):**")
+        lines.extend(f"• `{data['name']}` ({data['type']})" for _, data in plan['channels'])
+        await ctx.paginate(
+            f'♻️ **Restore plan from snapshot #{snapshot_id}** '
+            f'(send `{PREFIX}restore {snapshot_id} confirm` to run it)',
+            lines
+        )
+        return
+    
+    await ctx.send(f"♻️ Restoring {len(plan['roles'])} roles and {len(plan['channels'])} channels...")
+    result = await snapshots.restore(guild, snapshot_id)
     
     lines = [
-        f"**👥 {guild.name} Members**\n",
-        f"**Total:** {total_members}",
-        f"**Humans:** {humans}",
-        f"**Bots:** {bots}",
-        f"**Online:** {online}"
+        f'✅ **Restore from #{snapshot_id} finished**',
+        f"**Roles recreated:** {result['roles']}",
+        f"**Channels recreated:** {result['channels']}"
     ]
+    if result['skipped']:
+        lines.append(f"**Skipped:** {', '.join(result['skipped'][:10])}")
+    if result['failed']:
+        lines.append(f"**❌ Failed ({len(result['failed'])}):**")
+        lines.extend(f'• {failure}' for failure in result['failed'][:10])
     
-    await message.author.send('\n'.join(lines))
+    await ctx.send('\n'.join(lines))
 
-async def _cmd_settings(message: discord.Message):
+@command('record', 'تسجيل', args=[Arg('action', required=False, default='status'), Arg('name', required=False)],
+         concurrency=1)
+async def _cmd_record(ctx, action, name):
+    """Start/stop recording gateway events for replay.py"""
+    action = action.lower()
+    
+    # The recorder runs in the process that owns the guild
+    if sharding.enabled and await _require_guild(ctx.bot, ctx.message) is None:
+        return
+    
+    if action in ('start', 'بدء'):
+        guild = await _require_guild(ctx.bot, ctx.message)
+        if guild is None:
+            return
+        
+        if name and not name.replace('-', '').replace('_', '').isalnum():
+            await ctx.send('❌ Name may only contain letters, digits, - and _')
+            return
+        
+        path = recorder.start(guild, name)
+        await ctx.send(
+            f"⏺️ **Recording events** to `{path}`\n"
+            f"⚠️ Recordings are not encrypted and include message content. "
+            f"Send `{PREFIX}record stop` when done."
+        )
+    
+    elif action in ('stop', 'ايقاف', 'إيقاف'):
+        result = recorder.stop()
+        if result is None:
+            await ctx.send('❌ Not recording')
+            return
+        await ctx.send(
+            f"⏹️ **Recording saved:** `{result['path']}`\n"
+            f"**Events:** {result['events']} in {format_duration(int(result['seconds']))}\n"
+            f"Replay with `python replay.py {result['path']} --fast`"
+        )
+    
+    else:
+        status = recorder.get_status()
+        if not status['recording']:
+            await ctx.send(f'⏹️ Not recording. Use `{PREFIX}record start [name]`')
+            return
+        await ctx.send(
+            f"⏺️ **Recording** to `{status['path']}`\n"
+            f"**Events:** {status['events']} in {format_duration(int(status['seconds']))}"
+        )
+
+@command('settings', 'اعدادات')
+async def _cmd_settings(ctx):
     """Show current settings"""
     from config import BOT_NAME, DM_ALERTS, ENCRYPT_DB, QUICK_ACTIONS_ENABLED, ENABLE_FAKE_COMMANDS
     
+    selected_id = _selected_guild_id_for(ctx.bot)
+    selected = next((guild for guild in _protected_guilds(ctx.bot) if guild.id == selected_id), None)
     lines = [
         "⚙️ **Current Settings**\n",
         f"**Bot Name:** {BOT_NAME}",
-        f"**Guild ID:** {GUILD_ID or 'Not set'}",
+        f"**Protected Guilds:** {', '.join(str(guild_id) for guild_id in GUILD_IDS) or 'All'}",
+        f"**Selected Guild:** {f'{selected.name} ({selected.id})' if selected else 'None'}",
         f"**DM Alerts:** {'✅ Enabled' if DM_ALERTS else '❌ Disabled'}",
         f"**DB Encryption:** {'✅ Enabled' if ENCRYPT_DB else '❌ Disabled'}",
         f"**Quick Actions:** {'✅ Enabled' if QUICK_ACTIONS_ENABLED else '❌ Disabled'}",
         f"**Fake Commands:** {'✅ Enabled' if ENABLE_FAKE_COMMANDS else '❌ Disabled'}",
     ]
     
-    await message.author.send('\n'.join(lines))
+    await ctx.send('\n'.join(lines))
 
-async def _cmd_mask(message: discord.Message, parts: list, full_content: str):
-    """Manage mask (auto-reply) settings"""
-    if len(parts) < 2:
-        await message.author.send('❌ Usage:\n  `.mask set_channel <id>`\n  `.mask set_reply <text>`\n  `.mask clear`')
+_MASK_USAGE = (
+    '❌ Usage:\n'
+    '  `.mask list`\n'
+    '  `.mask set_channel <channel> [reply]`\n'
+    '  `.mask remove <channel>`\n'
+    '  `.mask set_reply <text>` (default reply)\n'
+    '  `.mask cooldown <channel> <seconds>`\n'
+    '  `.mask clear`'
+)
+
+@command('mask', args=[Arg('subcommand')], usage=_MASK_USAGE, guild=True)
+async def _cmd_mask(ctx, subcommand):
+    """Manage the selected guild's mask (auto-reply) channels"""
+    guild = ctx.guild
+    sub = subcommand.lower()
+    
+    if sub == 'list':
+        entries = mask.get_channels(guild.id)
+        if not entries:
+            await ctx.send(f'🎭 No mask channels in **{guild.name}**')
+            return
+        lines = [f'🎭 **Mask Channels in {guild.name}** ({len(entries)})\n']
+        for channel_id, entry in entries.items():
+            lines.append(f'• <#{channel_id}> (`{channel_id}`) every {entry.cooldown:g}s → {entry.template[:100]}')
+        lines.append(f"\n*Replies can use {', '.join(mask.PLACEHOLDERS)}*")
+        await ctx.send('\n'.join(lines))
         return
     
-    sub = parts[1].lower()
-    db = load_db()
-    
-    if sub == 'set_channel':
-        if len(parts) < 3:
-            await message.author.send('❌ Usage: `.mask set_channel <channel_id>`')
+    if sub in ('set_channel', 'add'):
+        channel_id = parse_channel_id(ctx.parts[2]) if len(ctx.parts) > 2 else None
+        if channel_id is None:
+            await ctx.send('❌ Usage: `.mask set_channel <channel> [reply]`')
             return
         
-        try:
-            channel_id = int(parts[2])
-        except ValueError:
-            await message.author.send('❌ Invalid channel ID')
+        # Reply text keeps its spacing: everything after the channel
+        words = ctx.content.split(None, 3)
+        reply_text = words[3] if len(words) > 3 else None
+        mask.set_channel(guild.id, channel_id, reply_text)
+        
+        reply = f'\n**Reply:** {reply_text}' if reply_text else ''
+        await ctx.send(f'✅ Mask channel `{channel_id}` set in **{guild.name}**{reply}{cache_policy.restart_notice()}')
+        logger.info(f'Mask channel set to {channel_id} in guild {guild.id} by owner')
+        return
+    
+    if sub == 'remove':
+        channel_id = parse_channel_id(ctx.parts[2]) if len(ctx.parts) > 2 else None
+        if channel_id is None:
+            await ctx.send('❌ Usage: `.mask remove <channel>`')
             return
         
-        db['mask']['channel_id'] = str(channel_id)
-        save_db(db)
+        if not mask.remove_channel(guild.id, channel_id):
+            await ctx.send(f'⚠️ `{channel_id}` is not a mask channel in **{guild.name}**')
+            return
         
-        await message.author.send(f'✅ Mask channel set to `{channel_id}`')
-        logger.info(f'Mask channel set to {channel_id} by owner')
+        await ctx.send(f'✅ Mask channel `{channel_id}` removed in **{guild.name}**')
+        logger.info(f'Mask channel {channel_id} removed in guild {guild.id} by owner')
         return
     
     if sub == 'set_reply':
-        if len(parts) < 3:
-            await message.author.send('❌ Usage: `.mask set_reply <text>`')
+        if len(ctx.parts) < 3:
+            await ctx.send('❌ Usage: `.mask set_reply <text>`')
             return
         
         # Get text after "set_reply"
-        text = full_content.split(None, 2)[2] if len(full_content.split(None, 2)) > 2 else ''
+        text = ctx.content.split(None, 2)[2] if len(ctx.content.split(None, 2)) > 2 else ''
         
         if not text:
-            await message.author.send('❌ Reply text cannot be empty')
+            await ctx.send('❌ Reply text cannot be empty')
+            return
+        
+        mask.set_default_reply(guild.id, text)
+        
+        await ctx.send(f'✅ Default mask reply in **{guild.name}** updated to:\n```\n{text}\n```')
+        logger.info(f'Mask reply updated in guild {guild.id} by owner')
+        return
+    
+    if sub == 'cooldown':
+        channel_id = parse_channel_id(ctx.parts[2]) if len(ctx.parts) > 3 else None
+        try:
+            seconds = float(ctx.parts[3]) if channel_id is not None else None
+        except ValueError:
+            seconds = None
+        if seconds is None or seconds < 0:
+            await ctx.send('❌ Usage: `.mask cooldown <channel> <seconds>`')
             return
         
-        db['mask']['reply_text'] = text
-        save_db(db)
+        if not mask.set_cooldown(guild.id, channel_id, seconds):
+            await ctx.send(f'⚠️ `{channel_id}` is not a mask channel in **{guild.name}**')
+            return
         
-        await message.author.send(f'✅ Mask reply updated to:\n```\n{text}\n```')
-        logger.info(f'Mask reply updated by owner')
+        await ctx.send(f'✅ Mask channel `{channel_id}` replies at most every {seconds:g}s')
+        logger.info(f'Mask cooldown in channel {channel_id} set to {seconds}s by owner')
         return
     
     if sub == 'clear':
-        db['mask'] = {"channel_id": None, "reply_text": "━━━━━━━━━━━━"}
-        save_db(db)
+        mask.clear(guild.id)
         
-        await message.author.send('✅ Mask settings cleared')
-        logger.info('Mask cleared by owner')
+        await ctx.send(f'✅ Mask settings cleared in **{guild.name}**')
+        logger.info(f'Mask cleared in guild {guild.id} by owner')
         return
     
-    await message.author.send('❌ Unknown mask command')
+    await ctx.send(_MASK_USAGE)
@@ -11,10 +11,17 @@ def _getenv_int(key):
 def _getenv_bool(key, default='false'):
     return os.getenv(key, default).lower() in ('1', 'true', 'yes')
 
+def _getenv_int_list(key):
+    parts = (os.getenv(key) or '').replace(' ', ',').split(',')
+    return [int(part) for part in parts if part.isdigit()]
+
 # ============= CORE SETTINGS =============
 TOKEN = os.getenv('TOKEN') or None
 OWNER_ID = _getenv_int('OWNER_ID')
-GUILD_ID = _getenv_int('GUILD_ID')
+# Protected guilds: GUILD_IDS (comma separated) and/or GUILD_ID. The bot
+# leaves any other guild; empty means it works in every guild it's in.
+GUILD_IDS = tuple(dict.fromkeys(_getenv_int_list('GUILD_ID') + _getenv_int_list('GUILD_IDS')))
+GUILD_ID = GUILD_IDS[0] if GUILD_IDS else None  # default guild for DM commands
 PREFIX = '.'  # Fixed prefix for DM commands
 
 # ============= BOT IDENTITY (STEALTH) =============
@@ -45,22 +52,142 @@ PRIORITY_CRITICAL = ['bots', 'server', 'mass_delete']
 PRIORITY_WARNING = ['roles', 'channels', 'moderation']
 PRIORITY_INFO = ['members', 'voice', 'invites']
 
+# ============= MASK (AUTO-REPLY) =============
+MASK_DEFAULT_REPLY = '━━━━━━━━━━━━'  # reply in mask channels without their own
+MASK_REPLY_COOLDOWN = 3  # default seconds between replies in one mask channel
+
+# ============= GUILD SETTINGS =============
+GUILD_DATA_DIR = 'guilds'  # one settings file per guild (filters, watch list, whitelist, mask, stats)
+
+# ============= GATEWAY & CACHING =============
+# Intents, the member list and the message cache follow what the guild
+# settings switch on (cache_policy.py). INTENTS_AUTO=false subscribes to
+# and caches everything the bot handles regardless.
+INTENTS_AUTO = _getenv_bool('INTENTS_AUTO', 'true')
+MESSAGE_CACHE_SIZE = 1000  # messages kept for delete/edit alerts (only while messages are tracked)
+# Presence updates keep the .members online count. Privileged intent (switch
+# it on in the developer portal) and the busiest gateway event on large guilds.
+TRACK_PRESENCE = _getenv_bool('TRACK_PRESENCE')
+
+# ============= SHARDING =============
+# launcher.py runs the bot as SHARD_PROCESSES processes and sets these for
+# each one. Running bot.py with just SHARD_COUNT set runs every shard in one process.
+SHARD_COUNT = _getenv_int('SHARD_COUNT')  # total gateway shards (None = unsharded)
+SHARD_IDS = tuple(_getenv_int_list('SHARD_IDS'))  # shards run by this process (empty = all)
+SHARD_PROCESS = _getenv_int('SHARD_PROCESS') or 0  # this process (0 runs shard 0 and owns DM delivery)
+SHARD_PROCESSES = _getenv_int('SHARD_PROCESSES') or 1
+STATE_DB_PATH = 'state.db'  # shared state service used when SHARD_PROCESSES > 1
+OUTBOX_POLL_INTERVAL = 0.2  # seconds between checks for work handed over by other processes
+SHARD_HEARTBEAT_INTERVAL = 30  # seconds between guild list refreshes in the state service
+SHARD_IDENTIFY_INTERVAL = 5  # seconds per shard identify, used to stagger process starts
+SHARD_RESTART_DELAY = 5  # first delay before restarting a crashed process (doubles up to the max)
+SHARD_RESTART_MAX_DELAY = 300
+# Files only one shard process writes get its number (the launcher keeps the plain names)
+_PROCESS_SUFFIX = f'.{SHARD_PROCESS}' if SHARD_PROCESSES > 1 and os.getenv('SHARD_PROCESS') else ''
+
 # ============= SECURITY =============
 DB_ENCRYPTION_KEY = os.getenv('DB_KEY', 'default-key-change-me')  # Change this!
 ENCRYPT_DB = _getenv_bool('ENCRYPT_DB', 'true')
 
+# ============= AUDIT LOG =============
+AUDIT_DB_PATH = 'audit.db'  # indexed audit log searched by .logs (shared by shard processes)
+AUDIT_LOG_MAX_ENTRIES = 1_000_000  # entries kept (the oldest are dropped)
+AUDIT_QUERY_BATCH = 50  # entries read per index lookup while streaming .logs results
+
 # ============= RATE LIMITING =============
 ALERT_COOLDOWN = 2  # seconds between alerts (anti-spam)
 MAX_ALERTS_PER_MINUTE = 30  # Max alerts to owner per minute
+ALERT_CRITICAL_RESERVE = 5  # Part of the per-minute budget only critical alerts may use
+
+# ============= INVITE TRACKING =============
+INVITE_REFRESH_DELAY = 1.5  # seconds to batch concurrent joins into one invites() refresh
+INVITE_ATTRIBUTION_TIMEOUT = 15  # max seconds a join handler waits for attribution
+
+# ============= EVENT PIPELINE =============
+# Per-stage worker pool size, queue bound and backpressure policy
+# (block = wait for space, drop_oldest / drop_newest = shed when full)
+PIPELINE_STAGES = {
+    'normalize': {'workers': 1, 'maxsize': 10000, 'policy': 'block'},
+    'filter': {'workers': 2, 'maxsize': 10000, 'policy': 'block'},
+    'enrich': {'workers': 16, 'maxsize': 5000, 'policy': 'block'},
+    'persist': {'workers': 1, 'maxsize': 5000, 'policy': 'block'},
+    'notify': {'workers': 2, 'maxsize': 1000, 'policy': 'drop_oldest'},
+}
+# Info events are shed once a stage queue is this full, leaving headroom
+# for critical/warning events (which also evict queued info work)
+PIPELINE_INFO_SHED_RATIO = 0.8
+# Handlers waiting on something slow (invite attribution) at once, outside
+# the enrich workers; more wait in their worker for a slot
+PIPELINE_DEFERRED_MAX = 1000
+
+# ============= PERMISSION ANALYSIS =============
+PERMISSION_CACHE_SIZE = 4096  # memoized permission bitfields / diffs
+CHANNEL_PERMS_CACHE_SIZE = 2000  # resolved values kept per channel
+MAX_OVERWRITE_DELTAS = 10  # overwrite targets listed per channel alert
+
+# ============= GUILD SNAPSHOTS =============
+SNAPSHOT_PATH = f'snapshots{_PROCESS_SUFFIX}.json'
+SNAPSHOT_INTERVAL = 6 * 60 * 60  # seconds between automatic snapshots
+SNAPSHOT_KEEP = 30  # snapshots kept (oldest are folded into the next one)
+SNAPSHOT_FULL_EVERY = 10  # store a full snapshot after this many deltas
+SNAPSHOT_RESTORE_DELAY = 1.0  # seconds between restore API calls
+SNAPSHOT_RESTORE_RETRIES = 3  # attempts per restore step on rate limit/server errors
+
+# ============= OFFLINE CATCH-UP =============
+CATCHUP_MAX_ENTRIES = 1000  # audit log entries replayed after downtime
+CATCHUP_CURSOR_FLUSH_DELAY = 10  # seconds to batch live audit cursor writes
+CATCHUP_MASS_THRESHOLD = 3  # destructive actions that make the summary critical
+
+# ============= METRICS ENDPOINT =============
+# Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics (off by default)
+METRICS_ENABLED = _getenv_bool('METRICS_ENABLED', 'false')
+METRICS_HOST = '127.0.0.1'  # localhost only: the endpoint has no authentication
+METRICS_PORT = (_getenv_int('METRICS_PORT') or 9464) + SHARD_PROCESS  # one port per shard process
+
+# ============= EVENT LOOP WATCHDOG =============
+WATCHDOG_INTERVAL = 0.1  # seconds between loop ticks
+WATCHDOG_THRESHOLD = 0.25  # lag (seconds) that counts as a stall and captures the blocking stack
+WATCHDOG_ALERT_STALLS = 5  # stalls within the window that alert the owner
+WATCHDOG_ALERT_WINDOW = 60  # seconds
+WATCHDOG_ALERT_COOLDOWN = 30 * 60  # seconds between stall alerts
+WATCHDOG_MAX_OFFENDERS = 50  # distinct blocking call sites kept
+
+# ============= PROFILING =============
+PROFILE_MAX_SECONDS = 120  # longest .profile window
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between CPU stack samples
+PROFILE_MEM_FRAMES = 10  # stack depth kept per allocation by tracemalloc
+PROFILE_TOP = 30  # rows per table in a profile report
+
+# ============= EVENT RECORDING =============
+RECORDINGS_DIR = 'recordings'  # gateway event recordings for replay.py
+RECORD_MAX_EVENTS = 100000  # recording stops by itself after this many events
+
+# ============= PAGINATED LISTINGS =============
+PAGINATOR_PAGE_LINES = 20  # lines per page of a listing
+PAGINATOR_PAGE_CHARS = 1900  # page length limit (pages still end on a line boundary)
+PAGINATOR_MAX_PAGES = 100  # pages one listing goes up to
+PAGINATOR_MAX_OPEN = 10  # listings keeping their ◀️ ▶️ buttons (the oldest lose them first)
+PAGINATOR_TIMEOUT = 600  # seconds without a button press before a listing loses its buttons
+PAGINATOR_RELAY_PAGES = 5  # pages sent as plain messages for commands run by another shard process
+
+# ============= MEMBER COUNTERS =============
+MEMBER_RECENT_DAYS = 7  # joined within this many days counts as recently joined
+MEMBER_TREND_DAYS = 30  # days of join/leave rollups kept per guild
+MEMBER_ROLLUP_FLUSH_DELAY = 60  # seconds to batch rollup writes
 
 # ============= QUICK ACTIONS =============
 QUICK_ACTIONS_ENABLED = True
 QUICK_ACTION_TIMEOUT = 300  # 5 minutes to respond
 
 # ============= LOGGING =============
-LOG_FILE = 'q_bot.log'
+LOG_FILE = f'q_bot{_PROCESS_SUFFIX}.log'
 LOG_LEVEL = 'INFO'
 LOG_TO_CONSOLE = True
+LOG_JSON = _getenv_bool('LOG_JSON')  # also write structured JSON lines
+LOG_JSON_FILE = f'q_bot{_PROCESS_SUFFIX}.jsonl'
+LOG_QUEUE_SIZE = 10000  # records waiting for the writer thread (extra ones are dropped)
+LOG_RATE_LIMIT = 20  # records per call site per window
+LOG_RATE_WINDOW = 10  # seconds
 
 # ============= FAKE COMMANDS (STEALTH) =============
 ENABLE_FAKE_COMMANDS = True  # Public slash commands for cover
@@ -71,7 +198,7 @@ if TOKEN is None:
     print('⚠️  WARNING: TOKEN not set in environment')
 if OWNER_ID is None:
     print('⚠️  WARNING: OWNER_ID not set - DM commands will not work')
-if GUILD_ID is None:
-    print('⚠️  WARNING: GUILD_ID not set - bot will work in all servers')
+if not GUILD_IDS:
+    print('⚠️  WARNING: GUILD_IDS/GUILD_ID not set - bot will work in all servers')
 
-print(f'✅ Config loaded: Bot={BOT_NAME}, Encryption={ENCRYPT_DB}, Guild={GUILD_ID}')
+print(f'✅ Config loaded: Bot={BOT_NAME}, Encryption={ENCRYPT_DB}, Guilds={list(GUILD_IDS) or "all"}')
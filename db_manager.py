@@ -1,14 +1,26 @@
 # db_manager.py — Ultimate Database Manager with Encryption
+import asyncio
+import functools
 import json
+import os
 import base64
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from logger import logger
-from config import DB_ENCRYPTION_KEY, ENCRYPT_DB
+from perf import phase
+import state_store
+from config import DB_ENCRYPTION_KEY, ENCRYPT_DB, DEFAULT_FILTERS, GUILD_ID, GUILD_DATA_DIR, MASK_DEFAULT_REPLY
 
 DB_PATH = 'db.json'
 
+# increment_stat calls since startup (exported by metrics_server): {(guild_id, stat): count}
+stat_increments = {}
+
+# Per-guild settings, loaded on first use and kept in memory: {guild_id: partition}
+PARTITION_KEYS = ('watched_users', 'whitelist', 'filters', 'mask', 'stats')
+_partitions = {}
+
 # Generate encryption key from password
 def _generate_key(password: str) -> bytes:
     kdf = PBKDF2HMAC(
@@ -20,38 +32,114 @@ def _generate_key(password: str) -> bytes:
     key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
     return key
 
+@functools.lru_cache(maxsize=4)
+def _cipher_for(password: str) -> Fernet:
+    # Key derivation is deliberately slow, and every guild file uses the same key
+    return Fernet(_generate_key(password))
+
 def _get_cipher():
     if not ENCRYPT_DB:
         return None
-    key = _generate_key(DB_ENCRYPTION_KEY)
-    return Fernet(key)
+    return _cipher_for(DB_ENCRYPTION_KEY)
 
-def load_db():
-    """Load database from disk with optional decryption"""
+# Stores are files, or documents in the shared state service when the bot
+# runs as several shard processes (keyed by the same path)
+def _read_text(path: str):
+    if state_store.enabled:
+        return state_store.get(path)
     try:
-        with open(DB_PATH, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Decrypt if enabled
-        if ENCRYPT_DB:
-            try:
-                cipher = _get_cipher()
-                decrypted = cipher.decrypt(content.encode())
-                data = json.loads(decrypted.decode())
-                logger.debug('Database decrypted successfully')
-                return data
-            except Exception as e:
-                logger.error(f'Decryption failed, trying plain JSON: {e}')
-                # Fallback to plain JSON
-                return json.loads(content)
-        else:
-            return json.loads(content)
-            
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
     except FileNotFoundError:
-        logger.info('Database not found, creating default')
-        default = _get_default_db()
-        save_db(default)
+        return None
+
+def _write_text(path: str, content: str):
+    if state_store.enabled:
+        state_store.put(path, content)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def _decode(path: str, content: str):
+    # Decrypt if enabled
+    if ENCRYPT_DB:
+        try:
+            cipher = _get_cipher()
+            decrypted = cipher.decrypt(content.encode())
+            data = json.loads(decrypted.decode())
+            logger.debug(f'{path} decrypted successfully')
+            return data
+        except Exception as e:
+            logger.error(f'Decryption of {path} failed, trying plain JSON: {e}')
+            # Fallback to plain JSON
+            return json.loads(content)
+    else:
+        return json.loads(content)
+
+def _encode(data, indent: int = 2) -> str:
+    json_str = json.dumps(data, indent=indent, ensure_ascii=False)
+    
+    # Encrypt if enabled
+    if ENCRYPT_DB:
+        cipher = _get_cipher()
+        encrypted = cipher.encrypt(json_str.encode())
+        return encrypted.decode()
+    return json_str
+
+def encrypt_text(text: str) -> str:
+    """Encrypt a string like the stores are (returned as is when ENCRYPT_DB is off)"""
+    return _get_cipher().encrypt(text.encode()).decode() if ENCRYPT_DB else text
+
+def decrypt_text(text: str) -> str:
+    """Reverse encrypt_text (plain JSON, stored before encryption was on, is returned as is)"""
+    if not ENCRYPT_DB or text.startswith(('{', '[')):
+        return text
+    return _get_cipher().decrypt(text.encode()).decode()
+
+def load_json(path: str, default=None):
+    """
+    Load a JSON store with optional decryption
+    
+    Returns:
+        The stored data, or `default` if it does not exist
+    """
+    content = _read_text(path)
+    if content is None:
         return default
+    return _decode(path, content)
+
+def save_json(path: str, data, indent: int = 2):
+    """Save a JSON store with optional encryption"""
+    _write_text(path, _encode(data, indent))
+
+def update_json(path: str, change, default=None, indent: int = 2):
+    """
+    Load a JSON store, let change(data) modify it in place, and save it
+    
+    With the shared state service this happens under its write lock, so
+    shard processes updating the same store can't lose each other's changes.
+    """
+    def apply(content):
+        data = default if content is None else _decode(path, content)
+        change(data)
+        return _encode(data, indent)
+    
+    if state_store.enabled:
+        state_store.update(path, apply)
+    else:
+        _write_text(path, apply(_read_text(path)))
+
+def load_db():
+    """Load database from disk with optional decryption"""
+    try:
+        with phase('db.load'):
+            data = load_json(DB_PATH)
+        if data is None:
+            logger.info('Database not found, creating default')
+            default = _get_default_db()
+            save_db(default)
+            return default
+        return data
     except Exception as e:
         logger.exception(f'Failed to load database: {e}')
         return _get_default_db()
@@ -59,45 +147,32 @@ def load_db():
 def save_db(data):
     """Save database to disk with optional encryption"""
     try:
-        json_str = json.dumps(data, indent=2, ensure_ascii=False)
-        
-        # Encrypt if enabled
-        if ENCRYPT_DB:
-            cipher = _get_cipher()
-            encrypted = cipher.encrypt(json_str.encode())
-            content = encrypted.decode()
-        else:
-            content = json_str
-        
-        with open(DB_PATH, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
+        with phase('db.save'):
+            save_json(DB_PATH, data)
         logger.debug('Database saved successfully')
     except Exception as e:
         logger.exception(f'Failed to save database: {e}')
 
 def _get_default_db():
-    """Get default database structure"""
+    """Get default database structure (guild settings live in their own files)"""
+    return {
+        "secret_channel_id": None,
+        "quick_actions": {},
+        "audit_cursors": {},
+        "command_sync": {}
+    }
+
+# ============= GUILD PARTITIONS =============
+def _get_default_partition():
+    """Get default settings for one guild"""
     return {
         "watched_users": [],
         "whitelist": [],
-        "filters": {
-            "roles": True,
-            "channels": True,
-            "members": True,
-            "messages": True,
-            "moderation": True,
-            "server": True,
-            "bots": True,
-            "invites": True,
-            "voice": True
-        },
+        "filters": dict(DEFAULT_FILTERS),
         "mask": {
-            "channel_id": None,
-            "reply_text": "━━━━━━━━━━━━"
+            "reply_text": MASK_DEFAULT_REPLY,
+            "channels": {}  # {channel_id: {"reply_text": str, "cooldown": seconds}}
         },
-        "secret_channel_id": None,
-        "quick_actions": {},
         "stats": {
             "total_alerts": 0,
             "bot_additions": 0,
@@ -105,66 +180,165 @@ def _get_default_db():
             "channel_changes": 0,
             "bans": 0,
             "kicks": 0
-        },
-        "audit_log": []
+        }
     }
 
-def add_to_audit_log(event_type: str, details: dict):
-    """Add event to audit log"""
+def _partition_path(guild_id: int) -> str:
+    return os.path.join(GUILD_DATA_DIR, f'{guild_id}.json')
+
+def _migrate_single_guild_settings(guild_id: int, partition: dict):
+    """Move settings from a pre-multi-guild db.json into the configured guild"""
+    if GUILD_ID is not None and guild_id != GUILD_ID:
+        return
+    db = load_db()
+    if not any(key in db for key in PARTITION_KEYS):
+        return
+    
+    legacy = []
+    def move(db):
+        for key in PARTITION_KEYS:
+            if key in db:
+                partition[key] = db.pop(key)
+                legacy.append(key)
+    update_json(DB_PATH, move, _get_default_db())
+    if legacy:
+        logger.info(f'Moved {", ".join(legacy)} from {DB_PATH} into guild {guild_id}')
+
+def get_partition(guild_id: int) -> dict:
+    """
+    Get one guild's settings (watched users, whitelist, filters, mask, stats)
+    
+    Loaded from disk on first use, then served from memory. Callers that
+    change the partition must call save_partition().
+    
+    Returns:
+        dict: The live partition
+    """
+    partition = _partitions.get(guild_id)
+    if partition is not None:
+        return partition
+    
+    partition = _get_default_partition()
     try:
-        db = load_db()
-        import datetime
-        entry = {
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "type": event_type,
-            "details": details
-        }
-        db['audit_log'].append(entry)
-        
-        # Keep only last 1000 entries
-        if len(db['audit_log']) > 1000:
-            db['audit_log'] = db['audit_log'][-1000:]
-        
-        save_db(db)
+        with phase('db.load'):
+            stored = load_json(_partition_path(guild_id))
+        if stored is None:
+            _migrate_single_guild_settings(guild_id, partition)
+            _partitions[guild_id] = partition
+            save_partition(guild_id)
+        else:
+            partition.update(stored)
+            _partitions[guild_id] = partition
     except Exception as e:
-        logger.exception(f'Failed to add audit log: {e}')
+        logger.exception(f'Failed to load settings for guild {guild_id}: {e}')
+        _partitions[guild_id] = partition
+    return partition
+
+def save_partition(guild_id: int):
+    """Write one guild's settings to disk"""
+    partition = _partitions.get(guild_id)
+    if partition is None:
+        return
+    try:
+        if not state_store.enabled:
+            os.makedirs(GUILD_DATA_DIR, exist_ok=True)
+        with phase('db.save'):
+            save_json(_partition_path(guild_id), partition)
+        logger.debug(f'Settings for guild {guild_id} saved')
+    except Exception as e:
+        logger.exception(f'Failed to save settings for guild {guild_id}: {e}')
 
-def increment_stat(stat_name: str):
-    """Increment a statistic counter"""
+def get_partition_ids() -> list:
+    """Get every guild that has settings (in memory or on disk)"""
+    guild_ids = set(_partitions)
     try:
-        db = load_db()
-        if stat_name in db['stats']:
-            db['stats'][stat_name] += 1
+        if state_store.enabled:
+            names = [os.path.basename(name) for name in state_store.names(os.path.join(GUILD_DATA_DIR, ''))]
         else:
-            db['stats'][stat_name] = 1
-        save_db(db)
+            names = os.listdir(GUILD_DATA_DIR)
+        for name in names:
+            stem = name[:-len('.json')]
+            if name.endswith('.json') and stem.isdigit():
+                guild_ids.add(int(stem))
+    except FileNotFoundError:
+        pass
+    return sorted(guild_ids)
+
+async def add_to_audit_log(event_type: str, details: dict):
+    """Add event to audit log (audit_store.py), written off the event loop"""
+    try:
+        import audit_store
+        with phase('db.audit'):
+            await asyncio.to_thread(audit_store.append, event_type, details)
+    except Exception as e:
+        logger.exception(f'Failed to add audit log: {e}')
+
+def increment_stat(guild_id: int, stat_name: str):
+    """Increment a statistic counter for a guild (guild-less stats are only counted in memory)"""
+    key = (guild_id, stat_name)
+    stat_increments[key] = stat_increments.get(key, 0) + 1
+    if guild_id is None:
+        return
+    try:
+        stats = get_partition(guild_id)['stats']
+        stats[stat_name] = stats.get(stat_name, 0) + 1
+        save_partition(guild_id)
     except Exception as e:
         logger.exception(f'Failed to increment stat: {e}')
 
-def get_watched_users():
-    """Get list of watched user IDs"""
+def get_audit_cursor(guild_id: int) -> int:
+    """Get the last Discord audit log entry ID seen for a guild (or None)"""
     db = load_db()
-    return db.get('watched_users', [])
+    cursor = db.get('audit_cursors', {}).get(str(guild_id))
+    return int(cursor) if cursor else None
+
+def set_audit_cursor(guild_id: int, entry_id: int):
+    """Remember the last Discord audit log entry ID seen for a guild"""
+    try:
+        def set_cursor(db):
+            db.setdefault('audit_cursors', {})[str(guild_id)] = str(entry_id)
+        
+        with phase('db.update'):
+            update_json(DB_PATH, set_cursor, _get_default_db())
+    except Exception as e:
+        logger.exception(f'Failed to save audit cursor: {e}')
 
-def get_whitelist():
-    """Get list of whitelisted user IDs"""
+def get_command_sync_hash(guild_id: int) -> str:
+    """Get the hash of the slash commands last synced to a guild (or None)"""
     db = load_db()
-    return db.get('whitelist', [])
+    return db.get('command_sync', {}).get(str(guild_id))
 
-def is_watched(user_id: int) -> bool:
-    """Check if user is being watched"""
-    return str(user_id) in get_watched_users()
+def set_command_sync_hash(guild_id: int, digest: str):
+    """Remember the hash of the slash commands just synced to a guild"""
+    try:
+        def set_hash(db):
+            db.setdefault('command_sync', {})[str(guild_id)] = digest
+        
+        with phase('db.update'):
+            update_json(DB_PATH, set_hash, _get_default_db())
+    except Exception as e:
+        logger.exception(f'Failed to save command sync hash: {e}')
 
-def is_whitelisted(user_id: int) -> bool:
-    """Check if user is whitelisted"""
-    return str(user_id) in get_whitelist()
+def get_watched_users(guild_id: int):
+    """Get list of watched user IDs in a guild"""
+    return get_partition(guild_id)['watched_users']
 
-def get_filter_status(filter_name: str) -> bool:
-    """Get status of a specific filter"""
-    db = load_db()
-    return db.get('filters', {}).get(filter_name, True)
+def get_whitelist(guild_id: int):
+    """Get list of whitelisted user IDs in a guild"""
+    return get_partition(guild_id)['whitelist']
 
-def get_all_filters():
-    """Get all filter statuses"""
-    db = load_db()
-    return db.get('filters', {})
\ No newline at end of file
+def is_watched(guild_id: int, user_id: int) -> bool:
+    """Check if user is being watched in a guild"""
+    return str(user_id) in get_watched_users(guild_id)
+
+def is_whitelisted(guild_id: int, user_id: int) -> bool:
+    """Check if user is whitelisted in a guild"""
+    return str(user_id) in get_whitelist(guild_id)
+
+def get_filter_status(guild_id: int, filter_name: str) -> bool:
+    """Get status of a specific filter in a guild"""
+    return get_partition(guild_id)['filters'].get(filter_name, True)
+
+def get_all_filters(guild_id: int):
+    """Get all filter statuses for a guild"""
+    return get_partition(guild_id)['filters']
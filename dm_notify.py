@@ -1,9 +1,11 @@
 # dm_notify.py — Ultimate Alert System (DM ONLY - NO SERVER CHANNELS!)
 import discord
 from logger import logger
-from config import OWNER_ID, DM_ALERTS, ALERT_COOLDOWN, MAX_ALERTS_PER_MINUTE
+from config import OWNER_ID, DM_ALERTS, ALERT_COOLDOWN, MAX_ALERTS_PER_MINUTE, ALERT_CRITICAL_RESERVE
 from db_manager import increment_stat
+from perf import phase
 from filters import get_priority
+import sharding
 import asyncio
 import time
 from collections import deque
@@ -12,8 +14,11 @@ from collections import deque
 alert_timestamps = deque(maxlen=MAX_ALERTS_PER_MINUTE)
 last_alert_time = 0
 
+# Alert outcomes since startup (exported by metrics_server)
+alert_counters = {'sent': 0, 'rate_limited': 0, 'failed': 0}
+
 async def alert(bot, title: str, details: str, priority: str = None, 
-                embed_fields: list = None, quick_action_text: str = None):
+                embed_fields: list = None, quick_action_text: str = None, guild=None):
     """
     Send alert to owner via DM ONLY
     
@@ -24,6 +29,7 @@ async def alert(bot, title: str, details: str, priority: str = None,
         priority: Priority level (e.g., '🔴 CRITICAL')
         embed_fields: List of (name, value, inline) for additional info
         quick_action_text: Quick action options text (if applicable)
+        guild: Guild the alert is about (tags the embed, counts in its stats)
     """
     global last_alert_time
     
@@ -35,6 +41,12 @@ async def alert(bot, title: str, details: str, priority: str = None,
         logger.warning('OWNER_ID not set; cannot send DM alert')
         return
     
+    # Only the DM process sends (and rate limits); count it where it happened
+    if not sharding.owns_dm:
+        increment_stat(guild.id if guild else None, 'total_alerts')
+        await sharding.forward_alert(title, details, priority, embed_fields, quick_action_text, guild)
+        return
+    
     # Rate limiting
     current_time = time.time()
     
@@ -43,9 +55,14 @@ async def alert(bot, title: str, details: str, priority: str = None,
     while alert_timestamps and alert_timestamps[0] < cutoff:
         alert_timestamps.popleft()
     
-    # Check if rate limit exceeded
-    if len(alert_timestamps) >= MAX_ALERTS_PER_MINUTE:
-        logger.warning(f'Alert rate limit exceeded ({MAX_ALERTS_PER_MINUTE}/min)')
+    # Check if rate limit exceeded (the last few slots are kept for critical alerts)
+    limit = MAX_ALERTS_PER_MINUTE
+    if not (priority and 'CRITICAL' in priority):
+        limit -= ALERT_CRITICAL_RESERVE
+    
+    if len(alert_timestamps) >= limit:
+        alert_counters['rate_limited'] += 1
+        logger.warning(f'Alert rate limit exceeded ({limit}/min for {priority or "unknown"} alerts)')
         return
     
     # Cooldown between alerts
@@ -56,17 +73,19 @@ async def alert(bot, title: str, details: str, priority: str = None,
     alert_timestamps.append(current_time)
     last_alert_time = current_time
     
-    # Increment stats
-    increment_stat('total_alerts')
+    # Increment stats (forwarded alerts were counted by the process that owns the guild)
+    if not isinstance(guild, sharding.RemoteGuild):
+        increment_stat(guild.id if guild else None, 'total_alerts')
     
     # Send DM
-    await _send_dm_alert(bot, title, details, priority or '⚪ UNKNOWN', embed_fields, quick_action_text)
+    await _send_dm_alert(bot, title, details, priority or '⚪ UNKNOWN', embed_fields, quick_action_text, guild)
 
 async def _send_dm_alert(bot, title: str, details: str, priority: str, 
-                         embed_fields: list = None, quick_action_text: str = None):
+                         embed_fields: list = None, quick_action_text: str = None, guild=None):
     """Send alert via DM to owner"""
     try:
-        owner = await bot.fetch_user(OWNER_ID)
+        with phase('dm.fetch_owner'):
+            owner = await bot.fetch_user(OWNER_ID)
         if not owner:
             logger.warning('Owner user not found')
             return
@@ -92,20 +111,29 @@ async def _send_dm_alert(bot, title: str, details: str, priority: str,
                     inline = False
                 embed.add_field(name=name, value=value, inline=inline)
         
-        embed.set_footer(text="Q Bot Security Monitor")
+        # Tag the guild so alerts from several servers can be told apart
+        if guild is not None:
+            embed.set_author(name=f'🏠 {guild.name}', icon_url=guild.icon.url if guild.icon else None)
+            embed.set_footer(text=f"Q Bot Security Monitor • Guild {guild.id}")
+        else:
+            embed.set_footer(text="Q Bot Security Monitor")
         
         # Send embed
-        await owner.send(embed=embed)
-        
-        # Send quick actions if available
-        if quick_action_text:
-            await owner.send(quick_action_text)
+        with phase('dm.send'):
+            await owner.send(embed=embed)
+            
+            # Send quick actions if available
+            if quick_action_text:
+                await owner.send(quick_action_text)
         
-        logger.info(f'Alert sent to owner: {title}')
+        alert_counters['sent'] += 1
+        logger.info(f'Alert sent to owner: {title}' + (f' ({guild.id})' if guild else ''))
         
     except discord.Forbidden:
+        alert_counters['failed'] += 1
         logger.error('Cannot send DM to owner - DMs are closed')
     except Exception as e:
+        alert_counters['failed'] += 1
         logger.exception(f'Failed to send alert DM: {e}')
 
 async def alert_simple(bot, message: str):
@@ -120,6 +148,10 @@ async def alert_simple(bot, message: str):
         return
     
     try:
+        if not sharding.owns_dm:
+            await sharding.forward('dm', {'content': message})
+            return
+        
         owner = await bot.fetch_user(OWNER_ID)
         if owner:
             await owner.send(message)
@@ -127,7 +159,7 @@ async def alert_simple(bot, message: str):
     except Exception as e:
         logger.exception(f'Failed to send simple alert: {e}')
 
-async def alert_critical(bot, title: str, details: str, quick_action_text: str = None):
+async def alert_critical(bot, title: str, details: str, quick_action_text: str = None, guild=None):
     """
     Send critical priority alert
     
@@ -136,19 +168,19 @@ async def alert_critical(bot, title: str, details: str, quick_action_text: str =
         title: Alert title
         details: Details
         quick_action_text: Quick action options
+        guild: Guild the alert is about
     """
-    await alert(bot, title, details, priority='🔴 CRITICAL', quick_action_text=quick_action_text)
+    await alert(bot, title, details, priority='🔴 CRITICAL', quick_action_text=quick_action_text, guild=guild)
 
-async def alert_warning(bot, title: str, details: str, quick_action_text: str = None):
+async def alert_warning(bot, title: str, details: str, quick_action_text: str = None, guild=None):
     """Send warning priority alert"""
-    await alert(bot, title, details, priority='🟡 WARNING', quick_action_text=quick_action_text)
+    await alert(bot, title, details, priority='🟡 WARNING', quick_action_text=quick_action_text, guild=guild)
 
-async def alert_info(bot, title: str, details: str):
+async def alert_info(bot, title: str, details: str, guild=None):
     """Send info priority alert"""
-    await alert(bot, title, details, priority='🟢 INFO')
+    await alert(bot, title, details, priority='🟢 INFO', guild=guild)
 
-def get_alert_stats() -> dict:
-    """Get alert statistics"""
-    from db_manager import load_db
-    db = load_db()
-    return db.get('stats', {})
+def get_alert_stats(guild_id: int) -> dict:
+    """Get alert statistics for a guild"""
+    from db_manager import get_partition
+    return get_partition(guild_id)['stats']
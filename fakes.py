@@ -0,0 +1,183 @@
+# fakes.py — Offline Discord Objects for Replay & Benchmarks
+#
+# Builds real discord.py objects from gateway-shaped payloads on a
+# ConnectionState whose HTTP client never touches the network, so monitor
+# code runs unmodified without a token or connection.
+import datetime
+import discord
+from discord.state import ConnectionState
+
+DISCORD_EPOCH_MS = 1420070400000
+
+class OfflineHTTP:
+    """HTTP client stand-in: read endpoints return empty results, anything else fails"""
+
+    def __init__(self):
+        self.calls = {}  # {endpoint: count}
+
+    def _count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    async def get_audit_logs(self, guild_id, **kwargs):
+        self._count('get_audit_logs')
+        return {'audit_log_entries': [], 'users': [], 'webhooks': [], 'integrations': [], 'threads': []}
+
+    async def invites_from(self, guild_id):
+        self._count('invites_from')
+        return []
+
+    async def get_vanity_code(self, guild_id):
+        self._count('get_vanity_code')
+        return {'code': None, 'uses': 0}
+
+    async def guild_webhooks(self, guild_id):
+        self._count('guild_webhooks')
+        return []
+
+    def __getattr__(self, name):
+        async def _offline(*args, **kwargs):
+            raise RuntimeError(f'Offline HTTP: {name} is not available')
+        return _offline
+
+def make_state(http: OfflineHTTP = None) -> ConnectionState:
+    """Get a ConnectionState that caches everything and never connects"""
+    return ConnectionState(
+        dispatch=lambda *args, **kwargs: None,
+        handlers={},
+        hooks={},
+        http=http or OfflineHTTP(),
+        intents=discord.Intents.all(),
+        member_cache_flags=discord.MemberCacheFlags.all(),
+        chunk_guilds_at_startup=False
+    )
+
+class FakeBot:
+    """Just enough of commands.Bot for monitor handlers"""
+
+    def __init__(self, guild: discord.Guild, user_id: int = 1):
+        self.guilds = [guild]
+        self.user = discord.Object(id=user_id)
+        self.latency = 0.0
+
+    def get_guild(self, guild_id: int):
+        return next((guild for guild in self.guilds if guild.id == guild_id), None)
+
+# ============= PAYLOAD BUILDERS =============
+def snowflake(dt: datetime.datetime = None, sequence: int = 0) -> int:
+    """Make a snowflake id for a point in time (now by default)"""
+    dt = dt or datetime.datetime.now(datetime.timezone.utc)
+    return (int(dt.timestamp() * 1000) - DISCORD_EPOCH_MS) << 22 | (sequence & 0x3FFFFF)
+
+def user_payload(user_id: int, name: str = None, bot: bool = False) -> dict:
+    return {
+        'id': str(user_id),
+        'username': name or f'user{user_id}',
+        'discriminator': '0',
+        'global_name': None,
+        'avatar': None,
+        'bot': bot
+    }
+
+def member_payload(user: dict, role_ids: list = (), joined_at: str = None, nick: str = None) -> dict:
+    return {
+        'user': user,
+        'roles': [str(role_id) for role_id in role_ids],
+        'nick': nick,
+        'joined_at': joined_at or datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'communication_disabled_until': None,
+        'flags': 0,
+        'deaf': False,
+        'mute': False,
+        'avatar': None
+    }
+
+def role_payload(role_id: int, name: str, permissions: int = 0, position: int = 0,
+                 color: int = 0, hoist: bool = False, managed: bool = False) -> dict:
+    return {
+        'id': str(role_id),
+        'name': name,
+        'permissions': str(permissions),
+        'position': position,
+        'color': color,
+        'hoist': hoist,
+        'managed': managed,
+        'mentionable': False,
+        'flags': 0
+    }
+
+def channel_payload(channel_id: int, name: str, channel_type: int = 0, position: int = 0,
+                    parent_id: int = None, overwrites: list = ()) -> dict:
+    return {
+        'id': str(channel_id),
+        'type': channel_type,
+        'name': name,
+        'position': position,
+        'parent_id': str(parent_id) if parent_id else None,
+        'topic': None,
+        'nsfw': False,
+        'rate_limit_per_user': 0,
+        'bitrate': 64000,
+        'user_limit': 0,
+        'permission_overwrites': list(overwrites)
+    }
+
+def guild_payload(guild_id: int, name: str = 'Guild', owner_id: int = 1, roles: list = (),
+                  channels: list = (), members: list = ()) -> dict:
+    """Guild payload; @everyone (id == guild id) is added if missing"""
+    roles = list(roles)
+    if not any(role['id'] == str(guild_id) for role in roles):
+        roles.insert(0, role_payload(guild_id, '@everyone', discord.Permissions.general().value))
+    return {
+        'id': str(guild_id),
+        'name': name,
+        'owner_id': str(owner_id),
+        'icon': None,
+        'verification_level': 0,
+        'default_message_notifications': 0,
+        'vanity_url_code': None,
+        'member_count': len(members),
+        'roles': roles,
+        'channels': list(channels),
+        'members': list(members),
+        'emojis': [],
+        'stickers': [],
+        'features': []
+    }
+
+# ============= OBJECT BUILDERS =============
+def make_guild(state: ConnectionState, data: dict) -> discord.Guild:
+    """Build a cached guild from a guild payload"""
+    guild = discord.Guild(data=data, state=state)
+    state._add_guild(guild)
+    return guild
+
+def make_member(guild: discord.Guild, data: dict) -> discord.Member:
+    return discord.Member(data=data, guild=guild, state=guild._state)
+
+def make_user(state: ConnectionState, data: dict) -> discord.User:
+    return discord.User(state=state, data=data)
+
+def make_role(guild: discord.Guild, data: dict) -> discord.Role:
+    return discord.Role(guild=guild, state=guild._state, data=data)
+
+def make_channel(guild: discord.Guild, data: dict):
+    """Build a guild channel of the payload's type (None for unknown types)"""
+    cls, _ = discord.channel._guild_channel_factory(data['type'])
+    if cls is None:
+        return None
+    return cls(state=guild._state, guild=guild, data=data)
+
+def make_message(guild: discord.Guild, data: dict) -> discord.Message:
+    """Build a message; unknown channels get a bare text channel"""
+    channel = guild.get_channel(int(data['channel_id']))
+    if channel is None:
+        channel = make_channel(guild, channel_payload(int(data['channel_id']), 'unknown'))
+    return discord.Message(state=guild._state, channel=channel, data=data)
+
+def make_voice_state(guild: discord.Guild, data: dict) -> discord.VoiceState:
+    channel = guild.get_channel(int(data['channel_id'])) if data.get('channel_id') else None
+    return discord.VoiceState(data=data, channel=channel)
+
+def make_invite(guild: discord.Guild, data: dict) -> discord.Invite:
+    channel = guild.get_channel(int(data['channel_id'])) if data.get('channel_id') else None
+    return discord.Invite(state=guild._state, data=data, guild=guild, channel=channel)
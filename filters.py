@@ -1,13 +1,14 @@
 # filters.py — Ultimate Notification Filter System
-from db_manager import load_db, save_db, get_filter_status, is_whitelisted
+from db_manager import get_partition, save_partition, get_filter_status, is_whitelisted
 from logger import logger
 from config import PRIORITY_CRITICAL, PRIORITY_WARNING, PRIORITY_INFO
 
-def should_alert(event_type: str, user_id: int = None) -> bool:
+def should_alert(guild_id: int, event_type: str, user_id: int = None) -> bool:
     """
-    Determine if an alert should be sent based on filters and whitelist
+    Determine if an alert should be sent based on a guild's filters and whitelist
     
     Args:
+        guild_id: Guild the event happened in
         event_type: Type of event (roles, channels, members, etc.)
         user_id: User ID involved (if applicable)
     
@@ -19,15 +20,15 @@ def should_alert(event_type: str, user_id: int = None) -> bool:
         return True
     
     # Check if user is whitelisted (skip non-critical alerts)
-    if user_id and is_whitelisted(user_id):
-        logger.debug(f'User {user_id} is whitelisted, skipping alert for {event_type}')
+    if user_id and is_whitelisted(guild_id, user_id):
+        logger.debug(f'User {user_id} is whitelisted in {guild_id}, skipping alert for {event_type}')
         return False
     
     # Check filter status
-    filter_enabled = get_filter_status(event_type)
+    filter_enabled = get_filter_status(guild_id, event_type)
     
     if not filter_enabled:
-        logger.debug(f'Filter {event_type} is disabled, skipping alert')
+        logger.debug(f'Filter {event_type} is disabled in {guild_id}, skipping alert')
         return False
     
     return True
@@ -43,7 +44,7 @@ def get_priority(event_type: str) -> str:
     else:
         return '⚪ UNKNOWN'
 
-def toggle_filter(filter_name: str) -> tuple[bool, str]:
+def toggle_filter(guild_id: int, filter_name: str) -> tuple[bool, str]:
     """
     Toggle a filter on/off
     
@@ -51,26 +52,25 @@ def toggle_filter(filter_name: str) -> tuple[bool, str]:
         tuple: (success, new_status_text)
     """
     try:
-        db = load_db()
-        filters = db.get('filters', {})
+        partition = get_partition(guild_id)
+        filters = partition['filters']
         
         if filter_name not in filters:
             return False, f'❌ Filter `{filter_name}` not found'
         
         # Toggle
         filters[filter_name] = not filters[filter_name]
-        db['filters'] = filters
-        save_db(db)
+        save_partition(guild_id)
         
         status = 'تشغيل ✅' if filters[filter_name] else 'إيقاف ❌'
-        logger.info(f'Filter {filter_name} toggled to {filters[filter_name]}')
+        logger.info(f'Filter {filter_name} toggled to {filters[filter_name]} in guild {guild_id}')
         
         return True, f'✅ Filter `{filter_name}` → {status}'
     except Exception as e:
         logger.exception(f'Failed to toggle filter: {e}')
         return False, f'❌ Error: {str(e)}'
 
-def set_filter(filter_name: str, enabled: bool) -> tuple[bool, str]:
+def set_filter(guild_id: int, filter_name: str, enabled: bool) -> tuple[bool, str]:
     """
     Set a filter to specific state
     
@@ -78,29 +78,28 @@ def set_filter(filter_name: str, enabled: bool) -> tuple[bool, str]:
         tuple: (success, message)
     """
     try:
-        db = load_db()
-        filters = db.get('filters', {})
+        partition = get_partition(guild_id)
+        filters = partition['filters']
         
         if filter_name not in filters:
             return False, f'❌ Filter `{filter_name}` not found'
         
         filters[filter_name] = enabled
-        db['filters'] = filters
-        save_db(db)
+        save_partition(guild_id)
         
         status = 'تشغيل ✅' if enabled else 'إيقاف ❌'
-        logger.info(f'Filter {filter_name} set to {enabled}')
+        logger.info(f'Filter {filter_name} set to {enabled} in guild {guild_id}')
         
         return True, f'✅ Filter `{filter_name}` → {status}'
     except Exception as e:
         logger.exception(f'Failed to set filter: {e}')
         return False, f'❌ Error: {str(e)}'
 
-def get_filters_status() -> str:
+def get_filters_status(guild_id: int) -> str:
     """Get formatted string of all filters"""
     try:
-        db = load_db()
-        filters = db.get('filters', {})
+        partition = get_partition(guild_id)
+        filters = partition['filters']
         
         lines = ['📋 **Filters Status:**\n']
         
@@ -128,46 +127,43 @@ def get_filters_status() -> str:
         logger.exception(f'Failed to get filters status: {e}')
         return f'❌ Error: {str(e)}'
 
-def enable_all_filters() -> str:
+def enable_all_filters(guild_id: int) -> str:
     """Enable all filters"""
     try:
-        db = load_db()
-        filters = db.get('filters', {})
+        partition = get_partition(guild_id)
+        filters = partition['filters']
         for key in filters:
             filters[key] = True
-        db['filters'] = filters
-        save_db(db)
-        logger.info('All filters enabled')
+        save_partition(guild_id)
+        logger.info(f'All filters enabled in guild {guild_id}')
         return '✅ تم تشغيل جميع الفلاتر'
     except Exception as e:
         logger.exception(f'Failed to enable all filters: {e}')
         return f'❌ Error: {str(e)}'
 
-def disable_all_filters() -> str:
+def disable_all_filters(guild_id: int) -> str:
     """Disable all filters (except critical)"""
     try:
-        db = load_db()
-        filters = db.get('filters', {})
+        partition = get_partition(guild_id)
+        filters = partition['filters']
         for key in filters:
             # Keep critical filters enabled
             if key not in PRIORITY_CRITICAL:
                 filters[key] = False
-        db['filters'] = filters
-        save_db(db)
-        logger.info('All non-critical filters disabled')
+        save_partition(guild_id)
+        logger.info(f'All non-critical filters disabled in guild {guild_id}')
         return '✅ تم إيقاف جميع الفلاتر (ما عدا الحرجة)'
     except Exception as e:
         logger.exception(f'Failed to disable filters: {e}')
         return f'❌ Error: {str(e)}'
 
-def reset_filters() -> str:
+def reset_filters(guild_id: int) -> str:
     """Reset filters to default"""
     try:
         from config import DEFAULT_FILTERS
-        db = load_db()
-        db['filters'] = DEFAULT_FILTERS.copy()
-        save_db(db)
-        logger.info('Filters reset to default')
+        get_partition(guild_id)['filters'] = DEFAULT_FILTERS.copy()
+        save_partition(guild_id)
+        logger.info(f'Filters reset to default in guild {guild_id}')
         return '✅ تم إعادة ضبط الفلاتر للإعدادات الافتراضية'
     except Exception as e:
         logger.exception(f'Failed to reset filters: {e}')
@@ -0,0 +1,135 @@
+# launcher.py — Multi-Process Shard Launcher
+#
+# Runs bot.py as SHARD_PROCESSES processes that split SHARD_COUNT gateway
+# shards between them, so a large bot can use several cores. Process 0
+# gets shard 0 (and with it the owner's DMs). Crashed processes are
+# restarted with exponential backoff; Ctrl+C / SIGTERM stops them all.
+#
+# Usage: SHARD_COUNT=8 SHARD_PROCESSES=4 python launcher.py
+import os
+import signal
+import subprocess
+import sys
+import time
+from logger import logger
+import state_store
+from config import (
+    TOKEN, GUILD_DATA_DIR, SHARD_IDENTIFY_INTERVAL, SHARD_RESTART_DELAY, SHARD_RESTART_MAX_DELAY
+)
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+STABLE_AFTER = 300  # seconds a process must run before its restart backoff resets
+
+_stopping = False
+
+def plan(shard_count: int, processes: int) -> list:
+    """
+    Split shards into contiguous runs, one per process (process 0 gets shard 0)
+
+    Returns:
+        list: [[shard_id, ...], ...]
+    """
+    processes = max(1, min(processes, shard_count))
+    per, extra = divmod(shard_count, processes)
+    layout = []
+    start = 0
+    for index in range(processes):
+        size = per + (1 if index < extra else 0)
+        layout.append(list(range(start, start + size)))
+        start += size
+    return layout
+
+def _import_files():
+    """Copy db.json and guild settings from a single-process install into the state service"""
+    paths = ['db.json']
+    if os.path.isdir(GUILD_DATA_DIR):
+        paths += [os.path.join(GUILD_DATA_DIR, name) for name in sorted(os.listdir(GUILD_DATA_DIR))
+                  if name.endswith('.json')]
+
+    imported = 0
+    for path in paths:
+        if not os.path.isfile(path) or state_store.get(path) is not None:
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            state_store.put(path, f.read())  # stored as-is (still encrypted if it was)
+        imported += 1
+    if imported:
+        logger.info(f'Imported {imported} store(s) from disk into {state_store.STATE_DB_PATH}')
+
+def _spawn(index: int, shard_ids: list, shard_count: int, processes: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SHARD_COUNT=str(shard_count),
+        SHARD_IDS=','.join(map(str, shard_ids)),
+        SHARD_PROCESS=str(index),
+        SHARD_PROCESSES=str(processes)
+    )
+    child = subprocess.Popen([sys.executable, BOT_SCRIPT], env=env)
+    logger.info(f'Shard process {index} started (pid {child.pid}, shards {shard_ids})')
+    return child
+
+def _stop(signum, frame):
+    global _stopping
+    _stopping = True
+
+def main():
+    if TOKEN is None:
+        raise SystemExit('❌ TOKEN not set. Please set it in environment variables.')
+
+    shard_count = int(os.getenv('SHARD_COUNT') or os.cpu_count() or 1)
+    processes = int(os.getenv('SHARD_PROCESSES') or min(os.cpu_count() or 1, shard_count))
+    layout = plan(shard_count, processes)
+    processes = len(layout)
+    logger.info(f'Launching {shard_count} shard(s) in {processes} process(es): {layout}')
+
+    _import_files()
+    state_store.reset_session()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    children = {}  # {index: Popen}
+    started = {}  # {index: monotonic start time}
+    failures = {}  # {index: consecutive quick crashes}
+    restart_at = {}  # {index: monotonic time to restart}
+
+    # Stagger starts so the processes don't identify at the same time
+    for index, shard_ids in enumerate(layout):
+        restart_at[index] = time.monotonic() + sum(len(run) for run in layout[:index]) * SHARD_IDENTIFY_INTERVAL
+
+    while not _stopping:
+        now = time.monotonic()
+        for index, shard_ids in enumerate(layout):
+            child = children.get(index)
+            if child is None:
+                if now >= restart_at[index]:
+                    children[index] = _spawn(index, shard_ids, shard_count, processes)
+                    started[index] = now
+                continue
+
+            code = child.poll()
+            if code is None:
+                continue
+
+            del children[index]
+            if now - started[index] >= STABLE_AFTER:
+                failures[index] = 0
+            delay = min(SHARD_RESTART_DELAY * 2 ** failures.get(index, 0), SHARD_RESTART_MAX_DELAY)
+            failures[index] = failures.get(index, 0) + 1
+            restart_at[index] = now + delay
+            logger.error(f'Shard process {index} exited with code {code}; restarting in {delay}s')
+        time.sleep(1)
+
+    logger.info('Stopping shard processes...')
+    for child in children.values():
+        child.terminate()
+    deadline = time.monotonic() + 15
+    for child in children.values():
+        try:
+            child.wait(timeout=max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            child.kill()
+    logger.info('All shard processes stopped')
+
+if __name__ == '__main__':
+    main()
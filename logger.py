@@ -1,7 +1,116 @@
 # logger.py — Ultimate Logging System
+#
+# Records are handed to a queue on the calling thread and written by a
+# listener thread, so file I/O and rotation never run on the event loop.
+# Each call site is rate limited, so a raid can't flood the disk.
+import atexit
+import contextvars
+import copy
+import datetime
+import json
 import logging
+import queue
 import sys
-from config import LOG_FILE, LOG_LEVEL, LOG_TO_CONSOLE
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import (
+    LOG_FILE, LOG_LEVEL, LOG_TO_CONSOLE, LOG_JSON, LOG_JSON_FILE,
+    LOG_QUEUE_SIZE, LOG_RATE_LIMIT, LOG_RATE_WINDOW
+)
+
+# Event being handled on this task: (event type, guild id, target id, received_at)
+# Set by the pipeline around each monitor handler, stamped onto every record
+log_context = contextvars.ContextVar('log_context', default=None)
+
+# Records that never reached a handler: {reason: count}
+dropped = {'rate_limited': 0, 'queue_full': 0}
+
+# ============= CALLER SIDE =============
+class CallSiteRateLimit(logging.Filter):
+    """
+    Let at most LOG_RATE_LIMIT records per LOG_RATE_WINDOW seconds through
+    from each call site (file + line). The first record after a quiet
+    window carries how many were suppressed. CRITICAL is never limited.
+    """
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites = {}  # {(pathname, lineno): [window start, count, suppressed]}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.CRITICAL:
+            return True
+
+        now = time.monotonic()
+        site = self._sites.get((record.pathname, record.lineno))
+        if site is None:
+            self._sites[(record.pathname, record.lineno)] = [now, 1, 0]
+            return True
+
+        if now - site[0] >= self.window:
+            if site[2]:
+                record.suppressed = site[2]
+            site[0], site[1], site[2] = now, 1, 0
+            return True
+
+        if site[1] < self.limit:
+            site[1] += 1
+            return True
+
+        site[2] += 1
+        dropped['rate_limited'] += 1
+        return False
+
+class _ContextQueueHandler(QueueHandler):
+    """Queue records without blocking, stamped with the current event context"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may change after this call returns) but leave
+        # the layout to the listener thread
+        message = record.getMessage()
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            message += f' ({suppressed} similar messages suppressed)'
+        if record.exc_info and not record.exc_text:
+            record.exc_text = formatter.formatException(record.exc_info)
+
+        record = copy.copy(record)
+        record.msg = message
+        record.message = message
+        record.args = None
+        record.exc_info = None
+
+        context = log_context.get()
+        if context is not None and getattr(record, 'event', None) is None:
+            record.event, record.guild, record.target, received_at = context
+            record.latency_ms = round((time.perf_counter() - received_at) * 1000, 1)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped['queue_full'] += 1
+
+# ============= WRITER SIDE =============
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line with a fixed set of keys (null when unknown)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'msg': record.getMessage(),
+            'event': getattr(record, 'event', None),
+            'guild': getattr(record, 'guild', None),
+            'target': getattr(record, 'target', None),
+            'latency_ms': getattr(record, 'latency_ms', None),
+            'suppressed': getattr(record, 'suppressed', 0),
+            'source': f'{record.module}:{record.lineno}',
+            'exc': record.exc_text
+        }, ensure_ascii=False, default=str)
 
 # Create logger
 logger = logging.getLogger('q_bot')
@@ -17,9 +126,10 @@ formatter = logging.Formatter(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+handlers = []
+
 # File handler with rotation
 try:
-    from logging.handlers import RotatingFileHandler
     file_handler = RotatingFileHandler(
         LOG_FILE,
         maxBytes=10*1024*1024,  # 10MB
@@ -28,16 +138,41 @@ try:
     )
     file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    handlers.append(file_handler)
 except Exception as e:
     print(f'⚠️  Failed to create file handler: {e}')
 
+# Structured JSON lines (optional)
+if LOG_JSON:
+    try:
+        json_handler = RotatingFileHandler(
+            LOG_JSON_FILE,
+            maxBytes=10*1024*1024,  # 10MB
+            backupCount=5,
+            encoding='utf-8'
+        )
+        json_handler.setLevel(logging.INFO)
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+    except Exception as e:
+        print(f'⚠️  Failed to create JSON log handler: {e}')
+
 # Console handler
 if LOG_TO_CONSOLE:
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
+
+# Everything above is written from the listener thread
+_queue = queue.Queue(LOG_QUEUE_SIZE)
+queue_handler = _ContextQueueHandler(_queue)
+queue_handler.addFilter(CallSiteRateLimit(LOG_RATE_LIMIT, LOG_RATE_WINDOW))
+logger.addHandler(queue_handler)
+
+listener = QueueListener(_queue, *handlers, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)  # flush what's queued before logging shuts down
 
 # Suppress discord.py verbose logging
 logging.getLogger('discord').setLevel(logging.WARNING)
@@ -0,0 +1,213 @@
+# loop_watchdog.py — Event Loop Lag Watchdog
+#
+# A loop task ticks every WATCHDOG_INTERVAL and measures how late it woke.
+# A helper thread watches the ticks: when they stop for longer than
+# WATCHDOG_THRESHOLD, the loop is blocked, so the thread grabs the loop
+# thread's stack (sys._current_frames) to see who is blocking it.
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from logger import logger
+from perf import Histogram
+from config import (
+    WATCHDOG_INTERVAL, WATCHDOG_THRESHOLD, WATCHDOG_ALERT_STALLS,
+    WATCHDOG_ALERT_WINDOW, WATCHDOG_ALERT_COOLDOWN, WATCHDOG_MAX_OFFENDERS
+)
+
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+_bot = None
+_task = None
+_thread = None
+_stop_event = threading.Event()
+_loop_thread_id = None
+
+_last_tick = 0.0  # monotonic time of the last tick, written by the loop
+_pending = None  # (offender key, stack text) captured during the current stall
+_lock = threading.Lock()
+
+# Lag statistics
+lag_histogram = Histogram()
+current_lag = 0.0
+max_lag = 0.0
+
+_offenders = {}  # {key: {'label', 'count', 'total', 'worst', 'stack'}}
+_recent_stalls = []  # monotonic times of recent stalls (for the alert)
+_last_alert = 0.0
+_alert_tasks = set()  # stall alerts being sent
+
+# ============= STACK CAPTURE =============
+def _attribute(frame) -> tuple:
+    """
+    Pick the frame to blame: the innermost one in the bot's own code
+
+    Returns:
+        tuple: (key, label, stack text)
+    """
+    stack = traceback.extract_stack(frame)
+    blamed = stack[-1]
+    for entry in reversed(stack):
+        if entry.filename.startswith(_REPO_DIR) and not entry.filename.endswith('loop_watchdog.py'):
+            blamed = entry
+            break
+
+    filename = os.path.relpath(blamed.filename, _REPO_DIR) if blamed.filename.startswith(_REPO_DIR) else os.path.basename(blamed.filename)
+    label = f'{blamed.name} ({filename}:{blamed.lineno})'
+    text = ''.join(traceback.format_list(stack[-12:]))
+    return (blamed.filename, blamed.lineno, blamed.name), label, text
+
+def _watch():
+    """Helper thread: capture the loop thread's stack while it is stalled"""
+    global _pending
+    while not _stop_event.wait(WATCHDOG_INTERVAL / 2):
+        if _pending is not None or time.monotonic() - _last_tick < WATCHDOG_THRESHOLD:
+            continue
+
+        frame = sys._current_frames().get(_loop_thread_id)
+        if frame is None:
+            continue
+        try:
+            _pending = _attribute(frame)
+        finally:
+            del frame
+
+# ============= LAG TRACKING =============
+def _record_stall(lag: float):
+    """Attribute a finished stall to what the helper thread caught"""
+    global _pending
+
+    pending, _pending = _pending, None
+    if pending is None:
+        # Blocked for less than the thread's poll, or in a C call holding the GIL
+        key, label, stack = ('?', 0, 'unknown'), 'unknown (not caught in time)', ''
+    else:
+        key, label, stack = pending
+
+    with _lock:
+        offender = _offenders.get(key)
+        if offender is None:
+            if len(_offenders) >= WATCHDOG_MAX_OFFENDERS:
+                # Forget the offender with the least total stall time
+                del _offenders[min(_offenders, key=lambda k: _offenders[k]['total'])]
+            offender = _offenders[key] = {'label': label, 'count': 0, 'total': 0.0, 'worst': 0.0, 'stack': stack}
+        offender['count'] += 1
+        offender['total'] += lag
+        if lag >= offender['worst']:
+            offender['worst'] = lag
+            offender['stack'] = stack or offender['stack']
+
+    logger.warning(f'Event loop blocked for {lag * 1000:.0f}ms by {label}' + (f'\n{stack}' if stack else ''))
+
+async def _tick():
+    """Loop task: measure how late each wake-up is"""
+    global _last_tick, _pending, current_lag, max_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + WATCHDOG_INTERVAL
+        _last_tick = time.monotonic()
+        await asyncio.sleep(WATCHDOG_INTERVAL)
+        current_lag = max(0.0, loop.time() - expected)
+        lag_histogram.record(current_lag)
+        if current_lag > max_lag:
+            max_lag = current_lag
+
+        if current_lag >= WATCHDOG_THRESHOLD:
+            _record_stall(current_lag)
+            await _maybe_alert()
+        else:
+            # A capture from a stall that ended just under the threshold
+            _pending = None
+
+async def _maybe_alert():
+    """Alert the owner when the loop keeps stalling"""
+    global _last_alert
+    now = time.monotonic()
+    _recent_stalls.append(now)
+    while _recent_stalls and _recent_stalls[0] < now - WATCHDOG_ALERT_WINDOW:
+        _recent_stalls.pop(0)
+
+    if len(_recent_stalls) < WATCHDOG_ALERT_STALLS or now - _last_alert < WATCHDOG_ALERT_COOLDOWN:
+        return
+    _last_alert = now
+
+    from dm_notify import alert_warning
+    details_lines = [
+        f"**Stalls:** {len(_recent_stalls)} over {WATCHDOG_ALERT_WINDOW}s (threshold {WATCHDOG_THRESHOLD * 1000:.0f}ms)",
+        f"**Worst lag:** {max_lag * 1000:.0f}ms",
+        "\n**Top offenders:**"
+    ]
+    details_lines.extend(
+        f"• `{offender['label']}` — {offender['count']}× (worst {offender['worst'] * 1000:.0f}ms)"
+        for offender in get_offenders()[:5]
+    )
+    task = asyncio.create_task(alert_warning(_bot, "Event Loop Stalling", '\n'.join(details_lines)))
+    _alert_tasks.add(task)
+    task.add_done_callback(_alert_tasks.discard)
+
+# ============= REPORT =============
+def get_offenders() -> list:
+    """Get offenders, worst total stall time first"""
+    with _lock:
+        offenders = [dict(offender) for offender in _offenders.values()]
+    offenders.sort(key=lambda offender: offender['total'], reverse=True)
+    return offenders
+
+def format_offenders(limit: int = 10) -> str:
+    """Get the loop lag summary and top offenders for .perf"""
+    lines = [
+        f"**🐢 Event Loop Lag** p50 {lag_histogram.percentile(50) * 1000:.1f} / "
+        f"p99 {lag_histogram.percentile(99) * 1000:.1f} / max {max_lag * 1000:.0f} ms"
+    ]
+    offenders = get_offenders()
+    if not offenders:
+        lines.append(f'No stalls over {WATCHDOG_THRESHOLD * 1000:.0f}ms')
+        return '\n'.join(lines)
+
+    rows = [f"{'blocked by':<44} {'count':>6} {'total':>8} {'worst':>7}"]
+    rows.extend(
+        f"{offender['label'][:44]:<44} {offender['count']:>6} {offender['total'] * 1000:>8.0f} {offender['worst'] * 1000:>7.0f}"
+        for offender in offenders[:limit]
+    )
+    block = '\n'.join(rows)
+    lines.append(f"```\n{block[:1800]}\n```")
+    return '\n'.join(lines)
+
+def reset():
+    """Clear lag statistics and offenders"""
+    global lag_histogram, max_lag
+    lag_histogram = Histogram()
+    max_lag = 0.0
+    with _lock:
+        _offenders.clear()
+    _recent_stalls.clear()
+
+# ============= LIFECYCLE =============
+def start(bot):
+    """Start the tick task and the helper thread"""
+    global _bot, _task, _thread, _loop_thread_id, _last_tick
+
+    if _task is not None:
+        return
+
+    _bot = bot
+    _loop_thread_id = threading.get_ident()
+    _last_tick = time.monotonic()
+    _stop_event.clear()
+    _task = asyncio.create_task(_tick())
+    _thread = threading.Thread(target=_watch, name='loop-watchdog', daemon=True)
+    _thread.start()
+    logger.info(f'Event loop watchdog started (threshold {WATCHDOG_THRESHOLD * 1000:.0f}ms)')
+
+def stop():
+    """Stop the watchdog"""
+    global _task, _thread
+    _stop_event.set()
+    if _task is not None:
+        _task.cancel()
+        _task = None
+    if _thread is not None:
+        _thread.join(timeout=1)
+        _thread = None
@@ -1,47 +1,145 @@
 # mask.py — Auto-Reply Mask System
+#
+# on_message sees every guild message, so mask channels are indexed in
+# memory by channel id: a message anywhere else costs one dict lookup.
+# Each mask channel has its own reply template (or the guild's default)
+# and cooldown; the index is changed together with the stored settings.
+import time
+from typing import NamedTuple
 import discord
-from db_manager import load_db, save_db
+from db_manager import get_partition, save_partition
 from logger import logger
-from config import GUILD_ID
+from config import MASK_DEFAULT_REPLY, MASK_REPLY_COOLDOWN
 
-def set_mask_channel_by_id(channel_id: int):
-    """Set mask channel (used by slash command)"""
-    db = load_db()
-    db['mask']['channel_id'] = str(channel_id)
-    save_db(db)
-    logger.info(f"Mask channel set to {channel_id}")
+# Placeholders a reply template can use
+PLACEHOLDERS = ('{user}', '{name}', '{channel}', '{server}')
 
+class MaskChannel(NamedTuple):
+    guild_id: int
+    template: str
+    cooldown: float  # seconds between replies in the channel
+
+    def render(self, message: discord.Message) -> str:
+        """Fill in the template's placeholders for a message"""
+        if '{' not in self.template:
+            return self.template
+        return (self.template
+                .replace('{user}', message.author.mention)
+                .replace('{name}', message.author.display_name)
+                .replace('{channel}', message.channel.mention)
+                .replace('{server}', message.guild.name))
+
+_MENTIONS = discord.AllowedMentions(everyone=False, roles=False, users=True)
+
+channels = {}  # {channel_id: MaskChannel} for every mask channel of the loaded guilds
+_last_reply = {}  # {channel_id: monotonic time of the last reply}
+
+# Replies since startup (exported by metrics_server): {outcome: count}
+reply_counters = {'sent': 0, 'rate_limited': 0, 'failed': 0}
+
+# ============= SETTINGS =============
+def _settings(guild_id: int) -> dict:
+    """Get a guild's mask settings, upgrading the single-channel format"""
+    mask = get_partition(guild_id)['mask']
+    if 'channels' not in mask:
+        channel_id = mask.pop('channel_id', None)
+        mask.setdefault('reply_text', MASK_DEFAULT_REPLY)
+        mask['channels'] = {str(channel_id): {}} if channel_id is not None else {}
+        save_partition(guild_id)
+    return mask
+
+def load_guild(guild_id: int):
+    """Index a guild's mask channels (again, replacing what was indexed for it)"""
+    for channel_id in [channel_id for channel_id, entry in channels.items() if entry.guild_id == guild_id]:
+        del channels[channel_id]
+
+    mask = _settings(guild_id)
+    for channel_id, options in mask['channels'].items():
+        channels[int(channel_id)] = MaskChannel(
+            guild_id,
+            options.get('reply_text') or mask.get('reply_text') or MASK_DEFAULT_REPLY,
+            options.get('cooldown', MASK_REPLY_COOLDOWN)
+        )
+
+def get_channels(guild_id: int) -> dict:
+    """Get a guild's indexed mask channels: {channel_id: MaskChannel}"""
+    return {channel_id: entry for channel_id, entry in channels.items() if entry.guild_id == guild_id}
+
+def set_channel(guild_id: int, channel_id: int, reply_text: str = None):
+    """Add a mask channel (or change its reply; None keeps its reply, or uses the guild default)"""
+    mask = _settings(guild_id)
+    options = mask['channels'].setdefault(str(channel_id), {})
+    if reply_text:
+        options['reply_text'] = reply_text
+    save_partition(guild_id)
+    load_guild(guild_id)
+    logger.info(f'Mask channel {channel_id} set in guild {guild_id}')
+
+def set_cooldown(guild_id: int, channel_id: int, seconds: float) -> bool:
+    """
+    Set the seconds between replies in a mask channel
+
+    Returns:
+        bool: False if the channel is not a mask channel
+    """
+    mask = _settings(guild_id)
+    options = mask['channels'].get(str(channel_id))
+    if options is None:
+        return False
+    options['cooldown'] = seconds
+    save_partition(guild_id)
+    load_guild(guild_id)
+    return True
+
+def set_default_reply(guild_id: int, reply_text: str):
+    """Set the reply used by mask channels without their own"""
+    _settings(guild_id)['reply_text'] = reply_text
+    save_partition(guild_id)
+    load_guild(guild_id)
+
+def remove_channel(guild_id: int, channel_id: int) -> bool:
+    """
+    Stop replying in a mask channel
+
+    Returns:
+        bool: False if the channel was not a mask channel
+    """
+    mask = _settings(guild_id)
+    if mask['channels'].pop(str(channel_id), None) is None:
+        return False
+    save_partition(guild_id)
+    load_guild(guild_id)
+    _last_reply.pop(channel_id, None)
+    return True
+
+def clear(guild_id: int):
+    """Remove every mask channel and reset the default reply"""
+    get_partition(guild_id)['mask'] = {'reply_text': MASK_DEFAULT_REPLY, 'channels': {}}
+    save_partition(guild_id)
+    load_guild(guild_id)
+
+def set_mask_channel_by_id(guild_id: int, channel_id: int):
+    """Add a guild mask channel (used by slash command)"""
+    set_channel(guild_id, channel_id)
+
+# ============= AUTO-REPLY =============
 async def on_message_mask(bot, message: discord.Message):
-    """Handle mask auto-reply"""
-    # Only in guild channels
-    if message.guild is None:
+    """Handle mask auto-reply (callers check `message.channel.id in channels` first)"""
+    entry = channels.get(message.channel.id)
+    if entry is None or message.author.bot:
         return
-    
-    # Check guild
-    if GUILD_ID and message.guild.id != GUILD_ID:
-        return
-    
-    # Ignore bots
-    if message.author.bot:
-        return
-    
-    # Get mask settings
-    db = load_db()
-    mask_channel_id = db.get('mask', {}).get('channel_id')
-    
-    if mask_channel_id is None:
-        return
-    
-    # Check if message is in mask channel
-    if str(message.channel.id) != str(mask_channel_id):
+
+    now = time.monotonic()
+    if now - _last_reply.get(message.channel.id, float('-inf')) < entry.cooldown:
+        reply_counters['rate_limited'] += 1
         return
-    
-    # Get reply text
-    reply_text = db.get('mask', {}).get('reply_text') or '━━━━━━━━━━━━'
-    
-    # Send reply
+    _last_reply[message.channel.id] = now
+
     try:
-        await message.channel.send(reply_text)
+        # Names in the template must not turn into @everyone or role pings
+        await message.channel.send(entry.render(message), allowed_mentions=_MENTIONS)
+        reply_counters['sent'] += 1
         logger.info(f'Mask replied in channel {message.channel.id} for message {message.id}')
     except Exception as e:
+        reply_counters['failed'] += 1
         logger.exception(f'Mask reply failed: {e}')
@@ -0,0 +1,235 @@
+# member_counters.py — Incremental Member Counters & Daily Rollups
+#
+# .members and .stats read counters instead of scanning guild.members.
+# They are built once per guild at ready (one pass over the cached
+# members) and then kept current from join, leave, update and presence
+# events:
+#   - bots and online members are plain counts (online needs the presence
+#     intent, TRACK_PRESENCE, and is unknown without it);
+#   - recently joined and suspicious members expire with time, so each is
+#     a {member_id: expiry} dict with a heap of expiries, pruned lazily
+#     when read.
+# Joins, leaves and the member count are also rolled up per UTC day in
+# the guild's stats (the last MEMBER_TREND_DAYS days), for trend lines.
+# Leaves are rolled up from raw removals: on_member_remove only fires for
+# cached members, and most aren't cached with a reduced member cache.
+# Rollup writes are batched like the catch-up cursor, and flushed when the
+# bot shuts down (bot.py).
+import asyncio
+import datetime
+import heapq
+import math
+import time
+import discord
+from logger import logger
+import db_manager
+from utils import suspicious_until
+from config import TRACK_PRESENCE, MEMBER_RECENT_DAYS, MEMBER_TREND_DAYS, MEMBER_ROLLUP_FLUSH_DELAY
+
+class _Expiring:
+    """Members that stop counting at a set time (math.inf = until removed)"""
+
+    def __init__(self):
+        self._until = {}  # {member_id: expiry}
+        self._heap = []   # (expiry, member_id), including stale ones
+
+    def set(self, member_id: int, until: float):
+        if until is None:
+            self.discard(member_id)
+            return
+        self._until[member_id] = until
+        if until != math.inf:
+            heapq.heappush(self._heap, (until, member_id))
+
+    def discard(self, member_id: int):
+        self._until.pop(member_id, None)
+
+    def count(self, now: float) -> int:
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            until, member_id = heapq.heappop(heap)
+            # Skip entries replaced since (rejoined, avatar changed, left)
+            if self._until.get(member_id) == until:
+                del self._until[member_id]
+        return len(self._until)
+
+class _Counters:
+    __slots__ = ('bots', 'online', 'recent', 'suspicious')
+
+    def __init__(self):
+        self.bots = 0
+        self.online = 0
+        self.recent = _Expiring()
+        self.suspicious = _Expiring()
+
+_counters = {}  # {guild_id: _Counters}
+
+def _online(member: discord.Member) -> bool:
+    return member.status is not discord.Status.offline
+
+def _recent_until(member: discord.Member) -> float:
+    """When a member stops counting as recently joined (None if they already don't)"""
+    if member.joined_at is None:
+        return None
+    until = member.joined_at.timestamp() + MEMBER_RECENT_DAYS * 86400
+    return until if until > time.time() else None
+
+def is_built(guild: discord.Guild) -> bool:
+    """Check if the counters have been built for a guild"""
+    return guild.id in _counters
+
+def build(guild: discord.Guild):
+    """Build a guild's counters from scratch (one pass over cached members)"""
+    started = time.perf_counter()
+    counters = _Counters()
+    for member in guild.members:
+        _add(counters, member)
+    _counters[guild.id] = counters
+
+    elapsed = (time.perf_counter() - started) * 1000
+    logger.info(f'Member counters built for guild {guild.id}: {counters.bots} bots, '
+                f'{counters.recent.count(time.time())} recent ({elapsed:.0f}ms)')
+
+def discard(guild: discord.Guild):
+    """Forget a guild"""
+    _counters.pop(guild.id, None)
+
+# ============= QUERIES =============
+def get_counts(guild: discord.Guild) -> dict:
+    """
+    Get a guild's member counts (humans and bots from the cached members
+    when the member list isn't loaded)
+
+    Returns:
+        dict: total, humans, bots, online (None without presences), recent, suspicious
+    """
+    counters = _counters.get(guild.id)
+    if counters is None:
+        build(guild)
+        counters = _counters[guild.id]
+
+    now = time.time()
+    total = guild.member_count or 0
+    return {
+        'total': total,
+        'humans': max(total - counters.bots, 0),
+        'bots': counters.bots,
+        'online': counters.online if TRACK_PRESENCE else None,
+        'recent': counters.recent.count(now),
+        'suspicious': counters.suspicious.count(now)
+    }
+
+# ============= INCREMENTAL UPDATES =============
+def _add(counters: _Counters, member: discord.Member):
+    counters.bots += member.bot
+    counters.online += _online(member)
+    counters.recent.set(member.id, _recent_until(member))
+    if not member.bot:
+        counters.suspicious.set(member.id, suspicious_until(member))
+
+def on_member_join(member: discord.Member):
+    """Count a new member and roll the join up"""
+    _roll_up(member.guild, joins=1)
+    counters = _counters.get(member.guild.id)
+    # Only cached members can be taken off again when they leave
+    if counters is not None and member.guild.get_member(member.id) is not None:
+        _add(counters, member)
+
+def on_raw_member_remove(guild: discord.Guild):
+    """Roll up a leave (every leave arrives here, cached member or not)"""
+    _roll_up(guild, leaves=1)
+
+def on_member_remove(member: discord.Member):
+    """Uncount a member who left (only cached ones arrive here)"""
+    counters = _counters.get(member.guild.id)
+    if counters is None:
+        return
+    counters.bots -= member.bot
+    counters.online -= _online(member)
+    counters.recent.discard(member.id)
+    counters.suspicious.discard(member.id)
+
+def on_member_update(before: discord.Member, after: discord.Member):
+    """Re-check whether a member looks suspicious (their avatar may have changed)"""
+    counters = _counters.get(after.guild.id)
+    # before shares the user object with after, so avatar changes can't be compared
+    if counters is not None and not after.bot:
+        counters.suspicious.set(after.id, suspicious_until(after))
+
+def on_presence_update(before: discord.Member, after: discord.Member):
+    """Follow members going online and offline"""
+    counters = _counters.get(after.guild.id)
+    if counters is not None:
+        counters.online += _online(after) - _online(before)
+
+# ============= DAILY ROLLUPS =============
+_pending = {}  # {guild_id: {day: [joins, leaves, total]}} not persisted yet
+_flush_task = None
+
+def _today() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d')
+
+def _roll_up(guild: discord.Guild, joins: int = 0, leaves: int = 0):
+    """Add to today's joins/leaves and note the member count (written in batches)"""
+    global _flush_task
+    day = _pending.setdefault(guild.id, {}).setdefault(_today(), [0, 0, 0])
+    day[0] += joins
+    day[1] += leaves
+    day[2] = guild.member_count or 0
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_delayed_flush())
+
+def flush():
+    """Persist pending rollups into each guild's stats, keeping MEMBER_TREND_DAYS days"""
+    for guild_id, days in list(_pending.items()):
+        try:
+            stats = db_manager.get_partition(guild_id)['stats']
+            rollups = stats.setdefault('member_days', {})
+            for day, (joins, leaves, total) in days.items():
+                stored = rollups.setdefault(day, {'joins': 0, 'leaves': 0, 'total': 0})
+                stored['joins'] += joins
+                stored['leaves'] += leaves
+                stored['total'] = total
+            for day in sorted(rollups)[:-MEMBER_TREND_DAYS]:
+                del rollups[day]
+            db_manager.save_partition(guild_id)
+        except Exception as e:
+            logger.exception(f'Failed to save member rollups for guild {guild_id}: {e}')
+        _pending.pop(guild_id, None)
+
+async def _delayed_flush():
+    await asyncio.sleep(MEMBER_ROLLUP_FLUSH_DELAY)
+    flush()
+
+def get_trend(guild: discord.Guild, days: int) -> dict:
+    """
+    Sum a guild's rollups over the last `days` days (today included)
+
+    Returns:
+        dict: joins, leaves, net, totals (member count per day with data, oldest first)
+    """
+    stored = db_manager.get_partition(guild.id)['stats'].get('member_days', {})
+    rollups = {day: [entry['joins'], entry['leaves'], entry['total']] for day, entry in stored.items()}
+    for day, (joins, leaves, total) in _pending.get(guild.id, {}).items():
+        entry = rollups.setdefault(day, [0, 0, 0])
+        entry[0] += joins
+        entry[1] += leaves
+        entry[2] = total
+
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    first = (today - datetime.timedelta(days=days - 1)).isoformat()
+    window = [rollups[day] for day in sorted(rollups) if day >= first]
+    joins = sum(entry[0] for entry in window)
+    leaves = sum(entry[1] for entry in window)
+    return {'joins': joins, 'leaves': leaves, 'net': joins - leaves, 'totals': [entry[2] for entry in window]}
+
+_SPARKS = '▁▂▃▄▅▆▇█'
+
+def sparkline(values: list) -> str:
+    """Draw values as a row of block characters"""
+    if not values:
+        return ''
+    low, high = min(values), max(values)
+    if high == low:
+        return _SPARKS[3] * len(values)
+    return ''.join(_SPARKS[(value - low) * (len(_SPARKS) - 1) // (high - low)] for value in values)
@@ -0,0 +1,239 @@
+# metrics_server.py — Prometheus Metrics Endpoint (localhost, optional)
+#
+# Serves GET /metrics in the Prometheus text exposition format. Every value
+# is read straight from the module that owns it, so a scrape only costs
+# the rendering itself.
+import asyncio
+import math
+import time
+from logger import logger, dropped as log_dropped
+import perf
+import loop_watchdog
+from config import METRICS_HOST, METRICS_PORT
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Histogram bucket bounds (seconds) exported from the perf histograms
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Last perf bucket index that fits under each bound, computed once
+_BUCKET_LIMITS = []
+for _le in LATENCY_BUCKETS:
+    _index = perf._bucket_of(int(_le * 1e6))
+    if perf._bucket_high(_index) > _le * 1e6:
+        _index -= 1
+    _BUCKET_LIMITS.append((repr(_le), _index))
+
+_bot = None
+_server = None
+_started = time.time()
+_labels = {}  # {(kind, name): rendered label set}
+
+# ============= RENDERING =============
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_set(kind: str, name: str) -> str:
+    labels = _labels.get((kind, name))
+    if labels is None:
+        labels = _labels[(kind, name)] = f'kind="{kind}",name="{_escape(name)}"'
+    return labels
+
+def _render_latency(out: list):
+    out.append('# HELP qbot_latency_seconds Latency of gateway events, monitors, sub-phases and DM commands')
+    out.append('# TYPE qbot_latency_seconds histogram')
+    histograms = perf.get_histograms()
+    for (kind, name), histogram in histograms.items():
+        labels = _label_set(kind, name)
+        counts = histogram.counts
+        cumulative = 0
+        index = 0
+        for le, limit in _BUCKET_LIMITS:
+            while index <= limit:
+                cumulative += counts[index]
+                index += 1
+            out.append(f'qbot_latency_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        out.append(f'qbot_latency_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        out.append(f'qbot_latency_seconds_sum{{{labels}}} {histogram.total}')
+        out.append(f'qbot_latency_seconds_count{{{labels}}} {histogram.count}')
+
+    out.append('# HELP qbot_errors_total Errors raised or logged inside a timed handler')
+    out.append('# TYPE qbot_errors_total counter')
+    for (kind, name), histogram in histograms.items():
+        out.append(f'qbot_errors_total{{{_label_set(kind, name)}}} {histogram.errors}')
+
+def _render_pipeline(out: list):
+    import pipeline
+
+    out.append('# HELP qbot_pipeline_queue_depth Items waiting in a pipeline stage (notify holds pending alerts)')
+    out.append('# TYPE qbot_pipeline_queue_depth gauge')
+    for name, stage in pipeline._stages.items():
+        out.append(f'qbot_pipeline_queue_depth{{stage="{name}"}} {stage.buffer.qsize()}')
+
+    out.append('# HELP qbot_pipeline_processed_total Items processed by a pipeline stage')
+    out.append('# TYPE qbot_pipeline_processed_total counter')
+    for name, stage in pipeline._stages.items():
+        out.append(f'qbot_pipeline_processed_total{{stage="{name}"}} {stage.processed}')
+
+    out.append('# HELP qbot_pipeline_dropped_total Items shed by a pipeline stage')
+    out.append('# TYPE qbot_pipeline_dropped_total counter')
+    for name, stage in pipeline._stages.items():
+        for rank, rank_name in enumerate(pipeline.RANK_NAMES):
+            out.append(f'qbot_pipeline_dropped_total{{stage="{name}",rank="{rank_name}"}} {stage.dropped[rank]}')
+
+    out.append('# HELP qbot_pipeline_errors_total Stage handler failures')
+    out.append('# TYPE qbot_pipeline_errors_total counter')
+    for name, stage in pipeline._stages.items():
+        out.append(f'qbot_pipeline_errors_total{{stage="{name}"}} {stage.errors}')
+
+def _render_counters(out: list):
+    import commands
+    import db_manager
+    import dm_notify
+    import mask
+    import sharding
+
+    out.append('# HELP qbot_stat_increments_total increment_stat calls since startup')
+    out.append('# TYPE qbot_stat_increments_total counter')
+    for (guild_id, stat), count in db_manager.stat_increments.items():
+        out.append(f'qbot_stat_increments_total{{guild="{guild_id or ""}",stat="{_escape(stat)}"}} {count}')
+
+    out.append('# HELP qbot_alerts_total Owner alerts by outcome (rate_limited = dropped by the rate limiter)')
+    out.append('# TYPE qbot_alerts_total counter')
+    for outcome, count in dm_notify.alert_counters.items():
+        out.append(f'qbot_alerts_total{{outcome="{outcome}"}} {count}')
+
+    out.append('# HELP qbot_mask_replies_total Mask auto-replies by outcome (rate_limited = within the channel cooldown)')
+    out.append('# TYPE qbot_mask_replies_total counter')
+    for outcome, count in mask.reply_counters.items():
+        out.append(f'qbot_mask_replies_total{{outcome="{outcome}"}} {count}')
+
+    out.append('# HELP qbot_command_busy_total DM commands turned away by their concurrency limit')
+    out.append('# TYPE qbot_command_busy_total counter')
+    for name, count in commands.busy_counters.items():
+        out.append(f'qbot_command_busy_total{{command="{name}"}} {count}')
+
+    out.append('# HELP qbot_shard_forwarded_total Work handed to another shard process through the outbox')
+    out.append('# TYPE qbot_shard_forwarded_total counter')
+    for kind, count in sharding.forwarded.items():
+        out.append(f'qbot_shard_forwarded_total{{kind="{kind}"}} {count}')
+
+    out.append('# HELP qbot_shard_received_total Work run for another shard process')
+    out.append('# TYPE qbot_shard_received_total counter')
+    for kind, count in sharding.received.items():
+        out.append(f'qbot_shard_received_total{{kind="{kind}"}} {count}')
+
+    out.append('# HELP qbot_log_records_dropped_total Log records never written (per-call-site rate limit or full queue)')
+    out.append('# TYPE qbot_log_records_dropped_total counter')
+    for reason, count in log_dropped.items():
+        out.append(f'qbot_log_records_dropped_total{{reason="{reason}"}} {count}')
+
+def _render_caches(out: list):
+    import channel_perms
+    import mask
+    import monitors
+    import paginator
+    import permissions
+    import quick_actions
+    import risk_index
+
+    # guild._members is the member cache itself (guild.members copies it)
+    members = sum(len(guild._members) for guild in _bot.guilds) if _bot else 0
+    sizes = (
+        ('members', members),
+        ('risk_roles', sum(len(roles) for roles in risk_index._roles.values())),
+        ('risk_members', sum(len(ranks) for ranks in risk_index._members.values())),
+        ('channel_perm_values', sum(len(values) for guild_values in channel_perms._values.values()
+                                    for values in guild_values.values())),
+        ('channel_perm_signatures', sum(len(groups) for groups in channel_perms._groups.values())),
+        ('permission_analysis', permissions._analyze_value.cache_info().currsize),
+        ('permission_changes', permissions._changes_for.cache_info().currsize),
+        ('invites', sum(len(uses) for uses in monitors._invite_cache.values())),
+        ('quick_actions', len(quick_actions.pending_actions)),
+        ('mask_channels', len(mask.channels)),
+        ('paginators', paginator.open_count()),
+    )
+
+    out.append('# HELP qbot_cache_entries Entries held by an in-memory cache')
+    out.append('# TYPE qbot_cache_entries gauge')
+    for cache, size in sizes:
+        out.append(f'qbot_cache_entries{{cache="{cache}"}} {size}')
+
+def _render_runtime(out: list):
+    latency = _bot.latency if _bot else math.nan
+    out.append('# HELP qbot_gateway_latency_seconds Gateway heartbeat latency (bot.latency)')
+    out.append('# TYPE qbot_gateway_latency_seconds gauge')
+    out.append(f'qbot_gateway_latency_seconds {latency if math.isfinite(latency) else "NaN"}')
+
+    out.append('# HELP qbot_event_loop_lag_seconds How late the event loop woke the last watchdog tick')
+    out.append('# TYPE qbot_event_loop_lag_seconds gauge')
+    out.append(f'qbot_event_loop_lag_seconds {loop_watchdog.current_lag}')
+    out.append('# HELP qbot_event_loop_lag_max_seconds Worst event loop lag since startup (or .perf reset)')
+    out.append('# TYPE qbot_event_loop_lag_max_seconds gauge')
+    out.append(f'qbot_event_loop_lag_max_seconds {loop_watchdog.max_lag}')
+
+    out.append('# HELP qbot_start_time_seconds Process start time (unix)')
+    out.append('# TYPE qbot_start_time_seconds gauge')
+    out.append(f'qbot_start_time_seconds {_started}')
+
+def render() -> str:
+    """Render every metric in the Prometheus text format"""
+    out = []
+    _render_runtime(out)
+    _render_counters(out)
+    _render_pipeline(out)
+    _render_caches(out)
+    _render_latency(out)
+    out.append('')
+    return '\n'.join(out)
+
+# ============= HTTP =============
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Answer one request and close the connection"""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Drain the headers
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?', 1)[0] == '/metrics':
+            body = render().encode('utf-8')
+            status = '200 OK'
+            content_type = CONTENT_TYPE
+        else:
+            body = b'Not Found\n'
+            status = '404 Not Found'
+            content_type = 'text/plain'
+
+        writer.write(
+            f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.debug(f'Metrics request failed: {e}')
+    finally:
+        writer.close()
+
+async def start(bot):
+    """Start the metrics listener"""
+    global _bot, _server
+
+    if _server is not None:
+        return
+
+    _bot = bot
+    _server = await asyncio.start_server(_handle, METRICS_HOST, METRICS_PORT)
+    logger.info(f'Metrics endpoint listening on http://{METRICS_HOST}:{METRICS_PORT}/metrics')
+
+async def stop():
+    """Stop the listener"""
+    global _server
+
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -1,4 +1,5 @@
 # monitors.py — ULTIMATE Server Monitoring System
+import asyncio
 import discord
 from logger import logger
 from dm_notify import alert, alert_critical, alert_warning, alert_info
@@ -6,19 +7,30 @@ from db_manager import add_to_audit_log, increment_stat, is_watched, is_whitelis
 from filters import should_alert, get_priority
 from permissions import analyze_permissions, format_role_info, check_member_can_harm
 from quick_actions import create_quick_action
+from pipeline import EventSpec, persist, notify, defer
+import risk_index
+from channel_perms import get_overwrite_deltas
+from perf import timed, phase
 from utils import *
-from config import GUILD_ID
+from config import GUILD_IDS, INVITE_REFRESH_DELAY, INVITE_ATTRIBUTION_TIMEOUT, MAX_OVERWRITE_DELTAS
 
 # ============= BOT ADDITION MONITOR =============
+@timed()
 async def handle_member_join(bot, member: discord.Member):
     """Monitor when members/bots join"""
     try:
         # Skip if not our guild
-        if GUILD_ID and member.guild.id != GUILD_ID:
+        if GUILD_IDS and member.guild.id not in GUILD_IDS:
             return
         
+        # Every human join consumes an invite use, so register it even when
+        # the member is whitelisted to keep the use counts in step
+        invite_future = None
+        if not member.bot:
+            invite_future = register_join(member)
+        
         # Check if whitelisted
-        if is_whitelisted(member.id):
+        if is_whitelisted(member.guild.id, member.id):
             logger.debug(f'Whitelisted member joined: {member.id}')
             return
         
@@ -28,8 +40,8 @@ async def handle_member_join(bot, member: discord.Member):
             return
         
         # Regular member join
-        if should_alert('members', member.id):
-            await _handle_regular_member_join(bot, member)
+        if should_alert(member.guild.id, 'members', member.id):
+            await _handle_regular_member_join(bot, member, invite_future)
     
     except Exception as e:
         logger.exception(f'handle_member_join failed: {e}')
@@ -47,11 +59,12 @@ async def _handle_bot_addition(bot, member: discord.Member):
         # Get who added the bot (from audit log)
         adder = None
         try:
-            async for entry in guild.audit_logs(limit=20, action=discord.AuditLogAction.bot_add):
-                if entry.target and entry.target.id == member.id:
-                    adder = entry.user
-                    details_lines.append(f"**Added by:** {format_user(adder)}")
-                    break
+            with phase('audit_log.fetch'):
+                async for entry in guild.audit_logs(limit=20, action=discord.AuditLogAction.bot_add):
+                    if entry.target and entry.target.id == member.id:
+                        adder = entry.user
+                        details_lines.append(f"**Added by:** {format_user(adder)}")
+                        break
         except Exception as e:
             logger.warning(f'Could not read audit log: {e}')
             details_lines.append("**Added by:** Unknown (no audit log access)")
@@ -69,7 +82,8 @@ async def _handle_bot_addition(bot, member: discord.Member):
             details_lines.append("**Roles:** None")
         
         # Add to audit log
-        add_to_audit_log('bot_add', {
+        await persist(add_to_audit_log, 'bot_add', {
+            'guild_id': guild.id,
             'bot_id': member.id,
             'bot_name': str(member),
             'adder_id': adder.id if adder else None,
@@ -78,7 +92,7 @@ async def _handle_bot_addition(bot, member: discord.Member):
             'permissions': perm_analysis['summary']
         })
         
-        increment_stat('bot_additions')
+        await persist(increment_stat, guild.id, 'bot_additions')
         
         # Create quick action
         quick_action_text = create_quick_action(
@@ -89,11 +103,13 @@ async def _handle_bot_addition(bot, member: discord.Member):
         )
         
         # Send critical alert
-        await alert_critical(
+        await notify(
+            alert_critical,
             bot,
             "BOT ADDED TO SERVER",
             '\n'.join(details_lines),
-            quick_action_text=quick_action_text
+            quick_action_text=quick_action_text,
+            guild=guild
         )
         
         logger.info(f'Bot added alert sent: {member.id}')
@@ -101,13 +117,13 @@ async def _handle_bot_addition(bot, member: discord.Member):
     except Exception as e:
         logger.exception(f'_handle_bot_addition failed: {e}')
 
-async def _handle_regular_member_join(bot, member: discord.Member):
+async def _handle_regular_member_join(bot, member: discord.Member, invite_future: asyncio.Future = None):
     """Handle regular member join"""
     try:
         # Check if account is suspicious
         is_sus, reason = is_suspicious_account(member)
         
-        if is_sus or is_watched(member.id):
+        if is_sus or is_watched(member.guild.id, member.id):
             details_lines = [
                 f"**Member:** {format_user(member)}",
                 f"**Account Age:** {get_account_age(member)}",
@@ -117,62 +133,90 @@ async def _handle_regular_member_join(bot, member: discord.Member):
             if is_sus:
                 details_lines.append(f"**⚠️ Suspicious:** {reason}")
             
-            if is_watched(member.id):
+            if is_watched(member.guild.id, member.id):
                 details_lines.append("**👁️ WATCHED USER!**")
             
-            # Add to audit log
-            add_to_audit_log('member_join', {
-                'user_id': member.id,
-                'user_name': str(member),
-                'suspicious': is_sus,
-                'reason': reason if is_sus else None,
-                'watched': is_watched(member.id)
-            })
-            
-            priority = '🟡 WARNING' if is_sus or is_watched(member.id) else '🟢 INFO'
-            
-            await alert(
-                bot,
-                "Member Joined",
-                '\n'.join(details_lines),
-                priority=priority
-            )
+            # Only joins that alert wait for the debounced invite refresh, and
+            # they wait in a deferred job so a join raid doesn't hold every
+            # enrich worker for INVITE_REFRESH_DELAY (the member's later
+            # events still wait for it)
+            if invite_future:
+                await defer(_finish_member_join, bot, member, is_sus, reason, details_lines, invite_future)
+            else:
+                await _finish_member_join(bot, member, is_sus, reason, details_lines)
     
     except Exception as e:
         logger.exception(f'_handle_regular_member_join failed: {e}')
 
+async def _finish_member_join(bot, member: discord.Member, is_sus: bool, reason: str, details_lines: list,
+                              invite_future: asyncio.Future = None):
+    """Add the invite attribution to a join alert, then log and send it"""
+    try:
+        invite_info = await wait_for_attribution(invite_future) if invite_future else None
+        details_lines.append(f"**Invite:** {format_invite_info(invite_info)}")
+        
+        # Add to audit log
+        await persist(add_to_audit_log, 'member_join', {
+            'guild_id': member.guild.id,
+            'user_id': member.id,
+            'user_name': str(member),
+            'suspicious': is_sus,
+            'reason': reason if is_sus else None,
+            'watched': is_watched(member.guild.id, member.id),
+            'invite_code': invite_info['code'] if invite_info else None,
+            'inviter_id': invite_info['inviter_id'] if invite_info else None,
+            'inviter_name': invite_info['inviter_name'] if invite_info else None
+        })
+        
+        priority = '🟡 WARNING' if is_sus or is_watched(member.guild.id, member.id) else '🟢 INFO'
+        
+        await notify(
+            alert,
+            bot,
+            "Member Joined",
+            '\n'.join(details_lines),
+            priority=priority,
+            guild=member.guild
+        )
+    
+    except Exception as e:
+        logger.exception(f'_finish_member_join failed: {e}')
+
 # ============= MEMBER LEAVE MONITOR =============
+@timed()
 async def handle_member_remove(bot, member: discord.Member):
     """Monitor when members leave"""
     try:
-        if GUILD_ID and member.guild.id != GUILD_ID:
+        if GUILD_IDS and member.guild.id not in GUILD_IDS:
             return
         
         # Only alert for watched users or bots
-        if is_watched(member.id) or member.bot:
+        if is_watched(member.guild.id, member.id) or member.bot:
             details = f"**{'Bot' if member.bot else 'Member'}:** {format_user(member)}\n**Guild:** {member.guild.name}"
             
-            add_to_audit_log('member_leave', {
+            await persist(add_to_audit_log, 'member_leave', {
+                'guild_id': member.guild.id,
                 'user_id': member.id,
                 'user_name': str(member),
                 'was_bot': member.bot
             })
             
-            if should_alert('members', member.id):
-                await alert_info(bot, "Member Left", details)
+            if should_alert(member.guild.id, 'members', member.id):
+                await notify(alert_info, bot, "Member Left", details, guild=member.guild)
     
     except Exception as e:
         logger.exception(f'handle_member_remove failed: {e}')
 
 # ============= MEMBER UPDATE MONITOR =============
+@timed()
 async def handle_member_update(bot, before: discord.Member, after: discord.Member):
     """Monitor member updates (roles, nickname, etc.)"""
     try:
-        if GUILD_ID and after.guild.id != GUILD_ID:
+        if GUILD_IDS and after.guild.id not in GUILD_IDS:
             return
         
         # Only alert for watched users or significant changes
-        if not (is_watched(after.id) or should_alert('members', after.id)):
+        if not (is_watched(after.guild.id, after.id) or should_alert(after.guild.id, 'members', after.id)):
             return
         
         changes = []
@@ -212,7 +256,8 @@ async def handle_member_update(bot, before: discord.Member, after: discord.Membe
                 *changes
             ]
             
-            add_to_audit_log('member_update', {
+            await persist(add_to_audit_log, 'member_update', {
+                'guild_id': after.guild.id,
                 'user_id': after.id,
                 'user_name': str(after),
                 'changes': changes
@@ -222,21 +267,24 @@ async def handle_member_update(bot, before: discord.Member, after: discord.Membe
             is_critical = any('Administrator' in str(c) or 'Manage' in str(c) for c in changes)
             priority = '🔴 CRITICAL' if is_critical else '🟡 WARNING'
             
-            await alert(
+            await notify(
+                alert,
                 bot,
                 "Member Updated",
                 '\n'.join(details_lines),
-                priority=priority
+                priority=priority,
+                guild=after.guild
             )
     
     except Exception as e:
         logger.exception(f'handle_member_update failed: {e}')
 
 # ============= BAN/KICK MONITOR =============
+@timed()
 async def handle_member_ban(bot, guild: discord.Guild, user: discord.User):
     """Monitor member bans"""
     try:
-        if GUILD_ID and guild.id != GUILD_ID:
+        if GUILD_IDS and guild.id not in GUILD_IDS:
             return
         
         details_lines = [
@@ -246,57 +294,63 @@ async def handle_member_ban(bot, guild: discord.Guild, user: discord.User):
         
         # Try to get who banned
         try:
-            async for entry in guild.audit_logs(limit=5, action=discord.AuditLogAction.ban):
-                if entry.target and entry.target.id == user.id:
-                    details_lines.append(f"**Banned by:** {format_user(entry.user)}")
-                    if entry.reason:
-                        details_lines.append(f"**Reason:** {entry.reason}")
-                    break
+            with phase('audit_log.fetch'):
+                async for entry in guild.audit_logs(limit=5, action=discord.AuditLogAction.ban):
+                    if entry.target and entry.target.id == user.id:
+                        details_lines.append(f"**Banned by:** {format_user(entry.user)}")
+                        if entry.reason:
+                            details_lines.append(f"**Reason:** {entry.reason}")
+                        break
         except:
             pass
         
-        add_to_audit_log('member_ban', {
+        await persist(add_to_audit_log, 'member_ban', {
+            'guild_id': guild.id,
             'user_id': user.id,
-            'user_name': str(user),
-            'guild_id': guild.id
+            'user_name': str(user)
         })
         
-        increment_stat('bans')
+        await persist(increment_stat, guild.id, 'bans')
         
-        if should_alert('moderation', user.id):
-            await alert_warning(
+        if should_alert(guild.id, 'moderation', user.id):
+            await notify(
+                alert_warning,
                 bot,
                 "Member Banned",
-                '\n'.join(details_lines)
+                '\n'.join(details_lines),
+                guild=guild
             )
     
     except Exception as e:
         logger.exception(f'handle_member_ban failed: {e}')
 
+@timed()
 async def handle_member_unban(bot, guild: discord.Guild, user: discord.User):
     """Monitor member unbans"""
     try:
-        if GUILD_ID and guild.id != GUILD_ID:
+        if GUILD_IDS and guild.id not in GUILD_IDS:
             return
         
         details = f"**User:** {format_user(user)}\n**Guild:** {guild.name}"
         
-        add_to_audit_log('member_unban', {
+        await persist(add_to_audit_log, 'member_unban', {
+            'guild_id': guild.id,
             'user_id': user.id,
             'user_name': str(user)
         })
         
-        if should_alert('moderation', user.id):
-            await alert_info(bot, "Member Unbanned", details)
+        if should_alert(guild.id, 'moderation', user.id):
+            await notify(alert_info, bot, "Member Unbanned", details, guild=guild)
     
     except Exception as e:
         logger.exception(f'handle_member_unban failed: {e}')
 
 # ============= CHANNEL MONITOR =============
+@timed()
 async def handle_channel_create(bot, channel: discord.abc.GuildChannel):
     """Monitor channel creation"""
     try:
-        if GUILD_ID and channel.guild.id != GUILD_ID:
+        if GUILD_IDS and channel.guild.id not in GUILD_IDS:
             return
         
         details_lines = [
@@ -307,35 +361,40 @@ async def handle_channel_create(bot, channel: discord.abc.GuildChannel):
         
         # Try to get who created it
         try:
-            async for entry in channel.guild.audit_logs(limit=5, action=discord.AuditLogAction.channel_create):
-                if entry.target and entry.target.id == channel.id:
-                    details_lines.append(f"**Created by:** {format_user(entry.user)}")
-                    break
+            with phase('audit_log.fetch'):
+                async for entry in channel.guild.audit_logs(limit=5, action=discord.AuditLogAction.channel_create):
+                    if entry.target and entry.target.id == channel.id:
+                        details_lines.append(f"**Created by:** {format_user(entry.user)}")
+                        break
         except:
             pass
         
-        add_to_audit_log('channel_create', {
+        await persist(add_to_audit_log, 'channel_create', {
+            'guild_id': channel.guild.id,
             'channel_id': channel.id,
             'channel_name': channel.name,
             'channel_type': type(channel).__name__
         })
         
-        increment_stat('channel_changes')
+        await persist(increment_stat, channel.guild.id, 'channel_changes')
         
-        if should_alert('channels'):
-            await alert_info(
+        if should_alert(channel.guild.id, 'channels'):
+            await notify(
+                alert_info,
                 bot,
                 "Channel Created",
-                '\n'.join(details_lines)
+                '\n'.join(details_lines),
+                guild=channel.guild
             )
     
     except Exception as e:
         logger.exception(f'handle_channel_create failed: {e}')
 
+@timed()
 async def handle_channel_delete(bot, channel: discord.abc.GuildChannel):
     """Monitor channel deletion"""
     try:
-        if GUILD_ID and channel.guild.id != GUILD_ID:
+        if GUILD_IDS and channel.guild.id not in GUILD_IDS:
             return
         
         details_lines = [
@@ -345,40 +404,46 @@ async def handle_channel_delete(bot, channel: discord.abc.GuildChannel):
         
         # Try to get who deleted it
         try:
-            async for entry in channel.guild.audit_logs(limit=5, action=discord.AuditLogAction.channel_delete):
-                if entry.target and entry.target.id == channel.id:
-                    details_lines.append(f"**Deleted by:** {format_user(entry.user)}")
-                    break
+            with phase('audit_log.fetch'):
+                async for entry in channel.guild.audit_logs(limit=5, action=discord.AuditLogAction.channel_delete):
+                    if entry.target and entry.target.id == channel.id:
+                        details_lines.append(f"**Deleted by:** {format_user(entry.user)}")
+                        break
         except:
             pass
         
-        add_to_audit_log('channel_delete', {
+        await persist(add_to_audit_log, 'channel_delete', {
+            'guild_id': channel.guild.id,
             'channel_id': channel.id,
             'channel_name': channel.name
         })
         
-        increment_stat('channel_changes')
+        await persist(increment_stat, channel.guild.id, 'channel_changes')
         
-        if should_alert('channels'):
-            await alert_warning(
+        if should_alert(channel.guild.id, 'channels'):
+            await notify(
+                alert_warning,
                 bot,
                 "Channel Deleted",
-                '\n'.join(details_lines)
+                '\n'.join(details_lines),
+                guild=channel.guild
             )
     
     except Exception as e:
         logger.exception(f'handle_channel_delete failed: {e}')
 
+@timed()
 async def handle_channel_update(bot, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
     """Monitor channel updates"""
     try:
-        if GUILD_ID and after.guild.id != GUILD_ID:
+        if GUILD_IDS and after.guild.id not in GUILD_IDS:
             return
         
-        if not should_alert('channels'):
+        if not should_alert(after.guild.id, 'channels'):
             return
         
         changes = []
+        deltas = []
         
         # Name change
         if before.name != after.name:
@@ -390,9 +455,26 @@ async def handle_channel_update(bot, before: discord.abc.GuildChannel, after: di
             after_cat = after.category.name if after.category else 'None'
             changes.append(f"**Category:** `{before_cat}` → `{after_cat}`")
         
-        # Permission changes (basic check)
+        # Permission changes, resolved to what each overwrite target gained/lost
         if hasattr(before, 'overwrites') and before.overwrites != after.overwrites:
-            changes.append("**Permissions:** Modified")
+            deltas = get_overwrite_deltas(before, after)
+            for delta in deltas[:MAX_OVERWRITE_DELTAS]:
+                parts = []
+                if delta['added']:
+                    parts.append(f"➕ {', '.join(delta['added'])}")
+                if delta['removed']:
+                    parts.append(f"➖ {', '.join(delta['removed'])}")
+                marker = '⚠️ ' if delta['has_critical_changes'] else ''
+                changes.append(f"{marker}**{delta['target']}:** {' | '.join(parts)}")
+            if len(deltas) > MAX_OVERWRITE_DELTAS:
+                changes.append(f"*...and {len(deltas) - MAX_OVERWRITE_DELTAS} more targets*")
+            if not deltas:
+                changes.append("**Permissions:** Overwrites edited (no effective change)")
+        
+        # Category sync
+        if getattr(after, 'category', None) and before.permissions_synced != after.permissions_synced:
+            state = 'Synced' if after.permissions_synced else 'Out of sync'
+            changes.append(f"**Category Sync:** {state}")
         
         if changes:
             details_lines = [
@@ -400,25 +482,33 @@ async def handle_channel_update(bot, before: discord.abc.GuildChannel, after: di
                 *changes
             ]
             
-            add_to_audit_log('channel_update', {
+            await persist(add_to_audit_log, 'channel_update', {
+                'guild_id': after.guild.id,
                 'channel_id': after.id,
                 'changes': changes
             })
             
-            await alert_info(
-                bot,
-                "Channel Updated",
-                '\n'.join(details_lines)
-            )
+            # Someone gaining or losing a critical permission deserves more than info
+            if any(delta['has_critical_changes'] for delta in deltas):
+                await notify(alert_warning, bot, "Channel Permissions Changed", '\n'.join(details_lines), guild=after.guild)
+            else:
+                await notify(
+                    alert_info,
+                    bot,
+                    "Channel Updated",
+                    '\n'.join(details_lines),
+                    guild=after.guild
+                )
     
     except Exception as e:
         logger.exception(f'handle_channel_update failed: {e}')
 
 # ============= ROLE MONITOR =============
+@timed()
 async def handle_guild_role_create(bot, role: discord.Role):
     """Monitor role creation"""
     try:
-        if GUILD_ID and role.guild.id != GUILD_ID:
+        if GUILD_IDS and role.guild.id not in GUILD_IDS:
             return
         
         perm_analysis = analyze_permissions(role.permissions)
@@ -433,61 +523,68 @@ async def handle_guild_role_create(bot, role: discord.Role):
         
         # Try to get who created it
         try:
-            async for entry in role.guild.audit_logs(limit=5, action=discord.AuditLogAction.role_create):
-                if entry.target and entry.target.id == role.id:
-                    details_lines.append(f"**Created by:** {format_user(entry.user)}")
-                    break
+            with phase('audit_log.fetch'):
+                async for entry in role.guild.audit_logs(limit=5, action=discord.AuditLogAction.role_create):
+                    if entry.target and entry.target.id == role.id:
+                        details_lines.append(f"**Created by:** {format_user(entry.user)}")
+                        break
         except:
             pass
         
-        add_to_audit_log('role_create', {
+        await persist(add_to_audit_log, 'role_create', {
+            'guild_id': role.guild.id,
             'role_id': role.id,
             'role_name': role.name,
             'risk_level': perm_analysis['risk_level']
         })
         
-        increment_stat('role_changes')
+        await persist(increment_stat, role.guild.id, 'role_changes')
         
-        if should_alert('roles'):
+        if should_alert(role.guild.id, 'roles'):
             priority = '🔴 CRITICAL' if perm_analysis['has_critical'] else '🟡 WARNING'
-            await alert(
+            await notify(
+                alert,
                 bot,
                 "Role Created",
                 '\n'.join(details_lines),
-                priority=priority
+                priority=priority,
+                guild=role.guild
             )
     
     except Exception as e:
         logger.exception(f'handle_guild_role_create failed: {e}')
 
+@timed()
 async def handle_guild_role_delete(bot, role: discord.Role):
     """Monitor role deletion"""
     try:
-        if GUILD_ID and role.guild.id != GUILD_ID:
+        if GUILD_IDS and role.guild.id not in GUILD_IDS:
             return
         
-        details = f"**Role:** {format_role(role)}\n**Had {len(role.members)} members**"
+        details = f"**Role:** {format_role(role)}\n**Had {risk_index.pop_deleted_member_count(role)} members**"
         
-        add_to_audit_log('role_delete', {
+        await persist(add_to_audit_log, 'role_delete', {
+            'guild_id': role.guild.id,
             'role_id': role.id,
             'role_name': role.name
         })
         
-        increment_stat('role_changes')
+        await persist(increment_stat, role.guild.id, 'role_changes')
         
-        if should_alert('roles'):
-            await alert_warning(bot, "Role Deleted", details)
+        if should_alert(role.guild.id, 'roles'):
+            await notify(alert_warning, bot, "Role Deleted", details, guild=role.guild)
     
     except Exception as e:
         logger.exception(f'handle_guild_role_delete failed: {e}')
 
+@timed()
 async def handle_guild_role_update(bot, before: discord.Role, after: discord.Role):
     """Monitor role updates"""
     try:
-        if GUILD_ID and after.guild.id != GUILD_ID:
+        if GUILD_IDS and after.guild.id not in GUILD_IDS:
             return
         
-        if not should_alert('roles'):
+        if not should_alert(after.guild.id, 'roles'):
             return
         
         changes = []
@@ -519,7 +616,8 @@ async def handle_guild_role_update(bot, before: discord.Role, after: discord.Rol
                 *changes
             ]
             
-            add_to_audit_log('role_update', {
+            await persist(add_to_audit_log, 'role_update', {
+                'guild_id': after.guild.id,
                 'role_id': after.id,
                 'changes': changes
             })
@@ -527,31 +625,34 @@ async def handle_guild_role_update(bot, before: discord.Role, after: discord.Rol
             is_critical = any('Administrator' in str(c) or 'Manage' in str(c) for c in changes)
             priority = '🔴 CRITICAL' if is_critical else '🟡 WARNING'
             
-            await alert(
+            await notify(
+                alert,
                 bot,
                 "Role Updated",
                 '\n'.join(details_lines),
-                priority=priority
+                priority=priority,
+                guild=after.guild
             )
     
     except Exception as e:
         logger.exception(f'handle_guild_role_update failed: {e}')
 
 # ============= MESSAGE MONITOR (For watched users only) =============
+@timed()
 async def handle_message_delete(bot, message: discord.Message):
     """Monitor message deletions (watched users only)"""
     try:
         if message.guild is None:
             return
         
-        if GUILD_ID and message.guild.id != GUILD_ID:
+        if GUILD_IDS and message.guild.id not in GUILD_IDS:
             return
         
         # Only track watched users
-        if not is_watched(message.author.id):
+        if not is_watched(message.guild.id, message.author.id):
             return
         
-        if not should_alert('messages', message.author.id):
+        if not should_alert(message.guild.id, 'messages', message.author.id):
             return
         
         content_preview = truncate_text(message.content, 200) if message.content else "[No text content]"
@@ -565,35 +666,39 @@ async def handle_message_delete(bot, message: discord.Message):
         if message.attachments:
             details_lines.append(f"**Attachments:** {len(message.attachments)} file(s)")
         
-        add_to_audit_log('message_delete', {
+        await persist(add_to_audit_log, 'message_delete', {
+            'guild_id': message.guild.id,
             'user_id': message.author.id,
             'channel_id': message.channel.id,
             'content': message.content[:500]
         })
         
-        await alert_info(
+        await notify(
+            alert_info,
             bot,
             "Message Deleted (Watched User)",
-            '\n'.join(details_lines)
+            '\n'.join(details_lines),
+            guild=message.guild
         )
     
     except Exception as e:
         logger.exception(f'handle_message_delete failed: {e}')
 
+@timed()
 async def handle_message_edit(bot, before: discord.Message, after: discord.Message):
     """Monitor message edits (watched users only)"""
     try:
         if after.guild is None:
             return
         
-        if GUILD_ID and after.guild.id != GUILD_ID:
+        if GUILD_IDS and after.guild.id not in GUILD_IDS:
             return
         
         # Only track watched users
-        if not is_watched(after.author.id):
+        if not is_watched(after.guild.id, after.author.id):
             return
         
-        if not should_alert('messages', after.author.id):
+        if not should_alert(after.guild.id, 'messages', after.author.id):
             return
         
         # Ignore embed updates
@@ -610,30 +715,34 @@ async def handle_message_edit(bot, before: discord.Message, after: discord.Messa
             f"**After:** ```{after_preview}```"
         ]
         
-        add_to_audit_log('message_edit', {
+        await persist(add_to_audit_log, 'message_edit', {
+            'guild_id': after.guild.id,
             'user_id': after.author.id,
             'channel_id': after.channel.id,
             'before': before.content[:500],
             'after': after.content[:500]
         })
         
-        await alert_info(
+        await notify(
+            alert_info,
             bot,
             "Message Edited (Watched User)",
-            '\n'.join(details_lines)
+            '\n'.join(details_lines),
+            guild=after.guild
         )
     
     except Exception as e:
         logger.exception(f'handle_message_edit failed: {e}')
 
 # ============= GUILD UPDATE MONITOR =============
+@timed()
 async def handle_guild_update(bot, before: discord.Guild, after: discord.Guild):
     """Monitor server settings changes"""
     try:
-        if GUILD_ID and after.id != GUILD_ID:
+        if GUILD_IDS and after.id not in GUILD_IDS:
             return
         
-        if not should_alert('server'):
+        if not should_alert(after.id, 'server'):
             return
         
         changes = []
@@ -651,75 +760,250 @@ async def handle_guild_update(bot, before: discord.Guild, after: discord.Guild):
             changes.append(f"**Notifications:** Changed")
         
         if changes:
-            add_to_audit_log('guild_update', {'changes': changes})
+            await persist(add_to_audit_log, 'guild_update', {'guild_id': after.id, 'changes': changes})
             
-            await alert_warning(
+            await notify(
+                alert_warning,
                 bot,
                 "Server Settings Changed",
-                '\n'.join(changes)
+                '\n'.join(changes),
+                guild=after
             )
     
     except Exception as e:
         logger.exception(f'handle_guild_update failed: {e}')
 
 # ============= VOICE MONITOR =============
+@timed()
 async def handle_voice_state_update(bot, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
     """Monitor voice channel activity"""
     try:
-        if GUILD_ID and member.guild.id != GUILD_ID:
+        if GUILD_IDS and member.guild.id not in GUILD_IDS:
             return
         
         # Only alert for watched users
-        if not is_watched(member.id):
+        if not is_watched(member.guild.id, member.id):
             return
         
-        if not should_alert('voice', member.id):
+        if not should_alert(member.guild.id, 'voice', member.id):
             return
         
         # Joined voice
         if before.channel is None and after.channel is not None:
             details = f"**User:** {format_user(member)} 👁️\n**Joined:** {after.channel.name}"
-            await alert_info(bot, "Voice: Joined", details)
+            await notify(alert_info, bot, "Voice: Joined", details, guild=member.guild)
         
         # Left voice
         elif before.channel is not None and after.channel is None:
             details = f"**User:** {format_user(member)} 👁️\n**Left:** {before.channel.name}"
-            await alert_info(bot, "Voice: Left", details)
+            await notify(alert_info, bot, "Voice: Left", details, guild=member.guild)
         
         # Moved channels
         elif before.channel != after.channel:
             details = f"**User:** {format_user(member)} 👁️\n**From:** {before.channel.name}\n**To:** {after.channel.name}"
-            await alert_info(bot, "Voice: Moved", details)
+            await notify(alert_info, bot, "Voice: Moved", details, guild=member.guild)
     
     except Exception as e:
         logger.exception(f'handle_voice_state_update failed: {e}')
 
 # ============= INVITE TRACKER =============
 # Store invites on bot ready
-_invite_cache = {}
+_invite_cache = {}   # {guild_id: {code: uses}}
+_invite_meta = {}    # {guild_id: {code: {'inviter_id', 'inviter_name', 'max_uses'}}}
+_vanity_uses = {}    # {guild_id: uses of the vanity URL}
+
+# Join attribution state (one debounced refresh per guild)
+_pending_joins = {}  # {guild_id: [future, ...]}
+_refresh_tasks = {}  # {guild_id: asyncio.Task}
+_refresh_locks = {}  # {guild_id: asyncio.Lock}
+
+def _invite_meta_entry(invite: discord.Invite) -> dict:
+    """Get cached metadata for an invite"""
+    return {
+        'inviter_id': invite.inviter.id if invite.inviter else None,
+        'inviter_name': str(invite.inviter) if invite.inviter else None,
+        'max_uses': invite.max_uses or 0
+    }
+
+def invites_cached(guild_id: int) -> bool:
+    """Whether a guild's invites were cached (after that, joins keep them current)"""
+    return guild_id in _invite_cache
 
 async def cache_invites(guild: discord.Guild):
     """Cache current invites"""
     try:
         invites = await guild.invites()
-        _invite_cache[guild.id] = {inv.code: inv.uses for inv in invites}
+        _invite_cache[guild.id] = {inv.code: inv.uses or 0 for inv in invites}
+        _invite_meta[guild.id] = {inv.code: _invite_meta_entry(inv) for inv in invites}
         logger.info(f'Cached {len(invites)} invites for guild {guild.id}')
     except Exception as e:
         logger.warning(f'Could not cache invites: {e}')
+    
+    if guild.vanity_url_code:
+        try:
+            vanity = await guild.vanity_invite()
+            if vanity:
+                _vanity_uses[guild.id] = vanity.uses or 0
+        except Exception as e:
+            logger.warning(f'Could not cache vanity invite: {e}')
+
+def register_join(member: discord.Member) -> asyncio.Future:
+    """
+    Register a join for invite attribution
+    
+    Joins arriving within INVITE_REFRESH_DELAY of each other share a single
+    guild.invites() refresh, so a join burst costs at most one invites()
+    call (plus one vanity lookup) per window.
+    
+    Returns:
+        asyncio.Future: Resolves to the attribution dict (or None)
+    """
+    guild = member.guild
+    future = asyncio.get_running_loop().create_future()
+    _pending_joins.setdefault(guild.id, []).append(future)
+    
+    task = _refresh_tasks.get(guild.id)
+    if task is None or task.done():
+        _refresh_tasks[guild.id] = asyncio.create_task(_refresh_and_attribute(guild))
+    
+    return future
+
+async def wait_for_attribution(future: asyncio.Future) -> dict:
+    """
+    Wait for a registered join to be attributed
+    
+    Returns:
+        dict: {'code', 'inviter_id', 'inviter_name', 'vanity', 'uncertain'} or None
+    """
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout=INVITE_ATTRIBUTION_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning('Invite attribution timed out')
+        return None
+
+async def attribute_join(member: discord.Member) -> dict:
+    """Register a join and wait for its invite attribution"""
+    return await wait_for_attribution(register_join(member))
 
+async def _refresh_and_attribute(guild: discord.Guild):
+    """Refresh invite uses once for all pending joins and resolve them"""
+    await asyncio.sleep(INVITE_REFRESH_DELAY)
+    
+    # Joins arriving from here on schedule the next refresh
+    _refresh_tasks.pop(guild.id, None)
+    waiters = _pending_joins.pop(guild.id, [])
+    if not waiters:
+        return
+    
+    results = []
+    lock = _refresh_locks.setdefault(guild.id, asyncio.Lock())
+    try:
+        async with lock:
+            results = await _diff_invite_uses(guild, len(waiters))
+    except Exception as e:
+        logger.warning(f'Invite attribution failed for guild {guild.id}: {e}')
+    
+    for i, future in enumerate(waiters):
+        if not future.done():
+            future.set_result(results[i] if i < len(results) else None)
+
+async def _diff_invite_uses(guild: discord.Guild, joins: int) -> list:
+    """
+    Fetch invites, diff use counts against the cache and update it
+    
+    Returns:
+        list: One attribution dict per consumed use (at most `joins` entries)
+    """
+    old_uses = _invite_cache.get(guild.id, {})
+    old_meta = _invite_meta.get(guild.id, {})
+    
+    invites = await guild.invites()
+    new_uses = {inv.code: inv.uses or 0 for inv in invites}
+    new_meta = {inv.code: _invite_meta_entry(inv) for inv in invites}
+    
+    used = []
+    for code, uses in new_uses.items():
+        delta = uses - old_uses.get(code, 0)
+        used.extend([code] * max(delta, 0))
+    
+    # An invite that hit max_uses is deleted by Discord on its last use
+    for code, uses in old_uses.items():
+        if code in new_uses:
+            continue
+        max_uses = old_meta.get(code, {}).get('max_uses', 0)
+        if max_uses and uses + 1 >= max_uses:
+            used.append(code)
+            new_meta.setdefault(code, old_meta[code])
+    
+    _invite_cache[guild.id] = new_uses
+    _invite_meta[guild.id] = {code: meta for code, meta in new_meta.items() if code in new_uses}
+    
+    # Remaining joins may have come through the vanity URL
+    vanity_joins = 0
+    if len(used) < joins and guild.vanity_url_code:
+        try:
+            vanity = await guild.vanity_invite()
+            if vanity:
+                delta = (vanity.uses or 0) - _vanity_uses.get(guild.id, vanity.uses or 0)
+                _vanity_uses[guild.id] = vanity.uses or 0
+                vanity_joins = min(max(delta, 0), joins - len(used))
+        except Exception as e:
+            logger.warning(f'Could not fetch vanity invite: {e}')
+    
+    # Uses are only unambiguous when one source accounts for every join
+    sources = set(used) | ({guild.vanity_url_code} if vanity_joins else set())
+    uncertain = len(sources) > 1 or len(used) + vanity_joins != joins
+    
+    results = []
+    for code in used[:joins]:
+        meta = new_meta.get(code, {})
+        results.append({
+            'code': code,
+            'inviter_id': meta.get('inviter_id'),
+            'inviter_name': meta.get('inviter_name'),
+            'vanity': False,
+            'uncertain': uncertain
+        })
+    
+    for _ in range(vanity_joins):
+        results.append({
+            'code': guild.vanity_url_code,
+            'inviter_id': None,
+            'inviter_name': None,
+            'vanity': True,
+            'uncertain': uncertain
+        })
+    
+    return results
+
+def format_invite_info(invite_info: dict) -> str:
+    """Format invite attribution for display"""
+    if not invite_info:
+        return 'Unknown'
+    
+    if invite_info['vanity']:
+        text = f"Vanity URL (`{invite_info['code']}`)"
+    else:
+        inviter = f"{invite_info['inviter_name']} ({invite_info['inviter_id']})" if invite_info['inviter_id'] else 'Unknown'
+        text = f"`{invite_info['code']}` by {inviter}"
+    
+    if invite_info['uncertain']:
+        text += ' (uncertain)'
+    return text
+
+@timed()
 async def handle_invite_create(bot, invite: discord.Invite):
     """Monitor invite creation"""
     try:
-        if GUILD_ID and invite.guild.id != GUILD_ID:
+        if GUILD_IDS and invite.guild.id not in GUILD_IDS:
             return
         
-        if not should_alert('invites'):
-            return
+        # Update cache (even when the filter is off, join attribution needs it)
+        _invite_cache.setdefault(invite.guild.id, {})[invite.code] = invite.uses or 0
+        _invite_meta.setdefault(invite.guild.id, {})[invite.code] = _invite_meta_entry(invite)
         
-        # Update cache
-        if invite.guild.id not in _invite_cache:
-            _invite_cache[invite.guild.id] = {}
-        _invite_cache[invite.guild.id][invite.code] = 0
+        if not should_alert(invite.guild.id, 'invites'):
+            return
         
         details_lines = [
             f"**Code:** {invite.code}",
@@ -729,31 +1013,124 @@ async def handle_invite_create(bot, invite: discord.Invite):
             f"**Expires:** {format_duration(invite.max_age) if invite.max_age else 'Never'}"
         ]
         
-        await alert_info(
+        await notify(
+            alert_info,
             bot,
             "Invite Created",
-            '\n'.join(details_lines)
+            '\n'.join(details_lines),
+            guild=invite.guild
         )
     
     except Exception as e:
         logger.exception(f'handle_invite_create failed: {e}')
 
+@timed()
 async def handle_invite_delete(bot, invite: discord.Invite):
     """Monitor invite deletion"""
     try:
-        if GUILD_ID and invite.guild.id != GUILD_ID:
+        if GUILD_IDS and invite.guild.id not in GUILD_IDS:
             return
         
-        if not should_alert('invites'):
-            return
+        # Remove from cache, unless this delete is Discord expiring an invite
+        # on its last use - the next attribution diff needs to see that use
+        uses = _invite_cache.get(invite.guild.id, {}).get(invite.code)
+        max_uses = _invite_meta.get(invite.guild.id, {}).get(invite.code, {}).get('max_uses', 0)
+        if uses is None or not max_uses or uses + 1 < max_uses:
+            _invite_cache.get(invite.guild.id, {}).pop(invite.code, None)
+            _invite_meta.get(invite.guild.id, {}).pop(invite.code, None)
         
-        # Remove from cache
-        if invite.guild.id in _invite_cache and invite.code in _invite_cache[invite.guild.id]:
-            del _invite_cache[invite.guild.id][invite.code]
+        if not should_alert(invite.guild.id, 'invites'):
+            return
         
         details = f"**Code:** {invite.code}\n**Channel:** {invite.channel.name}"
         
-        await alert_info(bot, "Invite Deleted", details)
+        await notify(alert_info, bot, "Invite Deleted", details, guild=invite.guild)
     
     except Exception as e:
         logger.exception(f'handle_invite_delete failed: {e}')
+
+# ============= PIPELINE ROUTING =============
+# Gateway event → monitor handler. Prefilters mirror the handlers' cheap
+# early exits so the filter stage can drop events before enrichment,
+# classify() picks the priority category when it depends on the payload,
+# and entity_of() names the entity whose events must be handled in order.
+EVENT_SPECS = {
+    'member_join': EventSpec(
+        handle_member_join, 'members', lambda m: m.guild,
+        classify=lambda m: 'bots' if m.bot else 'members',
+        entity_of=lambda m: m.id
+    ),
+    'member_remove': EventSpec(
+        handle_member_remove, 'members', lambda m: m.guild,
+        prefilter=lambda m: m.bot or is_watched(m.guild.id, m.id),
+        entity_of=lambda m: m.id
+    ),
+    'member_update': EventSpec(
+        handle_member_update, 'members', lambda b, a: a.guild,
+        prefilter=lambda b, a: is_watched(a.guild.id, a.id) or should_alert(a.guild.id, 'members', a.id),
+        classify=lambda b, a: 'roles' if b.roles != a.roles else 'members',
+        entity_of=lambda b, a: a.id
+    ),
+    'member_ban': EventSpec(
+        handle_member_ban, 'moderation', lambda g, u: g,
+        entity_of=lambda g, u: u.id
+    ),
+    'member_unban': EventSpec(
+        handle_member_unban, 'moderation', lambda g, u: g,
+        entity_of=lambda g, u: u.id
+    ),
+    'channel_create': EventSpec(
+        handle_channel_create, 'channels', lambda c: c.guild,
+        entity_of=lambda c: c.id
+    ),
+    'channel_delete': EventSpec(
+        handle_channel_delete, 'channels', lambda c: c.guild,
+        entity_of=lambda c: c.id
+    ),
+    'channel_update': EventSpec(
+        handle_channel_update, 'channels', lambda b, a: a.guild,
+        prefilter=lambda b, a: should_alert(a.guild.id, 'channels'),
+        entity_of=lambda b, a: a.id
+    ),
+    'role_create': EventSpec(
+        handle_guild_role_create, 'roles', lambda r: r.guild,
+        entity_of=lambda r: r.id
+    ),
+    'role_delete': EventSpec(
+        handle_guild_role_delete, 'roles', lambda r: r.guild,
+        entity_of=lambda r: r.id
+    ),
+    'role_update': EventSpec(
+        handle_guild_role_update, 'roles', lambda b, a: a.guild,
+        prefilter=lambda b, a: should_alert(a.guild.id, 'roles'),
+        entity_of=lambda b, a: a.id
+    ),
+    'message_delete': EventSpec(
+        handle_message_delete, 'messages', lambda m: m.guild,
+        prefilter=lambda m: is_watched(m.guild.id, m.author.id),
+        entity_of=lambda m: m.id
+    ),
+    'message_edit': EventSpec(
+        handle_message_edit, 'messages', lambda b, a: a.guild,
+        prefilter=lambda b, a: b.content != a.content and is_watched(a.guild.id, a.author.id),
+        entity_of=lambda b, a: a.id
+    ),
+    'guild_update': EventSpec(
+        handle_guild_update, 'server', lambda b, a: a,
+        prefilter=lambda b, a: should_alert(a.id, 'server'),
+        entity_of=lambda b, a: a.id
+    ),
+    'voice_state_update': EventSpec(
+        handle_voice_state_update, 'voice', lambda m, b, a: m.guild,
+        prefilter=lambda m, b, a: is_watched(m.guild.id, m.id) and should_alert(m.guild.id, 'voice', m.id),
+        entity_of=lambda m, b, a: m.id
+    ),
+    'invite_create': EventSpec(
+        handle_invite_create, 'invites', lambda i: i.guild,
+        entity_of=lambda i: i.code
+    ),
+    'invite_delete': EventSpec(
+        handle_invite_delete, 'invites', lambda i: i.guild,
+        entity_of=lambda i: i.code
+    ),
+}
@@ -0,0 +1,79 @@
+# ordering.py — Per-Entity Ordered Processing
+from logger import logger
+
+class _KeyState:
+    """Ticket bookkeeping for one key"""
+
+    __slots__ = ('next_ticket', 'serving', 'finished', 'parked')
+
+    def __init__(self):
+        self.next_ticket = 0   # next ticket to hand out
+        self.serving = 0       # ticket allowed to run now
+        self.finished = set()  # tickets released out of order
+        self.parked = {}       # {ticket: item} waiting for their turn
+
+class KeyedSerializer:
+    """
+    Run work for the same key strictly in arrival order
+
+    Each item takes a ticket when it arrives. Only the ticket being served
+    may run; later tickets are parked and handed back by release() once
+    everything before them has finished (or was dropped). Different keys
+    never wait on each other, and a key's state is removed as soon as it
+    has nothing outstanding.
+    """
+
+    def __init__(self):
+        self._keys = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def parked_count(self) -> int:
+        """Get number of items waiting for their turn"""
+        return sum(len(state.parked) for state in self._keys.values())
+
+    def ticket(self, key) -> int:
+        """Take the next ticket for a key"""
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = _KeyState()
+        ticket = state.next_ticket
+        state.next_ticket += 1
+        return ticket
+
+    def ready(self, key, ticket: int) -> bool:
+        """Check if it is this ticket's turn to run"""
+        state = self._keys.get(key)
+        return state is None or state.serving == ticket
+
+    def park(self, key, ticket: int, item):
+        """Hold an item until its ticket comes up"""
+        self._keys[key].parked[ticket] = item
+
+    def release(self, key, ticket: int) -> list:
+        """
+        Mark a ticket as finished (run or dropped)
+
+        Returns:
+            list: Parked items whose turn has now come
+        """
+        state = self._keys.get(key)
+        if state is None:
+            logger.debug(f'Release for unknown serializer key {key}')
+            return []
+
+        state.finished.add(ticket)
+        while state.serving in state.finished:
+            state.finished.remove(state.serving)
+            state.serving += 1
+
+        runnable = []
+        if state.serving in state.parked:
+            runnable.append(state.parked.pop(state.serving))
+
+        # Nothing outstanding for this key: drop its state
+        if state.serving == state.next_ticket and not state.parked:
+            del self._keys[key]
+
+        return runnable
@@ -0,0 +1,194 @@
+# paginator.py — Paginated DM Listings
+#
+# Long listings (channels, roles, logs, ...) are sent one page at a time
+# with ◀️ ▶️ buttons instead of as one string cut every 1900 characters.
+# Lines come from an iterator and pages are built only when the owner
+# pages forward, split on line boundaries. Built pages are kept for going
+# back, up to PAGINATOR_MAX_PAGES; at most PAGINATOR_MAX_OPEN listings
+# keep their buttons, the oldest losing them first.
+import asyncio
+from collections import OrderedDict
+import discord
+from logger import logger
+from config import (
+    OWNER_ID, PAGINATOR_PAGE_LINES, PAGINATOR_PAGE_CHARS, PAGINATOR_MAX_PAGES,
+    PAGINATOR_MAX_OPEN, PAGINATOR_TIMEOUT, PAGINATOR_RELAY_PAGES
+)
+
+_END = object()
+
+class _Pages:
+    """Pages built on demand from an iterator of lines"""
+
+    def __init__(self, title: str, lines, page_lines: int):
+        self.title = title
+        self.page_lines = page_lines
+        self.pages = []           # built pages (each a block of lines)
+        self.done = False         # every line has been paged
+        self.truncated = False    # stopped at PAGINATOR_MAX_PAGES with lines left
+        self._lines = iter(lines)
+        self._carry = _END        # line read but not paged yet
+        # Room for the title and the page footer
+        self._limit = PAGINATOR_PAGE_CHARS - len(title) - 60
+
+    def _take(self):
+        if self._carry is not _END:
+            line, self._carry = self._carry, _END
+            return line
+        return next(self._lines, _END)
+
+    def build_next(self) -> bool:
+        """
+        Build the next page
+
+        Returns:
+            bool: False if there were no lines left for one
+        """
+        if self.done:
+            return False
+        if len(self.pages) >= PAGINATOR_MAX_PAGES:
+            self.done = self.truncated = True
+            return False
+
+        lines, size = [], 0
+        while len(lines) < self.page_lines:
+            line = self._take()
+            if line is _END:
+                self.done = True
+                break
+            if len(line) > self._limit:
+                line = line[:self._limit - 1] + '…'
+            if lines and size + len(line) + 1 > self._limit:
+                self._carry = line
+                break
+            lines.append(line)
+            size += len(line) + 1
+
+        if lines:
+            self.pages.append('\n'.join(lines))
+        # Look one line ahead so the last page is known as soon as it's built
+        if not self.done and self._carry is _END:
+            self._carry = self._take()
+            self.done = self._carry is _END
+        return bool(lines)
+
+    def render(self, index: int) -> str:
+        """Get a page with the title and a `Page n/total` footer"""
+        total = f'{len(self.pages)}' if self.done else f'{len(self.pages)}+'
+        footer = f'*Page {index + 1}/{total}*' if len(self.pages) > 1 or not self.done else ''
+        if self.truncated and index == len(self.pages) - 1:
+            footer += f' *(stopped after {PAGINATOR_MAX_PAGES} pages)*'
+        return f'{self.title}\n{self.pages[index]}\n\n{footer}'.rstrip()
+
+class Paginator(discord.ui.View):
+    """Buttons paging through a listing in the owner's DMs"""
+
+    def __init__(self, pages: _Pages):
+        super().__init__(timeout=PAGINATOR_TIMEOUT)
+        self.pages = pages
+        self.index = 0
+        self.message = None
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = self.pages.done and self.index >= len(self.pages.pages) - 1
+
+    async def _show(self, interaction: discord.Interaction):
+        self._update_buttons()
+        await interaction.response.edit_message(content=self.pages.render(self.index), view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == OWNER_ID
+
+    @discord.ui.button(emoji='◀️', style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index = max(0, self.index - 1)
+        await self._show(interaction)
+
+    @discord.ui.button(emoji='▶️', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.index + 1 < len(self.pages.pages) or self.pages.build_next():
+            self.index += 1
+        await self._show(interaction)
+
+    @discord.ui.button(emoji='⏹️', style=discord.ButtonStyle.secondary)
+    async def close(self, interaction: discord.Interaction, button: discord.ui.Button):
+        _forget(self)
+        self.stop()
+        await interaction.response.edit_message(view=None)
+
+    async def on_timeout(self):
+        _forget(self)
+        await self.remove_buttons()
+
+    async def remove_buttons(self):
+        """Leave the current page in place without its buttons"""
+        if self.message is None:
+            return
+        try:
+            await self.message.edit(view=None)
+        except discord.HTTPException as e:
+            logger.warning(f'Failed to remove paginator buttons: {e}')
+
+    async def on_error(self, interaction: discord.Interaction, error: Exception, item: discord.ui.Item):
+        logger.exception(f'Paginator failed: {error}')
+
+# ============= OPEN PAGINATORS =============
+_open = OrderedDict()  # {message_id: Paginator}, oldest first
+_closing = set()  # tasks removing the buttons of evicted paginators
+
+def _forget(view: Paginator):
+    if view.message is not None:
+        _open.pop(view.message.id, None)
+
+def _register(view: Paginator):
+    """Track an open paginator, closing the oldest ones past PAGINATOR_MAX_OPEN"""
+    _open[view.message.id] = view
+    while len(_open) > PAGINATOR_MAX_OPEN:
+        _, oldest = _open.popitem(last=False)
+        oldest.stop()
+        task = asyncio.create_task(oldest.remove_buttons())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+def open_count() -> int:
+    """Number of listings that still have their buttons"""
+    return len(_open)
+
+async def send(destination, title: str, lines, empty: str = None, page_lines: int = PAGINATOR_PAGE_LINES):
+    """
+    Send a listing as pages (with buttons when there's more than one)
+
+    Only the first page is built here: the rest of the lines are read as
+    the owner pages forward. A destination that can't carry buttons (the
+    relay of a command forwarded from another shard process) gets the
+    first PAGINATOR_RELAY_PAGES pages as separate messages instead.
+
+    Args:
+        destination: The owner (anything with send())
+        title: First line of every page
+        lines: Iterable of lines (a generator keeps unread lines unbuilt)
+        empty: Sent instead when there are no lines (default: the title)
+    """
+    pages = _Pages(title, lines, page_lines)
+    if not pages.build_next():
+        await destination.send(empty or title)
+        return
+
+    if pages.done:
+        await destination.send(pages.render(0))
+        return
+
+    if not isinstance(destination, discord.abc.Messageable):
+        index = 0
+        while index < PAGINATOR_RELAY_PAGES and (index < len(pages.pages) or pages.build_next()):
+            await destination.send(pages.render(index))
+            index += 1
+        if not pages.done:
+            await destination.send(f'*... more not shown (showing {index} pages)*')
+        return
+
+    view = Paginator(pages)
+    view._update_buttons()
+    view.message = await destination.send(pages.render(0), view=view)
+    _register(view)
@@ -0,0 +1,222 @@
+# perf.py — Handler Latency Histograms
+import contextlib
+import contextvars
+import functools
+import inspect
+import logging
+import time
+from logger import logger
+
+# Log-linear buckets over microseconds (HDR-style): values below 32µs are
+# exact, above that every power of two is split into 16 sub-buckets, so a
+# reported percentile is within ~6% of the true value. Values are capped
+# at 2^37µs (~38 hours).
+SUB_BUCKETS = 16
+_LINEAR_LIMIT = SUB_BUCKETS * 2
+_MAX_SHIFT = 32
+BUCKET_COUNT = (_MAX_SHIFT + 2) * SUB_BUCKETS
+_MAX_VALUE = ((SUB_BUCKETS * 2) << _MAX_SHIFT) - 1
+
+KINDS = ('event', 'monitor', 'phase', 'command', 'startup')
+
+def _bucket_of(micros: int) -> int:
+    """Get the bucket index for a value in microseconds"""
+    if micros < _LINEAR_LIMIT:
+        return micros
+    micros = min(micros, _MAX_VALUE)
+    shift = micros.bit_length() - 5
+    return (shift + 1) * SUB_BUCKETS + (micros >> shift) - SUB_BUCKETS
+
+def _bucket_high(index: int) -> int:
+    """Get the highest value (µs) that falls into a bucket"""
+    if index < _LINEAR_LIMIT:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+class Histogram:
+    """Fixed-size latency histogram with count, errors, total and max"""
+
+    __slots__ = ('counts', 'count', 'errors', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float, error: bool = False):
+        self.counts[_bucket_of(int(seconds * 1e6))] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if error:
+            self.errors += 1
+
+    def percentile(self, pct: float) -> float:
+        """Get a percentile in seconds (upper bound of its bucket, at most the max)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(pct / 100 * self.count + 0.999999))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(_bucket_high(index) / 1e6, self.max)
+        return self.max
+
+    def bucket_counts(self) -> list:
+        """Get (upper bound in seconds, count) for every non-empty bucket"""
+        return [(_bucket_high(index) / 1e6, n) for index, n in enumerate(self.counts) if n]
+
+# ============= REGISTRY =============
+_histograms = {}  # {(kind, name): Histogram}
+_since = time.time()
+
+# Handlers catch and log their own exceptions, so an error logged while a
+# timer is running marks that timing as failed
+_failed = contextvars.ContextVar('perf_failed', default=None)
+
+class _ErrorCounter(logging.Handler):
+    """Flag the running timers when an error is logged"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+
+    def emit(self, record: logging.LogRecord):
+        flags = _failed.get()
+        if flags is not None:
+            for flag in flags:
+                flag[0] = True
+
+logger.addHandler(_ErrorCounter())
+
+@contextlib.contextmanager
+def _watch_errors():
+    """Collect errors raised or logged inside the block: yields a [failed] flag"""
+    flag = [False]
+    token = _failed.set((_failed.get() or ()) + (flag,))
+    try:
+        yield flag
+    except BaseException:
+        flag[0] = True
+        raise
+    finally:
+        _failed.reset(token)
+
+def record(kind: str, name: str, seconds: float, error: bool = False):
+    """Record one timing"""
+    histogram = _histograms.get((kind, name))
+    if histogram is None:
+        histogram = _histograms[(kind, name)] = Histogram()
+    histogram.record(seconds, error)
+
+def timed(name: str = None, kind: str = 'monitor'):
+    """
+    Decorator recording a function's latency and exceptions
+
+    Works on both coroutine and plain functions. The name defaults to the
+    function name. Errors logged by the function count as errors too.
+    """
+    def decorator(fn):
+        label = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                with _watch_errors() as failed:
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        record(kind, label, time.perf_counter() - started, failed[0])
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                with _watch_errors() as failed:
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        record(kind, label, time.perf_counter() - started, failed[0])
+        return wrapper
+
+    return decorator
+
+@contextlib.contextmanager
+def timer(kind: str, name: str):
+    """Time a block (errors raised or logged inside it count as errors)"""
+    started = time.perf_counter()
+    with _watch_errors() as failed:
+        try:
+            yield
+        finally:
+            record(kind, name, time.perf_counter() - started, failed[0])
+
+def phase(name: str):
+    """Time a sub-phase of a handler (audit log fetch, DB write, DM send)"""
+    return timer('phase', name)
+
+def get_histograms() -> dict:
+    """Get every histogram: {(kind, name): Histogram}"""
+    return dict(_histograms)
+
+def reset():
+    """Clear every histogram"""
+    global _since
+    _histograms.clear()
+    _since = time.time()
+
+# ============= REPORT =============
+def get_report() -> list:
+    """
+    Get a summary row per timer, grouped by kind
+
+    Returns:
+        list: Dicts with kind, name, count, errors, p50/p95/p99/max (ms), sorted by kind then p99
+    """
+    rows = []
+    for (kind, name), histogram in _histograms.items():
+        rows.append({
+            'kind': kind,
+            'name': name,
+            'count': histogram.count,
+            'errors': histogram.errors,
+            'p50_ms': histogram.percentile(50) * 1000,
+            'p95_ms': histogram.percentile(95) * 1000,
+            'p99_ms': histogram.percentile(99) * 1000,
+            'max_ms': histogram.max * 1000
+        })
+    rows.sort(key=lambda row: (KINDS.index(row['kind']) if row['kind'] in KINDS else len(KINDS), -row['p99_ms']))
+    return rows
+
+def format_report() -> list:
+    """
+    Get the latency table as code blocks, one per kind
+
+    Returns:
+        list: Message chunks (each under Discord's limit)
+    """
+    rows = get_report()
+    if not rows:
+        return ['📭 No timings recorded yet']
+
+    headings = {'event': '📥 Gateway Events', 'monitor': '🔍 Monitors', 'phase': '⏱️ Sub-phases', 'command': '💬 DM Commands', 'startup': '🚀 Startup Steps'}
+    elapsed = int(time.time() - _since)
+    chunks = [f"**⏱️ Handler Latency** (last {elapsed // 3600}h {elapsed % 3600 // 60}m, ms)"]
+
+    for kind in sorted({row['kind'] for row in rows}, key=lambda k: KINDS.index(k) if k in KINDS else len(KINDS)):
+        lines = [f"{'name':<28} {'count':>7} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"]
+        for row in rows:
+            if row['kind'] != kind:
+                continue
+            lines.append(
+                f"{row['name'][:28]:<28} {row['count']:>7} {row['errors']:>4} {row['p50_ms']:>8.1f} "
+                f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}"
+            )
+        block = '\n'.join(lines)
+        chunks.append(f"**{headings.get(kind, kind)}**\n```\n{block[:1850]}\n```")
+    return chunks
@@ -1,6 +1,8 @@
 # permissions.py — Ultimate Permission Analysis System
 import discord
+from functools import lru_cache
 from utils import format_permissions
+from config import PERMISSION_CACHE_SIZE
 
 # Critical permissions that require immediate alert
 CRITICAL_PERMS = [
@@ -31,6 +33,67 @@ MODERATE_PERMS = [
     'deafen_members',
 ]
 
+# ============= BITMASKS =============
+# Every permission flag (aliases included) as (name, bit, display title),
+# sorted by name - the same order the old dir() reflection produced
+_ALL_PERMS = [
+    (name, bit, name.replace('_', ' ').title())
+    for name, bit in sorted(discord.Permissions.VALID_FLAGS.items())
+]
+
+def _perm_bits(names: list) -> list:
+    """Get (bit, display title) pairs for known permission names"""
+    flags = discord.Permissions.VALID_FLAGS
+    return [(flags[name], name.replace('_', ' ').title()) for name in names if name in flags]
+
+def _mask_of(names: list) -> int:
+    """Get the combined bitmask for permission names"""
+    mask = 0
+    for bit, _ in _perm_bits(names):
+        mask |= bit
+    return mask
+
+_CRITICAL_BITS = _perm_bits(CRITICAL_PERMS)
+_DANGEROUS_BITS = _perm_bits(DANGEROUS_PERMS)
+_MODERATE_BITS = _perm_bits(MODERATE_PERMS)
+
+CRITICAL_MASK = _mask_of(CRITICAL_PERMS)
+DANGEROUS_MASK = _mask_of(DANGEROUS_PERMS)
+MODERATE_MASK = _mask_of(MODERATE_PERMS)
+
+# Numeric risk ranks, indexing RISK_LEVELS
+RISK_LOW = 0
+RISK_MODERATE = 1
+RISK_HIGH = 2
+RISK_CRITICAL = 3
+RISK_LEVELS = ('🟢 LOW', '🟠 MODERATE', '🟡 HIGH', '🔴 CRITICAL')
+
+def _rank_of_value(value: int) -> int:
+    """Get numeric risk rank for a permission bitfield"""
+    if value & CRITICAL_MASK:
+        return RISK_CRITICAL
+    elif value & DANGEROUS_MASK:
+        return RISK_HIGH
+    elif value & MODERATE_MASK:
+        return RISK_MODERATE
+    return RISK_LOW
+
+def get_risk_rank(perms: discord.Permissions) -> int:
+    """Get numeric risk rank (RISK_LOW .. RISK_CRITICAL)"""
+    return _rank_of_value(perms.value)
+
+@lru_cache(maxsize=PERMISSION_CACHE_SIZE)
+def _analyze_value(value: int) -> tuple:
+    """Analyze a permission bitfield (memoized by value)"""
+    critical_found = tuple(title for bit, title in _CRITICAL_BITS if value & bit)
+    dangerous_found = tuple(title for bit, title in _DANGEROUS_BITS if value & bit)
+    moderate_found = tuple(title for bit, title in _MODERATE_BITS if value & bit)
+    
+    risk_level = RISK_LEVELS[_rank_of_value(value)]
+    summary = format_permissions(discord.Permissions(value))
+    
+    return critical_found, dangerous_found, moderate_found, risk_level, summary
+
 def analyze_permissions(perms: discord.Permissions) -> dict:
     """
     Analyze permissions and categorize them
@@ -46,48 +109,30 @@ def analyze_permissions(perms: discord.Permissions) -> dict:
             'summary': str
         }
     """
-    critical_found = []
-    dangerous_found = []
-    moderate_found = []
-    
-    # Check critical
-    for perm in CRITICAL_PERMS:
-        if getattr(perms, perm, False):
-            critical_found.append(perm.replace('_', ' ').title())
-    
-    # Check dangerous
-    for perm in DANGEROUS_PERMS:
-        if getattr(perms, perm, False):
-            dangerous_found.append(perm.replace('_', ' ').title())
-    
-    # Check moderate
-    for perm in MODERATE_PERMS:
-        if getattr(perms, perm, False):
-            moderate_found.append(perm.replace('_', ' ').title())
-    
-    # Determine risk level
-    if critical_found:
-        risk_level = '🔴 CRITICAL'
-    elif dangerous_found:
-        risk_level = '🟡 HIGH'
-    elif moderate_found:
-        risk_level = '🟠 MODERATE'
-    else:
-        risk_level = '🟢 LOW'
-    
-    # Generate summary
-    summary = format_permissions(perms)
+    critical_found, dangerous_found, moderate_found, risk_level, summary = _analyze_value(perms.value)
     
     return {
         'has_critical': bool(critical_found),
         'has_dangerous': bool(dangerous_found),
-        'critical_list': critical_found,
-        'dangerous_list': dangerous_found,
-        'moderate_list': moderate_found,
+        'critical_list': list(critical_found),
+        'dangerous_list': list(dangerous_found),
+        'moderate_list': list(moderate_found),
         'risk_level': risk_level,
         'summary': summary
     }
 
+@lru_cache(maxsize=PERMISSION_CACHE_SIZE)
+def _changes_for(before_value: int, after_value: int) -> tuple:
+    """Diff two permission bitfields (memoized by value pair)"""
+    diff = before_value ^ after_value
+    if not diff:
+        return (), (), False
+    
+    added = tuple(title for _, bit, title in _ALL_PERMS if diff & bit and after_value & bit)
+    removed = tuple(title for _, bit, title in _ALL_PERMS if diff & bit and not after_value & bit)
+    
+    return added, removed, bool(diff & CRITICAL_MASK)
+
 def get_permission_changes(before: discord.Permissions, after: discord.Permissions) -> dict:
     """
     Get changes between two permission sets
@@ -99,29 +144,11 @@ def get_permission_changes(before: discord.Permissions, after: discord.Permissio
             'has_critical_changes': bool
         }
     """
-    added = []
-    removed = []
-    
-    # Get all permission names
-    all_perms = [attr for attr in dir(before) if not attr.startswith('_') and isinstance(getattr(before, attr), bool)]
-    
-    for perm in all_perms:
-        before_val = getattr(before, perm, False)
-        after_val = getattr(after, perm, False)
-        
-        if before_val != after_val:
-            perm_name = perm.replace('_', ' ').title()
-            if after_val:  # Permission added
-                added.append(perm_name)
-            else:  # Permission removed
-                removed.append(perm_name)
-    
-    # Check if critical permissions changed
-    has_critical = any(perm.replace(' ', '_').lower() in CRITICAL_PERMS for perm in added + removed)
+    added, removed, has_critical = _changes_for(before.value, after.value)
     
     return {
-        'added': added,
-        'removed': removed,
+        'added': list(added),
+        'removed': list(removed),
         'has_critical_changes': has_critical
     }
 
@@ -153,27 +180,32 @@ def get_dangerous_roles(guild: discord.Guild, threshold: str = 'dangerous') -> l
     Returns:
         list: List of (role, risk_level) tuples
     """
+    # Bits that put a role over the threshold
+    if threshold == 'critical':
+        mask = CRITICAL_MASK
+    elif threshold == 'dangerous':
+        mask = CRITICAL_MASK | DANGEROUS_MASK
+    elif threshold == 'moderate':
+        mask = CRITICAL_MASK | DANGEROUS_MASK | MODERATE_MASK
+    else:
+        return []
+    
     dangerous_roles = []
     
     for role in guild.roles:
         if role.name == '@everyone':
             continue
         
-        analysis = analyze_permissions(role.permissions)
-        
-        if threshold == 'critical' and analysis['has_critical']:
-            dangerous_roles.append((role, analysis['risk_level']))
-        elif threshold == 'dangerous' and (analysis['has_critical'] or analysis['has_dangerous']):
-            dangerous_roles.append((role, analysis['risk_level']))
-        elif threshold == 'moderate':
-            if analysis['has_critical'] or analysis['has_dangerous'] or analysis['moderate_list']:
-                dangerous_roles.append((role, analysis['risk_level']))
+        if role.permissions.value & mask:
+            dangerous_roles.append((role, _analyze_value(role.permissions.value)[3]))
     
     return dangerous_roles
 
 def format_role_info(role: discord.Role) -> str:
     """Get detailed role information"""
+    from risk_index import get_role_risk
     analysis = analyze_permissions(role.permissions)
+    _, member_count = get_role_risk(role)
     
     lines = [
         f"**Role:** {role.name}",
@@ -182,7 +214,7 @@ def format_role_info(role: discord.Role) -> str:
         f"**Color:** {role.color}",
         f"**Mentionable:** {'Yes' if role.mentionable else 'No'}",
         f"**Hoisted:** {'Yes' if role.hoist else 'No'}",
-        f"**Members:** {len(role.members)}",
+        f"**Members:** {member_count}",
         f"**Risk Level:** {analysis['risk_level']}",
         f"**Permissions:** {analysis['summary']}"
     ]
@@ -201,6 +233,12 @@ def check_member_can_harm(member: discord.Member) -> tuple[bool, str]:
     Returns:
         tuple: (can_harm, reason)
     """
+    from risk_index import get_member_rank
+    
+    # Indexed rank answers the common (harmless) case without analysis
+    if get_member_rank(member) < RISK_HIGH:
+        return False, "No harmful permissions"
+    
     analysis = analyze_permissions(member.guild_permissions)
     
     if analysis['has_critical']:
@@ -0,0 +1,479 @@
+# pipeline.py — Staged Event Processing Pipeline
+import asyncio
+import contextvars
+import time
+from collections import deque
+from logger import logger, log_context
+from ordering import KeyedSerializer
+import recorder
+from config import (
+    GUILD_IDS, PIPELINE_STAGES, PIPELINE_INFO_SHED_RATIO, PIPELINE_DEFERRED_MAX,
+    PRIORITY_CRITICAL, PRIORITY_WARNING
+)
+
+# Stage order: gateway events flow normalize → filter → enrich, and the
+# monitor handlers running in enrich hand their side effects to persist/notify
+STAGE_NAMES = ('normalize', 'filter', 'enrich', 'persist', 'notify')
+
+BACKPRESSURE_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+# Priority ranks (lower runs first)
+RANK_CRITICAL = 0
+RANK_WARNING = 1
+RANK_INFO = 2
+RANK_NAMES = ('critical', 'warning', 'info')
+
+# Rank of the event whose handler is currently running, inherited by the
+# persist/notify jobs it creates
+_current_rank = contextvars.ContextVar('pipeline_rank', default=RANK_INFO)
+# Event whose handler is currently running (for defer())
+_current_event = contextvars.ContextVar('pipeline_event', default=None)
+
+def get_rank(category: str) -> int:
+    """Get priority rank for an event category"""
+    if category in PRIORITY_CRITICAL:
+        return RANK_CRITICAL
+    elif category in PRIORITY_WARNING:
+        return RANK_WARNING
+    else:
+        return RANK_INFO
+
+class EventSpec:
+    """How the pipeline routes one gateway event type to its monitor handler"""
+
+    __slots__ = ('handler', 'category', 'guild_of', 'prefilter', 'classify', 'entity_of')
+
+    def __init__(self, handler, category: str, guild_of, prefilter=None, classify=None, entity_of=None):
+        self.handler = handler      # async handler(bot, *args)
+        self.category = category    # filter name (roles, members, ...)
+        self.guild_of = guild_of    # guild_of(*args) -> guild or None
+        self.prefilter = prefilter  # cheap prefilter(*args) -> bool
+        self.classify = classify    # classify(*args) -> category used for priority
+        self.entity_of = entity_of  # entity_of(*args) -> id events are ordered by
+
+    def rank_of(self, args: tuple) -> int:
+        """Get the priority rank for one event of this type"""
+        category = self.classify(*args) if self.classify else self.category
+        return get_rank(category)
+
+class PipelineEvent:
+    """A gateway event travelling through the pipeline"""
+
+    __slots__ = ('kind', 'args', 'spec', 'rank', 'guild_id', 'key', 'ticket', 'received_at', 'held')
+
+    def __init__(self, kind: str, args: tuple, spec: EventSpec, rank: int, guild_id: int):
+        self.kind = kind
+        self.args = args
+        self.spec = spec
+        self.rank = rank
+        self.guild_id = guild_id
+        self.key = None      # (guild_id, entity_id) when the event is ordered
+        self.ticket = None
+        self.received_at = time.perf_counter()
+        self.held = False    # a deferred job releases the ticket instead of the handler
+
+class PriorityBuffer:
+    """
+    Bounded multi-level FIFO buffer
+
+    get() always returns the oldest item of the best (lowest) rank. When the
+    buffer is full, a better-ranked put evicts the oldest item of the worst
+    queued rank, and info items are refused once depth reaches the shed
+    threshold so critical work always finds room.
+    """
+
+    def __init__(self, maxsize: int, shed_at: int = None):
+        self.maxsize = maxsize
+        self.shed_at = shed_at if shed_at is not None else maxsize
+        self._levels = [deque() for _ in RANK_NAMES]
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self._not_empty = asyncio.Condition(self._lock)
+        self._not_full = asyncio.Condition(self._lock)
+
+    def qsize(self) -> int:
+        return self._size
+
+    def level_sizes(self) -> list:
+        return [len(level) for level in self._levels]
+
+    def full(self) -> bool:
+        return self._size >= self.maxsize
+
+    def _append(self, rank: int, item):
+        self._levels[rank].append(item)
+        self._size += 1
+        self._not_empty.notify()
+
+    def _pop(self, rank: int, oldest: bool = True):
+        level = self._levels[rank]
+        item = level.popleft() if oldest else level.pop()
+        self._size -= 1
+        return item
+
+    def _worst_rank(self, below: int):
+        """Get the worst non-empty rank strictly worse than `below`"""
+        for rank in range(len(self._levels) - 1, below, -1):
+            if self._levels[rank]:
+                return rank
+        return None
+
+    async def put(self, rank: int, item, policy: str) -> list:
+        """
+        Add an item under the given policy
+
+        Returns:
+            list: Items dropped to make room (may include `item` itself)
+        """
+        async with self._lock:
+            # Info work is shed first, before the buffer is actually full
+            if rank == RANK_INFO and self._size >= self.shed_at:
+                return [item]
+
+            if not self.full():
+                self._append(rank, item)
+                return []
+
+            # Evict lower-priority work to make room
+            worse = self._worst_rank(rank)
+            if worse is not None:
+                evicted = self._pop(worse)
+                self._append(rank, item)
+                return [evicted]
+
+            # Only equal or better work queued: critical work is never dropped
+            if policy == 'block' or rank == RANK_CRITICAL:
+                await self._not_full.wait_for(lambda: not self.full())
+                self._append(rank, item)
+                return []
+
+            if policy == 'drop_newest':
+                return [item]
+
+            evicted = self._pop(rank)
+            self._append(rank, item)
+            return [evicted]
+
+    async def get(self):
+        """Remove and return the oldest item of the best rank"""
+        async with self._lock:
+            await self._not_empty.wait_for(lambda: self._size > 0)
+            for rank, level in enumerate(self._levels):
+                if level:
+                    item = self._pop(rank)
+                    self._not_full.notify()
+                    return item
+
+class Stage:
+    """One pipeline stage: a bounded priority buffer drained by a fixed worker pool"""
+
+    def __init__(self, name: str, handler, workers: int, maxsize: int, policy: str, on_drop=None):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f'Unknown backpressure policy for {name}: {policy}')
+
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_drop = on_drop
+        self.buffer = PriorityBuffer(maxsize, int(maxsize * PIPELINE_INFO_SHED_RATIO))
+        self._tasks = []
+
+        # Stats
+        self.processed = 0
+        self.dropped = [0] * len(RANK_NAMES)
+        self.errors = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+        self.max_latency = 0.0
+
+    async def put(self, rank: int, item):
+        """Enqueue an item, applying priority shedding and the backpressure policy"""
+        dropped = await self.buffer.put(rank, (time.perf_counter(), rank, item), self.policy)
+        for entry in dropped:
+            self.dropped[entry[1]] += 1
+            logger.debug(f'Pipeline stage {self.name} shed a {RANK_NAMES[entry[1]]} item')
+            if self.on_drop:
+                self.on_drop(entry[2])
+
+    def start(self):
+        """Start the worker pool"""
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f'pipeline-{self.name}-{i}'))
+
+    async def stop(self):
+        """Cancel the worker pool"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _worker(self):
+        """Drain the buffer forever, best rank first"""
+        while True:
+            enqueued_at, rank, item = await self.buffer.get()
+            started = time.perf_counter()
+            token = _current_rank.set(rank)
+            try:
+                await self.handler(item)
+            except Exception as e:
+                self.errors += 1
+                logger.exception(f'Pipeline stage {self.name} failed: {e}')
+            finally:
+                _current_rank.reset(token)
+                finished = time.perf_counter()
+                self.processed += 1
+                self.total_wait += started - enqueued_at
+                self.total_run += finished - started
+                self.max_latency = max(self.max_latency, finished - enqueued_at)
+            # get() doesn't suspend while there is work, so without this a
+            # worker drains its whole backlog before the next stage runs and
+            # a critical item it handed on waits behind that backlog
+            await asyncio.sleep(0)
+
+    def get_stats(self) -> dict:
+        """Get stage statistics"""
+        done = self.processed or 1
+        return {
+            'depth': self.buffer.qsize(),
+            'depth_by_rank': dict(zip(RANK_NAMES, self.buffer.level_sizes())),
+            'capacity': self.maxsize,
+            'workers': self.workers,
+            'policy': self.policy,
+            'processed': self.processed,
+            'dropped': sum(self.dropped),
+            'dropped_by_rank': dict(zip(RANK_NAMES, self.dropped)),
+            'errors': self.errors,
+            'avg_wait_ms': self.total_wait / done * 1000,
+            'avg_run_ms': self.total_run / done * 1000,
+            'max_latency_ms': self.max_latency * 1000
+        }
+
+# ============= PIPELINE =============
+_bot = None
+_specs = {}
+_stages = {}
+_serializer = KeyedSerializer()
+_requeues = set()  # tasks handing released events back to enrich
+_deferred = set()  # jobs finishing an event's handling outside the enrich workers
+_deferred_slots = None  # asyncio.Semaphore(PIPELINE_DEFERRED_MAX) while running
+
+def is_running() -> bool:
+    """Check if the pipeline is accepting events"""
+    return bool(_stages)
+
+async def start(bot, specs: dict):
+    """
+    Build the stages and start their workers
+
+    Args:
+        bot: Bot instance passed to monitor handlers
+        specs: {event_kind: EventSpec}
+    """
+    global _bot, _specs, _deferred_slots
+
+    if is_running():
+        return
+
+    _bot = bot
+    _specs = specs
+    _deferred_slots = asyncio.Semaphore(PIPELINE_DEFERRED_MAX)
+
+    handlers = {
+        'normalize': _normalize,
+        'filter': _filter,
+        'enrich': _enrich,
+        'persist': _run_job,
+        'notify': _run_job
+    }
+
+    for name in STAGE_NAMES:
+        cfg = PIPELINE_STAGES[name]
+        on_drop = _release if name in ('normalize', 'filter', 'enrich') else None
+        _stages[name] = Stage(name, handlers[name], cfg['workers'], cfg['maxsize'], cfg['policy'], on_drop)
+
+    for stage in _stages.values():
+        stage.start()
+
+    logger.info(f'Event pipeline started ({len(specs)} event types)')
+
+async def stop():
+    """Stop all stage workers, dropping queued, parked and deferred work"""
+    global _serializer
+
+    await _cancel_all(_deferred)
+    for stage in _stages.values():
+        await stage.stop()
+    # Requeues started by the releases above, or still waiting for room
+    await _cancel_all(_requeues)
+    _stages.clear()
+    # Dropped events never release their tickets, so start the next run clean
+    _serializer = KeyedSerializer()
+    logger.info('Event pipeline stopped')
+
+async def _cancel_all(tasks: set):
+    """Cancel a set of tasks and wait for them (they remove themselves)"""
+    pending = list(tasks)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+async def submit(kind: str, *args):
+    """
+    Submit a gateway event at ingress, classified by priority
+
+    Falls back to calling the handler directly when the pipeline isn't running.
+    """
+    if recorder.is_recording():
+        recorder.record(kind, args)
+
+    spec = _specs.get(kind)
+    if spec is None:
+        logger.debug(f'No pipeline spec for event {kind}')
+        return
+
+    if not is_running():
+        await spec.handler(_bot, *args)
+        return
+
+    guild = spec.guild_of(*args)
+    rank = spec.rank_of(args)
+    event = PipelineEvent(kind, args, spec, rank, guild.id if guild else None)
+    
+    # Take the entity's ticket now, in gateway arrival order
+    if guild is not None and spec.entity_of is not None:
+        event.key = (guild.id, spec.entity_of(*args))
+        event.ticket = _serializer.ticket(event.key)
+    
+    await _stages['normalize'].put(rank, event)
+
+async def persist(fn, *args, **kwargs):
+    """Run a DB write in the persist stage (inline if the pipeline is stopped)"""
+    if not is_running():
+        await _run_job((fn, args, kwargs))
+        return
+    await _stages['persist'].put(_current_rank.get(), (fn, args, kwargs))
+
+async def notify(fn, *args, **kwargs):
+    """Run an alert coroutine in the notify stage (inline if the pipeline is stopped)"""
+    if not is_running():
+        await fn(*args, **kwargs)
+        return
+    await _stages['notify'].put(_current_rank.get(), (fn, args, kwargs))
+
+async def defer(fn, *args, **kwargs):
+    """
+    Finish the current event's handling in a job of its own
+
+    For a handler that has to wait on something slow (invite attribution)
+    without holding an enrich worker. The event's entity ticket is kept
+    until the job is done, so later events for the entity still run after
+    it. At most PIPELINE_DEFERRED_MAX jobs run at once; past that the
+    handler waits for a slot. stop() cancels jobs still running. Runs
+    inline if the pipeline is stopped.
+    """
+    if not is_running():
+        await fn(*args, **kwargs)
+        return
+
+    await _deferred_slots.acquire()
+    event = _current_event.get()
+    if event is not None:
+        event.held = True
+    task = asyncio.create_task(_run_deferred(fn, args, kwargs))
+    _deferred.add(task)
+
+    def _done(task):
+        _deferred.discard(task)
+        _deferred_slots.release()
+        if event is not None:
+            _release(event)
+    task.add_done_callback(_done)
+
+async def _run_deferred(fn, args: tuple, kwargs: dict):
+    try:
+        await fn(*args, **kwargs)
+    except Exception as e:
+        logger.exception(f'Deferred pipeline job failed: {e}')
+
+def get_stats() -> dict:
+    """Get per-stage queue depth and latency statistics"""
+    return {name: stage.get_stats() for name, stage in _stages.items()}
+
+def get_ordering_stats() -> dict:
+    """Get per-entity ordering statistics"""
+    return {'active_keys': len(_serializer), 'parked': _serializer.parked_count(), 'deferred': len(_deferred)}
+
+def format_stats() -> str:
+    """Get formatted pipeline statistics for display"""
+    if not is_running():
+        return '⚙️ **Event Pipeline:** Not running'
+
+    lines = ['⚙️ **Event Pipeline** (critical / warning / info)\n']
+    for name, s in get_stats().items():
+        depth = ' / '.join(str(n) for n in s['depth_by_rank'].values())
+        dropped = ' / '.join(str(n) for n in s['dropped_by_rank'].values())
+        lines.append(
+            f"**{name}** — depth {s['depth']}/{s['capacity']} ({depth}), {s['workers']} workers, `{s['policy']}`\n"
+            f"  processed {s['processed']}, dropped {s['dropped']} ({dropped}), errors {s['errors']}\n"
+            f"  wait {s['avg_wait_ms']:.1f}ms, run {s['avg_run_ms']:.1f}ms, max {s['max_latency_ms']:.1f}ms"
+        )
+    
+    ordering = get_ordering_stats()
+    lines.append(f"\n**Ordering:** {ordering['active_keys']} active entities, {ordering['parked']} parked events, "
+                 f"{ordering['deferred']} deferred jobs")
+    return '\n'.join(lines)
+
+# ============= STAGE HANDLERS =============
+async def _normalize(event: PipelineEvent):
+    """Drop events without a guild or from other guilds"""
+    if event.guild_id is None or (GUILD_IDS and event.guild_id not in GUILD_IDS):
+        _release(event)
+        return
+
+    await _stages['filter'].put(event.rank, event)
+
+async def _filter(event: PipelineEvent):
+    """Drop events the monitor handler would ignore anyway"""
+    prefilter = event.spec.prefilter
+    if prefilter is not None and not prefilter(*event.args):
+        _release(event)
+        return
+    await _stages['enrich'].put(event.rank, event)
+
+async def _enrich(event: PipelineEvent):
+    """Run the monitor handler (audit-log lookups and alert building)"""
+    # An earlier event for the same entity is still in flight: park this one
+    # instead of holding a worker, release() hands it back when it's due
+    if event.key is not None and not _serializer.ready(event.key, event.ticket):
+        _serializer.park(event.key, event.ticket, event)
+        return
+
+    token = log_context.set((event.kind, event.guild_id, event.key[1] if event.key else None, event.received_at))
+    event_token = _current_event.set(event)
+    try:
+        await event.spec.handler(_bot, *event.args)
+    finally:
+        _current_event.reset(event_token)
+        log_context.reset(token)
+        if not event.held:
+            _release(event)
+
+def _release(event: PipelineEvent):
+    """Finish an event's ticket and requeue the next event for its entity"""
+    # After stop() the tickets belong to a serializer that is gone
+    if event.key is None or not is_running():
+        return
+
+    for successor in _serializer.release(event.key, event.ticket):
+        task = asyncio.create_task(_stages['enrich'].put(successor.rank, successor))
+        _requeues.add(task)
+        task.add_done_callback(_requeues.discard)
+
+async def _run_job(job: tuple):
+    """Run a deferred persist/notify job"""
+    fn, args, kwargs = job
+    result = fn(*args, **kwargs)
+    if asyncio.iscoroutine(result):
+        await result
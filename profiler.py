@@ -0,0 +1,224 @@
+# profiler.py — On-Demand CPU & Memory Profiling
+import asyncio
+import cProfile
+import collections
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from logger import logger
+from config import PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL, PROFILE_MEM_FRAMES, PROFILE_TOP
+
+_profile_lock = asyncio.Lock()  # one profile at a time
+
+# Leaf frames meaning the loop was waiting for I/O, not running code
+_IDLE_FUNCTIONS = {'select', 'poll', 'epoll', 'kqueue', 'control', 'wait'}
+
+def is_running() -> bool:
+    """Check if a profile is in progress"""
+    return _profile_lock.locked()
+
+def clamp_seconds(seconds: float) -> float:
+    """Keep a profiling window within 1..PROFILE_MAX_SECONDS"""
+    return max(1.0, min(float(seconds), PROFILE_MAX_SECONDS))
+
+def _short_path(filename: str) -> str:
+    """Trim a path to something readable (repo-relative or package-relative)"""
+    cwd = os.getcwd() + os.sep
+    if filename.startswith(cwd):
+        return filename[len(cwd):]
+    marker = os.sep + 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return filename
+
+# ============= CPU: SAMPLING =============
+class StackSampler(threading.Thread):
+    """
+    Sample another thread's Python stack at a fixed interval
+
+    Runs outside the event loop, so the loop only pays for the GIL handoff
+    of each sample (bounded by the interval) instead of a tracing hook on
+    every call. A sample can only be taken when the loop thread yields the
+    GIL, so time inside C calls that hold it is under-counted (use exact).
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profiler-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()  # {(frame, ...) root first: samples}
+        self.samples = 0
+        self.idle = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            stack.reverse()
+
+            self.samples += 1
+            if stack[-1][2] in _IDLE_FUNCTIONS:
+                self.idle += 1
+            else:
+                self.stacks[tuple(stack)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def _format_samples(sampler: StackSampler, seconds: float) -> str:
+    """Render self/cumulative tables and collapsed stacks"""
+    busy = sampler.samples - sampler.idle
+    self_counts = collections.Counter()
+    total_counts = collections.Counter()
+    for stack, count in sampler.stacks.items():
+        self_counts[stack[-1]] += count
+        for frame in set(stack):
+            total_counts[frame] += count
+
+    def _label(frame):
+        filename, lineno, name = frame
+        return f'{name} ({_short_path(filename)}:{lineno})'
+
+    def _pct(count):
+        return count / sampler.samples * 100 if sampler.samples else 0.0
+
+    lines = [
+        f'CPU profile (sampling every {sampler.interval * 1000:.0f} ms for {seconds:.0f}s)',
+        f'Samples: {sampler.samples}, busy: {busy} ({_pct(busy):.1f}%), idle in I/O wait: {sampler.idle}',
+        '',
+        f'Top {PROFILE_TOP} by self time:',
+        f"{'samples':>8} {'%':>6}  function"
+    ]
+    lines.extend(f'{count:>8} {_pct(count):>6.1f}  {_label(frame)}' for frame, count in self_counts.most_common(PROFILE_TOP))
+
+    lines += ['', f'Top {PROFILE_TOP} by cumulative time:', f"{'samples':>8} {'%':>6}  function"]
+    lines.extend(f'{count:>8} {_pct(count):>6.1f}  {_label(frame)}' for frame, count in total_counts.most_common(PROFILE_TOP))
+
+    # Collapsed stacks (flamegraph.pl / speedscope input)
+    lines += ['', 'Collapsed stacks:']
+    for stack, count in sampler.stacks.most_common():
+        lines.append(';'.join(f'{name} ({_short_path(filename)})' for filename, _, name in stack) + f' {count}')
+    return '\n'.join(lines)
+
+# ============= CPU: EXACT =============
+def _format_cprofile(profile: cProfile.Profile, seconds: float) -> str:
+    """Render cProfile stats sorted by own and cumulative time"""
+    out = io.StringIO()
+    out.write(f'CPU profile (cProfile, exact call counts, {seconds:.0f}s)\n\n')
+    stats = pstats.Stats(profile, stream=out)
+    stats.strip_dirs()
+    stats.sort_stats('tottime').print_stats(PROFILE_TOP)
+    stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+    return out.getvalue()
+
+async def profile_cpu(seconds: float, exact: bool = False) -> tuple:
+    """
+    Profile the event loop thread for a time window
+
+    Sampling is the default (bounded overhead). `exact` uses cProfile,
+    which traces every call and slows the bot noticeably while it runs.
+
+    Returns:
+        tuple: (summary line, report text)
+    """
+    seconds = clamp_seconds(seconds)
+    async with _profile_lock:
+        started = time.perf_counter()
+        if exact:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+            report = _format_cprofile(profile, seconds)
+            summary = f'cProfile, {seconds:.0f}s'
+        else:
+            sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                await asyncio.to_thread(sampler.stop)
+            report = _format_samples(sampler, seconds)
+            busy = (sampler.samples - sampler.idle) / sampler.samples * 100 if sampler.samples else 0.0
+            summary = f'{sampler.samples} samples over {seconds:.0f}s, loop busy {busy:.1f}%'
+
+        logger.info(f'CPU profile finished in {time.perf_counter() - started:.1f}s ({summary})')
+        return summary, report
+
+# ============= MEMORY =============
+async def profile_mem(seconds: float) -> tuple:
+    """
+    Trace allocations for a time window
+
+    Reports what was allocated during the window (and is still alive at
+    the end) by call site, plus the largest sites overall.
+
+    Returns:
+        tuple: (summary line, report text)
+    """
+    seconds = clamp_seconds(seconds)
+    async with _profile_lock:
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(PROFILE_MEM_FRAMES)
+        try:
+            before = tracemalloc.take_snapshot()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+        # Leave out the tracing machinery itself
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap>')]
+        before = before.filter_traces(filters)
+        after = after.filter_traces(filters)
+
+        growth = after.compare_to(before, 'lineno')
+        grown = sum(stat.size_diff for stat in growth if stat.size_diff > 0)
+
+        lines = [
+            f'Memory profile (tracemalloc, {PROFILE_MEM_FRAMES} frames, {seconds:.0f}s)',
+            f'Traced: {traced / 1024:.0f} KiB, peak: {peak / 1024:.0f} KiB, grown in window: {grown / 1024:.0f} KiB',
+            '',
+            f'Top {PROFILE_TOP} growth by line:'
+        ]
+        lines.extend(
+            f'{stat.size_diff / 1024:>+10.1f} KiB {stat.count_diff:>+8} blocks  '
+            f'{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}'
+            for stat in growth[:PROFILE_TOP] if stat.size_diff
+        )
+
+        lines += ['', f'Top {PROFILE_TOP // 2} growth by call stack:']
+        for stat in after.compare_to(before, 'traceback')[:PROFILE_TOP // 2]:
+            if stat.size_diff <= 0:
+                continue
+            lines.append(f'{stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+} blocks')
+            lines.extend(f'    {_short_path(frame.filename)}:{frame.lineno}' for frame in stat.traceback)
+
+        lines += ['', f'Top {PROFILE_TOP} live allocations by line:']
+        lines.extend(
+            f'{stat.size / 1024:>10.1f} KiB {stat.count:>8} blocks  '
+            f'{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}'
+            for stat in after.statistics('lineno')[:PROFILE_TOP]
+        )
+
+        summary = f'{grown / 1024:.0f} KiB grown over {seconds:.0f}s (peak traced {peak / 1024:.0f} KiB)'
+        logger.info(f'Memory profile finished ({summary})')
+        return summary, '\n'.join(lines)
@@ -4,6 +4,9 @@ import discord
 from db_manager import load_db, save_db
 from logger import logger
 from config import QUICK_ACTIONS_ENABLED, QUICK_ACTION_TIMEOUT
+from utils import get_or_fetch_member
+import sharding
+import cache_policy
 import datetime
 
 # Store pending quick actions: {action_id: {details}}
@@ -52,6 +55,9 @@ def create_quick_action(event_type: str, target_id: int, guild_id: int, details:
     if not options:
         return ""
     
+    # Replies reach the DM process: let it know which process holds this one
+    sharding.claim_action(action_id)
+    
     # Format message
     lines = [
         f"\n{'─'*40}",
@@ -163,7 +169,7 @@ async def _execute_action(bot, action: dict, command: str) -> str:
         
         elif command == 'kick':
             try:
-                member = guild.get_member(target_id)
+                member = await get_or_fetch_member(guild, target_id)
                 if member:
                     await member.kick(reason='Quick action: Kick')
                     logger.info(f'Quick action: Kicked {target_id}')
@@ -176,7 +182,7 @@ async def _execute_action(bot, action: dict, command: str) -> str:
         
         elif command == 'strip':
             try:
-                member = guild.get_member(target_id)
+                member = await get_or_fetch_member(guild, target_id)
                 if not member:
                     return '❌ Member not found'
                 
@@ -195,7 +201,7 @@ async def _execute_action(bot, action: dict, command: str) -> str:
         
         elif command == 'timeout':
             try:
-                member = guild.get_member(target_id)
+                member = await get_or_fetch_member(guild, target_id)
                 if not member:
                     return '❌ Member not found'
                 
@@ -208,19 +214,20 @@ async def _execute_action(bot, action: dict, command: str) -> str:
                 return f'❌ Timeout failed: {str(e)}'
         
         elif command == 'watch':
-            from db_manager import load_db, save_db
-            db = load_db()
+            from db_manager import get_watched_users, save_partition
+            watched = get_watched_users(guild.id)
             user_id_str = str(target_id)
-            if user_id_str not in db.get('watched_users', []):
-                db.setdefault('watched_users', []).append(user_id_str)
-                save_db(db)
+            if user_id_str not in watched:
+                watched.append(user_id_str)
+                save_partition(guild.id)
+                await cache_policy.cache_members(guild, [target_id])
                 logger.info(f'Quick action: Now watching {target_id}')
-                return f'✅ Now watching {target_id}'
+                return f'✅ Now watching {target_id}{cache_policy.restart_notice()}'
             else:
                 return f'⚠️ Already watching {target_id}'
         
         elif command == 'info':
-            member = guild.get_member(target_id)
+            member = await get_or_fetch_member(guild, target_id)
             if not member:
                 return f'❌ Member not found (ID: {target_id})'
             
@@ -0,0 +1,277 @@
+# recorder.py — Gateway Event Recorder
+#
+# Writes every event entering the pipeline to a gzip-compressed JSONL file:
+# a header line with the guild's roles and channels, then one line per event
+#   {"t": seconds since start, "kind": "member_join", "args": [payload, ...]}
+# Payloads are gateway-shaped, so replay.py can rebuild real discord.py
+# objects from them (see fakes.py).
+import datetime
+import gzip
+import json
+import os
+import time
+import discord
+from logger import logger
+from config import RECORDINGS_DIR, RECORD_MAX_EVENTS
+
+FORMAT_VERSION = 1
+
+# Argument types per event kind (matches monitors.EVENT_SPECS handler args)
+EVENT_ARGS = {
+    'member_join': ('member',),
+    'member_remove': ('member',),
+    'member_update': ('member', 'member'),
+    'member_ban': ('guild_ref', 'user'),
+    'member_unban': ('guild_ref', 'user'),
+    'channel_create': ('channel',),
+    'channel_delete': ('channel',),
+    'channel_update': ('channel', 'channel'),
+    'role_create': ('role',),
+    'role_delete': ('role',),
+    'role_update': ('role', 'role'),
+    'message_delete': ('message',),
+    'message_edit': ('message', 'message'),
+    'guild_update': ('guild', 'guild'),
+    'voice_state_update': ('member', 'voice', 'voice'),
+    'invite_create': ('invite',),
+    'invite_delete': ('invite',),
+}
+
+_file = None
+_path = None
+_started = 0.0
+_count = 0
+
+# ============= SERIALIZERS =============
+def _iso(dt) -> str:
+    return dt.isoformat() if dt else None
+
+def serialize_user(user) -> dict:
+    return {
+        'id': str(user.id),
+        'username': user.name,
+        'discriminator': user.discriminator,
+        'global_name': user.global_name,
+        'avatar': None,
+        'bot': user.bot
+    }
+
+def serialize_member(member: discord.Member) -> dict:
+    return {
+        'user': serialize_user(member),
+        'roles': [str(role_id) for role_id in member._roles],
+        'nick': member.nick,
+        'joined_at': _iso(member.joined_at),
+        'communication_disabled_until': _iso(member.timed_out_until),
+        'flags': member.flags.value,
+        'deaf': False,
+        'mute': False,
+        'avatar': None
+    }
+
+def serialize_role(role: discord.Role) -> dict:
+    return {
+        'id': str(role.id),
+        'name': role.name,
+        'permissions': str(role.permissions.value),
+        'position': role.position,
+        'color': role.color.value,
+        'hoist': role.hoist,
+        'managed': role.managed,
+        'mentionable': role.mentionable,
+        'flags': 0
+    }
+
+def serialize_channel(channel) -> dict:
+    return {
+        'id': str(channel.id),
+        'type': channel.type.value,
+        'name': channel.name,
+        'position': channel.position,
+        'parent_id': str(channel.category_id) if channel.category_id else None,
+        'topic': getattr(channel, 'topic', None),
+        'nsfw': getattr(channel, 'nsfw', False),
+        'rate_limit_per_user': getattr(channel, 'slowmode_delay', 0),
+        'bitrate': getattr(channel, 'bitrate', 64000),
+        'user_limit': getattr(channel, 'user_limit', 0),
+        'permission_overwrites': [
+            {'id': str(ow.id), 'type': ow.type, 'allow': str(ow.allow), 'deny': str(ow.deny)}
+            for ow in channel._overwrites
+        ]
+    }
+
+def serialize_message(message: discord.Message) -> dict:
+    return {
+        'id': str(message.id),
+        'channel_id': str(message.channel.id),
+        'guild_id': str(message.guild.id) if message.guild else None,
+        'author': serialize_user(message.author),
+        'content': message.content,
+        'attachments': [
+            {'id': str(a.id), 'filename': a.filename, 'size': a.size, 'url': a.url, 'proxy_url': a.proxy_url}
+            for a in message.attachments
+        ],
+        'embeds': [],
+        'mentions': [],
+        'mention_roles': [],
+        'pinned': message.pinned,
+        'mention_everyone': message.mention_everyone,
+        'tts': message.tts,
+        'timestamp': _iso(message.created_at),
+        'edited_timestamp': _iso(message.edited_at),
+        'type': message.type.value
+    }
+
+def serialize_guild(guild: discord.Guild, full: bool = False) -> dict:
+    """Guild settings (plus roles and channels when `full`)"""
+    data = {
+        'id': str(guild.id),
+        'name': guild.name,
+        'owner_id': str(guild.owner_id),
+        'icon': guild.icon.key if guild.icon else None,
+        'verification_level': guild.verification_level.value,
+        'default_message_notifications': guild.default_notifications.value,
+        'vanity_url_code': guild.vanity_url_code,
+        'member_count': guild.member_count,
+        'emojis': [],
+        'stickers': [],
+        'features': list(guild.features)
+    }
+    if full:
+        data['roles'] = [serialize_role(role) for role in guild.roles]
+        data['channels'] = [serialize_channel(channel) for channel in guild.channels]
+    return data
+
+def serialize_voice(state: discord.VoiceState, member: discord.Member) -> dict:
+    return {
+        'channel_id': str(state.channel.id) if state.channel else None,
+        'user_id': str(member.id),
+        'session_id': state.session_id or '',
+        'deaf': state.deaf,
+        'mute': state.mute,
+        'self_deaf': state.self_deaf,
+        'self_mute': state.self_mute,
+        'self_video': state.self_video,
+        'self_stream': state.self_stream,
+        'suppress': state.suppress,
+        'request_to_speak_timestamp': None
+    }
+
+def serialize_invite(invite: discord.Invite) -> dict:
+    return {
+        'code': invite.code,
+        'uses': invite.uses,
+        'max_uses': invite.max_uses,
+        'max_age': invite.max_age,
+        'temporary': invite.temporary,
+        'created_at': _iso(invite.created_at),
+        'inviter': serialize_user(invite.inviter) if invite.inviter else None,
+        'channel_id': str(invite.channel.id) if invite.channel else None
+    }
+
+def serialize_args(kind: str, args: tuple) -> list:
+    """Turn an event's handler args into payloads"""
+    payloads = []
+    for arg_type, arg in zip(EVENT_ARGS[kind], args):
+        if arg_type == 'member':
+            payloads.append(serialize_member(arg))
+        elif arg_type == 'user':
+            payloads.append(serialize_user(arg))
+        elif arg_type == 'guild_ref':
+            payloads.append({'id': str(arg.id)})
+        elif arg_type == 'guild':
+            payloads.append(serialize_guild(arg))
+        elif arg_type == 'channel':
+            payloads.append(serialize_channel(arg))
+        elif arg_type == 'role':
+            payloads.append(serialize_role(arg))
+        elif arg_type == 'message':
+            payloads.append(serialize_message(arg))
+        elif arg_type == 'voice':
+            payloads.append(serialize_voice(arg, args[0]))
+        elif arg_type == 'invite':
+            payloads.append(serialize_invite(arg))
+    return payloads
+
+# ============= RECORDING =============
+def is_recording() -> bool:
+    """Check if events are being recorded"""
+    return _file is not None
+
+def start(guild: discord.Guild, name: str = None) -> str:
+    """
+    Start recording events, beginning with a snapshot of the guild
+
+    Returns:
+        str: Path of the recording file
+    """
+    global _file, _path, _started, _count
+
+    if is_recording():
+        stop()
+
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    name = name or datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    _path = os.path.join(RECORDINGS_DIR, f'{name}.jsonl.gz')
+    _file = gzip.open(_path, 'wt', encoding='utf-8')
+    _started = time.monotonic()
+    _count = 0
+
+    header = {
+        'format': 'qbot-events',
+        'version': FORMAT_VERSION,
+        'started': datetime.datetime.utcnow().isoformat(),
+        'guild': serialize_guild(guild, full=True)
+    }
+    _file.write(json.dumps(header, ensure_ascii=False) + '\n')
+
+    logger.info(f'Recording events to {_path}')
+    return _path
+
+def stop() -> dict:
+    """
+    Stop recording
+
+    Returns:
+        dict: {'path', 'events', 'seconds'} or None if not recording
+    """
+    global _file
+
+    if not is_recording():
+        return None
+
+    _file.close()
+    _file = None
+    result = {'path': _path, 'events': _count, 'seconds': time.monotonic() - _started}
+    logger.info(f'Recording stopped: {_count} events in {_path}')
+    return result
+
+def record(kind: str, args: tuple):
+    """Append one event (no-op unless recording)"""
+    global _count
+
+    if _file is None or kind not in EVENT_ARGS:
+        return
+
+    try:
+        line = {'t': round(time.monotonic() - _started, 4), 'kind': kind, 'args': serialize_args(kind, args)}
+        _file.write(json.dumps(line, ensure_ascii=False) + '\n')
+        _count += 1
+    except Exception as e:
+        logger.exception(f'Failed to record {kind}: {e}')
+        return
+
+    if _count >= RECORD_MAX_EVENTS:
+        logger.warning(f'Recording reached {RECORD_MAX_EVENTS} events, stopping')
+        stop()
+
+def get_status() -> dict:
+    """Get current recording status"""
+    if not is_recording():
+        return {'recording': False}
+    return {
+        'recording': True,
+        'path': _path,
+        'events': _count,
+        'seconds': time.monotonic() - _started
+    }
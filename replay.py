@@ -0,0 +1,380 @@
+# replay.py — Offline Replay of Recorded Gateway Events
+#
+# Feeds a recorder.py file through the real event pipeline and monitor
+# handlers against an offline guild (see fakes.py), with DMs captured
+# instead of sent and a scratch database.
+#
+#   python replay.py recordings/raid.jsonl.gz            # recorded speed
+#   python replay.py recordings/raid.jsonl.gz --speed 10
+#   python replay.py recordings/raid.jsonl.gz --fast --json results.json
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+import discord
+import fakes
+from recorder import EVENT_ARGS, FORMAT_VERSION
+
+# ============= LOADING =============
+def load_recording(path: str) -> tuple:
+    """
+    Read a recording
+
+    Returns:
+        tuple: (header dict, list of event dicts)
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != 'qbot-events' or header.get('version') != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a version {FORMAT_VERSION} event recording')
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+def build_world(header: dict) -> tuple:
+    """
+    Build the offline guild a recording starts from
+
+    Returns:
+        tuple: (FakeBot, guild, OfflineHTTP)
+    """
+    http = fakes.OfflineHTTP()
+    state = fakes.make_state(http)
+    data = dict(header['guild'])
+    data.setdefault('members', [])
+    guild = fakes.make_guild(state, data)
+    return fakes.FakeBot(guild), guild, http
+
+# ============= DECODING =============
+def _detached_guild(state, data: dict) -> discord.Guild:
+    """Build a guild outside the cache (guild_update before/after settings)"""
+    return discord.Guild(data={'roles': [], 'channels': [], **data}, state=state)
+
+def decode_args(guild, kind: str, payloads: list) -> tuple:
+    """
+    Rebuild an event's handler args and apply its cache side effects
+
+    The guild cache is updated the way discord.py updates it before
+    dispatching, so handlers see the same state they saw live.
+    """
+    arg_types = EVENT_ARGS[kind]
+    state = guild._state
+    args = []
+
+    for arg_type, data in zip(arg_types, payloads):
+        if arg_type == 'member':
+            args.append(fakes.make_member(guild, data))
+        elif arg_type == 'user':
+            args.append(fakes.make_user(state, data))
+        elif arg_type == 'guild_ref':
+            args.append(guild)
+        elif arg_type == 'guild':
+            args.append(_detached_guild(state, data))
+        elif arg_type == 'channel':
+            args.append(fakes.make_channel(guild, data))
+        elif arg_type == 'role':
+            args.append(fakes.make_role(guild, data))
+        elif arg_type == 'message':
+            args.append(fakes.make_message(guild, data))
+        elif arg_type == 'voice':
+            args.append(fakes.make_voice_state(guild, data))
+        elif arg_type == 'invite':
+            args.append(fakes.make_invite(guild, data))
+
+    if kind == 'member_join':
+        guild._add_member(args[0])
+        guild._member_count = (guild._member_count or 0) + 1
+    elif kind == 'member_remove':
+        guild._remove_member(args[0])
+        guild._member_count = max((guild._member_count or 1) - 1, 0)
+    elif kind == 'member_update':
+        guild._add_member(args[1])
+    elif kind in ('channel_create', 'channel_update'):
+        guild._add_channel(args[-1])
+    elif kind == 'channel_delete':
+        guild._remove_channel(args[0])
+    elif kind in ('role_create', 'role_update'):
+        guild._add_role(args[-1])
+    elif kind == 'role_delete':
+        guild._remove_role(args[0].id)
+
+    return tuple(args)
+
+# ============= INDEX HOOKS =============
+def _index_hooks() -> dict:
+    """The synchronous index updates bot.py runs before submitting each event"""
+    import risk_index
+    import channel_perms
+    import member_counters
+    return {
+        'member_join': (risk_index.on_member_join, channel_perms.on_member_join, member_counters.on_member_join),
+        'member_remove': (risk_index.on_member_remove, channel_perms.on_member_remove, member_counters.on_member_remove,
+                          lambda member: member_counters.on_raw_member_remove(member.guild)),
+        'member_update': (risk_index.on_member_update, channel_perms.on_member_update, member_counters.on_member_update),
+        'channel_delete': (channel_perms.on_channel_delete,),
+        'channel_update': (channel_perms.on_channel_update,),
+        'role_create': (risk_index.on_role_create,),
+        'role_delete': (risk_index.on_role_delete, channel_perms.on_role_delete),
+        'role_update': (risk_index.on_role_update, channel_perms.on_role_update),
+        'guild_update': (risk_index.on_guild_update,),
+    }
+
+# ============= ISOLATION =============
+_saved_audit = None  # (AUDIT_DB_PATH, connection) isolate() replaced
+
+def isolate(scratch_dir: str, guild_id: int, watch: list, rate_limit: bool) -> list:
+    """
+    Point every side effect somewhere harmless
+
+    Returns:
+        list: Captured alerts (filled in as handlers run)
+    """
+    global _saved_audit
+    import audit_store
+    import db_manager
+    import dm_notify
+    import monitors
+    import pipeline
+
+    db_manager.DB_PATH = os.path.join(scratch_dir, 'db.json')
+    db_manager.GUILD_DATA_DIR = os.path.join(scratch_dir, 'guilds')
+    db_manager._partitions.clear()
+    _saved_audit = (audit_store.AUDIT_DB_PATH, audit_store._conn)
+    audit_store.AUDIT_DB_PATH = os.path.join(scratch_dir, 'audit.db')
+    audit_store._conn = None
+    if watch:
+        db_manager.get_partition(guild_id)['watched_users'] = [str(user_id) for user_id in watch]
+        db_manager.save_partition(guild_id)
+
+    # Recordings may come from any guild
+    monitors.GUILD_IDS = ()
+    pipeline.GUILD_IDS = ()
+
+    dm_notify.DM_ALERTS = True
+    dm_notify.OWNER_ID = dm_notify.OWNER_ID or 1
+    if not rate_limit:
+        dm_notify.ALERT_COOLDOWN = 0
+        dm_notify.MAX_ALERTS_PER_MINUTE = 10 ** 9
+        dm_notify.alert_timestamps = deque()
+
+    alerts = []
+
+    async def _capture_dm_alert(bot, title, details, priority, embed_fields=None, quick_action_text=None, guild=None):
+        alerts.append({
+            'at': time.perf_counter(),
+            'title': title,
+            'priority': priority,
+            'details': details,
+            'quick_actions': bool(quick_action_text)
+        })
+
+    dm_notify._send_dm_alert = _capture_dm_alert
+    return alerts
+
+def release_audit_store():
+    """Close the scratch audit store and point audit_store back at the one isolate() replaced"""
+    global _saved_audit
+    import audit_store
+
+    if _saved_audit is None:
+        return
+    if audit_store._conn is not None and audit_store._conn is not _saved_audit[1]:
+        audit_store._conn.close()
+    audit_store.AUDIT_DB_PATH, audit_store._conn = _saved_audit
+    _saved_audit = None
+
+# ============= TIMING =============
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def _timed_specs(specs: dict, latencies: dict, in_flight: list) -> dict:
+    """Copy the event specs with each handler wrapped in a timer"""
+    from pipeline import EventSpec
+
+    def _wrap(kind, handler):
+        async def _timed(bot, *args):
+            in_flight[0] += 1
+            started = time.perf_counter()
+            try:
+                await handler(bot, *args)
+            finally:
+                latencies.setdefault(kind, []).append(time.perf_counter() - started)
+                in_flight[0] -= 1
+        return _timed
+
+    return {
+        kind: EventSpec(_wrap(kind, spec.handler), spec.category, spec.guild_of,
+                        spec.prefilter, spec.classify, spec.entity_of)
+        for kind, spec in specs.items()
+    }
+
+async def _drained(in_flight: list) -> bool:
+    """Check that no queued, parked, running or deferred work is left"""
+    import monitors
+    import pipeline
+
+    if in_flight[0] or monitors._refresh_tasks:
+        return False
+    ordering = pipeline.get_ordering_stats()
+    if ordering['parked'] or ordering['deferred']:
+        return False
+    return all(stats['depth'] == 0 for stats in pipeline.get_stats().values())
+
+async def _wait_drained(in_flight: list, idle_checks: int = 3, interval: float = 0.01):
+    """Wait until the pipeline stays idle for a few consecutive checks"""
+    idle = 0
+    while idle < idle_checks:
+        await asyncio.sleep(interval)
+        idle = idle + 1 if await _drained(in_flight) else 0
+
+# ============= REPLAY =============
+async def replay(path: str, speed: float = 1.0, watch: list = (), rate_limit: bool = False) -> dict:
+    """
+    Replay a recording through the pipeline and monitor handlers
+
+    Args:
+        speed: Playback speed relative to the recording (0 = as fast as possible)
+
+    Returns:
+        dict: Throughput, per-handler latency percentiles and captured alerts
+    """
+    header, events = load_recording(path)
+
+    with tempfile.TemporaryDirectory(prefix='qbot-replay-') as scratch_dir:
+        alerts = isolate(scratch_dir, int(header['guild']['id']), list(watch), rate_limit)
+
+        import monitors
+        import pipeline
+        import risk_index
+        import channel_perms
+        import member_counters
+
+        bot, guild, http = build_world(header)
+        await monitors.cache_invites(guild)
+        risk_index.build(guild)
+        channel_perms.build(guild)
+        member_counters.build(guild)
+        hooks = _index_hooks()
+
+        latencies = {}
+        in_flight = [0]
+        await pipeline.start(bot, _timed_specs(monitors.EVENT_SPECS, latencies, in_flight))
+
+        decode_time = 0.0
+        started = time.perf_counter()
+        try:
+            for event in events:
+                if speed > 0:
+                    delay = started + event['t'] / speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                decode_started = time.perf_counter()
+                args = decode_args(guild, event['kind'], event['args'])
+                for hook in hooks.get(event['kind'], ()):
+                    hook(*args)
+                decode_time += time.perf_counter() - decode_started
+
+                await pipeline.submit(event['kind'], *args)
+
+            await _wait_drained(in_flight)
+            elapsed = time.perf_counter() - started
+            pipeline_stats = pipeline.get_stats()
+        finally:
+            await pipeline.stop()
+            release_audit_store()
+
+    handlers = {}
+    for kind, values in sorted(latencies.items()):
+        values.sort()
+        handlers[kind] = {
+            'count': len(values),
+            'p50_ms': percentile(values, 50) * 1000,
+            'p90_ms': percentile(values, 90) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': values[-1] * 1000
+        }
+
+    by_title = {}
+    for entry in alerts:
+        by_title[entry['title']] = by_title.get(entry['title'], 0) + 1
+        entry['at'] = round(entry['at'] - started, 4)
+
+    return {
+        'recording': path,
+        'guild': header['guild']['name'],
+        'speed': speed,
+        'events': len(events),
+        'recorded_seconds': events[-1]['t'] if events else 0.0,
+        'elapsed_seconds': elapsed,
+        'events_per_second': len(events) / elapsed if elapsed else 0.0,
+        'decode_ms': decode_time * 1000,
+        'handlers': handlers,
+        'dropped': {name: stats['dropped_by_rank'] for name, stats in pipeline_stats.items() if stats['dropped']},
+        'alerts': alerts,
+        'alerts_by_title': by_title,
+        'http_calls': dict(http.calls)
+    }
+
+def print_report(result: dict, show_alerts: int = 10):
+    """Print a replay result as a readable report"""
+    print(f"Recording: {result['recording']} ({result['guild']})")
+    print(f"Events:    {result['events']} over {result['recorded_seconds']:.2f}s recorded")
+    speed = 'as fast as possible' if result['speed'] <= 0 else f"{result['speed']:g}x"
+    print(f"Replay:    {result['elapsed_seconds']:.3f}s at {speed} "
+          f"→ {result['events_per_second']:,.0f} events/s (decode {result['decode_ms']:.1f} ms)")
+
+    print('\nHandler latency (ms):')
+    print(f"  {'event':<20} {'count':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for kind, h in result['handlers'].items():
+        print(f"  {kind:<20} {h['count']:>6} {h['p50_ms']:>9.2f} {h['p90_ms']:>9.2f} "
+              f"{h['p99_ms']:>9.2f} {h['max_ms']:>9.2f}")
+
+    if result['dropped']:
+        print(f"\nDropped by stage: {result['dropped']}")
+
+    print(f"\nAlerts that would have been sent: {len(result['alerts'])}")
+    for title, count in sorted(result['alerts_by_title'].items(), key=lambda item: -item[1]):
+        print(f"  {count:>5} × {title}")
+    for entry in result['alerts'][:show_alerts]:
+        first_line = entry['details'].split('\n', 1)[0]
+        print(f"  [{entry['at']:>8.3f}s] {entry['priority']} {entry['title']} — {first_line[:80]}")
+
+    if result['http_calls']:
+        print(f"\nOffline HTTP calls: {result['http_calls']}")
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description='Replay recorded gateway events through the monitors')
+    parser.add_argument('recording', help='path to a .jsonl.gz recording')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed (default: recorded speed)')
+    parser.add_argument('--fast', action='store_true', help='replay as fast as possible')
+    parser.add_argument('--watch', type=int, nargs='*', default=[], help='user ids to treat as watched')
+    parser.add_argument('--rate-limit', action='store_true', help='keep the live alert cooldown and rate limit')
+    parser.add_argument('--json', help='also write the full result to this file')
+    parser.add_argument('--show-alerts', type=int, default=10, help='alerts to print (default: 10)')
+    parser.add_argument('--verbose', action='store_true', help='keep handler logging')
+    args = parser.parse_args(argv)
+
+    from logger import logger
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    result = asyncio.run(replay(args.recording, 0 if args.fast else args.speed, args.watch, args.rate_limit))
+    print_report(result, args.show_alerts)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\nFull result written to {args.json}")
+
+if __name__ == '__main__':
+    sys.exit(main())
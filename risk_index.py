@@ -0,0 +1,200 @@
+# risk_index.py — Incremental Role & Member Risk Index
+import time
+import discord
+from logger import logger
+from permissions import get_risk_rank, RISK_LEVELS, RISK_HIGH
+
+# Built once per guild at ready, then kept current from gateway events
+_roles = {}    # {guild_id: {role_id: [risk_rank, member_count]}}
+_members = {}  # {guild_id: {member_id: risk_rank}} (risky members only)
+_deleted = {}  # {role_id: member_count} for deleted roles, until their alert reads it
+
+MAX_DELETED_ROLES = 1000
+
+def is_built(guild: discord.Guild) -> bool:
+    """Check if the index has been built for a guild"""
+    return guild.id in _roles
+
+def build(guild: discord.Guild):
+    """Build the index for a guild from scratch (one pass over members)"""
+    started = time.perf_counter()
+
+    roles = {role.id: [get_risk_rank(role.permissions), 0] for role in guild.roles if not role.is_default()}
+    members = {}
+
+    for member in guild.members:
+        for role in member.roles:
+            entry = roles.get(role.id)
+            if entry is not None:
+                entry[1] += 1
+
+        rank = get_risk_rank(member.guild_permissions)
+        if rank:
+            members[member.id] = rank
+
+    _roles[guild.id] = roles
+    _members[guild.id] = members
+
+    elapsed = (time.perf_counter() - started) * 1000
+    logger.info(f'Risk index built for guild {guild.id}: {len(roles)} roles, {len(members)} risky members ({elapsed:.0f}ms)')
+
+def discard(guild: discord.Guild):
+    """Forget a guild"""
+    _roles.pop(guild.id, None)
+    _members.pop(guild.id, None)
+
+# ============= QUERIES =============
+def get_role_risk(role: discord.Role) -> tuple:
+    """
+    Get a role's risk level and member count
+
+    Returns:
+        tuple: (risk_level, member_count)
+    """
+    entry = _roles.get(role.guild.id, {}).get(role.id)
+    if entry is None:
+        # Not indexed (yet): fall back to computing it
+        count = role.guild.member_count if role.is_default() else len(role.members)
+        return RISK_LEVELS[get_risk_rank(role.permissions)], count
+    return RISK_LEVELS[entry[0]], entry[1]
+
+def pop_deleted_member_count(role: discord.Role) -> int:
+    """Get how many members a deleted role had when it was deleted"""
+    count = _deleted.pop(role.id, None)
+    return count if count is not None else len(role.members)
+
+def get_member_rank(member: discord.Member) -> int:
+    """Get a member's effective risk rank"""
+    members = _members.get(member.guild.id)
+    if members is None:
+        return get_risk_rank(member.guild_permissions)
+    return members.get(member.id, 0)
+
+def get_risky_members(guild: discord.Guild, min_rank: int = RISK_HIGH) -> list:
+    """
+    Get members at or above a risk rank, riskiest first
+
+    Returns:
+        list: List of (member_id, risk_level) tuples
+    """
+    members = _members.get(guild.id, {})
+    risky = [(member_id, rank) for member_id, rank in members.items() if rank >= min_rank]
+    risky.sort(key=lambda item: item[1], reverse=True)
+    return [(member_id, RISK_LEVELS[rank]) for member_id, rank in risky]
+
+def get_stats(guild: discord.Guild) -> dict:
+    """Get index size for a guild"""
+    return {
+        'roles': len(_roles.get(guild.id, {})),
+        'risky_members': len(_members.get(guild.id, {}))
+    }
+
+# ============= INCREMENTAL UPDATES =============
+def _set_member_rank(member: discord.Member):
+    """Recompute one member's effective risk"""
+    members = _members.get(member.guild.id)
+    if members is None:
+        return
+
+    rank = get_risk_rank(member.guild_permissions)
+    if rank:
+        members[member.id] = rank
+    else:
+        members.pop(member.id, None)
+
+def on_role_create(role: discord.Role):
+    """Index a new role"""
+    roles = _roles.get(role.guild.id)
+    if roles is not None:
+        roles[role.id] = [get_risk_rank(role.permissions), 0]
+
+def on_role_update(before: discord.Role, after: discord.Role):
+    """Re-rank a role, and its members if its risk changed"""
+    guild_id = after.guild.id
+    if guild_id not in _roles:
+        return
+
+    # @everyone's permissions apply to every member
+    if after.is_default():
+        if before.permissions != after.permissions:
+            build(after.guild)
+        return
+
+    rank = get_risk_rank(after.permissions)
+    entry = _roles[guild_id].setdefault(after.id, [rank, 0])
+    if entry[0] == rank:
+        return
+
+    entry[0] = rank
+    for member in after.members:
+        _set_member_rank(member)
+
+def on_role_delete(role: discord.Role):
+    """Drop a role and re-rank the members who held it"""
+    roles = _roles.get(role.guild.id)
+    entry = roles.pop(role.id, None) if roles is not None else None
+    if entry is None:
+        return
+
+    _deleted[role.id] = entry[1]
+    if len(_deleted) > MAX_DELETED_ROLES:
+        del _deleted[next(iter(_deleted))]
+
+    # discord.py keeps the deleted id on members, so role.members still works
+    for member in role.members:
+        _set_member_rank(member)
+
+def on_member_join(member: discord.Member):
+    """Index a new member"""
+    roles = _roles.get(member.guild.id)
+    if roles is None:
+        return
+
+    for role in member.roles:
+        entry = roles.get(role.id)
+        if entry is not None:
+            entry[1] += 1
+    _set_member_rank(member)
+
+def on_member_remove(member: discord.Member):
+    """Drop a member"""
+    roles = _roles.get(member.guild.id)
+    if roles is None:
+        return
+
+    for role in member.roles:
+        entry = roles.get(role.id)
+        if entry is not None and entry[1] > 0:
+            entry[1] -= 1
+    _members[member.guild.id].pop(member.id, None)
+
+def on_member_update(before: discord.Member, after: discord.Member):
+    """Apply a member's role changes"""
+    roles = _roles.get(after.guild.id)
+    if roles is None or before.roles == after.roles:
+        return
+
+    before_ids = {role.id for role in before.roles}
+    after_ids = {role.id for role in after.roles}
+
+    for role_id in after_ids - before_ids:
+        entry = roles.get(role_id)
+        if entry is not None:
+            entry[1] += 1
+
+    for role_id in before_ids - after_ids:
+        entry = roles.get(role_id)
+        if entry is not None and entry[1] > 0:
+            entry[1] -= 1
+
+    _set_member_rank(after)
+
+def on_guild_update(before: discord.Guild, after: discord.Guild):
+    """The owner implicitly holds every permission"""
+    if after.id not in _members or before.owner_id == after.owner_id:
+        return
+
+    for owner_id in (before.owner_id, after.owner_id):
+        member = after.get_member(owner_id)
+        if member:
+            _set_member_rank(member)
@@ -0,0 +1,209 @@
+# sharding.py — Multi-Process Sharding
+#
+# launcher.py runs the bot as several processes, each connected with a
+# slice of the gateway shards (AutoShardedBot) and so owning a subset of
+# guilds. A guild's settings are only changed by the process that owns
+# it: DM commands and quick action replies about another process's guild
+# are forwarded there. Discord delivers DMs to shard 0, so process 0 owns
+# DM delivery: the other processes hand it their alerts and command
+# replies through the state service outbox, which keeps the alert rate
+# limit global.
+import asyncio
+import base64
+import io
+import types
+from typing import NamedTuple
+import discord
+from logger import logger
+import state_store
+from config import (
+    OWNER_ID, GUILD_IDS, SHARD_COUNT, SHARD_IDS, SHARD_PROCESS,
+    OUTBOX_POLL_INTERVAL, SHARD_HEARTBEAT_INTERVAL, QUICK_ACTION_TIMEOUT
+)
+
+DM_PROCESS = 0  # runs shard 0, which receives the owner's DMs
+
+enabled = state_store.enabled
+process = SHARD_PROCESS
+owns_dm = not enabled or SHARD_PROCESS == DM_PROCESS
+
+# Outbox traffic since startup (exported by metrics_server): {kind: count}
+forwarded = {'alert': 0, 'dm': 0, 'command': 0}
+received = {'alert': 0, 'dm': 0, 'command': 0}
+
+_task = None
+_heartbeat_task = None
+_command_tasks = set()
+
+class RemoteGuild(NamedTuple):
+    """A guild run by another process: enough to list it and label its alerts"""
+    id: int
+    name: str
+    member_count: int = None
+    icon_url: str = None
+    process: int = None
+
+    @property
+    def icon(self):
+        # Mirrors discord.Guild.icon for the alert embed
+        return types.SimpleNamespace(url=self.icon_url) if self.icon_url else None
+
+# ============= ROUTING =============
+def shard_for_guild(guild_id: int) -> int:
+    """Get the gateway shard a guild is on"""
+    return (guild_id >> 22) % SHARD_COUNT if SHARD_COUNT else 0
+
+def process_for_guild(guild_id: int):
+    """Get the process running a guild's shard (None if no process has registered it)"""
+    shard_id = shard_for_guild(guild_id)
+    for other, info in state_store.processes().items():
+        if shard_id in info['shard_ids']:
+            return other
+    return None
+
+def remote_guilds() -> list:
+    """Get the protected guilds other processes run, as RemoteGuilds"""
+    guilds = []
+    for other, info in sorted(state_store.processes().items()):
+        if other != process:
+            guilds.extend(RemoteGuild(*entry, process=other) for entry in info['guilds'])
+    return guilds
+
+async def publish(bot):
+    """Register this process's shards and protected guilds with the state service"""
+    if not enabled:
+        return
+    guilds = [
+        [guild.id, guild.name, guild.member_count, guild.icon.url if guild.icon else None]
+        for guild in bot.guilds if not GUILD_IDS or guild.id in GUILD_IDS
+    ]
+    try:
+        await asyncio.to_thread(state_store.register, process, list(SHARD_IDS), guilds)
+    except Exception as e:
+        logger.exception(f'Failed to register shard process {process}: {e}')
+
+# ============= QUICK ACTIONS =============
+def claim_action(action_id: str):
+    """Note that this process holds a quick action, so replies to it are routed here"""
+    if enabled:
+        try:
+            state_store.claim_action(action_id, process, QUICK_ACTION_TIMEOUT)
+        except Exception as e:
+            logger.exception(f'Failed to register quick action {action_id}: {e}')
+
+def action_process(action_id: str):
+    """Get the process holding a quick action (or None)"""
+    return state_store.action_owner(action_id)
+
+def latest_action():
+    """Get (action_id, process) of the newest quick action in any process (or None)"""
+    return state_store.latest_action(QUICK_ACTION_TIMEOUT)
+
+# ============= OUTBOX =============
+async def forward(kind: str, payload: dict, target: int = DM_PROCESS):
+    """Hand work to another process"""
+    await asyncio.to_thread(state_store.post, target, kind, payload)
+    forwarded[kind] += 1
+
+async def forward_alert(title: str, details: str, priority: str, embed_fields: list,
+                        quick_action_text: str, guild):
+    """Hand an alert to the DM process, which rate limits and sends it"""
+    await forward('alert', {
+        'title': title,
+        'details': details,
+        'priority': priority,
+        'embed_fields': embed_fields,
+        'quick_action_text': quick_action_text,
+        'guild': [guild.id, guild.name, guild.member_count, guild.icon.url if guild.icon else None] if guild else None
+    })
+
+async def forward_command(target: int, content: str, guild_id: int = None):
+    """Run a DM command in the process that owns its guild"""
+    await forward('command', {'content': content, 'guild_id': guild_id}, target=target)
+
+class _OwnerProxy:
+    """Stands in for the owner in a forwarded command: replies go back to the DM process"""
+    id = OWNER_ID
+
+    def __str__(self):
+        return f'owner ({OWNER_ID})'
+
+    async def send(self, content=None, *, embed=None, file=None, **kwargs):
+        payload = {'content': content}
+        if embed is not None:
+            payload['embed'] = embed.to_dict()
+        if file is not None:
+            file.reset()
+            payload['file'] = {'filename': file.filename, 'data': base64.b64encode(file.fp.read()).decode()}
+        await forward('dm', payload)
+
+class ForwardedMessage:
+    """The parts of a DM commands.handle_dm reads"""
+    guild = None
+    author = _OwnerProxy()
+
+    def __init__(self, content: str):
+        self.content = content
+
+async def _on_alert(bot, payload: dict):
+    from dm_notify import alert
+    guild = RemoteGuild(*payload['guild']) if payload['guild'] else None
+    await alert(
+        bot, payload['title'], payload['details'], payload['priority'],
+        embed_fields=payload['embed_fields'], quick_action_text=payload['quick_action_text'], guild=guild
+    )
+
+async def _on_dm(bot, payload: dict):
+    owner = await bot.fetch_user(OWNER_ID)
+    embed = discord.Embed.from_dict(payload['embed']) if payload.get('embed') else None
+    file = None
+    if payload.get('file'):
+        data = base64.b64decode(payload['file']['data'])
+        file = discord.File(io.BytesIO(data), filename=payload['file']['filename'])
+    await owner.send(payload['content'], embed=embed, file=file)
+
+async def _on_command(bot, payload: dict):
+    import commands
+    # Commands can run for a while (restore, profile): don't hold up the outbox
+    task = asyncio.create_task(commands.handle_forwarded(bot, ForwardedMessage(payload['content']), payload['guild_id']))
+    _command_tasks.add(task)
+    task.add_done_callback(_command_tasks.discard)
+
+_HANDLERS = {'alert': _on_alert, 'dm': _on_dm, 'command': _on_command}
+
+async def _drain(bot):
+    """Run work other processes handed to this one, in the order it was posted"""
+    while True:
+        await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+        try:
+            items = await asyncio.to_thread(state_store.take, process)
+        except Exception as e:
+            logger.exception(f'Outbox read failed: {e}')
+            continue
+        for kind, payload, created in items:
+            received[kind] += 1
+            try:
+                await _HANDLERS[kind](bot, payload)
+            except Exception as e:
+                logger.exception(f'Forwarded {kind} failed: {e}')
+
+async def _heartbeat(bot):
+    """Keep this process's guild list current (joins, leaves, renames)"""
+    while True:
+        await asyncio.sleep(SHARD_HEARTBEAT_INTERVAL)
+        if bot.is_ready():
+            await publish(bot)
+
+def start(bot):
+    """Start reading this process's outbox and refreshing its registration"""
+    global _task, _heartbeat_task
+
+    if not enabled or _task is not None:
+        return
+
+    _task = asyncio.create_task(_drain(bot))
+    _heartbeat_task = asyncio.create_task(_heartbeat(bot))
+    logger.info(
+        f'Shard process {process} started (shards {list(SHARD_IDS) or "all"} of {SHARD_COUNT}'
+        f'{", owns DM delivery" if owns_dm else ""})'
+    )
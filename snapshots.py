@@ -0,0 +1,575 @@
+# snapshots.py — Guild State Snapshots, Drift & Restore
+import asyncio
+import datetime
+import discord
+from logger import logger
+from db_manager import load_json, save_json, add_to_audit_log
+from permissions import get_permission_changes
+from config import (
+    GUILD_IDS, SNAPSHOT_PATH, SNAPSHOT_INTERVAL, SNAPSHOT_KEEP, SNAPSHOT_FULL_EVERY,
+    SNAPSHOT_RESTORE_DELAY, SNAPSHOT_RESTORE_RETRIES
+)
+
+SECTIONS = ('roles', 'channels', 'webhooks')
+
+# Store layout: {'next_id': int, 'guilds': {guild_id: [record, ...]}}
+# A record holds either the 'full' state or the 'delta' from the record
+# before it. The first record of a guild is always full.
+_latest = {}  # {guild_id: (snapshot_id, state)} newest materialized state
+_task = None
+_snapshot_lock = asyncio.Lock()  # one read-modify-write of the store at a time
+_restore_lock = asyncio.Lock()
+
+# ============= CAPTURE =============
+def _capture_role(role: discord.Role) -> dict:
+    return {
+        'name': role.name,
+        'permissions': role.permissions.value,
+        'position': role.position,
+        'color': role.color.value,
+        'hoist': role.hoist,
+        'mentionable': role.mentionable,
+        'managed': role.managed
+    }
+
+def _capture_channel(channel: discord.abc.GuildChannel) -> dict:
+    overwrites = {}
+    for target, overwrite in channel.overwrites.items():
+        allow, deny = overwrite.pair()
+        # Targets missing from the cache come back as Objects tagged with their type
+        is_role = isinstance(target, discord.Role) or getattr(target, 'type', None) is discord.Role
+        kind = 'role' if is_role else 'member'
+        overwrites[str(target.id)] = [kind, allow.value, deny.value]
+
+    return {
+        'name': channel.name,
+        'type': str(channel.type),
+        'position': channel.position,
+        'category_id': str(channel.category_id) if channel.category_id else None,
+        'topic': getattr(channel, 'topic', None),
+        'nsfw': getattr(channel, 'nsfw', False),
+        'slowmode_delay': getattr(channel, 'slowmode_delay', 0),
+        'bitrate': getattr(channel, 'bitrate', None),
+        'user_limit': getattr(channel, 'user_limit', None),
+        'overwrites': overwrites
+    }
+
+def capture_cached(guild: discord.Guild, previous: dict = None) -> dict:
+    """
+    Capture a guild's roles and channels from the local cache only
+
+    Webhooks are not cached, so the previous webhook section is carried
+    forward. Works while the gateway is disconnected.
+
+    Returns:
+        dict: State keyed by section, then by id (as str)
+    """
+    return {
+        'roles': {str(role.id): _capture_role(role) for role in guild.roles if not role.is_default()},
+        'channels': {str(channel.id): _capture_channel(channel) for channel in guild.channels},
+        'webhooks': (previous or {}).get('webhooks', {})
+    }
+
+async def capture(guild: discord.Guild, previous: dict = None) -> dict:
+    """
+    Capture a guild's roles, channels and webhooks
+
+    Webhooks need Manage Webhooks; without it the previous webhook
+    section is carried forward.
+
+    Returns:
+        dict: State keyed by section, then by id (as str)
+    """
+    state = capture_cached(guild, previous)
+
+    try:
+        webhooks = await guild.webhooks()
+        state['webhooks'] = {
+            str(webhook.id): {
+                'name': webhook.name,
+                'channel_id': str(webhook.channel_id) if webhook.channel_id else None,
+                'creator_id': str(webhook.user.id) if webhook.user else None
+            }
+            for webhook in webhooks
+        }
+    except discord.Forbidden:
+        logger.warning(f'No permission to read webhooks in guild {guild.id}, keeping previous')
+
+    return state
+
+# ============= DELTAS =============
+def _delta(old: dict, new: dict) -> dict:
+    """Get what changed between two states (empty if nothing did)"""
+    delta = {}
+    for section in SECTIONS:
+        before = old.get(section, {})
+        after = new.get(section, {})
+        upserts = {key: value for key, value in after.items() if before.get(key) != value}
+        removed = [key for key in before if key not in after]
+        if upserts or removed:
+            delta[section] = {'set': upserts, 'removed': removed}
+    return delta
+
+def _apply(state: dict, delta: dict) -> dict:
+    """Apply a delta to a state, returning a new state"""
+    result = {section: dict(state.get(section, {})) for section in SECTIONS}
+    for section, change in delta.items():
+        result[section].update(change['set'])
+        for key in change['removed']:
+            result[section].pop(key, None)
+    return result
+
+def _materialize(records: list, index: int) -> dict:
+    """Rebuild the state of records[index] from the nearest full record"""
+    start = index
+    while 'full' not in records[start]:
+        start -= 1
+
+    state = records[start]['full']
+    for record in records[start + 1:index + 1]:
+        state = _apply(state, record['delta'])
+    return state
+
+def _fold_oldest(records: list):
+    """Drop the oldest record, turning the next one into a full record"""
+    if len(records) > 1 and 'delta' in records[1]:
+        records[1]['full'] = _apply(records[0]['full'], records[1].pop('delta'))
+    records.pop(0)
+
+# ============= STORE =============
+def _load_store() -> dict:
+    try:
+        store = load_json(SNAPSHOT_PATH)
+    except Exception as e:
+        logger.exception(f'Failed to load snapshots: {e}')
+        store = None
+    return store or {'next_id': 1, 'guilds': {}}
+
+def _save_store(store: dict):
+    try:
+        save_json(SNAPSHOT_PATH, store, indent=None)
+    except Exception as e:
+        logger.exception(f'Failed to save snapshots: {e}')
+
+def _latest_state(guild_id: str, records: list):
+    """Get the newest stored state for a guild (cached in memory)"""
+    if not records:
+        return None
+    cached = _latest.get(guild_id)
+    if cached and cached[0] == records[-1]['id']:
+        return cached[1]
+    state = _materialize(records, len(records) - 1)
+    _latest[guild_id] = (records[-1]['id'], state)
+    return state
+
+def _find(records: list, snapshot_id: int) -> int:
+    """Get a snapshot's index, or -1"""
+    for index, record in enumerate(records):
+        if record['id'] == snapshot_id:
+            return index
+    return -1
+
+# ============= SNAPSHOTS =============
+async def take_snapshot(guild: discord.Guild, reason: str = 'manual') -> dict:
+    """
+    Snapshot a guild, storing only the changes since the last snapshot
+
+    Automatic snapshots are skipped when nothing changed.
+
+    Returns:
+        dict: The new record's summary, or None if skipped
+    """
+    async with _snapshot_lock:
+        return await _take_snapshot(guild, reason)
+
+async def _take_snapshot(guild: discord.Guild, reason: str) -> dict:
+    guild_id = str(guild.id)
+    store = _load_store()
+    records = store['guilds'].setdefault(guild_id, [])
+    latest = _latest_state(guild_id, records)
+
+    state = await capture(guild, latest)
+    record = {
+        'id': store['next_id'],
+        'time': datetime.datetime.utcnow().isoformat(),
+        'reason': reason,
+        'counts': {section: len(state[section]) for section in SECTIONS}
+    }
+
+    deltas_since_full = 0
+    for previous in reversed(records):
+        if 'full' in previous:
+            break
+        deltas_since_full += 1
+
+    if latest is not None:
+        delta = _delta(latest, state)
+        if not delta and reason == 'auto':
+            return None
+        record['changes'] = sum(len(change['set']) + len(change['removed']) for change in delta.values())
+
+    if latest is None or deltas_since_full >= SNAPSHOT_FULL_EVERY:
+        record['full'] = state
+    else:
+        record['delta'] = delta
+
+    records.append(record)
+    store['next_id'] += 1
+    while len(records) > SNAPSHOT_KEEP:
+        _fold_oldest(records)
+
+    _save_store(store)
+    _latest[guild_id] = (record['id'], state)
+
+    logger.info(f'Snapshot #{record["id"]} taken for guild {guild.id} ({reason})')
+    return _summary(record)
+
+def _summary(record: dict) -> dict:
+    return {
+        'id': record['id'],
+        'time': record['time'],
+        'reason': record['reason'],
+        'full': 'full' in record,
+        'changes': record.get('changes'),
+        'counts': record['counts']
+    }
+
+def list_snapshots(guild: discord.Guild) -> list:
+    """
+    Get stored snapshots for a guild, newest first
+
+    Returns:
+        list: List of summary dicts
+    """
+    records = _load_store()['guilds'].get(str(guild.id), [])
+    return [_summary(record) for record in reversed(records)]
+
+def get_snapshot(guild: discord.Guild, snapshot_id: int) -> dict:
+    """Get a snapshot's full state, or None if it does not exist"""
+    records = _load_store()['guilds'].get(str(guild.id), [])
+    index = _find(records, snapshot_id)
+    if index < 0:
+        return None
+    return _materialize(records, index)
+
+def get_latest_snapshot(guild: discord.Guild) -> tuple:
+    """
+    Get the newest stored snapshot for a guild
+
+    Returns:
+        tuple: (summary dict, state dict), or (None, None) if there is none
+    """
+    guild_id = str(guild.id)
+    records = _load_store()['guilds'].get(guild_id, [])
+    if not records:
+        return None, None
+    return _summary(records[-1]), _latest_state(guild_id, records)
+
+# ============= DRIFT =============
+_FIELD_NAMES = {
+    'slowmode_delay': 'slowmode',
+    'category_id': 'category',
+    'user_limit': 'user limit',
+}
+
+def _describe_change(section: str, before: dict, after: dict) -> list:
+    """Describe what changed in one role/channel/webhook"""
+    parts = []
+    for field, old in before.items():
+        new = after.get(field)
+        if old == new or field == 'position':
+            continue
+        if field == 'permissions':
+            changes = get_permission_changes(discord.Permissions(old), discord.Permissions(new))
+            if changes['added']:
+                parts.append(f"+{', +'.join(changes['added'][:5])}")
+            if changes['removed']:
+                parts.append(f"-{', -'.join(changes['removed'][:5])}")
+        elif field == 'overwrites':
+            parts.append(f'overwrites ({len(old)} → {len(new)} targets)' if len(old) != len(new) else 'overwrites')
+        elif field in ('name', 'topic'):
+            parts.append(f'{field} `{old}` → `{new}`')
+        else:
+            parts.append(_FIELD_NAMES.get(field, field))
+    return parts
+
+def compute_drift(old: dict, new: dict) -> dict:
+    """
+    Compare two states
+
+    Returns:
+        dict: {section: {'deleted': [...], 'created': [...], 'changed': [...], 'moved': int}}
+        where deleted/created are (id, name) and changed are (id, name, [descriptions])
+    """
+    drift = {}
+    for section in SECTIONS:
+        before = old.get(section, {})
+        after = new.get(section, {})
+
+        deleted = [(key, value['name']) for key, value in before.items() if key not in after]
+        created = [(key, value['name']) for key, value in after.items() if key not in before]
+        changed = []
+        moved = 0
+
+        for key, value in before.items():
+            current = after.get(key)
+            if current is None or current == value:
+                continue
+            parts = _describe_change(section, value, current)
+            if parts:
+                changed.append((key, current['name'], parts))
+            elif value.get('position') != current.get('position'):
+                moved += 1
+
+        drift[section] = {'deleted': deleted, 'created': created, 'changed': changed, 'moved': moved}
+    return drift
+
+async def diff_live(guild: discord.Guild, snapshot_id: int) -> dict:
+    """
+    Compare a snapshot against the guild as it is now
+
+    Returns:
+        dict: Drift (see compute_drift), or None if the snapshot does not exist
+    """
+    old = get_snapshot(guild, snapshot_id)
+    if old is None:
+        return None
+    live = await capture(guild, old)
+    return compute_drift(old, live)
+
+def format_drift(drift: dict, max_items: int = 15) -> list:
+    """Format drift as message lines"""
+    titles = {'roles': '🎭 Roles', 'channels': '📁 Channels', 'webhooks': '🪝 Webhooks'}
+    lines = []
+
+    for section in SECTIONS:
+        entry = drift[section]
+        if not (entry['deleted'] or entry['created'] or entry['changed'] or entry['moved']):
+            continue
+
+        lines.append(f"\n**{titles[section]}:**")
+        for _, name in entry['deleted'][:max_items]:
+            lines.append(f"🗑️ Deleted: `{name}`")
+        for key, name in entry['created'][:max_items]:
+            lines.append(f"➕ Created: `{name}` (`{key}`)")
+        for _, name, parts in entry['changed'][:max_items]:
+            lines.append(f"✏️ `{name}`: {'; '.join(parts)}")
+
+        hidden = sum(max(len(entry[kind]) - max_items, 0) for kind in ('deleted', 'created', 'changed'))
+        if hidden:
+            lines.append(f"... and {hidden} more")
+        if entry['moved']:
+            lines.append(f"↕️ {entry['moved']} reordered")
+
+    return lines
+
+# ============= RESTORE =============
+class RestoreExecutor:
+    """Run restore API calls one at a time, paced and retried on rate limits"""
+
+    def __init__(self, delay: float = SNAPSHOT_RESTORE_DELAY, retries: int = SNAPSHOT_RESTORE_RETRIES):
+        self.delay = delay
+        self.retries = retries
+        self.done = []
+        self.failed = []
+
+    async def run(self, description: str, factory):
+        """
+        Run one step (factory returns a fresh coroutine per attempt)
+
+        Returns:
+            The step's result, or None if it failed
+        """
+        for attempt in range(self.retries):
+            try:
+                result = await factory()
+                self.done.append(description)
+                await asyncio.sleep(self.delay)
+                return result
+            except discord.RateLimited as e:
+                # discord.py waits out rate limits itself and only raises
+                # this past the client's max_ratelimit_timeout
+                logger.warning(f'Restore step "{description}" rate limited, retrying in {e.retry_after:.1f}s')
+                await asyncio.sleep(e.retry_after)
+                continue
+            except discord.HTTPException as e:
+                # Server errors (and a 429 that got through) are worth another try
+                if e.status == 429 or e.status >= 500:
+                    wait = self.delay * (2 ** (attempt + 1))
+                    logger.warning(f'Restore step "{description}" hit {e.status}, retrying in {wait:.1f}s')
+                    await asyncio.sleep(wait)
+                    continue
+                self.failed.append(f'{description}: {e.text or e}')
+                return None
+            except Exception as e:
+                logger.exception(f'Restore step "{description}" failed: {e}')
+                self.failed.append(f'{description}: {e}')
+                return None
+
+        self.failed.append(f'{description}: gave up after {self.retries} attempts')
+        return None
+
+def plan_restore(guild: discord.Guild, snapshot_id: int) -> dict:
+    """
+    Get the roles and channels in a snapshot that no longer exist
+
+    Managed (bot/integration) roles cannot be recreated and are skipped.
+
+    Returns:
+        dict: {'roles': [(id, data)], 'channels': [(id, data)]}, or None if the snapshot does not exist
+    """
+    state = get_snapshot(guild, snapshot_id)
+    if state is None:
+        return None
+
+    live_roles = {str(role.id) for role in guild.roles}
+    live_channels = {str(channel.id) for channel in guild.channels}
+
+    roles = [
+        (key, data) for key, data in state['roles'].items()
+        if key not in live_roles and not data['managed']
+    ]
+    channels = [(key, data) for key, data in state['channels'].items() if key not in live_channels]
+
+    roles.sort(key=lambda item: item[1]['position'])
+    # Categories first so recreated channels can go back into them
+    channels.sort(key=lambda item: (item[1]['type'] != 'category', item[1]['position']))
+    return {'roles': roles, 'channels': channels}
+
+def _overwrites_for(guild: discord.Guild, data: dict, role_map: dict) -> dict:
+    """Translate stored overwrites, pointing at recreated roles where needed"""
+    overwrites = {}
+    for target_id, (kind, allow, deny) in data['overwrites'].items():
+        if kind == 'role':
+            target = role_map.get(target_id) or guild.get_role(int(target_id))
+            if target is None:
+                continue
+        else:
+            target = guild.get_member(int(target_id)) or discord.Object(id=int(target_id))
+        overwrites[target] = discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny))
+    return overwrites
+
+def _channel_factory(guild: discord.Guild, data: dict, category, overwrites: dict, reason: str):
+    """Get a coroutine factory that recreates a channel, or None for unsupported types"""
+    kind = data['type']
+    kwargs = {'name': data['name'], 'overwrites': overwrites, 'position': data['position'], 'reason': reason}
+
+    if kind == 'category':
+        return lambda: guild.create_category(**kwargs)
+
+    kwargs['category'] = category
+    if kind in ('text', 'news', 'forum'):
+        kwargs['nsfw'] = data['nsfw']
+        kwargs['slowmode_delay'] = data['slowmode_delay'] or 0
+        if data['topic']:
+            kwargs['topic'] = data['topic']
+        if kind == 'forum':
+            return lambda: guild.create_forum(**kwargs)
+        return lambda: guild.create_text_channel(news=(kind == 'news'), **kwargs)
+
+    if kind in ('voice', 'stage_voice'):
+        if data['bitrate']:
+            kwargs['bitrate'] = min(data['bitrate'], int(guild.bitrate_limit))
+        if data['user_limit'] is not None:
+            kwargs['user_limit'] = data['user_limit']
+        if kind == 'stage_voice':
+            return lambda: guild.create_stage_channel(**kwargs)
+        return lambda: guild.create_voice_channel(**kwargs)
+
+    return None
+
+def is_restoring() -> bool:
+    """Check if a restore is running"""
+    return _restore_lock.locked()
+
+async def restore(guild: discord.Guild, snapshot_id: int) -> dict:
+    """
+    Recreate roles and channels deleted since a snapshot
+
+    Roles are created first (lowest first) and then moved back to their
+    positions, so that recreated channels can point their overwrites at
+    the new role ids. Every API call goes through one RestoreExecutor.
+
+    Returns:
+        dict: {'roles': int, 'channels': int, 'skipped': [...], 'failed': [...]}, or None if the snapshot does not exist
+    """
+    async with _restore_lock:
+        plan = plan_restore(guild, snapshot_id)
+        if plan is None:
+            return None
+
+        reason = f'Q Bot restore from snapshot #{snapshot_id}'
+        executor = RestoreExecutor()
+        role_map = {}     # {old role id: new Role}
+        channel_map = {}  # {old channel id: new channel}
+        skipped = []
+
+        for old_id, data in plan['roles']:
+            role = await executor.run(f"role {data['name']}", lambda data=data: guild.create_role(
+                name=data['name'],
+                permissions=discord.Permissions(data['permissions']),
+                colour=discord.Colour(data['color']),
+                hoist=data['hoist'],
+                mentionable=data['mentionable'],
+                reason=reason
+            ))
+            if role is not None:
+                role_map[old_id] = role
+
+        if role_map:
+            # Roles above the bot's top role cannot be moved there; cap just below it
+            top = guild.me.top_role.position if guild.me else 1
+            positions = {}
+            for old_id, data in plan['roles']:
+                if old_id in role_map:
+                    positions[role_map[old_id]] = max(1, min(data['position'], top - 1))
+            await executor.run('role positions', lambda: guild.edit_role_positions(positions, reason=reason))
+
+        for old_id, data in plan['channels']:
+            category = None
+            if data['category_id']:
+                category = channel_map.get(data['category_id']) or guild.get_channel(int(data['category_id']))
+
+            factory = _channel_factory(guild, data, category, _overwrites_for(guild, data, role_map), reason)
+            if factory is None:
+                skipped.append(f"{data['type']} channel {data['name']}")
+                continue
+
+            channel = await executor.run(f"channel {data['name']}", factory)
+            if channel is not None:
+                channel_map[old_id] = channel
+
+        result = {
+            'roles': len(role_map),
+            'channels': len(channel_map),
+            'skipped': skipped,
+            'failed': executor.failed
+        }
+
+        await add_to_audit_log('guild_restore', {
+            'guild_id': guild.id,
+            'snapshot_id': snapshot_id,
+            'role_map': {old_id: role.id for old_id, role in role_map.items()},
+            'channel_map': {old_id: channel.id for old_id, channel in channel_map.items()},
+            'failed': executor.failed
+        })
+
+        logger.info(f'Restore from snapshot #{snapshot_id}: {result["roles"]} roles, {result["channels"]} channels, {len(executor.failed)} failed')
+        return result
+
+# ============= PERIODIC SNAPSHOTS =============
+async def _snapshot_loop(bot):
+    while True:
+        for guild in bot.guilds:
+            if not GUILD_IDS or guild.id in GUILD_IDS:
+                try:
+                    await take_snapshot(guild, 'auto')
+                except Exception as e:
+                    logger.exception(f'Periodic snapshot failed: {e}')
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+
+def start(bot):
+    """Start periodic snapshots (no-op if already running)"""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_snapshot_loop(bot))
@@ -0,0 +1,83 @@
+# startup.py — One-Time Initialization & Startup Timeline
+#
+# on_ready fires again after every gateway session that had to re-identify.
+# Steps that only make sense once per process (slash command sync, the
+# startup DM, background loops) are guarded here; the rest run again.
+# Independent steps run concurrently, and each ready logs a timeline of
+# when every step started and how long it took.
+import inspect
+import time
+from logger import logger
+import perf
+
+_process_started = time.perf_counter()  # bot.py imports this before the rest of the bot
+
+_done = set()  # one-time steps that completed
+readies = 0  # on_ready calls so far
+
+# Current timeline: [(label, start offset s, duration s or None, status)]
+_timeline = []
+_timeline_started = _process_started
+
+def begin(label: str):
+    """Start a new timeline (the first one is measured from process start)"""
+    global _timeline_started, readies
+    readies += 1
+    if readies > 1:
+        _timeline.clear()
+        _timeline_started = time.perf_counter()
+    mark(label)
+
+def mark(label: str):
+    """Note a point in time on the timeline"""
+    _timeline.append((label, time.perf_counter() - _timeline_started, None, 'mark'))
+
+def is_done(name: str) -> bool:
+    """Whether a one-time step already completed"""
+    return name in _done
+
+async def step(name: str, fn, *args, once: bool = False):
+    """
+    Run one initialization step, timing it on the timeline
+
+    A once step is skipped after it has succeeded; a failed one is tried
+    again on the next ready. Failures are logged, never raised, so one
+    step can't stop the others.
+
+    Returns:
+        bool: Whether the step ran and succeeded
+    """
+    if once and name in _done:
+        return False
+
+    started = time.perf_counter()
+    status = 'ok'
+    try:
+        result = fn(*args)
+        if inspect.isawaitable(result):
+            await result
+        if once:
+            _done.add(name)
+    except Exception as e:
+        status = 'failed'
+        logger.exception(f'Startup step {name} failed: {e}')
+    duration = time.perf_counter() - started
+    perf.record('startup', name, duration, status == 'failed')
+    _timeline.append((name, started - _timeline_started, duration, status))
+    return status == 'ok'
+
+def log_timeline(title: str):
+    """Log the timeline, one line per step in start order"""
+    total = time.perf_counter() - _timeline_started
+    lines = [f'{title} timeline ({total:.2f}s):']
+    for label, offset, duration, status in sorted(_timeline, key=lambda entry: entry[1]):
+        if duration is None:
+            lines.append(f'  {offset:8.3f}s  {label}')
+        else:
+            flag = '' if status == 'ok' else f'  [{status}]'
+            lines.append(f'  {offset:8.3f}s  {label:<24} {duration * 1000:9.1f} ms{flag}')
+    logger.info('\n'.join(lines))
+
+def get_timeline() -> list:
+    """Get the latest timeline as (label, start offset s, duration s or None, status) tuples"""
+    return sorted(_timeline, key=lambda entry: entry[1])
@@ -0,0 +1,220 @@
+# state_store.py — Shared State Service (SQLite)
+#
+# When the bot runs as several shard processes (launcher.py), the JSON
+# stores db_manager would keep on disk (db.json, guilds/<id>.json,
+# snapshots) are kept here instead, keyed by the same path, so every
+# process sees one copy. The same database carries the outbox the
+# processes use to hand work to each other and a registry of which
+# process runs which shards and guilds. WAL mode lets readers carry on
+# while another process writes.
+import json
+import sqlite3
+import threading
+import time
+from config import STATE_DB_PATH, SHARD_PROCESSES
+
+# Whether this process keeps its stores here rather than in files
+enabled = SHARD_PROCESSES > 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_target ON outbox (target, id);
+CREATE TABLE IF NOT EXISTS shards (
+    process INTEGER PRIMARY KEY,
+    shard_ids TEXT NOT NULL,
+    guilds TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quick_actions (
+    action_id TEXT PRIMARY KEY,
+    process INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+_conn = None
+_lock = threading.Lock()  # one connection, used from the loop and from worker threads
+_data_version = None
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        # Autocommit; multi-statement changes open their own transaction
+        _conn = sqlite3.connect(STATE_DB_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+        _conn.execute('PRAGMA journal_mode=WAL')
+        _conn.execute('PRAGMA synchronous=NORMAL')
+        _conn.executescript(SCHEMA)
+    return _conn
+
+class _transaction:
+    """BEGIN IMMEDIATE ... COMMIT, so a read-modify-write is atomic across processes"""
+
+    def __enter__(self) -> sqlite3.Connection:
+        _lock.acquire()
+        try:
+            self.conn = _connect()
+            self.conn.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            _lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            _lock.release()
+
+# ============= DOCUMENTS =============
+def get(name: str):
+    """
+    Get a stored document
+
+    Returns:
+        str: Its content, or None if it was never stored
+    """
+    with _lock:
+        row = _connect().execute('SELECT content FROM documents WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+def put(name: str, content: str):
+    """Store a document, replacing any previous content"""
+    with _lock:
+        _connect().execute(
+            'INSERT OR REPLACE INTO documents (name, content, updated) VALUES (?, ?, ?)',
+            (name, content, time.time())
+        )
+
+def update(name: str, change):
+    """
+    Replace a document with change(current content or None), holding the
+    write lock throughout so no other process can interleave
+    """
+    with _transaction() as conn:
+        row = conn.execute('SELECT content FROM documents WHERE name = ?', (name,)).fetchone()
+        content = change(row[0] if row else None)
+        conn.execute(
+            'INSERT OR REPLACE INTO documents (name, content, updated) VALUES (?, ?, ?)',
+            (name, content, time.time())
+        )
+
+def names(prefix: str) -> list:
+    """Get the names of stored documents starting with prefix"""
+    with _lock:
+        rows = _connect().execute(
+            'SELECT name FROM documents WHERE substr(name, 1, ?) = ?', (len(prefix), prefix)
+        ).fetchall()
+    return [row[0] for row in rows]
+
+# ============= OUTBOX =============
+def post(target: int, kind: str, payload: dict):
+    """Hand a piece of work to another process"""
+    with _lock:
+        _connect().execute(
+            'INSERT INTO outbox (target, kind, payload, created) VALUES (?, ?, ?, ?)',
+            (target, kind, json.dumps(payload, ensure_ascii=False), time.time())
+        )
+
+def take(target: int, limit: int = 100) -> list:
+    """
+    Remove and return the oldest work waiting for a process
+
+    Cheap when nothing changed: the table is only read after another
+    connection has committed since the last call.
+
+    Returns:
+        list: (kind, payload dict, created) tuples, oldest first
+    """
+    global _data_version
+    with _lock:
+        conn = _connect()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if version == _data_version:
+            return []
+        _data_version = version
+
+        # Each process is the only reader of its own rows, so the read and
+        # the delete need no transaction between them
+        rows = conn.execute(
+            'SELECT id, kind, payload, created FROM outbox WHERE target = ? ORDER BY id LIMIT ?',
+            (target, limit)
+        ).fetchall()
+        if rows:
+            conn.execute('DELETE FROM outbox WHERE target = ? AND id <= ?', (target, rows[-1][0]))
+
+    if len(rows) == limit:
+        _data_version = None  # more waiting: look again next time
+    return [(kind, json.loads(payload), created) for _, kind, payload, created in rows]
+
+# ============= SHARD REGISTRY =============
+def register(process: int, shard_ids: list, guilds: list):
+    """Record the shards and guilds ([id, name, member_count, icon_url]) a process runs"""
+    with _lock:
+        _connect().execute(
+            'INSERT OR REPLACE INTO shards (process, shard_ids, guilds, heartbeat) VALUES (?, ?, ?, ?)',
+            (process, json.dumps(shard_ids), json.dumps(guilds, ensure_ascii=False), time.time())
+        )
+
+def processes() -> dict:
+    """
+    Get every registered process
+
+    Returns:
+        dict: {process: {'shard_ids': [...], 'guilds': [...], 'heartbeat': float}}
+    """
+    with _lock:
+        rows = _connect().execute('SELECT process, shard_ids, guilds, heartbeat FROM shards').fetchall()
+    return {
+        process: {'shard_ids': json.loads(shard_ids), 'guilds': json.loads(guilds), 'heartbeat': heartbeat}
+        for process, shard_ids, guilds, heartbeat in rows
+    }
+
+# ============= QUICK ACTIONS =============
+def claim_action(action_id: str, process: int, max_age: float):
+    """Record which process holds a quick action (and forget expired ones)"""
+    now = time.time()
+    with _transaction() as conn:
+        conn.execute('DELETE FROM quick_actions WHERE created < ?', (now - max_age,))
+        conn.execute(
+            'INSERT OR REPLACE INTO quick_actions (action_id, process, created) VALUES (?, ?, ?)',
+            (action_id, process, now)
+        )
+
+def action_owner(action_id: str):
+    """Get the process holding a quick action (or None)"""
+    with _lock:
+        row = _connect().execute('SELECT process FROM quick_actions WHERE action_id = ?', (action_id,)).fetchone()
+    return row[0] if row else None
+
+def latest_action(max_age: float):
+    """
+    Get the newest unexpired quick action in any process
+
+    Returns:
+        tuple: (action_id, process), or None
+    """
+    with _lock:
+        row = _connect().execute(
+            'SELECT action_id, process FROM quick_actions WHERE created >= ? ORDER BY created DESC LIMIT 1',
+            (time.time() - max_age,)
+        ).fetchone()
+    return tuple(row) if row else None
+
+# ============= LAUNCHER =============
+def reset_session():
+    """Forget the previous run's registry, quick actions and forwarded commands (pending alerts are kept)"""
+    with _transaction() as conn:
+        conn.execute('DELETE FROM shards')
+        conn.execute('DELETE FROM quick_actions')
+        conn.execute("DELETE FROM outbox WHERE kind = 'command'")
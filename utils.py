@@ -83,6 +83,19 @@ def is_suspicious_account(user: discord.User) -> tuple[bool, str]:
     
     return False, "OK"
 
+def suspicious_until(user: discord.User) -> float:
+    """
+    Get when a user stops counting as suspicious (is_suspicious_account)
+
+    Returns:
+        float: Unix time, inf while they have no avatar, None if they aren't suspicious
+    """
+    if user.avatar is None:
+        return float('inf')
+
+    until = user.created_at + timedelta(days=7)
+    return until.timestamp() if until.replace(tzinfo=None) > datetime.utcnow() else None
+
 def format_permissions(perms: discord.Permissions) -> str:
     """Format permissions for display"""
     if perms.administrator:
@@ -171,6 +184,23 @@ def parse_user_id(text: str) -> int:
     except ValueError:
         return None
 
+def parse_channel_id(text: str) -> int:
+    """
+    Parse channel ID from text (handles mentions and plain IDs)
+    
+    Returns:
+        int: Channel ID or None if invalid
+    """
+    # Remove mention format <#123>
+    text = text.strip()
+    if text.startswith('<#') and text.endswith('>'):
+        text = text[2:-1]
+    
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
 def format_duration(seconds: int) -> str:
     """Format seconds into human readable duration"""
     if seconds < 60:
@@ -185,3 +215,19 @@ def format_duration(seconds: int) -> str:
         days = seconds // 86400
         hours = (seconds % 86400) // 3600
         return f"{days}d {hours}h"
+
+async def get_or_fetch_member(guild: discord.Guild, user_id: int):
+    """
+    Get a member from the cache, or from the API when the guild's member
+    list isn't cached (see cache_policy.py)
+    
+    Returns:
+        discord.Member: The member, or None if they are not in the guild (or can't be fetched)
+    """
+    member = guild.get_member(user_id)
+    if member is not None or guild.chunked:
+        return member
+    try:
+        return await guild.fetch_member(user_id)
+    except discord.HTTPException:  # NotFound: not a member
+        return None
@@ -1,8 +1,8 @@
 # whitelist.py — Whitelist Management System
-from db_manager import load_db, save_db, is_whitelisted
+from db_manager import get_partition, save_partition, is_whitelisted
 from logger import logger
 
-def add_to_whitelist(user_id: int) -> tuple[bool, str]:
+def add_to_whitelist(guild_id: int, user_id: int) -> tuple[bool, str]:
     """
     Add user to whitelist
     
@@ -11,24 +11,21 @@ def add_to_whitelist(user_id: int) -> tuple[bool, str]:
     """
     try:
         user_id_str = str(user_id)
-        db = load_db()
-        
-        whitelist = db.get('whitelist', [])
+        whitelist = get_partition(guild_id)['whitelist']
         
         if user_id_str in whitelist:
             return False, f'❌ User `{user_id}` already in whitelist'
         
         whitelist.append(user_id_str)
-        db['whitelist'] = whitelist
-        save_db(db)
+        save_partition(guild_id)
         
-        logger.info(f'User {user_id} added to whitelist')
+        logger.info(f'User {user_id} added to whitelist in guild {guild_id}')
         return True, f'✅ User `{user_id}` added to whitelist'
     except Exception as e:
         logger.exception(f'Failed to add to whitelist: {e}')
         return False, f'❌ Error: {str(e)}'
 
-def remove_from_whitelist(user_id: int) -> tuple[bool, str]:
+def remove_from_whitelist(guild_id: int, user_id: int) -> tuple[bool, str]:
     """
     Remove user from whitelist
     
@@ -37,32 +34,28 @@ def remove_from_whitelist(user_id: int) -> tuple[bool, str]:
     """
     try:
         user_id_str = str(user_id)
-        db = load_db()
-        
-        whitelist = db.get('whitelist', [])
+        whitelist = get_partition(guild_id)['whitelist']
         
         if user_id_str not in whitelist:
             return False, f'❌ User `{user_id}` not in whitelist'
         
         whitelist.remove(user_id_str)
-        db['whitelist'] = whitelist
-        save_db(db)
+        save_partition(guild_id)
         
-        logger.info(f'User {user_id} removed from whitelist')
+        logger.info(f'User {user_id} removed from whitelist in guild {guild_id}')
         return True, f'✅ User `{user_id}` removed from whitelist'
     except Exception as e:
         logger.exception(f'Failed to remove from whitelist: {e}')
         return False, f'❌ Error: {str(e)}'
 
-def get_whitelist_users() -> list:
+def get_whitelist_users(guild_id: int) -> list:
     """Get list of whitelisted users"""
-    db = load_db()
-    return db.get('whitelist', [])
+    return get_partition(guild_id)['whitelist']
 
-def get_whitelist_display() -> str:
+def get_whitelist_display(guild_id: int) -> str:
     """Get formatted whitelist for display"""
     try:
-        whitelist = get_whitelist_users()
+        whitelist = get_whitelist_users(guild_id)
         
         if not whitelist:
             return '📋 **Whitelist:** Empty'
@@ -76,15 +69,15 @@ def get_whitelist_display() -> str:
         logger.exception(f'Failed to get whitelist display: {e}')
         return f'❌ Error: {str(e)}'
 
-def clear_whitelist() -> tuple[bool, str]:
+def clear_whitelist(guild_id: int) -> tuple[bool, str]:
     """Clear entire whitelist"""
     try:
-        db = load_db()
-        count = len(db.get('whitelist', []))
-        db['whitelist'] = []
-        save_db(db)
+        partition = get_partition(guild_id)
+        count = len(partition['whitelist'])
+        partition['whitelist'] = []
+        save_partition(guild_id)
         
-        logger.info('Whitelist cleared')
+        logger.info(f'Whitelist cleared in guild {guild_id}')
         return True, f'✅ Whitelist cleared ({count} users removed)'
     except Exception as e:
         logger.exception(f'Failed to clear whitelist: {e}')